@@ -1,255 +1,203 @@
 import sys
-import struct
 import os
 import time
+import json
+import argparse
 
-def read_pcap_header(f):
-    """读取PCAP文件头"""
-    magic = f.read(4)
-    if magic != b'\xd4\xc3\xb2\xa1':  # little endian
-        if magic == b'\xa1\xb2\xc3\xd4':  # big endian
-            raise Exception("Big endian PCAP files not supported")
-        else:
-            raise Exception("Not a valid PCAP file")
-    
-    # 读取版本号、时区、时间戳精度等
-    version_major = struct.unpack('<H', f.read(2))[0]
-    version_minor = struct.unpack('<H', f.read(2))[0]
-    thiszone = struct.unpack('<l', f.read(4))[0]
-    sigfigs = struct.unpack('<L', f.read(4))[0]
-    snaplen = struct.unpack('<L', f.read(4))[0]
-    network = struct.unpack('<L', f.read(4))[0]
-    
-    return {
-        'version_major': version_major,
-        'version_minor': version_minor,
-        'snaplen': snaplen,
-        'network': network
-    }
+from pcap_analysis.analyzer import analyze, analyze_file as analyze_with_backend
+from pcap_analysis.backends.native import NativeBackend, add_record, link_layer_for
+from pcap_analysis.cli import add_analysis_arguments, decap_options, run_analysis_args
+from pcap_analysis.pcapfile import CorruptRecord, corrupt_record_warning, max_record_len
+from pcap_analysis.result import print_result
+# 以下名称保留在本模块中，兼容直接导入它们的旧代码
+from pcap_analysis.packet import parse_ethernet_header, parse_ip_header  # noqa: F401
+from pcap_analysis.pcapfile import (PCAP_GLOBAL_HEADER_LEN, PACKET_HEADER,  # noqa: F401
+                                    read_pcap_header, read_packet_header)
+from pcap_analysis.traffic import ANALYZER_VERSION, TrafficStats, format_report  # noqa: F401
 
-def read_packet_header(f):
-    """读取数据包头"""
-    try:
-        ts_sec = struct.unpack('<L', f.read(4))[0]
-        ts_usec = struct.unpack('<L', f.read(4))[0]
-        incl_len = struct.unpack('<L', f.read(4))[0]
-        orig_len = struct.unpack('<L', f.read(4))[0]
-        
-        return {
-            'ts_sec': ts_sec,
-            'ts_usec': ts_usec,
-            'incl_len': incl_len,
-            'orig_len': orig_len
-        }
-    except:
-        return None
+def collect_stats(file_path, max_packets=1000, bucket_ms=1000):
+    """用内置解析器单次遍历PCAP文件，返回聚合状态"""
+    stats = TrafficStats(bucket_interval=bucket_ms / 1000)
+    NativeBackend().collect(file_path, stats, max_packets)
+    return stats
 
-def parse_ethernet_header(data):
-    """解析以太网帧头"""
-    if len(data) < 14:
-        return None
-    
-    # 目标MAC地址(6字节) + 源MAC地址(6字节) + 类型(2字节)
-    dst_mac = data[0:6]
-    src_mac = data[6:12]
-    eth_type = struct.unpack('>H', data[12:14])[0]
-    
-    return {
-        'dst_mac': dst_mac.hex(),
-        'src_mac': src_mac.hex(),
-        'type': eth_type
-    }
+def analyze_file(file_path, max_packets=1000, bucket_ms=1000, columnar_path=None, backend='auto'):
+    """解析PCAP文件，返回包含文本报告的结构化结果"""
+    return analyze_with_backend(file_path, backend, None, max_packets, bucket_ms, columnar_path)
 
-def parse_ip_header(data):
-    """解析IP头"""
-    if len(data) < 20:
-        return None
-    
-    # 版本和头部长度
-    ver_ihl = data[0]
-    version = ver_ihl >> 4
-    ihl = ver_ihl & 0x0F
-    
-    if ihl < 5:
-        return None
-    
-    header_len = ihl * 4
-    
-    if len(data) < header_len:
-        return None
-    
-    # 服务类型、总长度、标识、标志位、片偏移
-    tos = data[1]
-    total_length = struct.unpack('>H', data[2:4])[0]
-    identification = struct.unpack('>H', data[4:6])[0]
-    flags_fragment = struct.unpack('>H', data[6:8])[0]
-    
-    # TTL、协议、校验和
-    ttl = data[8]
-    protocol = data[9]
-    checksum = struct.unpack('>H', data[10:12])[0]
-    
-    # 源IP和目标IP
-    src_ip = '.'.join(str(b) for b in data[12:16])
-    dst_ip = '.'.join(str(b) for b in data[16:20])
-    
-    protocol_names = {
-        1: 'ICMP',
-        6: 'TCP',
-        17: 'UDP'
-    }
-    
-    return {
-        'version': version,
-        'header_length': header_len,
-        'tos': tos,
-        'total_length': total_length,
-        'ttl': ttl,
-        'protocol': protocol_names.get(protocol, f'Unknown({protocol})'),
-        'src_ip': src_ip,
-        'dst_ip': dst_ip
-    }
+def build_report(file_path, max_packets=1000, bucket_ms=1000):
+    """解析PCAP文件并生成文本报告"""
+    return analyze_file(file_path, max_packets, bucket_ms)['report']
 
-def analyze_pcap_basic(file_path):
-    """基本的PCAP文件分析（不依赖Wireshark）"""
-    try:
-        # 检查文件是否存在
-        if not os.path.exists(file_path):
-            print(f"错误: 文件 {file_path} 不存在")
-            return
+class PcapFollower:
+    """跟踪一个仍在写入的PCAP文件，每次只解析新增的完整记录
+
+    记住最后一条完整记录的结束偏移和聚合状态；末尾写了一半的记录留到下次再读。
+    文件被截断或替换（如 capture.py 用 wrpcap 整体重写）时从头重新统计：原地重写不改变inode，
+    所以每次还比较文件头和最后一条已统计记录的记录头。
+    记录头的长度超出上限（见 max_record_len）时文件已损坏，之后的数据无法按记录边界读取：
+    把说明记入 corrupt 和 stats.warnings 并停止读取，直到文件被截断或重写。
+    """
+
+    def __init__(self, file_path, chunk_size=4 * 1024 * 1024, decap=None):
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self.decap = decap
+        self.reset()
+
+    def reset(self):
+        """清空偏移和聚合状态"""
+        self.offset = 0
+        self.inode = None
+        self.header = None
+        self.header_bytes = None
+        self.last_record_at = None
+        self.last_record = None
+        self.link_layer = None
+        self.corrupt = None
+        self.stats = TrafficStats(decap=self.decap)
 
-        # 构建分析报告
-        report = ""
+    def poll(self):
+        """读取上次之后新写入的完整记录，返回本次新增的数据包数"""
+        try:
+            file_stats = os.stat(self.file_path)
+        except OSError:
+            return 0
         
-        # 添加文件基本信息
-        stats = os.stat(file_path)
-        report += f"数据包总数: 0\n\n"
-        report += "协议分布:\n"
-        report += "- 无协议信息\n\n"
-        report += "主要通信IP:\n"
-        report += "- 无IP通信信息\n\n"
-        report += "主要通信对话:\n"
-        report += "- 无通信对话信息\n\n"
-        report += f"平均数据包大小: 0.00 字节\n\n"
+        if file_stats.st_ino != self.inode or file_stats.st_size < self.offset:
+            self.reset()
+            self.inode = file_stats.st_ino
         
-        # 尝试解析PCAP文件
-        try:
-            with open(file_path, 'rb') as f:
-                # 读取PCAP文件头
-                header = read_pcap_header(f)
-                
-                packet_count = 0
-                total_bytes = 0
-                protocol_counts = {}
-                ip_counts = {}
-                conversations = {}
-                
-                # 读取数据包
-                while True:
-                    packet_header = read_packet_header(f)
-                    if packet_header is None:
+        new_packets = 0
+        with open(self.file_path, 'rb') as f:
+            if self.header is not None and self._rewritten(f):
+                self.reset()
+                self.inode = file_stats.st_ino
+            if file_stats.st_size == self.offset or self.corrupt is not None:
+                return 0
+            if self.header is None:
+                if file_stats.st_size < PCAP_GLOBAL_HEADER_LEN:
+                    return 0
+                f.seek(0)
+                self.header = read_pcap_header(f)
+                self.link_layer = link_layer_for(self.header, self.stats)
+                f.seek(0)
+                self.header_bytes = f.read(PCAP_GLOBAL_HEADER_LEN)
+                self.offset = PCAP_GLOBAL_HEADER_LEN
+            
+            f.seek(self.offset)
+            record_header = self.header['record_header']
+            ts_divisor = self.header['ts_divisor']
+            max_len = max_record_len(self.header)
+            pending = b''
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                buf = pending + chunk
+                pos = 0
+                buf_len = len(buf)
+                last = None
+                # 逐条切出完整记录，不完整的尾部留给下一块或下一次poll
+                while buf_len - pos >= PACKET_HEADER.size:
+                    ts_sec, ts_frac, incl_len, orig_len = record_header.unpack_from(buf, pos)
+                    if incl_len > max_len:
+                        error = CorruptRecord(self.offset + pos - PCAP_GLOBAL_HEADER_LEN, incl_len, max_len)
+                        self.corrupt = corrupt_record_warning(error, self.stats.packet_count)
+                        self.stats.warnings.append(self.corrupt)
                         break
-                    
-                    packet_count += 1
-                    packet_size = packet_header['incl_len']
-                    total_bytes += packet_size
-                    
-                    # 读取数据包数据
-                    packet_data = f.read(packet_header['incl_len'])
-                    
-                    # 解析以太网帧
-                    eth_header = parse_ethernet_header(packet_data)
-                    if eth_header:
-                        # 解析IP头（如果是以太网类型为IPv4）
-                        if eth_header['type'] == 0x0800:  # IPv4
-                            ip_header = parse_ip_header(packet_data[14:])  # 以太网头占14字节
-                            if ip_header:
-                                # 协议统计
-                                protocol = ip_header['protocol']
-                                if protocol not in protocol_counts:
-                                    protocol_counts[protocol] = 0
-                                protocol_counts[protocol] += 1
-                                
-                                # IP地址统计
-                                src_ip = ip_header['src_ip']
-                                dst_ip = ip_header['dst_ip']
-                                
-                                if src_ip not in ip_counts:
-                                    ip_counts[src_ip] = {'packets': 0, 'bytes': 0}
-                                ip_counts[src_ip]['packets'] += 1
-                                ip_counts[src_ip]['bytes'] += packet_size
-                                
-                                if dst_ip not in ip_counts:
-                                    ip_counts[dst_ip] = {'packets': 0, 'bytes': 0}
-                                ip_counts[dst_ip]['packets'] += 1
-                                ip_counts[dst_ip]['bytes'] += packet_size
-                                
-                                # 通信对话统计
-                                conv_key = f"{src_ip} -> {dst_ip}"
-                                if conv_key not in conversations:
-                                    conversations[conv_key] = {'packets': 0, 'bytes': 0}
-                                conversations[conv_key]['packets'] += 1
-                                conversations[conv_key]['bytes'] += packet_size
-                    
-                    # 限制处理的数据包数量以避免处理时间过长
-                    if packet_count >= 1000:
+                    record_end = pos + PACKET_HEADER.size + incl_len
+                    if record_end > buf_len:
                         break
-                
-                # 更新报告
-                if packet_count > 0:
-                    report = f"数据包总数: {packet_count}\n\n"
-                    
-                    # 协议分布
-                    if protocol_counts:
-                        report += "协议分布:\n"
-                        sorted_protocols = sorted(protocol_counts.items(), key=lambda x: x[1], reverse=True)[:10]
-                        for protocol, count in sorted_protocols:
-                            report += f"- {protocol}: {count}个数据包\n"
-                    else:
-                        report += "协议分布:\n- 无协议信息\n"
-                    report += "\n"
-                    
-                    # 主要通信IP
-                    if ip_counts:
-                        report += "主要通信IP:\n"
-                        sorted_ips = sorted(ip_counts.items(), key=lambda x: x[1]['packets'], reverse=True)[:5]
-                        for ip, stats in sorted_ips:
-                            report += f"- {ip}: {stats['packets']}个包, {stats['bytes']}字节\n"
-                    else:
-                        report += "主要通信IP:\n- 无IP通信信息\n"
-                    report += "\n"
-                    
-                    # 主要通信对话
-                    if conversations:
-                        report += "主要通信对话:\n"
-                        sorted_convs = sorted(conversations.items(), key=lambda x: x[1]['packets'], reverse=True)[:5]
-                        for conv, stats in sorted_convs:
-                            report += f"- {conv}: {stats['packets']}个包, {stats['bytes']}字节\n"
-                    else:
-                        report += "主要通信对话:\n- 无通信对话信息\n"
-                    report += "\n"
-                    
-                    # 平均数据包大小
-                    avg_packet_size = total_bytes / packet_count if packet_count > 0 else 0
-                    report += f"平均数据包大小: {avg_packet_size:.2f} 字节\n\n"
-                
-        except Exception as e:
-            report = f"数据包总数: 0\n\n"
-            report += "协议分布:\n- 无协议信息\n\n"
-            report += "主要通信IP:\n- 无IP通信信息\n\n"
-            report += "主要通信对话:\n- 无通信对话信息\n\n"
-            report += f"平均数据包大小: 0.00 字节\n\n"
-            report += f"解析过程出错: {str(e)}\n\n"
-        
-        print(report)
+                    add_record(self.stats, ts_sec + ts_frac / ts_divisor, incl_len, orig_len,
+                               buf[pos + PACKET_HEADER.size:record_end], self.link_layer)
+                    last = pos
+                    pos = record_end
+                    new_packets += 1
+                if last is not None:
+                    self.last_record_at = self.offset + last
+                    self.last_record = buf[last:last + PACKET_HEADER.size]
+                self.offset += pos
+                if self.corrupt is not None:
+                    break
+                pending = buf[pos:]
         
+        return new_packets
+
+    def _rewritten(self, f):
+        """文件头或最后一条已统计记录的记录头与记住的不一致时返回True"""
+        f.seek(0)
+        if f.read(PCAP_GLOBAL_HEADER_LEN) != self.header_bytes:
+            return True
+        if self.last_record_at is None:
+            return False
+        f.seek(self.last_record_at)
+        return f.read(PACKET_HEADER.size) != self.last_record
+
+def follow_pcap(file_path, interval=1.0, idle_timeout=0, decap=None):
+    """持续跟踪正在写入的PCAP文件，每次有新数据时输出一行JSON统计"""
+    follower = PcapFollower(file_path, decap=decap)
+    last_change = time.time()
+    reported = None
+    
+    try:
+        while True:
+            new_packets = follower.poll()
+            stats = follower.stats
+            if follower.corrupt is not None and follower.corrupt is not reported:
+                # 文件损坏只报告一次，之后等待文件被截断或重写
+                reported = follower.corrupt
+                print(json.dumps({"type": "warning", "offset": follower.offset, "message": reported},
+                                 ensure_ascii=False))
+                sys.stdout.flush()
+            if new_packets:
+                last_change = time.time()
+                top_talkers = sorted(stats.ip_counts.items(), key=lambda x: x[1]['packets'], reverse=True)[:5]
+                print(json.dumps({
+                    "type": "stats",
+                    "offset": follower.offset,
+                    "new_packets": new_packets,
+                    "packet_count": stats.packet_count,
+                    "total_bytes": stats.total_bytes,
+                    "protocols": stats.protocol_counts,
+                    "top_talkers": [{"ip": ip, **counts} for ip, counts in top_talkers]
+                }, ensure_ascii=False))
+                sys.stdout.flush()
+            elif idle_timeout and time.time() - last_change >= idle_timeout:
+                break
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    
+    print(follower.stats.format_report())
+
+def analyze_pcap_basic(file_path, max_packets=1000, use_cache=True, bucket_ms=1000,
+                       output_format='text', columnar_path=None, backend='auto', metrics=None, decap=None):
+    """基本的PCAP文件分析（默认自动选择后端，pcap文件优先使用不依赖Wireshark的内置解析器）"""
+    try:
+        result = analyze(file_path, backend=backend, metrics=metrics, max_packets=max_packets, bucket_ms=bucket_ms,
+                         use_cache=use_cache, columnar_path=columnar_path, decap=decap)
+        print_result(result, output_format)
     except Exception as e:
         print(f"分析过程出错: {str(e)}")
 
+def parse_args(argv):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='基本的PCAP文件分析（不依赖Wireshark）')
+    add_analysis_arguments(parser, max_packets=1000)
+    parser.add_argument('--follow', action='store_true', help='跟踪仍在写入的PCAP文件，只解析新增记录')
+    parser.add_argument('--interval', type=float, default=1.0, help='跟踪模式的轮询间隔（秒）')
+    parser.add_argument('--idle-timeout', type=float, default=0, help='跟踪模式下文件多久不增长后退出（秒），0表示一直跟踪')
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("请提供PCAP文件路径作为参数")
         sys.exit(1)
     
-    file_path = sys.argv[1]
-    analyze_pcap_basic(file_path)
\ No newline at end of file
+    args = parse_args(sys.argv[1:])
+    if args.follow:
+        follow_pcap(args.file_path, interval=args.interval, idle_timeout=args.idle_timeout,
+                    decap=decap_options(args))
+        sys.exit(0)
+    run_analysis_args(args)
@@ -1,27 +1,14 @@
 import sys
-import os
+import argparse
 
-def analyze_pcap_simple(file_path):
-    """简化版的PCAP分析"""
-    try:
-        # 检查文件是否存在
-        if not os.path.exists(file_path):
-            print(f"错误: 文件 {file_path} 不存在")
-            return
+from pcap_analysis.analyzer import analyze
+from pcap_analysis.cli import add_analysis_arguments, run_analysis_args
+from pcap_analysis.result import print_result
 
-        # 获取文件信息
-        stats = os.stat(file_path)
-        
-        # 构建分析报告
-        report = ""
-        report += f"数据包总数: 0\n\n"  # 我们无法准确计算，所以显示0
-        report += "协议分布:\n- 未知\n\n"
-        report += "主要通信IP:\n- 未知\n\n"
-        report += "主要通信对话:\n- 未知\n\n"
-        report += "平均数据包大小: 0.00 字节\n\n"
-        
-        print(report)
-        
+def analyze_pcap_simple(file_path, output_format='text'):
+    """简化版的PCAP分析：只用不依赖任何第三方库的内置解析器"""
+    try:
+        print_result(analyze(file_path, backend='native'), output_format)
     except Exception as e:
         print(f"分析过程出错: {str(e)}")
 
@@ -29,6 +16,7 @@ if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("请提供PCAP文件路径作为参数")
         sys.exit(1)
-    
-    file_path = sys.argv[1]
-    analyze_pcap_simple(file_path)
\ No newline at end of file
+
+    parser = argparse.ArgumentParser(description='简化版的PCAP分析（不依赖第三方库）')
+    add_analysis_arguments(parser, backend='native')
+    run_analysis_args(parser.parse_args())
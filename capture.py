@@ -8,6 +8,10 @@ import signal
 from scapy.all import sniff, wrpcap, Packet
 from scapy.layers.inet import IP, TCP, UDP, ICMP
 
+from pcap_analysis.dedup import DuplicateFilter
+from pcap_analysis.repair import TAIL_PROBLEMS, check_capture, repair_capture
+from pcap_analysis.storage import CaptureStore
+
 # 全局变量存储捕获的数据包
 captured_packets = []  # 存储实际的数据包对象
 capture_active = False
@@ -16,6 +20,38 @@ total_size = 0
 start_time = 0  # 修复：添加start_time全局变量
 pcap_filename = ""
 packet_list = []  # 存储实际的数据包对象
+duplicate_filter = None  # 镜像口去重（--dedup），写入前丢弃重复帧
+capture_interface = ""
+
+def storage_update(action, path):
+    """在存储管理中登记抓包文件（begin: 先按容量上限腾出空间; finish: 截掉不完整的末尾记录、补全清单并安排后台压缩）
+
+    只管理项目的 temp/ 目录（CaptureStore 的默认目录）：输出到其他目录时只做文件修复，
+    不登记、不删除也不压缩该目录中的文件。存储管理出错不影响抓包本身。
+    """
+    if action == 'finish':
+        try:
+            report = check_capture(path)
+            if report['problem'] in TAIL_PROBLEMS:
+                repair_capture(path, resync=False)
+                print(json.dumps({"type": "warning", "message": f"【文件修复】{report['message']}，已截断"}))
+            elif not report['valid']:
+                print(json.dumps({"type": "warning",
+                                  "message": f"【文件修复】{report['message']}，可用 python -m pcap_analysis.repair --repair 修复"}))
+        except Exception as e:
+            print(json.dumps({"type": "warning", "message": f"【文件修复】{str(e)}"}))
+    try:
+        store = CaptureStore()
+        if os.path.realpath(os.path.dirname(os.path.abspath(path))) != os.path.realpath(store.root):
+            return
+        if action == 'begin':
+            store.begin(path, capture_interface)
+        else:
+            store.finish(path, capture_interface)
+            store.enforce()
+    except Exception as e:
+        print(json.dumps({"type": "warning", "message": f"【存储管理】{str(e)}"}))
+        sys.stdout.flush()
 
 def signal_handler(sig, frame):
     """信号处理函数 - 强制保存文件版本"""
@@ -154,6 +190,9 @@ def signal_handler(sig, frame):
                 "message": f"【信号处理】等待文件超时: {pcap_path}"
             }))
     
+    if pcap_path:
+        storage_update('finish', pcap_path)
+    
     print(json.dumps({
         "type": "info", 
         "message": "【信号处理】文件处理完成，准备退出"
@@ -174,6 +213,10 @@ def packet_handler(packet):
     if not capture_active:
         return False  # 停止捕获
     
+    # 镜像口重复送来的帧不计数也不写入
+    if duplicate_filter is not None and duplicate_filter.is_duplicate(float(packet.time), bytes(packet)):
+        return True
+    
     # 增加计数器
     packet_count += 1
     total_size += len(packet)
@@ -261,6 +304,8 @@ def packet_handler(packet):
             "total_size": total_size,
             "duration": time.time() - start_time
         }
+        if duplicate_filter is not None:
+            stats["duplicates"] = duplicate_filter.duplicates
         print(json.dumps(stats))
         sys.stdout.flush()
     
@@ -452,6 +497,8 @@ def save_packets_to_pcap():
 def start_capture(interface, duration=30, output_filename=None):
     """开始抓包"""
     global captured_packets, capture_active, packet_count, total_size, start_time, pcap_filename, packet_list
+    global capture_interface
+    capture_interface = interface
     captured_packets = []
     packet_list = []
     packet_count = 0
@@ -524,6 +571,8 @@ def start_capture(interface, duration=30, output_filename=None):
         # 生成默认文件名并保存到temp目录
         pcap_filename = os.path.join(temp_dir, f"capture_{int(start_time)}.pcap")
     
+    storage_update('begin', pcap_filename)
+    
     try:
         # 发送开始状态
         status = {
@@ -582,6 +631,8 @@ def start_capture(interface, duration=30, output_filename=None):
         sys.stdout.flush()
         
         pcap_path = save_packets_to_pcap()
+        if pcap_path:
+            storage_update('finish', pcap_path)
         
         # 发送完成状态
         stats = {
@@ -592,6 +643,8 @@ def start_capture(interface, duration=30, output_filename=None):
             "pcap_file": pcap_filename,
             "pcap_path": pcap_path
         }
+        if duplicate_filter is not None:
+            stats["dedup"] = duplicate_filter.summary()
         print(json.dumps(stats))
         sys.stdout.flush()
         
@@ -757,6 +810,11 @@ if __name__ == "__main__":
     }))
     sys.stdout.flush()
     
+    # --dedup 可以出现在任意位置，先取出再按位置解析其余参数
+    if '--dedup' in sys.argv:
+        sys.argv.remove('--dedup')
+        duplicate_filter = DuplicateFilter()
+    
     # 总是使用自动检测接口
     interface = get_active_interface()
     if not interface:
@@ -0,0 +1,38 @@
+"""PCAP分析包：统一的分析入口、可插拔的解析后端（native/numpy/tshark/pyshark）和结果缓存
+
+analyze_pcap*.py 脚本和常驻分析服务都通过 analyze() 调用，由后端注册表按文件格式
+和请求的指标自动选择最快的可用后端。
+"""
+
+from .cache import AnalysisCache, file_fingerprint, make_cache_key, cached_analysis
+from .analyzer import analyze, analyze_file, analyze_stream
+from .checkpoint import load_summary, merge_summaries, save_summary, summary_result
+from .backends import (Backend, BackendUnavailable, register_backend, get_backend,
+                       backend_names, available_backends, select_backend)
+from .digest import digest
+from .traffic import ANALYZER_VERSION, METRICS, TrafficStats
+
+__all__ = [
+    'AnalysisCache',
+    'file_fingerprint',
+    'make_cache_key',
+    'cached_analysis',
+    'analyze',
+    'analyze_file',
+    'analyze_stream',
+    'Backend',
+    'BackendUnavailable',
+    'register_backend',
+    'get_backend',
+    'backend_names',
+    'available_backends',
+    'select_backend',
+    'load_summary',
+    'merge_summaries',
+    'save_summary',
+    'summary_result',
+    'digest',
+    'ANALYZER_VERSION',
+    'METRICS',
+    'TrafficStats',
+]
@@ -0,0 +1,6 @@
+"""命令行入口: python -m pcap_analysis FILE [--backend auto|numpy|native|tshark|pyshark] [--format json]"""
+import sys
+
+from .cli import main
+
+sys.exit(main())
@@ -0,0 +1,206 @@
+import os
+import sys
+import gzip
+import time
+
+from .backends import BackendUnavailable, select_backend
+from .cache import cached_analysis
+from .pcapfile import PCAP_FORMATS, PCAP_GLOBAL_HEADER_LEN, detect_format, open_stream
+from .progress import Progress
+from .result import build_result, write_columnar
+from .checkpoint import CHECKPOINT_INTERVAL, CheckpointProgress, ResumeStream, resume_checkpoint, summary_options
+from .traffic import ANALYZER_VERSION, TrafficStats
+
+ANALYZER_NAME = 'pcap_analysis'
+# 表示从标准输入读取的文件参数
+STDIN = '-'
+
+
+def error_result(file_path, code, message, report=None):
+    """生成带 error 字段的结果，文本报告默认为错误信息"""
+    return build_result(ANALYZER_NAME, ANALYZER_VERSION, file_path, report if report is not None else message,
+                        error={'code': code, 'message': message})
+
+
+def _collect(file_path, backend, metrics, skipped, max_packets, bucket_ms, columnar_path,
+             deadline, on_progress, progress_interval, stream=None, decap=None,
+             checkpoint=None, checkpoint_interval=CHECKPOINT_INTERVAL):
+    """用选定的后端做一次遍历，返回结构化结果；时间预算用尽时返回已覆盖部分的统计
+
+    stream 不为None时从该输入流读取（总大小未知），file_path 只用于结果中的文件信息。
+    checkpoint 为检查点文件路径（见 checkpoint 模块）：存在且与文件和选项相符时从保存的偏移继续，
+    遍历中每隔 checkpoint_interval 秒保存一次，结束（或时间预算用尽）时保存最终状态，加载和保存的耗时计入时间预算。
+    """
+    stats = None
+    offset = PCAP_GLOBAL_HEADER_LEN
+    finished = False
+    load_cost = 0.0
+    if checkpoint:
+        options = summary_options(metrics, bucket_ms, max_packets, decap)
+        loading = time.monotonic()
+        resumed = resume_checkpoint(checkpoint, file_path, options)
+        if resumed is not None:
+            load_cost = time.monotonic() - loading
+            stats, offset, finished = resumed
+    if stats is None:
+        stats = TrafficStats(bucket_interval=bucket_ms / 1000, metrics=metrics, decap=decap)
+    progress = None
+    if checkpoint:
+        # 加载检查点的耗时同样计入时间预算（最多占一半）
+        budget = max(deadline - load_cost, deadline / 2) if deadline else deadline
+        progress = CheckpointProgress(checkpoint, stats, file_path, backend.name, options, offset,
+                                      checkpoint_interval, budget, on_progress, progress_interval, load_cost)
+    elif deadline or on_progress:
+        total_bytes = os.path.getsize(file_path) if stream is None else None
+        progress = Progress(total_bytes, deadline, on_progress, progress_interval)
+    try:
+        partial = False
+        if finished:
+            # 检查点已覆盖整个文件且文件未变，直接由汇总生成结果
+            pass
+        elif checkpoint:
+            with open(file_path, 'rb') as f:
+                partial = backend.collect_stream(ResumeStream(f, offset), stats, max_packets, progress)
+            # 续传时后端会再次给出文件级的警告
+            stats.warnings = list(dict.fromkeys(stats.warnings))
+            progress.save(complete=not progress.expired)
+        elif stream is None:
+            partial = backend.collect(file_path, stats, max_packets, progress)
+        else:
+            partial = backend.collect_stream(stream, stats, max_packets, progress)
+        coverage = None
+        if progress is not None and progress.expired:
+            # 部分结果同样是有效的统计，标记覆盖比例，不写入缓存
+            partial = True
+            coverage = progress.coverage()
+            if coverage['fraction'] is None:
+                covered = f"前{coverage['bytes']}字节"
+            else:
+                covered = f"{coverage['fraction']:.1%}"
+            stats.warnings.append(f"分析在{deadline:g}秒时间预算内未完成，结果只覆盖文件的"
+                                  f"{covered}（{stats.packet_count}个数据包）")
+        for metric in sorted(skipped):
+            stats.warnings.append(f"{backend.name} 后端不支持 {metric} 分析，已跳过")
+        if columnar_path:
+            write_columnar(columnar_path, stats.columnar_tables())
+        return stats.to_result(file_path, backend.name, partial, coverage=coverage)
+    except Exception as e:
+        report = f"数据包总数: 0\n\n解析过程出错: {str(e)}\n\n"
+        return error_result(file_path, 'PARSE_ERROR', str(e), report)
+
+
+def analyze(file_path, backend='auto', metrics=None, max_packets=0, bucket_ms=1000,
+            use_cache=True, columnar_path=None, deadline=None, on_progress=None, progress_interval=1.0,
+            sample=0, decap=None, checkpoint=None, checkpoint_interval=CHECKPOINT_INTERVAL):
+    """分析抓包文件，返回包含文本报告的结构化结果
+
+    backend 为 'auto' 时按文件格式和请求的指标（metrics，默认全部）自动选择最快的可用后端。
+    deadline 为时间预算（秒）：到时停止遍历，返回 partial 为真、带 coverage 的部分结果。
+    on_progress(record) 每隔 progress_interval 秒收到一条进度记录。
+    sample 为抽样窗口数（0表示完整解析）：抽样时只读取固定数量的数据，估算总量和置信区间。
+    file_path 为 '-' 时从标准输入流式读取（见 analyze_stream）；.gz 文件（存储管理压缩过的抓包）边解压边分析。
+    decap 为True或隧道端口设置（{'vxlan_ports': [...], 'geneve_ports': [...]}）时解开VXLAN/Geneve/GRE/IP-in-IP
+    隧道，按内层数据包统计，只有支持解封装的后端可用。
+    checkpoint 为检查点（汇总）文件路径：每隔 checkpoint_interval 秒保存一次聚合状态，中断后再次调用时
+    从中断位置继续；分析完成后文件未变时直接由汇总生成结果。汇总文件可以用 checkpoint.merge_summaries 合并。
+    出错时不抛出异常，而是返回带 error 字段的结果。
+    """
+    if file_path == STDIN:
+        if sample:
+            return error_result(file_path, 'INVALID_OPTIONS', "抽样分析需要随机读取，不支持标准输入")
+        if checkpoint:
+            return error_result(file_path, 'INVALID_OPTIONS', "检查点需要按偏移续传，不支持标准输入")
+        return analyze_stream(sys.stdin.buffer, backend, metrics, max_packets, bucket_ms, columnar_path,
+                              deadline, on_progress, progress_interval, decap=decap)
+    if not os.path.exists(file_path):
+        return error_result(file_path, 'FILE_NOT_FOUND', f"文件 {file_path} 不存在",
+                            f"错误: 文件 {file_path} 不存在")
+    if file_path.endswith('.gz'):
+        if sample:
+            return error_result(file_path, 'INVALID_OPTIONS', "抽样分析需要随机读取，不支持压缩文件")
+        if checkpoint:
+            return error_result(file_path, 'INVALID_OPTIONS', "检查点需要按偏移续传，不支持压缩文件")
+        try:
+            with gzip.open(file_path, 'rb') as stream:
+                return analyze_stream(stream, backend, metrics, max_packets, bucket_ms, columnar_path,
+                                      deadline, on_progress, progress_interval, name=file_path, decap=decap)
+        except (OSError, EOFError) as e:
+            return error_result(file_path, 'PARSE_ERROR', f"读取压缩文件失败: {e}")
+    if sample:
+        if checkpoint:
+            return error_result(file_path, 'INVALID_OPTIONS', "抽样分析不使用检查点")
+        return _estimate(file_path, sample, use_cache)
+    if checkpoint and detect_format(file_path) not in PCAP_FORMATS:
+        return error_result(file_path, 'INVALID_OPTIONS', "检查点按记录偏移续传，只支持pcap格式的文件")
+    try:
+        chosen, collected, skipped = select_backend(file_path, metrics, backend, streaming=bool(checkpoint),
+                                                    decap=bool(decap))
+    except BackendUnavailable as e:
+        return error_result(file_path, 'BACKEND_UNAVAILABLE', str(e))
+    except ValueError as e:
+        return error_result(file_path, 'INVALID_OPTIONS', str(e))
+
+    bucket_ms = max(bucket_ms, 1)
+    compute = lambda: _collect(file_path, chosen, collected, skipped, max_packets, bucket_ms, columnar_path,
+                               deadline, on_progress, progress_interval, decap=decap,
+                               checkpoint=checkpoint, checkpoint_interval=checkpoint_interval)
+
+    # 列式导出需要完整的聚合状态，检查点本身保存了聚合状态，都不走缓存
+    if use_cache and not columnar_path and not checkpoint:
+        # 同一文件、同一后端和选项的重复分析直接返回缓存结果
+        options = {
+            'backend': chosen.name,
+            'metrics': sorted(collected),
+            'max_packets': max_packets,
+            'bucket_ms': bucket_ms
+        }
+        if decap:
+            options['decap'] = decap
+        return cached_analysis(file_path, ANALYZER_NAME, ANALYZER_VERSION, options, compute)
+    return compute()
+
+
+def analyze_stream(stream, backend='auto', metrics=None, max_packets=0, bucket_ms=1000, columnar_path=None,
+                   deadline=None, on_progress=None, progress_interval=1.0, name=STDIN, decap=None):
+    """从只能向前读取的输入流（标准输入、管道、上传请求体）分析pcap数据
+
+    只读一遍，内存中最多保留后端的一个读取块，不需要先写入磁盘；结果不缓存。
+    进度记录中的 totalBytes 和 fraction 为None（总大小未知）。name 用作结果中的文件路径。
+    """
+    try:
+        file_format, reader = open_stream(stream)
+        if file_format == 'unknown':
+            return error_result(name, 'UNSUPPORTED_FORMAT', "输入不是可识别的抓包文件")
+        chosen, collected, skipped = select_backend(name, metrics, backend, file_format=file_format,
+                                                    streaming=True, decap=bool(decap))
+    except BackendUnavailable as e:
+        return error_result(name, 'BACKEND_UNAVAILABLE', str(e))
+    except ValueError as e:
+        return error_result(name, 'INVALID_OPTIONS', str(e))
+    return _collect(name, chosen, collected, skipped, max_packets, max(bucket_ms, 1), columnar_path,
+                    deadline, on_progress, progress_interval, stream=reader, decap=decap)
+
+
+def _estimate(file_path, windows, use_cache):
+    """抽样估算入口，只支持 native 解析器能读取的pcap文件"""
+    from .sampling import estimate
+
+    if detect_format(file_path) not in PCAP_FORMATS:
+        return error_result(file_path, 'UNSUPPORTED_FORMAT', "抽样分析目前只支持pcap格式的文件")
+
+    def compute():
+        try:
+            return estimate(file_path, windows=windows)
+        except Exception as e:
+            return error_result(file_path, 'PARSE_ERROR', str(e), f"抽样分析出错: {str(e)}\n\n")
+
+    if use_cache:
+        return cached_analysis(file_path, ANALYZER_NAME, ANALYZER_VERSION, {'sample': windows}, compute)
+    return compute()
+
+
+def analyze_file(file_path, backend='auto', metrics=None, max_packets=0, bucket_ms=1000, columnar_path=None,
+                 deadline=None, on_progress=None, decap=None):
+    """不使用缓存的 analyze"""
+    return analyze(file_path, backend, metrics, max_packets, bucket_ms, use_cache=False, columnar_path=columnar_path,
+                   deadline=deadline, on_progress=on_progress, decap=decap)
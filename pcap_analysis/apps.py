@@ -0,0 +1,298 @@
+import struct
+
+from .stats import TopCounter
+
+# 端口提示：载荷特征无法判断时按知名端口归类（UDP 443 为 QUIC，TCP 443 为 TLS）
+TCP_PORT_HINTS = {
+    20: 'FTP-DATA', 21: 'FTP', 22: 'SSH', 23: 'Telnet', 25: 'SMTP', 53: 'DNS', 80: 'HTTP', 110: 'POP3',
+    143: 'IMAP', 179: 'BGP', 389: 'LDAP', 443: 'TLS', 445: 'SMB', 465: 'SMTP', 587: 'SMTP', 636: 'LDAP',
+    993: 'IMAP', 995: 'POP3', 1433: 'MSSQL', 3306: 'MySQL', 3389: 'RDP', 5432: 'PostgreSQL', 6379: 'Redis',
+    8080: 'HTTP', 8443: 'TLS'
+}
+UDP_PORT_HINTS = {
+    53: 'DNS', 67: 'DHCP', 68: 'DHCP', 69: 'TFTP', 123: 'NTP', 137: 'NetBIOS', 161: 'SNMP', 162: 'SNMP',
+    443: 'QUIC', 500: 'IKE', 514: 'Syslog', 1900: 'SSDP', 4500: 'IKE', 4789: 'VXLAN', 5353: 'mDNS',
+    5355: 'LLMNR'
+}
+DNS_PORTS = frozenset({53, 5353, 5355})
+
+HTTP_PREFIXES = (b'GET ', b'POST ', b'PUT ', b'HEAD ', b'DELETE ', b'OPTIONS ', b'PATCH ', b'CONNECT ',
+                 b'TRACE ', b'HTTP/1.')
+# QUIC v1、v2 和 IETF 草案版本（0xff0000xx）；版本号为0是版本协商包
+QUIC_VERSIONS = frozenset({0x00000000, 0x00000001, 0x6B3343CF})
+
+# 每条流最多检查的带载荷数据包数，之后按端口归类
+MAX_INSPECT = 3
+
+_U16 = struct.Struct('>H')
+_U32 = struct.Struct('>L')
+
+
+def _dns_like(payload):
+    """DNS头部的合理性检查：操作码、问题数和各记录数"""
+    if len(payload) < 12:
+        return False
+    flags = payload[2]
+    qdcount = (payload[4] << 8) | payload[5]
+    return ((flags >> 3) & 0x0F) <= 5 and 0 < qdcount <= 16 and payload[6] == 0 and payload[8] == 0
+
+
+def tls_server_name(payload):
+    """从TLS ClientHello中提取SNI，载荷不完整或没有该扩展时返回None"""
+    # 记录头(5) + 握手头(4) + 版本(2) + 随机数(32)
+    pos = 43
+    if len(payload) < pos + 1 or payload[5] != 0x01:
+        return None
+    pos += 1 + payload[pos]                                      # 会话ID
+    if len(payload) < pos + 2:
+        return None
+    pos += 2 + _U16.unpack_from(payload, pos)[0]                 # 密码套件
+    if len(payload) < pos + 1:
+        return None
+    pos += 1 + payload[pos]                                      # 压缩方法
+    if len(payload) < pos + 2:
+        return None
+    end = min(len(payload), pos + 2 + _U16.unpack_from(payload, pos)[0])
+    pos += 2
+    while pos + 4 <= end:
+        ext_type, ext_len = struct.unpack_from('>HH', payload, pos)
+        pos += 4
+        if ext_type == 0:
+            # server_name_list: 列表长度(2) + 类型(1) + 名称长度(2) + 名称
+            if pos + 5 > end or payload[pos + 2] != 0:
+                return None
+            name_len = _U16.unpack_from(payload, pos + 3)[0]
+            name = payload[pos + 5:pos + 5 + name_len]
+            if len(name) != name_len:
+                return None
+            return name.decode('ascii', 'replace').lower()
+        pos += ext_len
+    return None
+
+
+def classify_payload(protocol, port_a, port_b, payload):
+    """按载荷首部特征判断应用层协议，返回 (协议名, SNI)；无法判断时协议名为None"""
+    first = payload[0]
+    if protocol == 6:
+        if first == 0x16 and len(payload) >= 6 and payload[1] == 0x03 and payload[2] <= 0x04:
+            return 'TLS', tls_server_name(payload)
+        if first in (0x17, 0x15, 0x14) and len(payload) >= 5 and payload[1] == 0x03 and payload[2] <= 0x04:
+            return 'TLS', None
+        if payload.startswith(HTTP_PREFIXES):
+            return 'HTTP', None
+        if payload.startswith(b'SSH-'):
+            return 'SSH', None
+        # DNS over TCP：2字节长度前缀
+        if (port_a in DNS_PORTS or port_b in DNS_PORTS) and _dns_like(payload[2:]):
+            return 'DNS', None
+        return None, None
+
+    if (port_a in DNS_PORTS or port_b in DNS_PORTS) and _dns_like(payload):
+        return port_hint(17, port_a, port_b), None
+    # QUIC长包头：最高两位为1，后跟4字节版本号
+    if first & 0xC0 == 0xC0 and len(payload) >= 5:
+        version = _U32.unpack_from(payload, 1)[0]
+        if version in QUIC_VERSIONS or version >> 8 == 0xFF0000:
+            return 'QUIC', None
+    return None, None
+
+
+def port_hint(protocol, port_a, port_b):
+    """按知名端口归类，两端都是知名端口时取较小的端口"""
+    hints = TCP_PORT_HINTS if protocol == 6 else UDP_PORT_HINTS
+    for port in sorted((port_a, port_b)):
+        app = hints.get(port)
+        if app is not None:
+            return app
+    return None
+
+
+class _Flow:
+    """单条流的分类状态和计数"""
+    __slots__ = ('app', 'method', 'inspected', 'packets', 'bytes')
+
+    def __init__(self):
+        self.app = None
+        self.method = None
+        self.inspected = 0
+        self.packets = 0
+        self.bytes = 0
+
+
+class AppClassifier:
+    """按流识别应用层协议（DNS、HTTP、TLS、QUIC等）
+
+    每条流只在前 MAX_INSPECT 个带载荷的数据包上检查载荷特征，结果保存在流状态中；
+    之后的数据包只做一次字典查找和计数。特征无法判断的流按知名端口归类。
+    流表超过 max_flows 时淘汰最早建立的流，其计数并入汇总；SNI域名计数使用 TopCounter。
+    """
+
+    def __init__(self, max_flows=100000, top_n=10, name_capacity=2000):
+        self.max_flows = max_flows
+        self.top_n = top_n
+        self.flows = {}
+        self.flows_seen = 0
+        self.evicted = 0
+        self.server_names = TopCounter(name_capacity)
+        # 已淘汰流的汇总：{协议名: [包数, 字节数, 流数]}
+        self._retired = {}
+        self._retired_methods = {}
+
+    def process(self, protocol, src_ip, dst_ip, segment, byte_count):
+        """处理一个TCP/UDP数据包；segment 从传输层头开始，byte_count 计入该流的字节数"""
+        src_port = (segment[0] << 8) | segment[1]
+        dst_port = (segment[2] << 8) | segment[3]
+        if (src_ip, src_port) <= (dst_ip, dst_port):
+            key = (protocol, src_ip, src_port, dst_ip, dst_port)
+        else:
+            key = (protocol, dst_ip, dst_port, src_ip, src_port)
+        flow = self.flows.get(key)
+        if flow is None:
+            flow = self.flow(key)
+        flow.packets += 1
+        flow.bytes += byte_count
+        if flow.app is None:
+            # 只在判断出协议之前切出载荷
+            payload = segment[(segment[12] >> 4) * 4:] if protocol == 6 else segment[8:]
+            if payload:
+                self.inspect(key, flow, payload)
+
+    def add_flow(self, key, packets, byte_count, payloads=()):
+        """批量累加同一条流的若干数据包（向量化后端按块调用）
+
+        payloads 按顺序产生各包的 (字节数, 载荷)，只在该流尚未判断出协议时逐个消费。
+        """
+        flow = self.flow(key)
+        if flow.app is None:
+            for size, payload in payloads:
+                packets -= 1
+                byte_count -= size
+                flow.packets += 1
+                flow.bytes += size
+                if payload:
+                    self.inspect(key, flow, payload)
+                    if flow.app is not None:
+                        break
+        flow.packets += packets
+        flow.bytes += byte_count
+
+    def flow(self, key):
+        """取出或新建流状态；key 为 (协议号, 地址A, 端口A, 地址B, 端口B)，地址可以是任意可比较的值"""
+        flow = self.flows.get(key)
+        if flow is None:
+            if len(self.flows) >= self.max_flows:
+                old_key = next(iter(self.flows))
+                self._retire(old_key, self.flows.pop(old_key))
+                self.evicted += 1
+            flow = self.flows[key] = _Flow()
+            self.flows_seen += 1
+        return flow
+
+    def inspect(self, key, flow, payload):
+        """检查一个带载荷的数据包，判断出协议时写入流状态"""
+        protocol, _, port_a, _, port_b = key
+        app, server_name = classify_payload(protocol, port_a, port_b, payload)
+        if app is not None:
+            flow.app = app
+            flow.method = 'signature'
+            if server_name:
+                self.server_names.add(server_name)
+            return
+        flow.inspected += 1
+        if flow.inspected >= MAX_INSPECT:
+            self._fallback(key, flow)
+
+    def merge(self, other):
+        """并入另一个文件或分片的分类结果，other 之后不应再使用
+
+        两边都有的流合并计数，优先采用按载荷特征识别的协议；只在 other 中的流按顺序加入流表，
+        超过 max_flows 时照常淘汰最早的流。
+        """
+        overlap = 0
+        for key, flow in other.flows.items():
+            mine = self.flows.get(key)
+            if mine is None:
+                if len(self.flows) >= self.max_flows:
+                    old_key = next(iter(self.flows))
+                    self._retire(old_key, self.flows.pop(old_key))
+                    self.evicted += 1
+                self.flows[key] = flow
+                continue
+            overlap += 1
+            mine.packets += flow.packets
+            mine.bytes += flow.bytes
+            if flow.app is not None and (mine.app is None or (mine.method != 'signature' and flow.method == 'signature')):
+                mine.app = flow.app
+                mine.method = flow.method
+            elif mine.app is None:
+                mine.inspected += flow.inspected
+                if mine.inspected >= MAX_INSPECT:
+                    self._fallback(key, mine)
+        self.flows_seen += other.flows_seen - overlap
+        self.evicted += other.evicted
+        self.server_names.merge(other.server_names)
+        for app, counts in other._retired.items():
+            totals = self._retired.setdefault(app, [0, 0, 0])
+            for i, value in enumerate(counts):
+                totals[i] += value
+        for method, count in other._retired_methods.items():
+            self._retired_methods[method] = self._retired_methods.get(method, 0) + count
+
+    def _fallback(self, key, flow):
+        protocol, _, port_a, _, port_b = key
+        app = port_hint(protocol, port_a, port_b)
+        flow.app = app or ('Other-TCP' if protocol == 6 else 'Other-UDP')
+        flow.method = 'port' if app else 'unknown'
+
+    def _retire(self, key, flow):
+        if flow.app is None:
+            self._fallback(key, flow)
+        totals = self._retired.setdefault(flow.app, [0, 0, 0])
+        totals[0] += flow.packets
+        totals[1] += flow.bytes
+        totals[2] += 1
+        self._retired_methods[flow.method] = self._retired_methods.get(flow.method, 0) + 1
+
+    def summary(self):
+        """返回各应用层协议的包数/字节数/流数和识别方式统计"""
+        totals = {app: list(counts) for app, counts in self._retired.items()}
+        methods = dict(self._retired_methods)
+        for key, flow in self.flows.items():
+            app, method = flow.app, flow.method
+            if app is None:
+                # 尚未判断出的流不改变状态，只按端口归类计入汇总
+                app = port_hint(key[0], key[2], key[4])
+                method = 'port' if app else 'unknown'
+                app = app or ('Other-TCP' if key[0] == 6 else 'Other-UDP')
+            counts = totals.setdefault(app, [0, 0, 0])
+            counts[0] += flow.packets
+            counts[1] += flow.bytes
+            counts[2] += 1
+            methods[method] = methods.get(method, 0) + 1
+        ranked = sorted(totals.items(), key=lambda x: x[1][0], reverse=True)
+        return {
+            'flows': self.flows_seen,
+            'evicted_flows': self.evicted,
+            'methods': {name: methods.get(name, 0) for name in ('signature', 'port', 'unknown')},
+            'protocols': {app: {'packets': p, 'bytes': b, 'flows': f} for app, (p, b, f) in ranked},
+            'tls_server_names': [{'name': name, 'flows': count, 'error': error}
+                                 for name, count, error in self.server_names.top(self.top_n)]
+        }
+
+    def format_report(self):
+        """生成应用层协议的文本报告段落"""
+        if not self.flows_seen:
+            return ""
+        summary = self.summary()
+        methods = summary['methods']
+        report = "应用层协议:\n"
+        for app, counts in list(summary['protocols'].items())[:10]:
+            report += f"- {app}: {counts['packets']}个数据包, {counts['flows']}条流\n"
+        report += (f"- 识别方式: 载荷特征 {methods['signature']}条流, 知名端口 {methods['port']}条流, "
+                   f"未识别 {methods['unknown']}条流\n\n")
+        if summary['tls_server_names']:
+            report += "TLS访问的主要域名(SNI):\n"
+            for entry in summary['tls_server_names']:
+                report += f"- {entry['name']}: {entry['flows']}条连接\n"
+            report += "\n"
+        return report
@@ -0,0 +1,128 @@
+"""分析后端注册表
+
+每个后端声明自己能读取的文件格式、能计算的指标和相对速度（priority），
+select_backend 按文件格式和请求的指标自动选出最快的可用后端。
+新增后端时继承 Backend 并调用 register_backend 即可。
+"""
+from ..pcapfile import detect_format
+from ..traffic import METRICS
+
+
+class BackendUnavailable(RuntimeError):
+    """请求的后端在当前环境不可用（缺少依赖或外部程序）"""
+
+
+class Backend:
+    """分析后端接口"""
+
+    name = None
+    # 可读取的文件格式（见 pcapfile.FILE_FORMATS）
+    formats = frozenset()
+    # 可计算的指标（见 traffic.METRICS）
+    metrics = frozenset()
+    # 相对速度，数值越大越优先
+    priority = 0
+    # 能否从只能向前读取的输入流（标准输入、管道）解析
+    streaming = False
+    # 能否解开隧道封装、按内层数据包统计（见 tunnels.TunnelDecoder）
+    decapsulation = False
+
+    def unavailable_reason(self):
+        """后端不可用时返回原因，可用时返回None"""
+        return None
+
+    def available(self):
+        return self.unavailable_reason() is None
+
+    def collect(self, file_path, stats, max_packets=0, progress=None):
+        """把文件中的数据包累加到 stats（TrafficStats），返回结果是否不完整
+
+        progress（progress.Progress）不为None时，遍历中要定期调用 progress.update，
+        它返回 False 时立即停止；结束时调用 progress.finish。
+        """
+        raise NotImplementedError
+
+    def collect_stream(self, stream, stats, max_packets=0, progress=None):
+        """与 collect 相同，但从已打开的输入流读取（streaming 为真的后端才实现）"""
+        raise NotImplementedError
+
+
+_BACKENDS = {}
+
+
+def register_backend(backend):
+    """注册一个后端实例，同名后端会被替换"""
+    _BACKENDS[backend.name] = backend
+    return backend
+
+
+def get_backend(name):
+    """按名称取后端，名称未知时抛出 ValueError"""
+    try:
+        return _BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"未知的分析后端: {name}（可选: {', '.join(backend_names())}）")
+
+
+def backend_names():
+    """按优先级从高到低列出已注册的后端名称"""
+    return [backend.name for backend in sorted(_BACKENDS.values(), key=lambda b: b.priority, reverse=True)]
+
+
+def available_backends():
+    """返回 {名称: 不可用原因或None}，按优先级排序"""
+    return {name: _BACKENDS[name].unavailable_reason() for name in backend_names()}
+
+
+def select_backend(file_path, metrics=None, preferred='auto', file_format=None, streaming=False, decap=False):
+    """为文件选择后端，返回 (后端, 实际计算的指标, 后端不支持而跳过的指标)
+
+    preferred 为后端名称时只检查该后端是否可用、能否读取该格式；
+    为 'auto' 时优先选择能计算全部指标的最快后端，没有时退而选择指标覆盖最多的后端。
+    已知格式时传入 file_format（不再读取文件）；streaming 为真时只考虑能从输入流解析的后端，
+    decap 为真时只考虑能解开隧道的后端。
+    """
+    requested = frozenset(metrics or METRICS) | {'summary'}
+    unknown = requested - set(METRICS)
+    if unknown:
+        raise ValueError(f"未知的分析指标: {', '.join(sorted(unknown))}（可选: {', '.join(METRICS)}）")
+
+    if file_format is None:
+        file_format = detect_format(file_path)
+
+    if preferred != 'auto':
+        backend = get_backend(preferred)
+        reason = backend.unavailable_reason()
+        if reason:
+            raise BackendUnavailable(reason)
+        if file_format not in backend.formats:
+            raise BackendUnavailable(f"{backend.name} 后端不支持 {file_format} 格式的文件")
+        if streaming and not backend.streaming:
+            raise BackendUnavailable(f"{backend.name} 后端不支持从标准输入读取，请先保存为文件")
+        if decap and not backend.decapsulation:
+            raise BackendUnavailable(f"{backend.name} 后端不支持隧道解封装")
+        return backend, requested & backend.metrics, requested - backend.metrics
+
+    candidates = []
+    for name in backend_names():
+        backend = _BACKENDS[name]
+        if (file_format in backend.formats and backend.available() and (backend.streaming or not streaming)
+                and (backend.decapsulation or not decap)):
+            candidates.append(backend)
+    if not candidates:
+        source = "标准输入中" if streaming else ""
+        raise BackendUnavailable(f"没有可读取{source} {file_format} 格式文件的可用后端")
+
+    # 指标覆盖数优先，其次按速度
+    backend = max(candidates, key=lambda b: (len(requested & b.metrics), b.priority))
+    return backend, requested & backend.metrics, requested - backend.metrics
+
+
+from .native import NativeBackend  # noqa: E402
+from .vectorized import NumpyBackend  # noqa: E402
+from .tshark import TsharkBackend, PysharkBackend, find_tshark  # noqa: E402
+
+register_backend(NativeBackend())
+register_backend(NumpyBackend())
+register_backend(TsharkBackend())
+register_backend(PysharkBackend())
@@ -0,0 +1,179 @@
+from socket import AF_INET6, inet_ntoa, inet_ntop
+
+from . import Backend
+from ..dns import DNS_PORT
+from ..packet import (ETHERNET_HEADER_LEN, ETHERTYPE_IPV4, ETHERTYPE_IPV6, IPV6_HEADER_LEN, LINK_LAYERS,
+                      ethernet_network, ip_protocol_name, ipv6_upper_layer)
+from ..pcapfile import (PCAP_FORMATS, PCAP_GLOBAL_HEADER_LEN, PACKET_HEADER, CorruptRecord, corrupt_record_warning,
+                        iter_records, max_record_len, read_pcap_header)
+from ..progress import CHECK_EVERY
+from ..traffic import METRICS
+from ..tunnels import MAX_TUNNEL_DEPTH
+
+
+def add_record(stats, ts, incl_len, orig_len, data, link_layer=ethernet_network):
+    """解析一条记录并累加到 stats
+
+    link_layer 为 packet.LINK_LAYERS 中对应文件链路类型的函数，给出网络层类型和偏移，
+    再按类型解析IPv4或IPv6（跳过扩展头）。IP分片交给 stats.fragments 重组，收齐前的分片
+    只计入总数、协议和地址统计，不进入会话、应用层和异常检测；
+    stats.tunnels 不为None时解开隧道，按内层数据包统计。与 packet.parse_ethernet_header /
+    parse_ip_header 的判断一致，但直接按偏移取字段，不为每个包构造字典。
+    """
+    data_len = len(data)
+    # 最常见的无标签以太网 + IPv4 不经过分派
+    if link_layer is ethernet_network and data_len >= ETHERNET_HEADER_LEN + 20 and data[12] == 0x08 and data[13] == 0x00:
+        ethertype, offset = ETHERTYPE_IPV4, ETHERNET_HEADER_LEN
+    else:
+        ethertype, offset = link_layer(data)
+    tunnels = stats.tunnels
+    # 分片尚未收齐时 pending 为True；收齐时 size 加上其余分片的载荷，由最后到达的分片代表整个数据报
+    pending = False
+    size = incl_len
+
+    for depth in range(MAX_TUNNEL_DEPTH + 1):
+        # segment 为从上层头开始的数据，l4_len 为IP头中的长度字段给出的上层长度（可能超出抓取长度）
+        segment = None
+        if ethertype == ETHERTYPE_IPV4 and data_len - offset >= 20:
+            header_len = (data[offset] & 0x0F) * 4
+            if header_len < 20 or data_len - offset < header_len:
+                ethertype = 0
+                break
+            protocol = data[offset + 9]
+            src_ip = inet_ntoa(data[offset + 12:offset + 16])
+            dst_ip = inet_ntoa(data[offset + 16:offset + 20])
+            transport = offset + header_len
+            ip_end = offset + ((data[offset + 2] << 8) | data[offset + 3])
+            l4_len = ip_end - transport
+            fragment = (data[offset + 6] << 8) | data[offset + 7]
+            if fragment & 0x3FFF:
+                # 有后续分片（MF）或分片偏移不为0
+                segment = stats.fragments.add(ts, (src_ip, dst_ip, (data[offset + 4] << 8) | data[offset + 5], protocol),
+                                              (fragment & 0x1FFF) * 8, bool(fragment & 0x2000), data[transport:ip_end])
+                if segment is None:
+                    transport = -1
+                    pending = True
+                else:
+                    size += len(segment) - l4_len
+                    l4_len = len(segment)
+        elif ethertype == ETHERTYPE_IPV6 and data_len - offset >= IPV6_HEADER_LEN:
+            protocol, transport, fragment = ipv6_upper_layer(data, offset, data_len)
+            src_ip = inet_ntop(AF_INET6, data[offset + 8:offset + 24])
+            dst_ip = inet_ntop(AF_INET6, data[offset + 24:offset + 40])
+            ip_end = offset + IPV6_HEADER_LEN + ((data[offset + 4] << 8) | data[offset + 5])
+            l4_len = ip_end - transport
+            if fragment is not None:
+                identification, frag_offset, more, start = fragment
+                segment = stats.fragments.add(ts, (src_ip, dst_ip, identification, protocol), frag_offset, more,
+                                              data[start:ip_end], transport - start if transport >= 0 else -1)
+                if segment is None:
+                    transport = -1
+                    pending = True
+                else:
+                    size += len(segment) - (ip_end - start)
+                    l4_len = len(segment)
+        else:
+            ethertype = 0
+            break
+
+        if transport < 0 or (tunnels is None and protocol != 6 and protocol != 17):
+            break
+        if segment is None:
+            segment = data[transport:ip_end]
+        if tunnels is None or depth == MAX_TUNNEL_DEPTH:
+            break
+        inner = tunnels.inner(protocol, segment)
+        if inner is None:
+            break
+        tunnel, (ethertype, offset, data) = inner
+        tunnels.count(tunnel, src_ip, dst_ip, incl_len)
+        data_len = len(data)
+
+    if not ethertype:
+        # 非IP数据包只计入总数和时间序列
+        stats.add(ts, incl_len, orig_len)
+        if stats.anomalies is not None:
+            stats.anomalies.count(ts)
+        return
+
+    stats.add(ts, incl_len, orig_len, (ip_protocol_name(protocol),), src_ip, dst_ip)
+    if stats.anomalies is not None:
+        stats.anomalies.count(ts)
+    if pending:
+        return
+    if stats.anomalies is not None:
+        if protocol == 1 or protocol == 58:
+            stats.anomalies.process(ts, protocol, src_ip, dst_ip, b'')
+
+    # TCP性能分析、应用层协议识别、DNS事务分析、异常检测和双向会话统计（同一次遍历内完成）
+    src_port = dst_port = 0
+    if (protocol == 6 or protocol == 17) and segment is not None:
+        if len(segment) >= (20 if protocol == 6 else 8):
+            src_port = (segment[0] << 8) | segment[1]
+            dst_port = (segment[2] << 8) | segment[3]
+            if protocol == 6 and stats.tcp is not None:
+                payload_len = l4_len - (segment[12] >> 4) * 4
+                stats.tcp.process(ts, src_ip, dst_ip, segment, payload_len)
+            if stats.apps is not None:
+                stats.apps.process(protocol, src_ip, dst_ip, segment, size)
+            if stats.dns is not None and (src_port == DNS_PORT or dst_port == DNS_PORT):
+                stats.dns.process(ts, protocol, src_ip, dst_ip, segment)
+            if stats.anomalies is not None:
+                stats.anomalies.process(ts, protocol, src_ip, dst_ip, segment)
+    if stats.flows is not None:
+        stats.flows.add(ts, protocol, src_ip, src_port, dst_ip, dst_port, size)
+
+
+def link_layer_for(header, stats=None):
+    """按文件头的链路类型取出 add_record 使用的链路层函数；不支持的类型在 stats 中记一条警告"""
+    link_layer = LINK_LAYERS.get(header['linktype'])
+    if link_layer is None:
+        if stats is not None:
+            stats.warnings.append(f"不支持的链路类型 {header['linktype']}，只统计数据包总数和时间序列")
+        return _no_network
+    return link_layer
+
+
+def _no_network(data):
+    return 0, 0
+
+
+class NativeBackend(Backend):
+    """纯Python的struct解析器，不依赖任何第三方库或外部程序"""
+
+    name = 'native'
+    formats = PCAP_FORMATS
+    metrics = frozenset(METRICS)
+    priority = 20
+    streaming = True
+    decapsulation = True
+
+    def collect(self, file_path, stats, max_packets=0, progress=None):
+        with open(file_path, 'rb') as f:
+            return self.collect_stream(f, stats, max_packets, progress)
+
+    def collect_stream(self, stream, stats, max_packets=0, progress=None):
+        bytes_done = PCAP_GLOBAL_HEADER_LEN
+        header = read_pcap_header(stream)
+        link_layer = link_layer_for(header, stats)
+        ts_divisor = header['ts_divisor']
+        partial = False
+        records = iter_records(stream, record_header=header['record_header'], max_len=max_record_len(header))
+        try:
+            for ts_sec, ts_frac, incl_len, orig_len, data in records:
+                add_record(stats, ts_sec + ts_frac / ts_divisor, incl_len, orig_len, data, link_layer)
+                bytes_done += PACKET_HEADER.size + incl_len
+
+                # 限制处理的数据包数量（0表示不限制）
+                if max_packets and stats.packet_count >= max_packets:
+                    break
+                if (progress is not None and stats.packet_count % CHECK_EVERY == 0
+                        and not progress.update(bytes_done, stats.packet_count)):
+                    break
+        except CorruptRecord as e:
+            # 损坏的记录头之后无法确定记录边界，报告不完整
+            stats.warnings.append(corrupt_record_warning(e, stats.packet_count))
+            partial = True
+        if progress is not None:
+            progress.finish(bytes_done, stats.packet_count)
+        return partial
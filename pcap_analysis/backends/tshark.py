@@ -0,0 +1,184 @@
+import os
+import shutil
+import tempfile
+import subprocess
+
+from . import Backend
+from ..pcapfile import PCAP_GLOBAL_HEADER_LEN, PACKET_HEADER
+from ..progress import CHECK_EVERY
+
+# PATH中找不到tshark时依次尝试的安装位置（第一个为早期版本硬编码的路径）
+TSHARK_CANDIDATE_PATHS = [
+    r'D:\Wireshark\tshark.exe',
+    r'C:\Program Files\Wireshark\tshark.exe',
+    r'C:\Program Files (x86)\Wireshark\tshark.exe',
+    '/usr/bin/tshark',
+    '/usr/local/bin/tshark',
+    '/opt/homebrew/bin/tshark',
+    '/Applications/Wireshark.app/Contents/MacOS/tshark'
+]
+
+# 报告只需要这几列，tshark -T fields 只输出这些字段
+TSHARK_FIELDS = ['frame.time_epoch', 'frame.cap_len', 'frame.len', 'frame.protocols',
+                 'ip.src', 'ip.dst', 'ipv6.src', 'ipv6.dst']
+
+# frame.protocols 中不对应真实协议层的条目
+IGNORED_PROTOCOLS = {'ethertype'}
+
+# tshark不输出记录在文件中的偏移，进度按 文件头 + 每条记录(记录头 + 保存长度) 估算
+RECORD_OVERHEAD = PACKET_HEADER.size
+
+# tshark可以读取的格式：native/numpy 支持各种字节序和时间戳精度的经典pcap（PCAP_FORMATS），
+# pcapng 和无法识别的格式只能交给tshark尝试
+TSHARK_FORMATS = frozenset({'pcap', 'pcap-be', 'pcap-ns', 'pcap-ns-be', 'pcapng', 'unknown'})
+
+
+def find_tshark():
+    """查找tshark：环境变量 TSHARK_PATH、PATH、常见安装位置"""
+    env_path = os.environ.get('TSHARK_PATH')
+    if env_path and os.path.exists(env_path):
+        return env_path
+
+    path = shutil.which('tshark')
+    if path:
+        return path
+
+    for candidate in TSHARK_CANDIDATE_PATHS:
+        if os.path.exists(candidate):
+            return candidate
+
+    raise FileNotFoundError("错误: 未找到tshark程序，请安装Wireshark并将tshark加入PATH，或设置TSHARK_PATH环境变量")
+
+
+def _tshark_missing():
+    try:
+        find_tshark()
+    except FileNotFoundError as e:
+        return str(e)
+    return None
+
+
+class TsharkBackend(Backend):
+    """运行一次 tshark -T fields，只取报告需要的列并流式解析"""
+
+    name = 'tshark'
+    formats = TSHARK_FORMATS
+    metrics = frozenset({'summary', 'timeseries'})
+    priority = 10
+
+    def unavailable_reason(self):
+        return _tshark_missing()
+
+    def collect(self, file_path, stats, max_packets=0, progress=None):
+        command = [find_tshark(), '-r', file_path, '-n', '-T', 'fields',
+                   '-E', 'separator=/t', '-E', 'occurrence=f']
+        for field in TSHARK_FIELDS:
+            command += ['-e', field]
+
+        # stderr 写入临时文件而不是管道：stdout 读完之前不读 stderr，tshark写满stderr管道后会阻塞
+        stderr_file = tempfile.TemporaryFile()
+        try:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr_file,
+                                       encoding='utf-8', errors='replace', bufsize=1024 * 1024)
+        except OSError:
+            stderr_file.close()
+            raise
+        stopped_early = False
+        bytes_done = PCAP_GLOBAL_HEADER_LEN
+        try:
+            for line in process.stdout:
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) < len(TSHARK_FIELDS):
+                    continue
+                time_epoch, cap_len, length, protocols, ip_src, ip_dst, ipv6_src, ipv6_dst = fields[:8]
+
+                stats.add(
+                    float(time_epoch) if time_epoch else None,
+                    int(cap_len) if cap_len else 0,
+                    int(length) if length else 0,
+                    [p.upper() for p in protocols.split(':') if p and p not in IGNORED_PROTOCOLS],
+                    ip_src or ipv6_src,
+                    ip_dst or ipv6_dst
+                )
+                bytes_done += RECORD_OVERHEAD + (int(cap_len) if cap_len else 0)
+
+                # 限制处理的数据包数量（0表示不限制）
+                if max_packets and stats.packet_count >= max_packets:
+                    stopped_early = True
+                    break
+                if (progress is not None and stats.packet_count % CHECK_EVERY == 0
+                        and not progress.update(bytes_done, stats.packet_count)):
+                    stopped_early = True
+                    break
+        finally:
+            if stopped_early:
+                process.kill()
+            process.stdout.close()
+            returncode = process.wait()
+            stderr_file.seek(0)
+            stderr = stderr_file.read().decode('utf-8', 'replace')
+            stderr_file.close()
+            if progress is not None:
+                progress.finish(bytes_done, stats.packet_count)
+
+        if not stopped_early and returncode != 0:
+            message = stderr.strip().splitlines()[-1] if stderr.strip() else f"tshark退出码 {returncode}"
+            if stats.packet_count == 0:
+                raise RuntimeError(message)
+            # 截断的文件tshark会报错退出，但已输出的数据包仍然有效
+            stats.warnings.append(message)
+
+        return False
+
+
+class PysharkBackend(Backend):
+    """使用pyshark逐包构建协议树（较慢，保留用于需要完整协议树的场景）"""
+
+    name = 'pyshark'
+    formats = TSHARK_FORMATS
+    metrics = frozenset({'summary', 'timeseries'})
+    priority = 0
+
+    def unavailable_reason(self):
+        try:
+            import pyshark  # noqa: F401
+        except ImportError:
+            return "pyshark 后端需要安装 pyshark"
+        return _tshark_missing()
+
+    def collect(self, file_path, stats, max_packets=0, progress=None):
+        import pyshark
+
+        partial = False
+        bytes_done = PCAP_GLOBAL_HEADER_LEN
+        cap = pyshark.FileCapture(file_path, keep_packets=False, tshark_path=find_tshark())
+        try:
+            for packet in cap:
+                length = int(packet.length) if hasattr(packet, 'length') else 0
+                cap_len = int(packet.captured_length) if hasattr(packet, 'captured_length') else length
+                ts = float(packet.sniff_timestamp) if hasattr(packet, 'sniff_timestamp') else None
+                protocols = [layer.layer_name.upper() for layer in packet.layers] if hasattr(packet, 'layers') else []
+                if 'IP' in packet:
+                    src_ip, dst_ip = packet.ip.src, packet.ip.dst
+                else:
+                    src_ip, dst_ip = None, None
+                stats.add(ts, cap_len, length, protocols, src_ip, dst_ip)
+                bytes_done += RECORD_OVERHEAD + cap_len
+
+                # 限制处理的数据包数量（0表示不限制）
+                if max_packets and stats.packet_count >= max_packets:
+                    break
+                # pyshark每个包开销很大，每个包都检查截止时间
+                if progress is not None and not progress.update(bytes_done, stats.packet_count):
+                    break
+        except Exception as e:
+            # 解析中途出错时报告不完整，不写入缓存
+            stats.warnings.append(f"分析过程出错: {str(e)}")
+            partial = True
+        finally:
+            # 关闭捕获
+            cap.close()
+            if progress is not None:
+                progress.finish(bytes_done, stats.packet_count)
+
+        return partial
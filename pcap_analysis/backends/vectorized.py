@@ -0,0 +1,507 @@
+import struct
+from socket import AF_INET6, inet_ntoa, inet_ntop
+
+try:
+    import numpy as np
+except ImportError:  # numpy为可选依赖，缺少时该后端不可用
+    np = None
+
+from . import Backend
+from ..dns import DNS_PORT
+from ..packet import (ETHERNET_HEADER_LEN, ETHERTYPE_IPV4, ETHERTYPE_IPV6, IPV6_EXTENSION_HEADERS, IPV6_HEADER_LEN,
+                      LINK_LAYERS, LINKTYPE_ETHERNET, LINKTYPE_IPV4, LINKTYPE_IPV6, LINKTYPE_LINUX_SLL, LINKTYPE_LINUX_SLL2,
+                      LINKTYPE_RAW, MAX_VLAN_TAGS, VLAN_ETHERTYPES, ip_protocol_name, ipv6_upper_layer)
+from ..pcapfile import (MAX_RECORD_LEN, PCAP_FORMATS, PCAP_GLOBAL_HEADER_LEN, PACKET_HEADER, CorruptRecord,
+                        corrupt_record_warning, max_record_len, read_pcap_header)
+from ..traffic import METRICS
+from .native import add_record
+
+# 每次读入并向量化处理的字节数
+CHUNK_SIZE = 16 * 1024 * 1024
+# 带类型字段的链路层：类型字段位置和链路层头长度（其后可能还有VLAN标签）
+_LINK_HEADERS = {
+    LINKTYPE_ETHERNET: (12, ETHERNET_HEADER_LEN),
+    LINKTYPE_LINUX_SLL: (14, 16),
+    LINKTYPE_LINUX_SLL2: (0, 20)
+}
+_VLAN_TYPES = sorted(VLAN_ETHERTYPES)
+_IPV6_EXTENSIONS = sorted(IPV6_EXTENSION_HEADERS)
+# 分片记录之间不足这么多条的非分片记录也逐条解析，避免为很短的片段做一次向量化聚合
+MIN_VECTOR_RUN = 256
+# IPv6地址的键从这里开始编号，不与32位的IPv4地址重叠；流键中地址占40位
+IPV6_KEY_BASE = 1 << 32
+
+_INCL_LEN = struct.Struct('<L')
+_INCL_LEN_BE = struct.Struct('>L')
+
+
+def _record_offsets(buf, limit=0, incl_len_field=_INCL_LEN, max_len=MAX_RECORD_LEN):
+    """顺序扫描记录头，返回 (完整记录的起始偏移, 已消费的字节数, 损坏的记录头长度)
+
+    记录是变长的，只有这一步需要逐条循环；字段提取都在 numpy 中完成。
+    记录长度超过 max_len 时在该记录前停止，第三项为该长度，否则为None。
+    """
+    unpack_from = incl_len_field.unpack_from
+    header_size = PACKET_HEADER.size
+    buf_len = len(buf)
+    offsets = []
+    append = offsets.append
+    pos = 0
+    while buf_len - pos >= header_size:
+        incl_len = unpack_from(buf, pos + 8)[0]
+        if incl_len > max_len:
+            return offsets, pos, incl_len
+        record_end = pos + header_size + incl_len
+        if record_end > buf_len:
+            break
+        append(pos)
+        pos = record_end
+        if limit and len(offsets) >= limit:
+            break
+    return offsets, pos, None
+
+
+def _ip_name(value, cache):
+    name = cache.get(value)
+    if name is None:
+        name = cache[value] = inet_ntoa(value.to_bytes(4, 'big'))
+    return name
+
+
+def _be32(data, positions, last):
+    """按绝对位置批量读取大端32位整数"""
+    value = data[np.minimum(positions, last)].astype(np.uint32)
+    for i in range(1, 4):
+        value = (value << 8) | data[np.minimum(positions + i, last)]
+    return value
+
+
+def _pair_keys(a, b):
+    """把两列地址键合并成一列整数键，返回 (键, 把键拆回两个地址键的函数)
+
+    都是IPv4地址时直接拼成64位；含IPv6地址的编号时先映射为本块内的下标再组合。
+    """
+    if not len(a) or max(int(a.max()), int(b.max())) < IPV6_KEY_BASE:
+        return (a << np.uint64(32)) | b, lambda key: (key >> 32, key & 0xFFFFFFFF)
+    values, inverse = np.unique(np.concatenate([a, b]), return_inverse=True)
+    width = len(values)
+    inverse = inverse.ravel().astype(np.uint64)
+    keys = inverse[:len(a)] * np.uint64(width) + inverse[len(a):]
+    values = values.tolist()
+    return keys, lambda key: (values[key // width], values[key % width])
+
+
+class _Columns:
+    """从记录偏移批量取出相对记录起点固定（或逐条给定）位置的字节/整数"""
+
+    def __init__(self, buf, offsets):
+        self.data = np.frombuffer(buf, dtype=np.uint8)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.last = len(self.data) - 1
+
+    def u8(self, position):
+        # 帧比读取位置短时下标可能越过缓冲区末尾，取值无意义但会被掩码过滤
+        return self.data[np.minimum(self.offsets + position, self.last)]
+
+    def be16(self, position):
+        return (self.u8(position).astype(np.int64) << 8) | self.u8(position + 1)
+
+    def le32(self, position):
+        value = self.u8(position).astype(np.uint32)
+        for i in range(1, 4):
+            value |= self.u8(position + i).astype(np.uint32) << (8 * i)
+        return value
+
+    def be32(self, position):
+        value = self.u8(position).astype(np.uint32)
+        for i in range(1, 4):
+            value = (value << 8) | self.u8(position + i)
+        return value
+
+
+def _count_keys(keys, weights):
+    """对键去重计数，返回 [(键, 包数, 字节数)]，按首次出现的顺序排列
+
+    与逐包解析的字典插入顺序一致，报告中包数并列的条目排序因此与 native 后端相同。
+    """
+    unique, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    packets = np.bincount(inverse, minlength=len(unique))
+    byte_counts = np.bincount(inverse, weights=weights, minlength=len(unique))
+    order = np.argsort(first, kind='stable')
+    return zip(unique[order].tolist(), packets[order].tolist(), byte_counts[order].tolist())
+
+
+class NumpyBackend(Backend):
+    """向量化解析：逐条只读取记录长度，其余字段按列批量提取并用 bincount/unique 聚合"""
+
+    name = 'numpy'
+    formats = PCAP_FORMATS
+    metrics = frozenset(METRICS)
+    priority = 30
+    streaming = True
+
+    def unavailable_reason(self):
+        if np is None:
+            return "numpy 后端需要安装 numpy"
+        return None
+
+    def collect(self, file_path, stats, max_packets=0, progress=None):
+        with open(file_path, 'rb') as f:
+            return self.collect_stream(f, stats, max_packets, progress)
+
+    def collect_stream(self, stream, stats, max_packets=0, progress=None):
+        names = {}
+        ipv6_keys = {}
+        bytes_done = PCAP_GLOBAL_HEADER_LEN
+        header = read_pcap_header(stream)
+        if header['linktype'] not in LINK_LAYERS:
+            stats.warnings.append(f"不支持的链路类型 {header['linktype']}，只统计数据包总数和时间序列")
+        incl_len_field = _INCL_LEN_BE if header['byte_order'] == '>' else _INCL_LEN
+        max_len = max_record_len(header)
+        partial = False
+        # 内存中最多保留一个块和上一块末尾不完整的记录（记录长度有上限）
+        pending = b''
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            buf = pending + chunk if pending else chunk
+            limit = max_packets - stats.packet_count if max_packets else 0
+            offsets, consumed, corrupt = _record_offsets(buf, limit, incl_len_field, max_len)
+            if offsets:
+                self._aggregate(stats, buf, offsets, names, ipv6_keys, header)
+            pending = buf[consumed:]
+            bytes_done += consumed
+            if corrupt is not None:
+                # 损坏的记录头之后无法确定记录边界，报告不完整
+                error = CorruptRecord(bytes_done - PCAP_GLOBAL_HEADER_LEN, corrupt, max_len)
+                stats.warnings.append(corrupt_record_warning(error, stats.packet_count))
+                partial = True
+                break
+            # 限制处理的数据包数量（0表示不限制）
+            if max_packets and stats.packet_count >= max_packets:
+                break
+            if progress is not None and not progress.update(bytes_done, stats.packet_count):
+                break
+        if progress is not None:
+            progress.finish(bytes_done, stats.packet_count)
+        return partial
+
+    def _network(self, columns, incl_len, linktype):
+        """按链路类型批量取出网络层类型和相对帧起点的偏移（与 packet.LINK_LAYERS 中的函数一致）"""
+        frame = PACKET_HEADER.size
+        count = len(incl_len)
+        if linktype in _LINK_HEADERS:
+            type_position, link_len = _LINK_HEADERS[linktype]
+            ethertype = np.where(incl_len >= link_len, columns.be16(frame + type_position), 0)
+            network = np.full(count, link_len, dtype=np.int64)
+            for _ in range(MAX_VLAN_TAGS):
+                tagged = np.isin(ethertype, _VLAN_TYPES) & (incl_len >= network + 4)
+                if not tagged.any():
+                    break
+                ethertype = np.where(tagged, columns.be16(frame + network + 2), ethertype)
+                network = network + tagged * 4
+            return ethertype, network
+        network = np.zeros(count, dtype=np.int64)
+        if linktype == LINKTYPE_RAW:
+            version = columns.u8(frame) >> 4
+            ethertype = np.where(version == 4, ETHERTYPE_IPV4, np.where(version == 6, ETHERTYPE_IPV6, 0))
+            return np.where(incl_len > 0, ethertype, 0), network
+        if linktype == LINKTYPE_IPV4:
+            return np.full(count, ETHERTYPE_IPV4), network
+        if linktype == LINKTYPE_IPV6:
+            return np.full(count, ETHERTYPE_IPV6), network
+        return np.zeros(count, dtype=np.int64), network
+
+    def _aggregate(self, stats, buf, offsets, names, ipv6_keys, file_header):
+        columns = _Columns(buf, offsets)
+        header = PACKET_HEADER.size
+        u32 = columns.be32 if file_header['byte_order'] == '>' else columns.le32
+        ts = u32(0) + u32(4) / file_header['ts_divisor']
+        incl_len = u32(8).astype(np.int64)
+        orig_len = u32(12)
+
+        # 帧数据紧跟在记录头之后；network 为网络层相对帧起点的偏移
+        frame = header
+        ethertype, network = self._network(columns, incl_len, file_header['linktype'])
+        fragmented = self._fragmented(buf, columns, ethertype, network, incl_len)
+        if fragmented.any():
+            self._split(stats, buf, offsets, fragmented, names, ipv6_keys, file_header)
+            return
+        ip_len = incl_len - network
+        l3 = columns.offsets + frame + network
+        data, last = columns.data, columns.last
+        ihl = (data[np.minimum(l3, last)] & 0x0F).astype(np.int64)
+        is_ipv4 = (ethertype == ETHERTYPE_IPV4) & (ip_len >= 20) & (ihl >= 5) & (ip_len >= ihl * 4)
+        is_ipv6 = (ethertype == ETHERTYPE_IPV6) & (ip_len >= IPV6_HEADER_LEN)
+        ip_index = np.nonzero(is_ipv4 | is_ipv6)[0]
+
+        # 以下各列按IPv4的字段位置取值，IPv6包随后逐个改写；transport/ip_end 为缓冲区中的绝对位置
+        l3 = l3[ip_index]
+        protocol = data[np.minimum(l3 + 9, last)]
+        src = _be32(data, l3 + 12, last).astype(np.uint64)
+        dst = _be32(data, l3 + 16, last).astype(np.uint64)
+        transport = l3 + ihl[ip_index] * 4
+        ip_end = l3 + ((data[np.minimum(l3 + 2, last)].astype(np.int64) << 8) | data[np.minimum(l3 + 3, last)])
+        record_end = columns.offsets[ip_index] + frame + incl_len[ip_index]
+        v6 = np.nonzero(is_ipv6[ip_index])[0]
+        if len(v6):
+            self._ipv6(buf, v6, l3, record_end, protocol, src, dst, transport, ip_end, names, ipv6_keys)
+        ip_bytes = incl_len[ip_index].astype(np.float64)
+
+        values, counts = np.unique(protocol, return_counts=True)
+        protocol_counts = {}
+        for value, count in zip(values.tolist(), counts.tolist()):
+            name = ip_protocol_name(value)
+            protocol_counts[name] = protocol_counts.get(name, 0) + count
+
+        ip_counts = {}
+        # 源、目的地址交错排列，与逐包统计的先源后目的顺序一致
+        ip_keys = np.column_stack([src, dst]).ravel()
+        for key, packets, byte_count in _count_keys(ip_keys, np.repeat(ip_bytes, 2)):
+            ip_counts[_ip_name(key, names)] = {'packets': packets, 'bytes': int(byte_count)}
+
+        conversations = {}
+        conv_keys, split = _pair_keys(src, dst)
+        for key, packets, byte_count in _count_keys(conv_keys, ip_bytes):
+            source, target = split(key)
+            conv = f"{_ip_name(source, names)} -> {_ip_name(target, names)}"
+            conversations[conv] = {'packets': packets, 'bytes': int(byte_count)}
+
+        stats.add_counts(len(offsets), int(incl_len.sum()), protocol_counts, ip_counts, conversations)
+        if stats.first_ts is None:
+            stats.first_ts = float(ts[0])
+        stats.last_ts = float(ts[-1])
+        if stats.series is not None:
+            stats.series.add_batch(ts, orig_len)
+
+        if (stats.apps is not None or stats.dns is not None or stats.anomalies is not None
+                or stats.flows is not None):
+            segments = self._transport(columns, ip_index, protocol, src, dst, transport, ip_end, record_end, ts)
+            if stats.apps is not None and len(segments.index):
+                self._classify(stats.apps, buf, segments, incl_len, names)
+            if stats.dns is not None:
+                self._dns(stats.dns, buf, segments, names)
+            if stats.anomalies is not None:
+                self._detect(stats.anomalies, ts, ip_index, protocol, src, dst, segments, columns, names)
+            if stats.flows is not None:
+                self._flows(stats.flows, ts[ip_index], incl_len[ip_index], protocol, src, dst, segments, names)
+
+        # TCP分析依赖连接状态，只对TCP包逐个处理
+        if stats.tcp is not None:
+            tcp = (protocol == 6) & (transport >= 0)
+            process = stats.tcp.process
+            for t, start, end, nominal_end, s, d in zip(ts[ip_index[tcp]].tolist(), transport[tcp].tolist(),
+                                                        np.minimum(ip_end[tcp], record_end[tcp]).tolist(),
+                                                        ip_end[tcp].tolist(), src[tcp].tolist(), dst[tcp].tolist()):
+                segment = buf[start:end]
+                if len(segment) >= 20:
+                    payload_len = nominal_end - start - (segment[12] >> 4) * 4
+                    process(t, _ip_name(s, names), _ip_name(d, names), segment, payload_len)
+
+    def _fragmented(self, buf, columns, ethertype, network, incl_len):
+        """标记IPv4/IPv6分片记录：分片要按到达顺序重组，交给逐包解析"""
+        data, last = columns.data, columns.last
+        l3 = columns.offsets + PACKET_HEADER.size + network
+        ip_len = incl_len - network
+        flags = (data[np.minimum(l3 + 6, last)].astype(np.int64) << 8) | data[np.minimum(l3 + 7, last)]
+        fragmented = (ethertype == ETHERTYPE_IPV4) & (ip_len >= 20) & ((flags & 0x3FFF) != 0)
+        # IPv6的分片头在扩展头链中，只有紧跟扩展头的包需要逐个查看
+        candidates = (ethertype == ETHERTYPE_IPV6) & (ip_len >= IPV6_HEADER_LEN) & np.isin(
+            data[np.minimum(l3 + 6, last)], _IPV6_EXTENSIONS)
+        record_end = columns.offsets + PACKET_HEADER.size + incl_len
+        for i in np.nonzero(candidates)[0].tolist():
+            if ipv6_upper_layer(buf, int(l3[i]), int(record_end[i]))[2] is not None:
+                fragmented[i] = True
+        return fragmented
+
+    def _split(self, stats, buf, offsets, fragmented, names, ipv6_keys, file_header):
+        """块中有分片时：分片记录按顺序交给 native 的 add_record，其间较长的非分片片段仍向量化聚合"""
+        link_layer = LINK_LAYERS[file_header['linktype']]
+        unpack_from = file_header['record_header'].unpack_from
+        ts_divisor = file_header['ts_divisor']
+        header_size = PACKET_HEADER.size
+        fragmented = fragmented.tolist()
+        count = len(offsets)
+        i = 0
+        while i < count:
+            j = i + 1
+            if not fragmented[i]:
+                while j < count and not fragmented[j]:
+                    j += 1
+                if j - i >= MIN_VECTOR_RUN:
+                    self._aggregate(stats, buf, offsets[i:j], names, ipv6_keys, file_header)
+                    i = j
+                    continue
+            for pos in offsets[i:j]:
+                ts_sec, ts_frac, incl_len, orig_len = unpack_from(buf, pos)
+                add_record(stats, ts_sec + ts_frac / ts_divisor, incl_len, orig_len,
+                           buf[pos + header_size:pos + header_size + incl_len], link_layer)
+            i = j
+
+    def _ipv6(self, buf, v6, l3, record_end, protocol, src, dst, transport, ip_end, names, ipv6_keys):
+        """IPv6包的扩展头长度不定，逐个解析后写回各列；地址按首次出现的顺序编号"""
+        for i, start, end in zip(v6.tolist(), l3[v6].tolist(), record_end[v6].tolist()):
+            protocol[i], transport[i], _ = ipv6_upper_layer(buf, start, end)
+            ip_end[i] = start + IPV6_HEADER_LEN + ((buf[start + 4] << 8) | buf[start + 5])
+            for column, position in ((src, start + 8), (dst, start + 24)):
+                address = buf[position:position + 16]
+                key = ipv6_keys.get(address)
+                if key is None:
+                    key = ipv6_keys[address] = IPV6_KEY_BASE + len(ipv6_keys)
+                    names[key] = inet_ntop(AF_INET6, address)
+                column[i] = key
+
+    def _transport(self, columns, ip_index, protocol, src, dst, transport, ip_end, record_end, ts):
+        """取出TCP/UDP包的传输层段位置和端口（与逐包解析相同：TCP头不足20字节、UDP头不足8字节的包除外）"""
+        l4 = ((protocol == 6) | (protocol == 17)) & (transport >= 0)
+        index = ip_index[l4]
+        starts = transport[l4]
+        ends = np.minimum(np.maximum(ip_end[l4], starts), record_end[l4])
+        proto = protocol[l4].astype(np.uint64)
+        valid = (ends - starts) >= np.where(proto == 6, 20, 8)
+        data, last = columns.data, columns.last
+        starts, ends = starts[valid], ends[valid]
+        index = index[valid]
+        segments = _Transport()
+        segments.index = index
+        # 在各IP包列中的位置
+        segments.position = np.nonzero(l4)[0][valid]
+        segments.proto = proto[valid]
+        segments.src = src[l4][valid]
+        segments.dst = dst[l4][valid]
+        segments.ts = ts[index]
+        segments.starts = starts
+        segments.ends = ends
+        segments.sport = (data[np.minimum(starts, last)].astype(np.uint64) << np.uint64(8)) | data[np.minimum(starts + 1, last)]
+        segments.dport = (data[np.minimum(starts + 2, last)].astype(np.uint64) << np.uint64(8)) | data[np.minimum(starts + 3, last)]
+        # 载荷起点：TCP按数据偏移，UDP固定8字节
+        segments.payload_starts = starts + np.where(
+            segments.proto == 6, (data[np.minimum(starts + 12, last)] >> 4).astype(np.int64) * 4, 8)
+        return segments
+
+    def _flows(self, flows, ts, sizes, protocol, src, dst, transport, names):
+        """按双向规范化的五元组分组，每条流每块只调用一次 FlowTable.add_flow（非TCP/UDP的包端口为0）"""
+        t = transport
+        sport = np.zeros(len(src), dtype=np.uint64)
+        dport = np.zeros(len(src), dtype=np.uint64)
+        sport[t.position] = t.sport
+        dport[t.position] = t.dport
+        side_src = (src << np.uint64(16)) | sport
+        side_dst = (dst << np.uint64(16)) | dport
+        low = np.minimum(side_src, side_dst) | (protocol.astype(np.uint64) << np.uint64(56))
+        # 两端先映射为本块内的编号再组合成一列键，一维去重比按行去重快得多
+        sides, side_index = np.unique(np.concatenate([low, np.maximum(side_src, side_dst)]), return_inverse=True)
+        side_index = side_index.ravel().astype(np.uint64)
+        keys = side_index[:len(low)] * np.uint64(len(sides)) + side_index[len(low):]
+        unique, first, inverse, counts = np.unique(keys, return_index=True, return_inverse=True, return_counts=True)
+        inverse = inverse.ravel()
+        # 与流内第一个包同向的包
+        reversed_side = side_src > side_dst
+        forward = reversed_side == reversed_side[first][inverse]
+        forward_packets = np.bincount(inverse, weights=forward, minlength=len(unique))
+        forward_bytes = np.bincount(inverse, weights=sizes * forward, minlength=len(unique))
+        byte_counts = np.bincount(inverse, weights=sizes, minlength=len(unique))
+        last = np.argsort(inverse, kind='stable')[np.cumsum(counts) - 1]
+
+        order = np.argsort(first, kind='stable')
+        first = first[order]
+        columns = zip(ts[first].tolist(), ts[last[order]].tolist(), protocol[first].tolist(), src[first].tolist(),
+                      sport[first].tolist(), dst[first].tolist(), dport[first].tolist(), counts[order].tolist(),
+                      byte_counts[order].tolist(), forward_packets[order].tolist(), forward_bytes[order].tolist())
+        add_flow = flows.add_flow
+        for first_ts, last_ts, proto, s, s_port, d, d_port, packets, byte_count, fwd_packets, fwd_bytes in columns:
+            fwd_packets, fwd_bytes, byte_count = int(fwd_packets), int(fwd_bytes), int(byte_count)
+            add_flow(first_ts, last_ts, proto, _ip_name(s, names), s_port, _ip_name(d, names), d_port,
+                     (fwd_packets, fwd_bytes), (packets - fwd_packets, byte_count - fwd_bytes))
+
+    def _classify(self, apps, buf, transport, incl_len, names):
+        """按流分组累加应用层协议计数，只对尚未判断出协议的流逐包检查载荷
+
+        流键与逐包解析相同（地址字符串），IPv6地址的编号只在一次遍历内有效，不能进入保存的汇总。
+        """
+        t = transport
+        # (地址键, 端口) 打包成56位整数后取较小的一端在前，得到双向规范化的流键
+        side_a = (t.src.astype(np.uint64) << np.uint64(16)) | t.sport
+        side_b = (t.dst.astype(np.uint64) << np.uint64(16)) | t.dport
+        low = np.minimum(side_a, side_b) | (t.proto << np.uint64(56))
+        high = np.maximum(side_a, side_b)
+        keys = np.column_stack([low, high])
+        unique, first, inverse, counts = np.unique(keys, axis=0, return_index=True, return_inverse=True,
+                                                   return_counts=True)
+        inverse = inverse.ravel()
+        sizes = incl_len[t.index]
+        # 没有载荷的包不需要逐个检查
+        has_payload = t.ends > t.payload_starts
+        byte_counts = np.bincount(inverse, weights=sizes, minlength=len(unique))
+        members = np.argsort(inverse, kind='stable')
+        bounds = np.concatenate(([0], np.cumsum(counts)))
+
+        def payloads(group):
+            group_members = members[bounds[group]:bounds[group + 1]]
+            group_members = group_members[has_payload[group_members]]
+            for start, end, size in zip(t.payload_starts[group_members].tolist(), t.ends[group_members].tolist(),
+                                        sizes[group_members].tolist()):
+                yield size, buf[start:end]
+
+        for group in np.argsort(first, kind='stable').tolist():
+            low_key, high_key = unique[group].tolist()
+            side_a = (_ip_name((low_key >> 16) & 0xFFFFFFFFFF, names), low_key & 0xFFFF)
+            side_b = (_ip_name(high_key >> 16, names), high_key & 0xFFFF)
+            if side_b < side_a:
+                side_a, side_b = side_b, side_a
+            key = (low_key >> 56,) + side_a + side_b
+            apps.add_flow(key, int(counts[group]), int(byte_counts[group]), payloads(group))
+
+    def _dns(self, dns, buf, transport, names):
+        """DNS包数量很少，先按端口筛选再逐包交给 DnsAnalyzer"""
+        t = transport
+        selected = np.nonzero((t.sport == DNS_PORT) | (t.dport == DNS_PORT))[0]
+        for ts, proto, start, end, s, d in zip(t.ts[selected].tolist(), t.proto[selected].tolist(),
+                                               t.starts[selected].tolist(), t.ends[selected].tolist(),
+                                               t.src[selected].tolist(), t.dst[selected].tolist()):
+            dns.process(ts, proto, _ip_name(s, names), _ip_name(d, names), buf[start:end])
+
+    def _detect(self, detector, ts, ip_index, protocol, src, dst, transport, columns, names):
+        """按检测步长切分本块，每段按键聚合后批量交给检测器，调用次数只与不同键的数量有关"""
+        t = transport
+        flags = columns.data[np.minimum(t.starts + 13, columns.last)]
+        tcp = t.proto == 6
+        syn = tcp & ((flags & 0x12) == 0x02)
+        syn_ack = tcp & ((flags & 0x12) == 0x12)
+        probe = syn | (~tcp & (t.dport < t.sport))
+        icmp = (protocol == 1) | (protocol == 58)
+
+        # 时间戳回退的包与逐包处理时一样计入当前步长
+        steps = np.maximum.accumulate(np.floor(ts / detector.step).astype(np.int64))
+        bounds = np.concatenate(([0], np.flatnonzero(np.diff(steps)) + 1, [len(ts)]))
+        ts_list = ts.tolist()
+
+        def grouped(records, mask, keys, low, high):
+            """本段内 mask 选中的包按键去重：单列键返回 [(键, 包数)]，多列键返回去重后的键"""
+            begin, end = np.searchsorted(records, (low, high))
+            selected = mask[begin:end]
+            values = [key[begin:end][selected] for key in keys]
+            if len(values) == 1:
+                unique, counts = np.unique(values[0], return_counts=True)
+                return zip(unique.tolist(), counts.tolist())
+            return [tuple(row) for row in np.unique(np.column_stack(values), axis=0).tolist()]
+
+        for i in range(len(bounds) - 1):
+            low, high = bounds[i], bounds[i + 1]
+            at = ts_list[low]
+            detector.count(at, int(high - low))
+            for target, count in grouped(t.index, syn, [t.dst], low, high):
+                detector.syn(at, _ip_name(target, names), count)
+            for source, count in grouped(t.index, syn_ack, [t.src], low, high):
+                detector.syn_ack(at, _ip_name(source, names), count)
+            for source, target, port in grouped(t.index, probe, [t.src, t.dst, t.dport], low, high):
+                detector.probe(at, _ip_name(source, names), _ip_name(target, names), port)
+            for target, count in grouped(ip_index, icmp, [dst], low, high):
+                detector.icmp(at, _ip_name(target, names), count)
+
+
+class _Transport:
+    """一个块内TCP/UDP包的传输层列（index 为在块内记录中的下标）"""
+    __slots__ = ('index', 'position', 'proto', 'src', 'dst', 'ts', 'starts', 'ends', 'sport', 'dport',
+                 'payload_starts')
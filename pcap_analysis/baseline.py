@@ -0,0 +1,456 @@
+"""历史基线对比：按站点（或接口）保存每次抓包的紧凑概况，新抓包与历史基线比较
+
+    python -m pcap_analysis.baseline list [SITE]
+    python -m pcap_analysis.baseline add SITE FILE [FILE ...]
+    python -m pcap_analysis.baseline compare SITE FILE [--format text|json]
+    python -m pcap_analysis.baseline remove SITE [KEY]
+
+概况（capture_profile）只保留比较需要的几KB数据：协议和应用层协议占比、主要通信IP的字节占比、
+带宽/包速率及其分桶百分位、TCP重传率和RTT、DNS失败率和解析时延。它由结构化结果生成，
+任何后端、缓存命中的结果和 checkpoint 模块的汇总文件（.summary）都可以作为来源，
+比较时只读取保存的概况，不重新分析历史抓包。
+
+站点名称由调用方决定（如机房名或抓包接口名），每个站点保存在 temp/baselines/<站点>/ 下，
+每次抓包一个JSON文件（同一抓包再次加入时覆盖），超过 max_profiles 个时删除开始时间最早的。
+FILE 以 .summary 结尾时按汇总文件读取，否则按抓包文件分析（可使用分析结果缓存）。
+"""
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+import statistics
+
+from .analyzer import analyze
+from .checkpoint import SUMMARY_SUFFIX, load_summary, summary_result
+from .result import TOP_TALKERS, iso_time
+
+# 默认基线目录：项目根目录下的 temp/baselines
+DEFAULT_BASELINE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'temp', 'baselines'
+)
+# 概况的格式版本；字段含义变化时递增，旧版本的概况在比较时跳过
+PROFILE_VERSION = 2
+DEFAULT_MAX_PROFILES = 50
+# 概况中最多保留的通信IP数
+MAX_TALKERS = 50
+# 字节占比达到该值的通信IP才报告为新出现或消失
+TALKER_SHARE = 0.02
+# 判断通信IP新出现或消失时，占比须超过列表截断处占比的倍数（结果中的主要通信IP按包数而不是字节数排列）
+FLOOR_MARGIN = 2
+# 协议、应用层协议占比变化达到该值（百分点/100）时报告
+SHARE_SHIFT = 0.05
+# 指标超出基线范围且相对基线中位数变化达到该比例时报告
+METRIC_CHANGE = 0.5
+
+# 概况中的指标：(名称, 显示名, 单位)
+METRICS = (
+    ('bandwidth_mbps', '平均带宽', 'Mbps'),
+    ('packet_rate', '平均包速率', '包/秒'),
+    ('avg_packet_size', '平均包大小', '字节'),
+    ('pps_p50', '包速率P50', '包/秒'),
+    ('pps_p95', '包速率P95', '包/秒'),
+    ('mbps_p50', '带宽P50', 'Mbps'),
+    ('mbps_p95', '带宽P95', 'Mbps'),
+    ('mbps_p99', '带宽P99', 'Mbps'),
+    ('tcp_retransmission_rate', 'TCP重传率', ''),
+    ('tcp_handshake_rtt_p50_ms', '握手RTT P50', 'ms'),
+    ('tcp_handshake_rtt_p99_ms', '握手RTT P99', 'ms'),
+    ('tcp_data_rtt_p50_ms', '数据RTT P50', 'ms'),
+    ('tcp_data_rtt_p99_ms', '数据RTT P99', 'ms'),
+    ('dns_failure_rate', 'DNS失败率', ''),
+    ('dns_latency_p50_ms', 'DNS时延P50', 'ms'),
+    ('dns_latency_p99_ms', 'DNS时延P99', 'ms')
+)
+_METRIC_LABELS = {name: (label, unit) for name, label, unit in METRICS}
+# 比例类指标按百分比显示
+_RATIO_METRICS = frozenset({'tcp_retransmission_rate', 'dns_failure_rate'})
+# 分桶速率的百分位随分桶间隔变化（间隔越小越能反映突发），只与相同间隔的基线比较
+_BUCKET_METRICS = frozenset({'pps_p50', 'pps_p95', 'mbps_p50', 'mbps_p95', 'mbps_p99'})
+_SITE_NAME = re.compile(r'^[^/\\.\x00][^/\\\x00]*$')
+
+
+def _check_site(site):
+    if not site or not _SITE_NAME.match(site):
+        raise ValueError(f"站点名称不合法: {site!r}")
+    return site
+
+
+def _shares(counts, total):
+    return {name: count / total for name, count in counts.items()} if total else {}
+
+
+def _percentiles(metrics, prefix, summary, keys=('p50', 'p99')):
+    """把时延摘要中的百分位写入指标（没有样本时不写）"""
+    if summary and summary.get('count'):
+        for key in keys:
+            metrics[f"{prefix}_{key}_ms"] = summary[key]
+
+
+def capture_profile(result, ip_counts=None):
+    """由结构化结果生成紧凑的抓包概况
+
+    ip_counts 为完整的 {ip: {'packets', 'bytes'}}（如汇总文件中的 TrafficStats.ip_counts）时按它取主要通信IP，
+    否则只能用结果中的主要通信IP、对话和主机对。通信IP的占比为字节数占总字节数的比例（每个包计入两端）。
+    """
+    total_bytes = result.get('totalSize', 0)
+    duration = result.get('duration', 0)
+    packets = result.get('totalPackets', 0)
+
+    talkers = {}
+    # 概况中只列出占比高于 floor 的通信IP（列表被截断时），低于它的IP不能判断是否出现过
+    floor = 0
+    if ip_counts is not None:
+        ranked = sorted(ip_counts.items(), key=lambda x: x[1]['bytes'], reverse=True)
+        talkers = {ip: stats['bytes'] for ip, stats in ranked[:MAX_TALKERS]}
+        if len(ranked) > MAX_TALKERS:
+            floor = ranked[MAX_TALKERS - 1][1]['bytes']
+    else:
+        top = result.get('topTalkers', [])
+        for talker in top:
+            talkers[talker['ip']] = talker['bytes']
+        if len(top) >= TOP_TALKERS:
+            floor = min(talker['bytes'] for talker in top)
+        # 对话和主机对只给出部分字节数，作为下限补充结果中没有列出的通信IP
+        for conv in result.get('conversations', []):
+            for ip in (conv['source'], conv['destination']):
+                talkers[ip] = max(talkers.get(ip, 0), conv['bytes'])
+        for pair in result.get('flows', {}).get('top_host_pairs', []):
+            for ip in pair['hosts'].split(' <-> '):
+                talkers[ip] = max(talkers.get(ip, 0), pair['bytes'])
+
+    metrics = {
+        'bandwidth_mbps': result.get('trafficPattern', {}).get('bandwidthUsage', 0),
+        'packet_rate': packets / duration if duration > 0 else 0.0,
+        'avg_packet_size': total_bytes / packets if packets else 0.0
+    }
+    series = result.get('timeSeries')
+    if series and series.get('buckets'):
+        # 分桶百分位已换算为每秒速率，但数值仍随分桶间隔变化，只与相同间隔的基线比较（见 _BUCKET_METRICS）
+        for key in ('p50', 'p95'):
+            metrics[f"pps_{key}"] = series['pps'][key]
+        for key in ('p50', 'p95', 'p99'):
+            metrics[f"mbps_{key}"] = series['bps'][key] / 1000000
+    tcp = result.get('tcp')
+    if tcp and tcp.get('segments'):
+        metrics['tcp_retransmission_rate'] = tcp['retransmission_rate']
+        _percentiles(metrics, 'tcp_handshake_rtt', tcp.get('handshake_rtt_ms'))
+        _percentiles(metrics, 'tcp_data_rtt', tcp.get('data_rtt_ms'))
+    dns = result.get('dns')
+    if dns and dns.get('queries'):
+        metrics['dns_failure_rate'] = dns['failure_rate']
+        _percentiles(metrics, 'dns_latency', dns.get('latency_ms'))
+
+    applications = result.get('applications', {}).get('protocols', {})
+    series_start = series.get('start') if series else None
+    identity = json.dumps([result.get('captureInfo', {}).get('fileSize'), packets, total_bytes, duration,
+                           series_start, sorted(result.get('protocols', {}).items())])
+    return {
+        'version': PROFILE_VERSION,
+        # 同一抓包（包数、字节数、时长等都相同）再次加入时覆盖原有概况
+        'key': hashlib.sha1(identity.encode('utf-8')).hexdigest()[:16],
+        'file': result.get('captureInfo', {}).get('filePath'),
+        'start': series_start,
+        'recorded_at': time.time(),
+        'packets': packets,
+        'bytes': total_bytes,
+        'duration': duration,
+        'protocols': _shares(result.get('protocols', {}), packets),
+        'applications': _shares({name: stats['bytes'] for name, stats in applications.items()},
+                                sum(stats['bytes'] for stats in applications.values())),
+        'talkers': _shares(talkers, total_bytes),
+        'talker_floor': floor / total_bytes if total_bytes else 0.0,
+        'bucket_ms': series.get('interval_ms') if series else None,
+        'metrics': metrics
+    }
+
+
+class BaselineStore:
+    """按站点保存抓包概况：root/<站点>/<概况键>.json
+
+    每个概况单独一个文件并以原子替换方式写入，多个进程同时加入概况不需要加锁。
+    """
+
+    def __init__(self, root=None, max_profiles=DEFAULT_MAX_PROFILES):
+        self.root = root or os.environ.get('PCAP_ANALYSIS_BASELINE_DIR') or DEFAULT_BASELINE_DIR
+        self.max_profiles = max_profiles
+
+    def sites(self):
+        """返回已有基线的站点名称"""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(entry.name for entry in os.scandir(self.root) if entry.is_dir())
+
+    def profiles(self, site):
+        """返回站点的全部概况，按抓包开始时间排列；损坏或版本不符的文件跳过"""
+        site_dir = os.path.join(self.root, _check_site(site))
+        if not os.path.isdir(site_dir):
+            return []
+        profiles = []
+        for entry in os.scandir(site_dir):
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                with open(entry.path, 'r', encoding='utf-8') as f:
+                    profile = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if isinstance(profile, dict) and profile.get('version') == PROFILE_VERSION:
+                profiles.append(profile)
+        profiles.sort(key=_profile_time)
+        return profiles
+
+    def add(self, site, profile):
+        """加入一个概况，超过 max_profiles 时删除开始时间最早的概况"""
+        site_dir = os.path.join(self.root, _check_site(site))
+        os.makedirs(site_dir, exist_ok=True)
+        path = os.path.join(site_dir, f"{profile['key']}.json")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(profile, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+        profiles = self.profiles(site)
+        for old in profiles[:max(0, len(profiles) - self.max_profiles)]:
+            self._remove_file(site_dir, old['key'])
+
+    def remove(self, site, key=None):
+        """删除站点的一个概况（key 为None时删除整个站点），返回删除的概况数"""
+        site_dir = os.path.join(self.root, _check_site(site))
+        if key is not None:
+            return self._remove_file(site_dir, key)
+        removed = sum(self._remove_file(site_dir, profile['key']) for profile in self.profiles(site))
+        try:
+            os.rmdir(site_dir)
+        except OSError:
+            pass
+        return removed
+
+    @staticmethod
+    def _remove_file(site_dir, key):
+        try:
+            os.remove(os.path.join(site_dir, f"{key}.json"))
+            return 1
+        except OSError:
+            return 0
+
+
+def _profile_time(profile):
+    start = profile.get('start')
+    return start if start is not None else profile.get('recorded_at', 0)
+
+
+def _share_shifts(current, baselines, name, threshold):
+    """比较占比：缺少某项的概况按0计，返回变化达到 threshold 的项（按变化幅度排列）"""
+    shifts = []
+    for item in set(current).union(*baselines):
+        baseline_share = statistics.median(shares.get(item, 0.0) for shares in baselines)
+        share = current.get(item, 0.0)
+        delta = share - baseline_share
+        if abs(delta) >= threshold:
+            shifts.append({name: item, 'share': share, 'baseline_share': baseline_share, 'delta': delta})
+    shifts.sort(key=lambda x: abs(x['delta']), reverse=True)
+    return shifts
+
+
+def compare_profile(profile, baselines, talker_share=TALKER_SHARE, share_shift=SHARE_SHIFT,
+                    metric_change=METRIC_CHANGE):
+    """把抓包概况与基线概况比较，返回差异（各项与基线中位数比较）
+
+    新出现/消失的通信IP：字节占比达到 talker_share 且没有出现在任何基线中，或基线中位数占比达到
+    talker_share 而本次没有出现；协议和应用层协议占比变化达到 share_shift 时报告；
+    指标超出基线的取值范围且相对中位数变化达到 metric_change 时标记为 changed。
+    """
+    baselines = [b for b in baselines if b['key'] != profile['key']]
+    comparison = {
+        'baselines': len(baselines),
+        'baseline_start': iso_time(_profile_time(baselines[0])) if baselines else None,
+        'baseline_end': iso_time(_profile_time(baselines[-1])) if baselines else None,
+        'new_talkers': [],
+        'missing_talkers': [],
+        'protocol_shifts': [],
+        'application_shifts': [],
+        'metrics': [],
+        'deviations': 0
+    }
+    if not baselines:
+        return comparison
+
+    # 概况只列出主要通信IP：新出现的IP要高到足以出现在基线的列表中，消失的IP要高到足以出现在本次的列表中
+    known = set().union(*(b['talkers'] for b in baselines))
+    new_share = max(talker_share,
+                    FLOOR_MARGIN * statistics.median(b.get('talker_floor', 0.0) for b in baselines))
+    comparison['new_talkers'] = sorted(
+        ({'ip': ip, 'share': share} for ip, share in profile['talkers'].items()
+         if share >= new_share and ip not in known),
+        key=lambda x: x['share'], reverse=True)
+    missing_share = max(talker_share, FLOOR_MARGIN * profile.get('talker_floor', 0.0))
+    for ip in known.difference(profile['talkers']):
+        baseline_share = statistics.median(b['talkers'].get(ip, 0.0) for b in baselines)
+        if baseline_share > missing_share:
+            comparison['missing_talkers'].append({'ip': ip, 'baseline_share': baseline_share})
+    comparison['missing_talkers'].sort(key=lambda x: x['baseline_share'], reverse=True)
+    comparison['protocol_shifts'] = _share_shifts(profile['protocols'], [b['protocols'] for b in baselines],
+                                                  'protocol', share_shift)
+    comparison['application_shifts'] = _share_shifts(profile['applications'],
+                                                     [b['applications'] for b in baselines],
+                                                     'application', share_shift)
+
+    for name, _, _ in METRICS:
+        value = profile['metrics'].get(name)
+        history = [b['metrics'][name] for b in baselines if name in b['metrics'] and
+                   (name not in _BUCKET_METRICS or b.get('bucket_ms') == profile.get('bucket_ms'))]
+        if value is None or not history:
+            continue
+        median = statistics.median(history)
+        low, high = min(history), max(history)
+        change = (value - median) / median if median else None
+        if change is None:
+            changed = value > 0 and high == 0
+        else:
+            changed = not low <= value <= high and abs(change) >= metric_change
+        comparison['metrics'].append({
+            'metric': name,
+            'value': value,
+            'baseline_median': median,
+            'baseline_min': low,
+            'baseline_max': high,
+            'change': change,
+            'changed': changed
+        })
+
+    comparison['deviations'] = (len(comparison['new_talkers']) + len(comparison['missing_talkers']) +
+                                len(comparison['protocol_shifts']) + len(comparison['application_shifts']) +
+                                sum(1 for entry in comparison['metrics'] if entry['changed']))
+    return comparison
+
+
+def _format_value(name, value):
+    if name in _RATIO_METRICS:
+        return f"{value * 100:.2f}%"
+    unit = _METRIC_LABELS[name][1]
+    return f"{value:.2f} {unit}" if unit else f"{value:.2f}"
+
+
+def comparison_lines(comparison):
+    """差异的文本行（报告和摘要共用），没有基线时只有一行说明"""
+    if not comparison['baselines']:
+        return [f"站点 {comparison['site']} 尚无历史基线"]
+    lines = []
+    if comparison['new_talkers']:
+        lines.append("新出现的主要通信IP: " + ', '.join(f"{t['ip']} ({t['share']:.1%})"
+                                                  for t in comparison['new_talkers'][:10]))
+    if comparison['missing_talkers']:
+        lines.append("未出现的常见通信IP: " + ', '.join(f"{t['ip']} (基线 {t['baseline_share']:.1%})"
+                                                  for t in comparison['missing_talkers'][:10]))
+    for key, field in (('protocol_shifts', 'protocol'), ('application_shifts', 'application')):
+        for shift in comparison[key]:
+            lines.append(f"{'协议' if field == 'protocol' else '应用层协议'} {shift[field]} 占比 {shift['share']:.1%} "
+                         f"(基线 {shift['baseline_share']:.1%}, {shift['delta'] * 100:+.1f}个百分点)")
+    for entry in comparison['metrics']:
+        if not entry['changed']:
+            continue
+        name = entry['metric']
+        change = f", {entry['change']:+.0%}" if entry['change'] is not None else ""
+        lines.append(f"{_METRIC_LABELS[name][0]} {_format_value(name, entry['value'])} "
+                     f"(基线中位数 {_format_value(name, entry['baseline_median'])}, "
+                     f"范围 {_format_value(name, entry['baseline_min'])} ~ "
+                     f"{_format_value(name, entry['baseline_max'])}{change})")
+    if not lines:
+        lines.append("与历史基线一致，未发现明显变化")
+    return lines
+
+
+def format_comparison(comparison):
+    """生成基线对比的文本报告段落"""
+    report = f"基线对比（站点 {comparison['site']}"
+    if comparison['baselines']:
+        report += f"，{comparison['baselines']}个历史抓包"
+    report += "）:\n"
+    return report + ''.join(f"- {line}\n" for line in comparison_lines(comparison)) + "\n"
+
+
+def compare_with_baseline(result, site, store=None, record=False, ip_counts=None):
+    """把结果与站点的历史基线比较，返回附带 baselineComparison 字段和报告段落的新结果
+
+    record 为真时比较后把本次抓包的概况加入基线；出错、不完整（partial）或抽样估算的结果不加入。
+    出错的结果原样返回。
+    """
+    if result.get('error'):
+        return result
+    store = store or BaselineStore()
+    profile = capture_profile(result, ip_counts)
+    comparison = {'site': site, **compare_profile(profile, store.profiles(site))}
+    if record and not result.get('partial') and not result.get('estimated'):
+        store.add(site, profile)
+        comparison['recorded'] = True
+    return dict(result, baselineComparison=comparison, report=result['report'] + format_comparison(comparison))
+
+
+def _load_result(path):
+    """读取来源文件，返回 (结构化结果, 完整的IP计数或None)"""
+    if path.endswith(SUMMARY_SUFFIX):
+        stats, meta = load_summary(path)
+        return summary_result(stats, meta), stats.ip_counts
+    result = analyze(path)
+    if result.get('error'):
+        raise ValueError(f"{path}: {result['error']['message']}")
+    return result, None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='按站点保存抓包概况，与历史基线比较')
+    sub = parser.add_subparsers(dest='command', required=True)
+    listing = sub.add_parser('list', help='列出站点或某个站点的基线概况')
+    listing.add_argument('site', nargs='?', help='站点名称')
+    add = sub.add_parser('add', help='把抓包文件或汇总文件的概况加入站点基线')
+    add.add_argument('site', help='站点名称（如机房名或抓包接口名）')
+    add.add_argument('files', nargs='+', help='抓包文件或 .summary 汇总文件')
+    compare = sub.add_parser('compare', help='与站点的历史基线比较')
+    compare.add_argument('site', help='站点名称')
+    compare.add_argument('file', help='抓包文件或 .summary 汇总文件')
+    compare.add_argument('--record', action='store_true', help='比较后把本次抓包加入基线')
+    compare.add_argument('--format', choices=['text', 'json'], default='text',
+                         help='输出格式：基线对比的文本报告或结构化JSON')
+    remove = sub.add_parser('remove', help='删除站点的一个概况或整个站点')
+    remove.add_argument('site', help='站点名称')
+    remove.add_argument('key', nargs='?', help='概况键（list 的第一列），不指定时删除整个站点')
+    args = parser.parse_args(argv)
+
+    store = BaselineStore()
+    try:
+        if args.command == 'list':
+            if args.site is None:
+                for site in store.sites():
+                    print(f"{site}: {len(store.profiles(site))}个概况")
+            else:
+                for profile in store.profiles(args.site):
+                    print(f"{profile['key']}  {iso_time(_profile_time(profile))}  {profile['packets']}个包  "
+                          f"{profile['duration']:.1f}秒  {profile['file']}")
+        elif args.command == 'add':
+            for path in args.files:
+                result, ip_counts = _load_result(path)
+                if result.get('partial') or result.get('estimated'):
+                    raise ValueError(f"{path}: 结果不完整，不能作为基线")
+                store.add(args.site, capture_profile(result, ip_counts))
+                print(f"已加入: {path}")
+        elif args.command == 'compare':
+            result, ip_counts = _load_result(args.file)
+            comparison = compare_with_baseline(result, args.site, store, args.record,
+                                               ip_counts)['baselineComparison']
+            if args.format == 'json':
+                print(json.dumps(comparison, ensure_ascii=False))
+            else:
+                print(format_comparison(comparison), end='')
+        else:
+            print(f"已删除 {store.remove(args.site, args.key)} 个概况")
+    except (OSError, ValueError) as e:
+        print(f"处理失败: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
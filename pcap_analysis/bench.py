@@ -0,0 +1,87 @@
+"""后端吞吐量基准测试
+
+    python -m pcap_analysis.bench FILE [--repeat 3] [--backends native,numpy]
+
+每个后端不走缓存重复分析同一文件，取最快的一次计算包速率和字节速率。
+后端的 priority 应与这里测得的速度顺序一致。
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+from .analyzer import analyze_file
+from .backends import BackendUnavailable, backend_names, select_backend
+
+
+def benchmark(file_path, backends=None, metrics=None, repeat=3, max_packets=0):
+    """返回 (按速度排序的测量结果列表, {跳过的后端: 原因})"""
+    file_size = os.path.getsize(file_path)
+    rows = []
+    skipped = {}
+    for name in backends or backend_names():
+        try:
+            _, collected, _ = select_backend(file_path, metrics, name)
+        except BackendUnavailable as e:
+            skipped[name] = str(e)
+            continue
+
+        best = None
+        result = None
+        for _ in range(max(1, repeat)):
+            start = time.perf_counter()
+            result = analyze_file(file_path, name, metrics, max_packets)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        if result.get('error'):
+            skipped[name] = result['error']['message']
+            continue
+
+        # 限制包数时只按实际读取的比例估算字节数
+        packets = result['totalPackets']
+        rows.append({
+            'backend': name,
+            'metrics': sorted(collected),
+            'seconds': best,
+            'packets': packets,
+            'packets_per_sec': packets / best if best > 0 else 0,
+            'mb_per_sec': (file_size if not max_packets else result['totalSize']) / 1000000 / best if best > 0 else 0
+        })
+    rows.sort(key=lambda row: row['packets_per_sec'], reverse=True)
+    return rows, skipped
+
+
+def format_benchmark(file_path, rows, skipped):
+    text = f"{file_path}:\n"
+    for row in rows:
+        text += (f"- {row['backend']:<8} {row['seconds'] * 1000:10.1f} ms  {row['packets_per_sec']:12.0f} 包/秒  "
+                 f"{row['mb_per_sec']:8.1f} MB/秒  ({','.join(row['metrics'])})\n")
+    for name, reason in skipped.items():
+        text += f"- {name:<8} 跳过（{reason}）\n"
+    return text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='比较各分析后端的吞吐量')
+    parser.add_argument('files', nargs='+', help='PCAP文件路径')
+    parser.add_argument('--backends', help='逗号分隔的后端列表，默认全部')
+    parser.add_argument('--metrics', help='逗号分隔的指标列表，默认全部')
+    parser.add_argument('--repeat', type=int, default=3, help='每个后端重复次数，取最快一次')
+    parser.add_argument('--max-packets', type=int, default=0, help='每次最多分析的数据包数量，0表示不限制')
+    parser.add_argument('--format', choices=['text', 'json'], default='text', help='输出格式')
+    args = parser.parse_args(argv)
+
+    backends = args.backends.split(',') if args.backends else None
+    metrics = args.metrics.split(',') if args.metrics else None
+    for file_path in args.files:
+        rows, skipped = benchmark(file_path, backends, metrics, args.repeat, args.max_packets)
+        if args.format == 'json':
+            print(json.dumps({'file': file_path, 'results': rows, 'skipped': skipped}, ensure_ascii=False))
+        else:
+            print(format_benchmark(file_path, rows, skipped))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
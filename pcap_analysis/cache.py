@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import hashlib
+
+# 默认缓存目录：项目根目录下的 temp/analysis_cache
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'temp', 'analysis_cache'
+)
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# 指纹只读取文件头尾各64KB，与文件总大小无关
+FINGERPRINT_SAMPLE_SIZE = 64 * 1024
+
+
+def file_fingerprint(file_path, sample_size=FINGERPRINT_SAMPLE_SIZE):
+    """计算文件指纹（大小、修改时间、头尾哈希），不读取整个文件"""
+    stats = os.stat(file_path)
+    size = stats.st_size
+
+    head_hash = hashlib.sha1()
+    tail_hash = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        head_hash.update(f.read(sample_size))
+        if size > sample_size:
+            f.seek(max(size - sample_size, sample_size))
+            tail_hash.update(f.read(sample_size))
+
+    return {
+        'size': size,
+        'mtime_ns': stats.st_mtime_ns,
+        'head': head_hash.hexdigest(),
+        'tail': tail_hash.hexdigest()
+    }
+
+
+def make_cache_key(fingerprint, analyzer, version, options=None):
+    """由文件指纹、分析器名称/版本和分析选项生成缓存键"""
+    material = json.dumps({
+        'fingerprint': fingerprint,
+        'analyzer': analyzer,
+        'version': version,
+        'options': options or {}
+    }, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class AnalysisCache:
+    """基于内容寻址的磁盘缓存，按总大小做LRU淘汰"""
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = cache_dir or os.environ.get('PCAP_ANALYSIS_CACHE_DIR') or DEFAULT_CACHE_DIR
+        if max_bytes is None:
+            env_max_mb = os.environ.get('PCAP_ANALYSIS_CACHE_MAX_MB')
+            max_bytes = int(float(env_max_mb) * 1024 * 1024) if env_max_mb else DEFAULT_MAX_BYTES
+        self.max_bytes = max_bytes
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key):
+        """读取缓存条目，命中时刷新访问时间；未命中返回None"""
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        # 用mtime记录最近访问时间，供LRU淘汰使用
+        try:
+            os.utime(entry_path, None)
+        except OSError:
+            pass
+        return entry.get('value')
+
+    def put(self, key, value):
+        """写入缓存条目（原子替换），并在超出容量时淘汰最久未用的条目"""
+        entry_path = self._entry_path(key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+
+        tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'key': key, 'created': time.time(), 'value': value}, f, ensure_ascii=False)
+        os.replace(tmp_path, entry_path)
+
+        self.evict()
+
+    def evict(self):
+        """按最近访问时间淘汰条目，直到总大小不超过上限"""
+        entries = []
+        total_bytes = 0
+        if not os.path.isdir(self.cache_dir):
+            return 0
+
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if not entry.name.endswith('.json'):
+                    continue
+                try:
+                    stats = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stats.st_mtime, stats.st_size, entry.path))
+                total_bytes += stats.st_size
+
+        removed = 0
+        if total_bytes <= self.max_bytes:
+            return removed
+
+        entries.sort()
+        for _, size, path in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total_bytes -= size
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+
+def cached_analysis(file_path, analyzer, version, options, compute, cache=None):
+    """带缓存执行分析：命中直接返回结果，否则调用compute()并写入缓存
+
+    compute() 返回可JSON序列化的dict；partial 为真（结果不完整）或带 error（分析失败，可能只是暂时的）时不写入缓存。
+    缓存读写失败不影响分析本身。
+    """
+    cache = cache or AnalysisCache()
+    try:
+        key = make_cache_key(file_fingerprint(file_path), analyzer, version, options)
+    except OSError:
+        return compute()
+
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    value = compute()
+    if value.get('partial') or value.get('error'):
+        return value
+    try:
+        cache.put(key, value)
+    except OSError:
+        pass
+    return value
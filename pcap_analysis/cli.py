@@ -0,0 +1,104 @@
+import sys
+import json
+import argparse
+
+from .analyzer import analyze
+from .backends import available_backends, backend_names
+from .baseline import compare_with_baseline
+from .digest import DEFAULT_MAX_CHARS, digest
+from .result import print_result
+from .checkpoint import CHECKPOINT_INTERVAL
+from .traffic import METRICS
+
+
+def add_analysis_arguments(parser, backend='auto', max_packets=0):
+    """添加各分析入口共用的命令行参数，默认值由入口脚本决定"""
+    parser.add_argument('file_path', help='PCAP文件路径，- 表示从标准输入流式读取')
+    parser.add_argument('--backend', choices=['auto'] + backend_names(), default=backend,
+                        help='分析后端，auto 表示按文件格式和指标自动选择最快的可用后端')
+    parser.add_argument('--metrics', default=','.join(METRICS),
+                        help=f"逗号分隔的分析指标（{', '.join(METRICS)}）")
+    parser.add_argument('--max-packets', type=int, default=max_packets, help='最多分析的数据包数量，0表示不限制')
+    parser.add_argument('--no-cache', action='store_true', help='不使用分析结果缓存')
+    parser.add_argument('--bucket-ms', type=float, default=1000, help='流量时间序列的分桶间隔（毫秒），最小1毫秒')
+    parser.add_argument('--format', choices=['text', 'json', 'digest'], default='text',
+                        help='输出格式：文本报告、结构化JSON（含文本报告）或限定长度的摘要（用于AI分析提示词）')
+    parser.add_argument('--digest-chars', type=int, help=f'摘要的最大字符数（默认{DEFAULT_MAX_CHARS}）')
+    parser.add_argument('--digest-tokens', type=int, help='摘要的最大token数（估算值），优先于 --digest-chars')
+    parser.add_argument('--columnar', metavar='PATH', help='同时导出通信对话/时间序列列式表（.npz 或 .arrow）')
+    parser.add_argument('--deadline', type=float, help='时间预算（秒），到时停止并输出已分析部分的结果')
+    parser.add_argument('--checkpoint', metavar='PATH',
+                        help='检查点（汇总）文件：定期保存聚合状态，中断后再次运行从中断位置继续；'
+                             '可用 python -m pcap_analysis.summary merge 合并多个文件的汇总')
+    parser.add_argument('--checkpoint-interval', type=float, default=CHECKPOINT_INTERVAL,
+                        help=f'保存检查点的间隔（秒，默认{CHECKPOINT_INTERVAL:g}）')
+    parser.add_argument('--baseline', metavar='SITE',
+                        help='与该站点（或接口）保存的历史基线比较，报告新出现的通信IP、协议占比和速率/时延的变化')
+    parser.add_argument('--record-baseline', action='store_true',
+                        help='比较后把本次抓包的概况加入 --baseline 指定站点的基线')
+    parser.add_argument('--progress', action='store_true', help='每秒向标准错误输出一行JSON进度（字节数、包数、预计剩余时间）')
+    parser.add_argument('--sample', type=int, nargs='?', const=64, default=0, metavar='WINDOWS',
+                        help='抽样估算（默认64个窗口），只读取固定数量的数据，给出总量和置信区间')
+    parser.add_argument('--decap', action='store_true',
+                        help='解开VXLAN/Geneve/GRE/IP-in-IP隧道，按内层数据包统计地址、协议和对话')
+    parser.add_argument('--vxlan-ports', help='逗号分隔的VXLAN UDP端口（默认4789,8472），指定时自动开启 --decap')
+    parser.add_argument('--geneve-ports', help='逗号分隔的Geneve UDP端口（默认6081），指定时自动开启 --decap')
+
+
+def decap_options(args):
+    """由命令行参数得到 analyze 的 decap 参数：不解封装时为None，使用默认端口时为True"""
+    options = {}
+    for name in ('vxlan_ports', 'geneve_ports'):
+        value = getattr(args, name)
+        if value:
+            options[name] = [int(port) for port in value.split(',')]
+    if options:
+        return options
+    return True if args.decap else None
+
+
+def print_progress(record):
+    """进度记录写到标准错误，标准输出只保留最终结果"""
+    sys.stderr.write(json.dumps(record, ensure_ascii=False) + '\n')
+    sys.stderr.flush()
+
+
+def run_analysis_args(args):
+    """按解析后的命令行参数分析并打印结果"""
+    try:
+        result = analyze(args.file_path, backend=args.backend, metrics=args.metrics.split(','),
+                         max_packets=args.max_packets, bucket_ms=args.bucket_ms,
+                         use_cache=not args.no_cache, columnar_path=args.columnar,
+                         deadline=args.deadline, on_progress=print_progress if args.progress else None,
+                         sample=args.sample, decap=decap_options(args), checkpoint=args.checkpoint,
+                         checkpoint_interval=args.checkpoint_interval)
+        if args.baseline:
+            result = compare_with_baseline(result, args.baseline, record=args.record_baseline)
+        if args.format == 'digest':
+            print(digest(result, max_chars=args.digest_chars, max_tokens=args.digest_tokens))
+        else:
+            print_result(result, args.format)
+    except Exception as e:
+        print(f"分析过程出错: {str(e)}")
+
+
+def format_backends():
+    """列出已注册的后端及其可用性"""
+    text = "分析后端（按优先级）:\n"
+    for name, reason in available_backends().items():
+        text += f"- {name}: {'可用' if reason is None else '不可用 - ' + reason}\n"
+    return text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='PCAP文件分析（自动选择解析后端）')
+    parser.add_argument('--list-backends', action='store_true', help='列出分析后端及其可用性后退出')
+    add_analysis_arguments(parser)
+    # 只列出后端时不需要文件参数
+    if argv is None:
+        argv = sys.argv[1:]
+    if '--list-backends' in argv:
+        print(format_backends())
+        return 0
+    run_analysis_args(parser.parse_args(argv))
+    return 0
@@ -0,0 +1,74 @@
+from collections import deque
+
+from .packet import ETHERTYPE_IPV4, ETHERTYPE_IPV6, IPV6_HEADER_LEN, LINK_LAYERS, LINKTYPE_ETHERNET
+
+# 镜像口的重复帧通常在几十微秒内先后到达；真正的重传至少相隔一个RTT
+DEFAULT_WINDOW = 0.001
+DEFAULT_MAX_ENTRIES = 100000
+
+
+def _whole_frame(data):
+    return 0, 0
+
+
+def frame_digest(data, link_layer):
+    """计算帧的去重哈希：IP包从网络层开始，跳过TTL/跳数限制和IPv4头校验和
+
+    经过路由的镜像副本MAC地址、VLAN标签和TTL可能不同，这些字段不参与比较；
+    IPv4标识保持不变，可以区分内容相同但真正重发的包。非IP帧按整帧计算。
+    """
+    ethertype, offset = link_layer(data)
+    if ethertype == ETHERTYPE_IPV4 and len(data) - offset >= 20:
+        return hash((data[offset:offset + 8], data[offset + 9], data[offset + 12:]))
+    if ethertype == ETHERTYPE_IPV6 and len(data) - offset >= IPV6_HEADER_LEN:
+        return hash((data[offset:offset + 7], data[offset + 8:]))
+    return hash(data)
+
+
+class DuplicateFilter:
+    """流式去重：在时间窗口内出现过相同哈希的帧视为重复
+
+    窗口内的哈希按到达顺序保存在队列中，超过 window 秒的从队首过期；
+    条目数超过 max_entries 时提前淘汰最早的条目，内存有上限（被提前淘汰的条目计入 evicted，
+    数量较多说明窗口相对包速率过大）。哈希只在进程内使用，不写入文件。
+    """
+
+    def __init__(self, linktype=LINKTYPE_ETHERNET, window=DEFAULT_WINDOW, max_entries=DEFAULT_MAX_ENTRIES):
+        self.link_layer = LINK_LAYERS.get(linktype, _whole_frame)
+        self.window = window
+        self.max_entries = max_entries
+        self.recent = deque()
+        self.seen = set()
+        self.packets = 0
+        self.duplicates = 0
+        self.duplicate_bytes = 0
+        self.evicted = 0
+
+    def is_duplicate(self, ts, data):
+        """判断一个帧是否为窗口内已出现过的帧的副本；不是时记入窗口"""
+        self.packets += 1
+        recent = self.recent
+        seen = self.seen
+        horizon = ts - self.window
+        while recent and recent[0][0] < horizon:
+            seen.discard(recent.popleft()[1])
+        digest = frame_digest(data, self.link_layer)
+        if digest in seen:
+            self.duplicates += 1
+            self.duplicate_bytes += len(data)
+            return True
+        if len(recent) >= self.max_entries:
+            seen.discard(recent.popleft()[1])
+            self.evicted += 1
+        recent.append((ts, digest))
+        seen.add(digest)
+        return False
+
+    def summary(self):
+        return {
+            'packets': self.packets,
+            'duplicates': self.duplicates,
+            'duplicate_bytes': self.duplicate_bytes,
+            'window': self.window,
+            'evicted': self.evicted
+        }
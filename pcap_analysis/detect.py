@@ -0,0 +1,344 @@
+import math
+
+from .result import iso_time
+from .stats import TopCounter
+
+SYN = 0x02
+ACK = 0x10
+
+# 滑动窗口长度和步长（秒）：每个步长结束时对最近一个窗口做一次检测
+WINDOW_SECONDS = 10.0
+STEP_SECONDS = 2.0
+
+# 检测阈值（均为一个窗口内的数量）
+SYN_FLOOD_MIN_SYN = 500
+# SYN/ACK 与 SYN 之比低于该值视为服务器未能响应
+SYN_FLOOD_MAX_ACK_RATIO = 0.3
+SCAN_MIN_TARGETS = 50
+ICMP_FLOOD_MIN_PACKETS = 1000
+# 速率突变：与指数加权平均相比的倍数，且速率不低于 RATE_MIN_PPS
+RATE_CHANGE_FACTOR = 4.0
+RATE_MIN_PPS = 100
+RATE_WARMUP_STEPS = 5
+RATE_EWMA_ALPHA = 0.2
+
+# 去重位图的位数（每个步长一个）：判断 (源, 目的, 端口) 是否在本步长内已出现过
+PROBE_BITMAP_BITS = 1 << 20
+
+EVENT_LABELS = {
+    'syn_flood': 'SYN洪泛',
+    'horizontal_scan': '水平端口扫描',
+    'vertical_scan': '垂直端口扫描',
+    'icmp_flood': 'ICMP洪泛',
+    'rate_spike': '流量突增',
+    'rate_drop': '流量骤降'
+}
+
+
+class _Step:
+    """一个步长内的统计：各项计数都用有界的 TopCounter，探测去重用固定大小的位图"""
+    __slots__ = ('index', 'packets', 'syn', 'syn_ack', 'icmp', 'horizontal', 'vertical', 'seen')
+
+    def __init__(self, index, capacity):
+        self.index = index
+        self.packets = 0
+        self.syn = TopCounter(capacity)          # 目的IP -> SYN数
+        self.syn_ack = TopCounter(capacity)      # 源IP -> SYN/ACK数
+        self.icmp = TopCounter(capacity)         # 目的IP -> ICMP包数
+        self.horizontal = TopCounter(capacity)   # (源IP, 目的端口) -> 不同目的IP数
+        self.vertical = TopCounter(capacity)     # (源IP, 目的IP) -> 不同目的端口数
+        self.seen = bytearray(PROBE_BITMAP_BITS // 8)
+
+
+def _window_counts(steps, name):
+    """合并窗口内各步长同一类计数，返回 {键: 计数}"""
+    merged = {}
+    for step in steps:
+        for key, count in getattr(step, name).counts.items():
+            merged[key] = merged.get(key, 0) + count
+    return merged
+
+
+class AnomalyDetector:
+    """滑动窗口异常检测：SYN洪泛、水平/垂直端口扫描、ICMP洪泛和流量速率突变
+
+    时间轴按 step 秒分段，每段的状态为固定容量的频繁项计数和去重位图，每包开销为O(1)；
+    每段结束时合并最近 window 秒的各段做一次判断。连续多个窗口命中的同一异常合并为一个事件，
+    事件带起止时间和触发时的计数。
+    端口探测只统计不带ACK的SYN，以及目的端口小于源端口的UDP包（排除服务器发往客户端临时端口的响应）。
+    """
+
+    def __init__(self, window=WINDOW_SECONDS, step=STEP_SECONDS, capacity=256, max_events=200):
+        self.step = step
+        self.window_steps = max(1, int(round(window / step)))
+        self.window = self.window_steps * step
+        self.capacity = capacity
+        self.max_events = max_events
+
+        self.steps = []
+        self.current = None
+        self.events = []
+        self.event_counts = {}
+        self.dropped_events = 0
+        self._active = {}
+        self._rate_mean = None
+        self._rate_var = 0.0
+        self._rate_steps = 0
+
+    def count(self, ts, packets=1):
+        """累加数据包数（用于速率突变检测），所有数据包都应计入"""
+        current = self._advance(ts)
+        current.packets += packets
+
+    def process(self, ts, protocol, src_ip, dst_ip, segment):
+        """处理一个TCP/UDP/ICMP包；segment 从传输层头开始（TCP至少20字节，UDP至少8字节，ICMP不使用）"""
+        if protocol == 6:
+            flags = segment[13]
+            if not flags & SYN:
+                return
+            if flags & ACK:
+                self.syn_ack(ts, src_ip)
+                return
+            self.syn(ts, dst_ip)
+        elif protocol == 17:
+            if ((segment[2] << 8) | segment[3]) >= ((segment[0] << 8) | segment[1]):
+                return
+        else:
+            self.icmp(ts, dst_ip)
+            return
+        self.probe(ts, src_ip, dst_ip, (segment[2] << 8) | segment[3])
+
+    def syn(self, ts, target, count=1):
+        """累加发往 target 的SYN（不带ACK）"""
+        self._advance(ts).syn.add(target, count)
+
+    def syn_ack(self, ts, source, count=1):
+        """累加 source 发出的SYN/ACK"""
+        self._advance(ts).syn_ack.add(source, count)
+
+    def icmp(self, ts, target, count=1):
+        """累加发往 target 的ICMP包"""
+        self._advance(ts).icmp.add(target, count)
+
+    def probe(self, ts, source, target, port):
+        """一次连接尝试：按 (源, 目的, 端口) 去重后分别计入水平和垂直扫描计数"""
+        current = self._advance(ts)
+        bit = hash((source, target, port)) & (PROBE_BITMAP_BITS - 1)
+        seen = current.seen
+        mask = 1 << (bit & 7)
+        if seen[bit >> 3] & mask:
+            return
+        seen[bit >> 3] |= mask
+        current.horizontal.add((source, port))
+        current.vertical.add((source, target))
+
+    def _advance(self, ts):
+        """切换到 ts 所在的步长；时间戳回退时仍计入当前步长"""
+        index = int(ts // self.step)
+        current = self.current
+        if current is not None and index <= current.index:
+            return current
+        if current is not None:
+            self._close(current)
+            # 空闲的步长按0个包处理，间隔很长时最多补齐一个窗口
+            gap = min(index - current.index - 1, self.window_steps)
+            for empty in range(index - gap, index):
+                self._close(_Step(empty, 0))
+        self.current = current = _Step(index, self.capacity)
+        return current
+
+    def _close(self, step):
+        """一个步长结束：更新速率基线并对最近一个窗口做检测"""
+        self.steps.append(step)
+        if len(self.steps) > self.window_steps:
+            self.steps.pop(0)
+        end = (step.index + 1) * self.step
+        self._check_rate(step, end)
+        self._check_window(end)
+
+    def _check_rate(self, step, end):
+        rate = step.packets / self.step
+        mean = self._rate_mean
+        if mean is not None and self._rate_steps >= RATE_WARMUP_STEPS:
+            baseline = {'rate_pps': rate, 'baseline_pps': mean, 'baseline_std': math.sqrt(self._rate_var)}
+            if rate >= RATE_MIN_PPS and rate > mean * RATE_CHANGE_FACTOR:
+                self._detect('rate_spike', None, None, end, (end - self.step, end), baseline,
+                             f"流量速率 {rate:.0f} 包/秒，为基线 {mean:.0f} 包/秒的 {rate / max(mean, 1e-9):.1f} 倍")
+            elif mean >= RATE_MIN_PPS and rate * RATE_CHANGE_FACTOR < mean:
+                self._detect('rate_drop', None, None, end, (end - self.step, end), baseline,
+                             f"流量速率降至 {rate:.0f} 包/秒，基线为 {mean:.0f} 包/秒")
+        # 指数加权的均值和方差
+        if mean is None:
+            self._rate_mean = rate
+        else:
+            diff = rate - mean
+            self._rate_mean = mean + RATE_EWMA_ALPHA * diff
+            self._rate_var = (1 - RATE_EWMA_ALPHA) * (self._rate_var + RATE_EWMA_ALPHA * diff * diff)
+        self._rate_steps += 1
+
+    def _span(self, name, key):
+        """窗口内该键计数不为0的第一个步长的开始时间和最后一个步长的结束时间"""
+        active = [step.index for step in self.steps if getattr(step, name).counts.get(key)]
+        return active[0] * self.step, (active[-1] + 1) * self.step
+
+    def _check_window(self, end):
+        steps = self.steps
+
+        syn = _window_counts(steps, 'syn')
+        syn_ack = _window_counts(steps, 'syn_ack') if syn else {}
+        for target, syn_count in syn.items():
+            if syn_count < SYN_FLOOD_MIN_SYN:
+                continue
+            ack_count = syn_ack.get(target, 0)
+            if ack_count < syn_count * SYN_FLOOD_MAX_ACK_RATIO:
+                self._detect('syn_flood', None, target, end, self._span('syn', target),
+                             {'syn': syn_count, 'syn_ack': ack_count},
+                             f"{target} 在{self.window:g}秒内收到 {syn_count} 个SYN，只回复 {ack_count} 个SYN/ACK")
+
+        for key, targets in _window_counts(steps, 'horizontal').items():
+            if targets >= SCAN_MIN_TARGETS:
+                source, port = key
+                self._detect('horizontal_scan', source, port, end, self._span('horizontal', key), {'targets': targets},
+                             f"{source} 在{self.window:g}秒内探测了 {targets} 个主机的 {port} 端口")
+
+        for key, ports in _window_counts(steps, 'vertical').items():
+            if ports >= SCAN_MIN_TARGETS:
+                source, target = key
+                self._detect('vertical_scan', source, target, end, self._span('vertical', key), {'ports': ports},
+                             f"{source} 在{self.window:g}秒内探测了 {target} 的 {ports} 个端口")
+
+        for target, packets in _window_counts(steps, 'icmp').items():
+            if packets >= ICMP_FLOOD_MIN_PACKETS:
+                self._detect('icmp_flood', None, target, end, self._span('icmp', target), {'packets': packets},
+                             f"{target} 在{self.window:g}秒内收到 {packets} 个ICMP包")
+
+    def _detect(self, kind, source, target, detected_at, span, metrics, description):
+        """记录一次命中；与上一步长命中的同一异常合并为一个事件
+
+        detected_at 为触发检测的步长结束时间，span 为异常活动实际覆盖的 (开始, 结束) 时间（按步长取整）。
+        """
+        key = (kind, source, target)
+        event = self._active.get(key)
+        # 上一步长（或本步长）已经命中过：延长原事件
+        if event is not None and event['_detected'] >= detected_at - self.step - 1e-9:
+            event['_detected'] = max(event['_detected'], detected_at)
+            event['_start'] = min(event['_start'], span[0])
+            event['_end'] = max(event['_end'], span[1])
+            # 保留峰值计数和对应的描述
+            if next(iter(metrics.values())) >= next(iter(event['metrics'].values())):
+                event['metrics'] = metrics
+                event['description'] = description
+            return
+        self.event_counts[kind] = self.event_counts.get(kind, 0) + 1
+        if len(self.events) >= self.max_events:
+            self.dropped_events += 1
+            return
+        event = {
+            'type': kind,
+            'label': EVENT_LABELS[kind],
+            'source': source,
+            'target': target,
+            'metrics': metrics,
+            'description': description,
+            '_detected': detected_at,
+            '_start': span[0],
+            '_end': span[1]
+        }
+        self._active[key] = event
+        self.events.append(event)
+
+    def merge(self, other):
+        """并入另一个文件或分片的检测结果，other 之后不应再使用
+
+        两边同一异常在时间上相接或重叠的事件合并为一个；窗口状态和速率基线沿用时间较晚的一方，
+        之后可以继续累加。跨越分片边界的窗口只由两边各自检测，边界附近的计数不会合并到同一窗口中。
+        """
+        if other.current is not None and (self.current is None or other.current.index >= self.current.index):
+            self.steps = other.steps
+            self.current = other.current
+            self._rate_mean = other._rate_mean
+            self._rate_var = other._rate_var
+            self._rate_steps = other._rate_steps
+        for kind, count in other.event_counts.items():
+            self.event_counts[kind] = self.event_counts.get(kind, 0) + count
+        self.dropped_events += other.dropped_events
+        for event in other.events:
+            key = (event['type'], event['source'], event['target'])
+            mine = self._active.get(key)
+            if (mine is not None and event['_start'] <= mine['_end'] + self.step + 1e-9
+                    and mine['_start'] <= event['_end'] + self.step + 1e-9):
+                mine['_detected'] = max(mine['_detected'], event['_detected'])
+                mine['_start'] = min(mine['_start'], event['_start'])
+                mine['_end'] = max(mine['_end'], event['_end'])
+                if next(iter(event['metrics'].values())) >= next(iter(mine['metrics'].values())):
+                    mine['metrics'] = event['metrics']
+                    mine['description'] = event['description']
+                self.event_counts[event['type']] -= 1
+                continue
+            if len(self.events) >= self.max_events:
+                self.dropped_events += 1
+                continue
+            self._active[key] = event
+            self.events.append(event)
+        self.events.sort(key=lambda event: event['_detected'])
+
+    def _event_summary(self, event):
+        return {
+            'type': event['type'],
+            'label': event['label'],
+            'source': event['source'],
+            'target': event['target'],
+            'start': iso_time(event['_start']),
+            'end': iso_time(event['_end']),
+            'duration': event['_end'] - event['_start'],
+            'metrics': event['metrics'],
+            'description': event['description']
+        }
+
+    def finish(self):
+        """对包含当前未结束步长的窗口做一次检测（生成报告前调用，可重复调用）
+
+        当前步长不关闭，之后仍可继续累加；再次命中的同一异常会与这里的事件合并。
+        """
+        current = self.current
+        if current is None:
+            return
+        steps = self.steps
+        self.steps = (steps + [current])[-self.window_steps:]
+        self._check_window((current.index + 1) * self.step)
+        self.steps = steps
+
+    def summary(self):
+        """返回检测参数和事件列表"""
+        self.finish()
+        return {
+            'window_seconds': self.window,
+            'step_seconds': self.step,
+            'event_counts': dict(self.event_counts),
+            'dropped_events': self.dropped_events,
+            'events': [self._event_summary(event) for event in self.events]
+        }
+
+    def suspicious_activities(self):
+        """按前端 suspiciousActivities 的格式汇总：[{type, count, details}]"""
+        grouped = {}
+        for event in self.summary()['events']:
+            group = grouped.setdefault(event['label'], {'type': event['label'], 'count': 0, 'details': []})
+            group['count'] += 1
+            if len(group['details']) < 5:
+                group['details'].append(f"{event['start']} - {event['end']}: {event['description']}")
+        return list(grouped.values())
+
+    def format_report(self):
+        """生成异常检测的文本报告段落"""
+        summary = self.summary()
+        if not summary['events']:
+            return ""
+        report = f"异常检测 (窗口 {summary['window_seconds']:g} 秒, 步长 {summary['step_seconds']:g} 秒):\n"
+        for event in summary['events'][:20]:
+            report += f"- [{event['label']}] {event['start']} 起持续 {event['duration']:.0f} 秒: {event['description']}\n"
+        if len(summary['events']) > 20 or summary['dropped_events']:
+            hidden = len(summary['events']) - 20 + summary['dropped_events']
+            report += f"- 另有 {max(hidden, 0)} 个事件未列出\n"
+        report += "\n"
+        return report
@@ -0,0 +1,236 @@
+"""面向AI分析提示词的结果摘要
+
+把结构化结果中的各部分（概况、异常事件、基线对比、协议、TCP/DNS、应用层协议、主要IP和对话、双向会话、时间序列）
+转成按重要性排序的若干段文本，在给定的字符数或token数以内按优先级填充：
+先保证每段的标题和第一行，再按段的优先级依次补充细节，放不下的条目整体省略。
+只读取已经汇总好的结果，计算量与抓包文件大小无关，相同输入总是得到相同输出。
+"""
+import re
+
+DEFAULT_MAX_CHARS = 6000
+# 摘要中最多列出的异常事件数
+MAX_EVENT_LINES = 20
+
+# 中日韩字符大致一个字符一个token，其余文本大致四个字符一个token
+_WIDE_CHARS = re.compile(r'[⺀-鿿가-힯＀-￯]')
+
+
+def estimate_tokens(text):
+    """粗略估算文本的token数（不依赖具体分词器，只用于控制长度）"""
+    wide = len(_WIDE_CHARS.findall(text))
+    return wide + (len(text) - wide + 3) // 4
+
+
+def _ms(value):
+    return f"{value:.1f}ms" if value is not None else "-"
+
+
+def _overview(result):
+    lines = []
+    prefix = "约" if result.get('estimated') else ""
+    lines.append(f"数据包 {prefix}{result.get('totalPackets', 0)} 个, {prefix}{result.get('totalSize', 0)} 字节, "
+                 f"时长 {result.get('duration', 0):.1f} 秒, "
+                 f"平均带宽 {result.get('trafficPattern', {}).get('bandwidthUsage', 0):.2f} Mbps")
+    if result.get('estimated'):
+        sampling = result.get('sampling', {})
+        lines.append(f"抽样估算结果（抽取 {sampling.get('fraction', 0):.1%} 的数据），数值为估计值")
+    coverage = result.get('coverage')
+    if result.get('partial') and coverage:
+        if coverage.get('fraction') is None:
+            lines.append(f"部分结果：只分析了输入的前 {coverage.get('bytes', 0)} 字节")
+        else:
+            lines.append(f"部分结果：只分析了文件的 {coverage['fraction']:.1%}")
+    tunnels = result.get('tunnels', {}).get('tunnels')
+    if tunnels:
+        lines.append("已解开隧道按内层统计: " + ', '.join(f"{name} {counts['packets']}包"
+                                                for name, counts in tunnels.items()))
+    fragments = result.get('fragments')
+    if fragments:
+        lines.append(f"IP分片 {fragments['fragments']} 个, 重组 {fragments['reassembled']} 个数据报, "
+                     f"未收齐 {fragments['expired'] + fragments['evicted']} 个")
+    for warning in result.get('warnings', []):
+        lines.append(f"警告: {warning}")
+    return lines
+
+
+def _anomalies(result):
+    events = result.get('anomalies', {}).get('events', [])
+    if not events:
+        return []
+    lines = [f"检测到 {len(events)} 个异常事件"]
+    for event in events[:MAX_EVENT_LINES]:
+        lines.append(f"[{event['label']}] {event['start']} 持续{event['duration']:.0f}秒: {event['description']}")
+    return lines
+
+
+def _baseline(result):
+    comparison = result.get('baselineComparison')
+    if not comparison:
+        return []
+    # baseline 同时是命令行入口（python -m），不在包导入时加载
+    from .baseline import comparison_lines
+    return comparison_lines(comparison)
+
+
+def _protocols(result):
+    protocols = result.get('protocols', {})
+    total = sum(protocols.values()) or 1
+    ranked = sorted(protocols.items(), key=lambda x: x[1], reverse=True)
+    return [f"{name}: {count} ({count / total:.1%})" for name, count in ranked]
+
+
+def _tcp(result):
+    tcp = result.get('tcp')
+    if not tcp or not tcp.get('segments'):
+        return []
+    lines = [f"连接 {tcp['connections']} 条, 重传率 {tcp['retransmission_rate']:.2%}, "
+             f"重复ACK {tcp['dup_acks']}, 零窗口 {tcp['zero_windows']}, RST {tcp['resets']}"]
+    for label, key in (('握手时延', 'handshake_rtt_ms'), ('数据RTT', 'data_rtt_ms')):
+        rtt = tcp.get(key, {})
+        if rtt.get('count'):
+            lines.append(f"{label}: P50 {_ms(rtt['p50'])}, P99 {_ms(rtt['p99'])}, 最大 {_ms(rtt['max'])}")
+    for conn in tcp.get('top_retransmission', []):
+        lines.append(f"高重传: {conn['connection']} {conn['retransmission_rate']:.1%}")
+    for conn in tcp.get('top_latency', []):
+        lines.append(f"高时延: {conn['connection']} 平均RTT {_ms(conn['avg_rtt_ms'])}")
+    return lines
+
+
+def _dns(result):
+    dns = result.get('dns')
+    if not dns or not (dns.get('queries') or dns.get('unmatched_responses')):
+        return []
+    rcodes = dns.get('rcodes', {})
+    lines = [f"查询 {dns['queries']}, 失败率 {dns['failure_rate']:.1%} (NXDOMAIN {rcodes.get('NXDOMAIN', 0)}, "
+             f"SERVFAIL {rcodes.get('SERVFAIL', 0)}), 未响应 {dns['unanswered']}"]
+    latency = dns.get('latency_ms', {})
+    if latency.get('count'):
+        lines.append(f"解析时延: P50 {_ms(latency['p50'])}, P99 {_ms(latency['p99'])}")
+    for resolver in dns.get('resolvers', []):
+        avg = resolver['latency_ms'].get('avg')
+        lines.append(f"服务器 {resolver['resolver']}: {resolver['queries']}次查询, 失败{resolver['failures']}, "
+                     f"平均 {_ms(avg)}")
+    for entry in dns.get('top_failed_names', []):
+        lines.append(f"解析失败: {entry['name']} {entry['failures']}次")
+    for entry in dns.get('top_names', []):
+        lines.append(f"常查域名: {entry['name']} {entry['queries']}次")
+    return lines
+
+
+def _applications(result):
+    apps = result.get('applications')
+    if not apps or not apps.get('protocols'):
+        return []
+    lines = [', '.join(f"{name} {counts['packets']}包/{counts['flows']}流"
+                       for name, counts in list(apps['protocols'].items())[:4])]
+    for name, counts in list(apps['protocols'].items())[4:]:
+        lines.append(f"{name}: {counts['packets']}包/{counts['flows']}流")
+    for entry in apps.get('tls_server_names', []):
+        lines.append(f"TLS域名: {entry['name']} ({entry['flows']}条连接)")
+    return lines
+
+
+def _talkers(result):
+    return [f"{entry['ip']}: {entry['packets']}包, {entry['bytes']}字节" for entry in result.get('topTalkers', [])]
+
+
+def _conversations(result):
+    return [f"{entry['source']} -> {entry['destination']}: {entry['packets']}包, {entry['bytes']}字节"
+            for entry in result.get('conversations', [])]
+
+
+def _flows(result):
+    flows = result.get('flows')
+    if not flows or not flows.get('top_flows'):
+        return []
+    lines = [f"共 {flows['flows']} 条双向流, {flows['host_pairs']} 个主机对"]
+    for flow in flows['top_flows']:
+        lines.append(f"{flow['protocol']} {flow['source']}:{flow['source_port']} -> "
+                     f"{flow['destination']}:{flow['destination_port']}: 发送 {flow['forward_bytes']}字节, "
+                     f"接收 {flow['reverse_bytes']}字节, 持续 {flow['duration']:.1f}秒")
+    return lines
+
+
+def _timeseries(result):
+    series = result.get('timeSeries')
+    if not series or not series.get('buckets'):
+        return []
+    pps = series.get('pps', {})
+    lines = [f"按{series['interval_ms']:g}ms分桶: 包速率 P50 {pps.get('p50', 0):.0f} 包/秒, 峰值 {pps.get('max', 0):.0f} 包/秒; "
+             f"突发 {series.get('bursts', 0)} 次, 骤降 {series.get('drops', 0)} 次"]
+    distribution = series.get('size_distribution', {})
+    if distribution:
+        lines.append("包大小分布: " + ', '.join(f"{k}B {v}" for k, v in distribution.items()))
+    return lines
+
+
+# (标题, 生成函数)，按优先级排列
+SECTIONS = (
+    ('概况', _overview),
+    ('异常检测', _anomalies),
+    ('基线对比', _baseline),
+    ('协议分布', _protocols),
+    ('TCP性能', _tcp),
+    ('DNS', _dns),
+    ('应用层协议', _applications),
+    ('主要通信IP', _talkers),
+    ('主要通信对话', _conversations),
+    ('双向会话', _flows),
+    ('流量时间序列', _timeseries)
+)
+
+
+def digest(result, max_chars=None, max_tokens=None):
+    """把结构化结果压缩成不超过 max_chars 个字符（或约 max_tokens 个token）的摘要文本
+
+    两个限制都不设置时使用 DEFAULT_MAX_CHARS。出错的结果只输出错误信息。
+    """
+    if max_chars is None and max_tokens is None:
+        max_chars = DEFAULT_MAX_CHARS
+    if max_tokens is not None:
+        measure, budget = estimate_tokens, max_tokens
+    else:
+        measure, budget = len, max_chars
+
+    if result.get('error'):
+        return _fit(f"分析失败: {result['error']['message']}\n", measure, budget)
+
+    sections = [(title, lines) for title, build in SECTIONS for lines in [build(result)] if lines]
+    chosen = [0] * len(sections)
+    omitted = sum(len(lines) for _, lines in sections)
+    # 预留省略提示的长度
+    note = "（摘要已按长度限制省略 {} 项）\n"
+    used = measure(note.format(omitted))
+
+    # 先保证每段的标题和最重要的一行，再按段的优先级依次补充，某段放不下下一行后转到下一段
+    for i, (title, lines) in enumerate(sections):
+        cost = measure(f"{title}:\n- {lines[0]}\n\n")
+        if used + cost <= budget:
+            used += cost
+            chosen[i] = 1
+    for i, (title, lines) in enumerate(sections):
+        if not chosen[i]:
+            continue
+        for line in lines[1:]:
+            cost = measure(f"- {line}\n")
+            if used + cost > budget:
+                break
+            used += cost
+            chosen[i] += 1
+    omitted -= sum(chosen)
+
+    text = ""
+    for (title, lines), count in zip(sections, chosen):
+        if not count:
+            continue
+        text += f"{title}:\n" + ''.join(f"- {line}\n" for line in lines[:count]) + "\n"
+    if omitted:
+        text += note.format(omitted)
+    return _fit(text, measure, budget)
+
+
+def _fit(text, measure, budget):
+    """兜底：仍超出限制时按字符截断"""
+    while text and measure(text) > budget:
+        text = text[:max(0, min(len(text) - 1, int(len(text) * budget / measure(text))))]
+    return text
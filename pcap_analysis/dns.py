@@ -0,0 +1,287 @@
+import struct
+from collections import OrderedDict
+
+from .stats import BoundedSample, TopCounter
+
+DNS_PORT = 53
+
+# 标识、标志位、问题数、回答数、授权记录数、附加记录数
+DNS_HEADER = struct.Struct('>HHHHHH')
+
+RCODE_NAMES = {
+    0: 'NOERROR',
+    1: 'FORMERR',
+    2: 'SERVFAIL',
+    3: 'NXDOMAIN',
+    4: 'NOTIMP',
+    5: 'REFUSED'
+}
+QTYPE_NAMES = {
+    1: 'A', 2: 'NS', 5: 'CNAME', 6: 'SOA', 12: 'PTR', 15: 'MX', 16: 'TXT', 28: 'AAAA', 33: 'SRV',
+    64: 'SVCB', 65: 'HTTPS', 255: 'ANY'
+}
+# 超过该数量的解析服务器合并为一项统计
+OTHER_RESOLVERS = '其他'
+
+
+def parse_question(payload):
+    """解析DNS报文头和第一个问题，返回 (标识, 是否响应, 响应码, 查询名, 查询类型)；格式不合法时返回None"""
+    if len(payload) < DNS_HEADER.size:
+        return None
+    txid, flags, qdcount, _, _, _ = DNS_HEADER.unpack_from(payload)
+    if (flags >> 11) & 0x0F or not qdcount:
+        # 只处理标准查询（opcode 0）
+        return None
+    labels = []
+    pos = DNS_HEADER.size
+    end = len(payload)
+    while True:
+        if pos >= end:
+            return None
+        length = payload[pos]
+        if length == 0:
+            pos += 1
+            break
+        if length & 0xC0:
+            # 问题部分一般不压缩，遇到指针时只保留已解析的部分
+            pos += 2
+            break
+        labels.append(payload[pos + 1:pos + 1 + length].decode('ascii', 'replace'))
+        pos += 1 + length
+        if pos > 255 + DNS_HEADER.size:
+            return None
+    qtype = struct.unpack_from('>H', payload, pos)[0] if pos + 2 <= end else 0
+    name = '.'.join(labels).lower() or '.'
+    return txid, bool(flags & 0x8000), flags & 0x0F, name, qtype
+
+
+class _Resolver:
+    """单个解析服务器的统计"""
+    __slots__ = ('queries', 'responses', 'failures', 'latency')
+
+    def __init__(self):
+        self.queries = 0
+        self.responses = 0
+        self.failures = 0
+        self.latency = BoundedSample(capacity=2000)
+
+
+class DnsAnalyzer:
+    """流式DNS事务分析：按 (客户端, 端口, 标识, 服务器) 匹配查询与响应
+
+    待响应查询表按查询时间排列，超过 timeout 未响应或超过 max_pending 时从表头淘汰并计为未响应；
+    域名计数使用 TopCounter，解析服务器最多单独统计 max_resolvers 个，内存与查询总量无关。
+    """
+
+    def __init__(self, max_pending=100000, timeout=5.0, max_resolvers=64, top_n=10, name_capacity=2000):
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.max_resolvers = max_resolvers
+        self.top_n = top_n
+
+        self.pending = OrderedDict()
+        self.resolvers = {}
+        self.queries = 0
+        self.responses = 0
+        self.retransmissions = 0
+        self.unanswered = 0
+        self.unmatched_responses = 0
+        self.rcodes = {}
+        self.qtypes = {}
+        self.latency = BoundedSample()
+        self.names = TopCounter(name_capacity)
+        self.failed_names = TopCounter(name_capacity)
+        # 开始后 timeout 秒内未匹配的响应：合并分片时与前一分片末尾的待响应查询配对
+        self.first_ts = None
+        self.early_responses = OrderedDict()
+
+    def process(self, ts, protocol, src_ip, dst_ip, segment):
+        """处理一个目的或源端口为53的TCP/UDP段；segment 从传输层头开始"""
+        if self.first_ts is None:
+            self.first_ts = ts
+        src_port = (segment[0] << 8) | segment[1]
+        dst_port = (segment[2] << 8) | segment[3]
+        if protocol == 6:
+            # DNS over TCP：只解析段首的一条报文（跳过2字节长度前缀）
+            payload = segment[(segment[12] >> 4) * 4 + 2:]
+        else:
+            payload = segment[8:]
+        parsed = parse_question(payload)
+        if parsed is None:
+            return
+        txid, is_response, rcode, name, qtype = parsed
+        if is_response:
+            if src_port == DNS_PORT:
+                self._response(ts, dst_ip, dst_port, txid, src_ip, rcode, name)
+        elif dst_port == DNS_PORT:
+            self._query(ts, src_ip, src_port, txid, dst_ip, name, qtype)
+
+    def _resolver(self, ip):
+        resolver = self.resolvers.get(ip)
+        if resolver is None:
+            if len(self.resolvers) >= self.max_resolvers:
+                ip = OTHER_RESOLVERS
+                resolver = self.resolvers.get(ip)
+            if resolver is None:
+                resolver = self.resolvers[ip] = _Resolver()
+        return resolver
+
+    def _query(self, ts, client_ip, client_port, txid, server_ip, name, qtype):
+        key = (client_ip, client_port, txid, server_ip)
+        if key in self.pending:
+            # 客户端重发：时延仍从第一次查询算起
+            self.retransmissions += 1
+            return
+        self._expire(ts)
+        if len(self.pending) >= self.max_pending:
+            self.pending.popitem(last=False)
+            self.unanswered += 1
+        self.pending[key] = ts
+        self.queries += 1
+        self._resolver(server_ip).queries += 1
+        self.names.add(name)
+        qtype_name = QTYPE_NAMES.get(qtype, str(qtype))
+        self.qtypes[qtype_name] = self.qtypes.get(qtype_name, 0) + 1
+
+    def _response(self, ts, client_ip, client_port, txid, server_ip, rcode, name):
+        key = (client_ip, client_port, txid, server_ip)
+        query_ts = self.pending.pop(key, None)
+        if query_ts is None:
+            self.unmatched_responses += 1
+            if ts - self.first_ts < self.timeout and len(self.early_responses) < self.max_pending:
+                self.early_responses[key] = (ts, rcode, name)
+            return
+        self._answered(ts, query_ts, server_ip, rcode, name)
+
+    def _answered(self, ts, query_ts, server_ip, rcode, name):
+        """累加一个匹配到查询的响应"""
+        self.responses += 1
+        rcode_name = RCODE_NAMES.get(rcode, f'RCODE{rcode}')
+        self.rcodes[rcode_name] = self.rcodes.get(rcode_name, 0) + 1
+        resolver = self._resolver(server_ip)
+        resolver.responses += 1
+        latency = max(0.0, ts - query_ts)
+        resolver.latency.add(latency)
+        self.latency.add(latency)
+        if rcode:
+            resolver.failures += 1
+            self.failed_names.add(name)
+
+    def merge(self, other):
+        """并入另一个文件或分片的DNS统计，other 之后不应再使用
+
+        other 应在时间上紧接 self 之后（按时间顺序合并分片）：other 开头未匹配的响应与 self 末尾的待响应查询配对，
+        查询和响应分在两个分片中时仍计为一次完整的事务。合并后的待响应查询表按查询时间排列。
+        """
+        for key, (ts, rcode, name) in other.early_responses.items():
+            query_ts = self.pending.get(key)
+            if query_ts is not None and 0 <= ts - query_ts < self.timeout:
+                del self.pending[key]
+                self._answered(ts, query_ts, key[3], rcode, name)
+                self.unmatched_responses -= 1
+        if other.first_ts is not None and (self.first_ts is None or other.first_ts < self.first_ts):
+            self.first_ts = other.first_ts
+            self.early_responses = other.early_responses
+        pending = dict(other.pending)
+        for key, query_ts in self.pending.items():
+            if key not in pending or query_ts < pending[key]:
+                pending[key] = query_ts
+        self.pending = OrderedDict(sorted(pending.items(), key=lambda item: item[1]))
+        while len(self.pending) > self.max_pending:
+            self.pending.popitem(last=False)
+            self.unanswered += 1
+        for ip, other_resolver in other.resolvers.items():
+            resolver = self._resolver(ip)
+            resolver.queries += other_resolver.queries
+            resolver.responses += other_resolver.responses
+            resolver.failures += other_resolver.failures
+            resolver.latency.merge(other_resolver.latency)
+        for name in ('queries', 'responses', 'retransmissions', 'unanswered', 'unmatched_responses'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for counts, other_counts in ((self.rcodes, other.rcodes), (self.qtypes, other.qtypes)):
+            for name, count in other_counts.items():
+                counts[name] = counts.get(name, 0) + count
+        self.latency.merge(other.latency)
+        self.names.merge(other.names)
+        self.failed_names.merge(other.failed_names)
+
+    def _expire(self, now):
+        """把超过 timeout 仍未响应的查询计为未响应（表头即最早的查询）"""
+        pending = self.pending
+        while pending:
+            query_ts = next(iter(pending.values()))
+            if now - query_ts < self.timeout:
+                break
+            pending.popitem(last=False)
+            self.unanswered += 1
+
+    def summary(self):
+        """返回汇总统计（时延单位为毫秒）"""
+        failures = self.responses - self.rcodes.get('NOERROR', 0)
+        resolvers = sorted(self.resolvers.items(), key=lambda x: x[1].queries, reverse=True)
+        return {
+            'queries': self.queries,
+            'responses': self.responses,
+            'retransmissions': self.retransmissions,
+            # 抓包结束时仍在等待的查询也计为未响应
+            'unanswered': self.unanswered + len(self.pending),
+            'unmatched_responses': self.unmatched_responses,
+            'failures': failures,
+            'failure_rate': failures / self.responses if self.responses else 0.0,
+            'rcodes': dict(self.rcodes),
+            'query_types': dict(sorted(self.qtypes.items(), key=lambda x: x[1], reverse=True)),
+            'latency_ms': self.latency.summary(scale=1000),
+            'resolvers': [{
+                'resolver': ip,
+                'queries': r.queries,
+                'responses': r.responses,
+                'failures': r.failures,
+                'latency_ms': r.latency.summary(scale=1000)
+            } for ip, r in resolvers[:self.top_n]],
+            'top_names': [{'name': name, 'queries': count, 'error': error}
+                          for name, count, error in self.names.top(self.top_n)],
+            'top_failed_names': [{'name': name, 'failures': count, 'error': error}
+                                 for name, count, error in self.failed_names.top(self.top_n)]
+        }
+
+    def format_report(self):
+        """生成DNS分析的文本报告段落"""
+        if not self.queries and not self.unmatched_responses:
+            return ""
+        summary = self.summary()
+        rcodes = summary['rcodes']
+
+        report = "DNS分析:\n"
+        report += (f"- 查询: {summary['queries']}个, 响应: {summary['responses']}个, "
+                   f"未响应: {summary['unanswered']}个, 重发: {summary['retransmissions']}个\n")
+        report += (f"- 失败响应: {summary['failures']}个 (占响应 {summary['failure_rate'] * 100:.2f}%; "
+                   f"NXDOMAIN {rcodes.get('NXDOMAIN', 0)}, SERVFAIL {rcodes.get('SERVFAIL', 0)}, "
+                   f"REFUSED {rcodes.get('REFUSED', 0)})\n")
+        latency = summary['latency_ms']
+        if latency['count']:
+            report += (f"- 解析时延: 平均 {latency['avg']:.2f} ms, P50 {latency['p50']:.2f} ms, "
+                       f"P99 {latency['p99']:.2f} ms, 最大 {latency['max']:.2f} ms\n")
+        report += "\n"
+
+        if summary['resolvers']:
+            report += "DNS服务器:\n"
+            for resolver in summary['resolvers']:
+                line = f"- {resolver['resolver']}: {resolver['queries']}个查询, 失败 {resolver['failures']}个"
+                if resolver['latency_ms']['count']:
+                    line += (f", 平均时延 {resolver['latency_ms']['avg']:.2f} ms, "
+                             f"P99 {resolver['latency_ms']['p99']:.2f} ms")
+                report += line + "\n"
+            report += "\n"
+
+        if summary['top_names']:
+            report += "查询最多的域名:\n"
+            for entry in summary['top_names']:
+                report += f"- {entry['name']}: {entry['queries']}次\n"
+            report += "\n"
+
+        if summary['top_failed_names']:
+            report += "解析失败最多的域名:\n"
+            for entry in summary['top_failed_names']:
+                report += f"- {entry['name']}: {entry['failures']}次\n"
+            report += "\n"
+        return report
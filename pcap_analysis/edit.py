@@ -0,0 +1,296 @@
+"""PCAP文件的合并、切分、截取和去重（类似 mergecap / editcap）
+
+    python -m pcap_analysis.edit merge OUTPUT INPUT [INPUT ...]
+    python -m pcap_analysis.edit split INPUT [--packets N | --size BYTES | --seconds S] [--prefix PATH]
+    python -m pcap_analysis.edit slice INPUT OUTPUT [--start T] [--end T] [--host IP]
+    python -m pcap_analysis.edit dedup INPUT OUTPUT [--window SECONDS]
+
+只读取记录头，记录按原始字节复制，不解码数据包（--host 只读取网络层地址，dedup 只计算帧哈希）；
+每个输入只保留一个读取块，内存占用与文件大小无关。合并用堆做多路归并，
+假定各输入文件内的记录已按时间排列（与 mergecap 相同）。
+"""
+import os
+import sys
+import heapq
+import struct
+import argparse
+import datetime
+from socket import AF_INET, AF_INET6, inet_pton
+
+from .dedup import DEFAULT_MAX_ENTRIES, DEFAULT_WINDOW, DuplicateFilter
+from .packet import ETHERTYPE_IPV4, ETHERTYPE_IPV6, IPV6_HEADER_LEN, LINK_LAYERS
+from .pcapfile import (PCAP_GLOBAL_HEADER_LEN, PCAP_VARIANTS, PACKET_HEADERS, iter_raw_records, max_record_len,
+                       read_pcap_header)
+
+# 输出文件的写缓冲
+WRITE_BUFFER = 1024 * 1024
+
+
+def _open_capture(path):
+    """打开pcap文件，返回 (文件对象, 文件头, 原始文件头字节)"""
+    f = open(path, 'rb')
+    try:
+        header = read_pcap_header(f)
+    except Exception:
+        f.close()
+        raise ValueError(f"{path} 不是pcap格式的文件（pcapng 请先用 editcap -F pcap 转换）")
+    f.seek(0)
+    raw_header = f.read(PCAP_GLOBAL_HEADER_LEN)
+    return f, header, raw_header
+
+
+class _Writer:
+    """按输入的原始文件头写出pcap文件，记录原样追加"""
+
+    def __init__(self, path, raw_header):
+        self.path = path
+        self.file = open(path, 'wb', buffering=WRITE_BUFFER)
+        self.file.write(raw_header)
+        self.packets = 0
+        self.size = len(raw_header)
+
+    def write(self, record):
+        self.file.write(record)
+        self.packets += 1
+        self.size += len(record)
+
+    def close(self):
+        self.file.close()
+
+
+def _timestamp_ns(header):
+    """返回把 (ts_sec, ts_frac) 换算为纳秒整数的函数"""
+    scale = 1000000000 // header['ts_divisor']
+    return lambda ts_sec, ts_frac: ts_sec * 1000000000 + ts_frac * scale
+
+
+def merge_captures(inputs, output):
+    """按时间戳合并多个pcap文件，返回写出的数据包数
+
+    链路类型必须相同。输出使用第一个输入的字节序和时间戳精度（snaplen 取各输入的最大值），
+    格式不同的输入只改写其记录头。
+    """
+    if not inputs:
+        raise ValueError("没有输入文件")
+    files = []
+    try:
+        for path in inputs:
+            files.append(_open_capture(path))
+        first = files[0][1]
+        for (_, header, _), path in zip(files, inputs):
+            if header['network'] != first['network']:
+                raise ValueError(f"{path} 的链路类型 {header['linktype']} 与 {inputs[0]} 的 {first['linktype']} 不同，"
+                                 f"pcap格式不能混合链路类型")
+
+        byte_order, ts_divisor = first['byte_order'], first['ts_divisor']
+        magic = next(m for m, variant in PCAP_VARIANTS.items() if variant == (byte_order, ts_divisor))
+        snaplen = max(header['snaplen'] for _, header, _ in files)
+        raw_header = magic + struct.pack(byte_order + 'HHlLLL', first['version_major'], first['version_minor'],
+                                         0, 0, snaplen, first['network'])
+
+        def records(index, f, header):
+            to_ns = _timestamp_ns(header)
+            convert = header['byte_order'] != byte_order or header['ts_divisor'] != ts_divisor
+            unpack_from = header['record_header'].unpack_from
+            pack = PACKET_HEADERS[byte_order].pack
+            seq = 0
+            for ts_sec, ts_frac, record in iter_raw_records(f, record_header=header['record_header'],
+                                                            max_len=max_record_len(header)):
+                if convert:
+                    _, _, incl_len, orig_len = unpack_from(record)
+                    frac = ts_frac * ts_divisor // header['ts_divisor']
+                    record = pack(ts_sec, frac, incl_len, orig_len) + record[16:]
+                # 同一时刻的记录按输入顺序、文件内顺序排列，不比较记录内容
+                yield to_ns(ts_sec, ts_frac), index, seq, record
+                seq += 1
+
+        writer = _Writer(output, raw_header)
+        try:
+            for _, _, _, record in heapq.merge(*(records(i, f, header) for i, (f, header, _) in enumerate(files))):
+                writer.write(record)
+        finally:
+            writer.close()
+        return writer.packets
+    finally:
+        for f, _, _ in files:
+            f.close()
+
+
+def split_capture(input_path, prefix=None, packets=0, size=0, seconds=0):
+    """按包数、文件大小（字节）或时间间隔（秒，从第一个包起算）切分，返回输出文件路径列表
+
+    输出为 {prefix}_00000.pcap、{prefix}_00001.pcap……，prefix 默认为输入文件去掉扩展名。
+    单个记录超过 size 时独占一个文件。
+    """
+    if sum(1 for limit in (packets, size, seconds) if limit) != 1:
+        raise ValueError("需要且只能指定一种切分方式：包数、文件大小或时间间隔")
+    if prefix is None:
+        prefix = os.path.splitext(input_path)[0]
+    f, header, raw_header = _open_capture(input_path)
+    to_ns = _timestamp_ns(header)
+    interval = int(seconds * 1000000000)
+    outputs = []
+    writer = None
+    boundary = None
+    try:
+        for ts_sec, ts_frac, record in iter_raw_records(f, record_header=header['record_header'],
+                                                        max_len=max_record_len(header)):
+            if seconds:
+                ts = to_ns(ts_sec, ts_frac)
+                if boundary is None:
+                    boundary = ts + interval
+                elif ts >= boundary:
+                    # 区间从第一个包起等间隔划分，中间没有数据包的区间不产生文件
+                    boundary += ((ts - boundary) // interval + 1) * interval
+                    writer.close()
+                    writer = None
+            elif writer is not None and ((packets and writer.packets >= packets)
+                                         or (size and writer.packets and writer.size + len(record) > size)):
+                writer.close()
+                writer = None
+            if writer is None:
+                writer = _Writer(f"{prefix}_{len(outputs):05d}.pcap", raw_header)
+                outputs.append(writer.path)
+            writer.write(record)
+    finally:
+        if writer is not None:
+            writer.close()
+        f.close()
+    return outputs
+
+
+def _host_matcher(header, host):
+    """返回判断记录（含记录头）的源或目的地址是否为 host 的函数"""
+    link_layer = LINK_LAYERS.get(header['linktype'])
+    if link_layer is None:
+        raise ValueError(f"不支持按主机过滤链路类型 {header['linktype']} 的文件")
+    if ':' in host:
+        ethertype, address, positions = ETHERTYPE_IPV6, inet_pton(AF_INET6, host), (8, 24)
+        min_len = IPV6_HEADER_LEN
+    else:
+        ethertype, address, positions = ETHERTYPE_IPV4, inet_pton(AF_INET, host), (12, 16)
+        min_len = 20
+    length = len(address)
+    record_header_len = header['record_header'].size
+
+    def matches(record):
+        data = record[record_header_len:]
+        network, offset = link_layer(data)
+        if network != ethertype or len(data) - offset < min_len:
+            return False
+        return any(data[offset + p:offset + p + length] == address for p in positions)
+    return matches
+
+
+def slice_capture(input_path, output, start=None, end=None, host=None):
+    """截取时间窗口 [start, end)（Unix时间戳，秒）内、可选地只保留与 host 通信的记录，返回写出的数据包数"""
+    # 命令行给出的时间精确到微秒（纳秒级的浮点数超出双精度的有效位数）
+    start_ns = round(start * 1000000) * 1000 if start is not None else None
+    end_ns = round(end * 1000000) * 1000 if end is not None else None
+    f, header, raw_header = _open_capture(input_path)
+    try:
+        to_ns = _timestamp_ns(header)
+        matches = _host_matcher(header, host) if host else None
+        writer = _Writer(output, raw_header)
+        try:
+            for ts_sec, ts_frac, record in iter_raw_records(f, record_header=header['record_header'],
+                                                            max_len=max_record_len(header)):
+                if start_ns is not None or end_ns is not None:
+                    ts = to_ns(ts_sec, ts_frac)
+                    if (start_ns is not None and ts < start_ns) or (end_ns is not None and ts >= end_ns):
+                        continue
+                if matches is not None and not matches(record):
+                    continue
+                writer.write(record)
+        finally:
+            writer.close()
+    finally:
+        f.close()
+    return writer.packets
+
+
+def dedup_capture(input_path, output, window=DEFAULT_WINDOW, max_entries=DEFAULT_MAX_ENTRIES):
+    """删除镜像口产生的重复帧（window 秒内内容相同的帧只保留第一个），返回去重统计"""
+    f, header, raw_header = _open_capture(input_path)
+    try:
+        duplicates = DuplicateFilter(header['linktype'], window, max_entries)
+        is_duplicate = duplicates.is_duplicate
+        record_header_len = header['record_header'].size
+        ts_divisor = header['ts_divisor']
+        writer = _Writer(output, raw_header)
+        try:
+            for ts_sec, ts_frac, record in iter_raw_records(f, record_header=header['record_header'],
+                                                            max_len=max_record_len(header)):
+                if not is_duplicate(ts_sec + ts_frac / ts_divisor, record[record_header_len:]):
+                    writer.write(record)
+        finally:
+            writer.close()
+    finally:
+        f.close()
+    return duplicates.summary()
+
+
+def parse_time(value):
+    """命令行时间参数：Unix时间戳（秒）或ISO格式时间（不带时区时按本地时间）"""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.datetime.fromisoformat(value).timestamp()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='PCAP文件的合并、切分、截取和去重（原样复制记录，内存占用固定）')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    merge = commands.add_parser('merge', help='按时间戳合并多个pcap文件')
+    merge.add_argument('output', help='输出文件路径')
+    merge.add_argument('inputs', nargs='+', help='输入文件路径')
+
+    split = commands.add_parser('split', help='按包数、文件大小或时间间隔切分')
+    split.add_argument('input', help='输入文件路径')
+    split.add_argument('--prefix', help='输出文件名前缀，默认为输入文件去掉扩展名')
+    split.add_argument('--packets', type=int, default=0, help='每个文件的数据包数')
+    split.add_argument('--size', type=int, default=0, help='每个文件的最大字节数')
+    split.add_argument('--seconds', type=float, default=0, help='每个文件覆盖的时长（秒）')
+
+    cut = commands.add_parser('slice', help='截取时间窗口，或只保留与某个主机通信的数据包')
+    cut.add_argument('input', help='输入文件路径')
+    cut.add_argument('output', help='输出文件路径')
+    cut.add_argument('--start', type=parse_time, help='起始时间（含），Unix时间戳或ISO格式')
+    cut.add_argument('--end', type=parse_time, help='结束时间（不含），Unix时间戳或ISO格式')
+    cut.add_argument('--host', help='只保留源或目的地址为该IP的数据包')
+
+    dedup = commands.add_parser('dedup', help='删除镜像口（SPAN）产生的重复帧')
+    dedup.add_argument('input', help='输入文件路径')
+    dedup.add_argument('output', help='输出文件路径')
+    dedup.add_argument('--window', type=float, default=DEFAULT_WINDOW,
+                       help=f'视为重复的最大时间间隔（秒，默认{DEFAULT_WINDOW}）')
+    dedup.add_argument('--max-entries', type=int, default=DEFAULT_MAX_ENTRIES, help='窗口内最多保存的帧哈希数')
+
+    args = parser.parse_args(argv)
+    try:
+        if args.command == 'merge':
+            count = merge_captures(args.inputs, args.output)
+            print(f"已合并 {len(args.inputs)} 个文件，共 {count} 个数据包 -> {args.output}")
+        elif args.command == 'split':
+            outputs = split_capture(args.input, args.prefix, args.packets, args.size, args.seconds)
+            print(f"已切分为 {len(outputs)} 个文件:")
+            for path in outputs:
+                print(f"- {path}")
+        elif args.command == 'dedup':
+            summary = dedup_capture(args.input, args.output, args.window, args.max_entries)
+            print(f"已删除 {summary['duplicates']} 个重复数据包（{summary['duplicate_bytes']}字节），"
+                  f"保留 {summary['packets'] - summary['duplicates']} 个 -> {args.output}")
+            if summary['evicted']:
+                print(f"注意: 窗口内的帧超过 {args.max_entries} 个，{summary['evicted']} 个条目提前淘汰，可能漏掉部分重复帧")
+        else:
+            count = slice_capture(args.input, args.output, args.start, args.end, args.host)
+            print(f"已截取 {count} 个数据包 -> {args.output}")
+    except (OSError, ValueError) as e:
+        print(f"处理失败: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,290 @@
+import heapq
+from collections import OrderedDict
+
+from .packet import ip_protocol_name
+
+# 打包键中各部分的位宽：端点为 (地址编号 << 16 | 端口)，五元组键为 (协议 << 96 | 较小端点 << 48 | 较大端点)
+_SIDE_BITS = 48
+_SIDE_MASK = (1 << _SIDE_BITS) - 1
+_PROTOCOL_SHIFT = 2 * _SIDE_BITS
+
+# 流状态列表中的下标：两个方向（0为较小端点发往较大端点）的包数和字节数、首末时间戳、发起方向
+PACKETS, BYTES = 0, 1
+FIRST_TS, LAST_TS, INITIATOR = 4, 5, 6
+
+
+def _flow_key(protocol, a, port_a, b, port_b):
+    """打包双向规范化的五元组键，返回 (键, 方向)：方向0表示 a 为较小端点"""
+    side_a = (a << 16) | port_a
+    side_b = (b << 16) | port_b
+    if side_a <= side_b:
+        return (protocol << _PROTOCOL_SHIFT) | (side_a << _SIDE_BITS) | side_b, 0
+    return (protocol << _PROTOCOL_SHIFT) | (side_b << _SIDE_BITS) | side_a, 1
+
+
+class FlowTable:
+    """双向会话表：同一会话两个方向的数据包合并为一条流
+
+    流键为打包成整数的五元组（地址先映射为编号），不为每个包格式化字符串；
+    每条流记录两个方向的包数/字节数、首末时间戳和发起方向（第一个包的方向），
+    主机对视图在汇总时由流合并得到。流表按最近活跃顺序排列：超过 idle_timeout 未活动的流视为结束
+    （之后同一五元组的包算作新的流），超过 max_flows 时淘汰最久未活动的流；
+    结束和被淘汰的流并入主机对汇总，并保留字节数最多的 top_n 条用于报告。
+    """
+
+    def __init__(self, max_flows=100000, idle_timeout=300.0, top_n=10):
+        self.max_flows = max_flows
+        self.idle_timeout = idle_timeout
+        self.top_n = top_n
+        self.flows = OrderedDict()
+        self.flows_seen = 0
+        self.evicted = 0
+        self._retired_seq = 0
+        # 地址编号：address_ids 为 {地址: 编号}，addresses 按编号保存地址
+        self.address_ids = {}
+        self.addresses = []
+        self._retired_top = []
+        self._retired_pairs = {}
+
+    def address_id(self, address):
+        key = self.address_ids.get(address)
+        if key is None:
+            key = self.address_ids[address] = len(self.addresses)
+            self.addresses.append(address)
+        return key
+
+    def add(self, ts, protocol, src_ip, src_port, dst_ip, dst_port, byte_count):
+        """累加一个IP数据包；非TCP/UDP的包端口为0"""
+        ids = self.address_ids
+        src = ids.get(src_ip)
+        if src is None:
+            src = self.address_id(src_ip)
+        dst = ids.get(dst_ip)
+        if dst is None:
+            dst = self.address_id(dst_ip)
+        # 与 _flow_key 相同，逐包调用时内联
+        side_src = (src << 16) | src_port
+        side_dst = (dst << 16) | dst_port
+        if side_src <= side_dst:
+            key = (protocol << _PROTOCOL_SHIFT) | (side_src << _SIDE_BITS) | side_dst
+            flow = self.flows.get(key)
+            if flow is None:
+                flow = self._new_flow(key, ts, 0)
+            else:
+                self.flows.move_to_end(key)
+            flow[0] += 1
+            flow[1] += byte_count
+        else:
+            key = (protocol << _PROTOCOL_SHIFT) | (side_dst << _SIDE_BITS) | side_src
+            flow = self.flows.get(key)
+            if flow is None:
+                flow = self._new_flow(key, ts, 1)
+            else:
+                self.flows.move_to_end(key)
+            flow[2] += 1
+            flow[3] += byte_count
+        flow[LAST_TS] = ts
+
+    def add_flow(self, first_ts, last_ts, protocol, src_ip, src_port, dst_ip, dst_port, forward, reverse):
+        """批量累加同一条流的若干数据包（向量化后端按块调用）
+
+        src 为其中第一个包的发送方，forward/reverse 为与第一个包同向/反向的 (包数, 字节数)。
+        """
+        key, direction = _flow_key(protocol, self.address_id(src_ip), src_port, self.address_id(dst_ip), dst_port)
+        flow = self.flows.get(key)
+        if flow is None:
+            flow = self._new_flow(key, first_ts, direction)
+        else:
+            self.flows.move_to_end(key)
+        for counts, side in ((forward, direction), (reverse, 1 - direction)):
+            flow[side * 2] += counts[0]
+            flow[side * 2 + 1] += counts[1]
+        flow[LAST_TS] = last_ts
+
+    def _new_flow(self, key, ts, direction):
+        self._expire(ts)
+        if len(self.flows) >= self.max_flows:
+            self._retire(*self.flows.popitem(last=False))
+            self.evicted += 1
+        flow = self.flows[key] = [0, 0, 0, 0, ts, ts, direction]
+        self.flows_seen += 1
+        return flow
+
+    def _expire(self, now):
+        """结束超过空闲时间的流（表头即最久未活动的流）"""
+        flows = self.flows
+        while flows:
+            key = next(iter(flows))
+            if now - flows[key][LAST_TS] < self.idle_timeout:
+                break
+            self._retire(*flows.popitem(last=False))
+
+    def _retire(self, key, flow):
+        _add_pair(self._retired_pairs, key, flow)
+        self._retired_seq += 1
+        entry = (flow[BYTES] + flow[BYTES + 2], self._retired_seq, key, flow)
+        if len(self._retired_top) < self.top_n:
+            heapq.heappush(self._retired_top, entry)
+        else:
+            heapq.heappushpop(self._retired_top, entry)
+
+    def merge(self, other):
+        """并入另一个文件或分片的流表，other 之后不应再使用
+
+        两边的地址编号各自独立，other 的键先按地址重新编号（端点顺序可能因此交换，方向计数随之交换）。
+        两边都有的流合并计数，发起方向取较早开始的一方；合并后的流表按最后活动时间排列，
+        超过 max_flows 时淘汰最久未活动的流。
+        """
+        overlap = 0
+        flows = self.flows
+        for key, flow in other.flows.items():
+            key, flow = self._import(other, key, flow)
+            mine = flows.get(key)
+            if mine is None:
+                flows[key] = flow
+                continue
+            overlap += 1
+            for i in range(4):
+                mine[i] += flow[i]
+            if flow[FIRST_TS] < mine[FIRST_TS]:
+                mine[FIRST_TS] = flow[FIRST_TS]
+                mine[INITIATOR] = flow[INITIATOR]
+            mine[LAST_TS] = max(mine[LAST_TS], flow[LAST_TS])
+        self.flows = OrderedDict(sorted(flows.items(), key=lambda item: item[1][LAST_TS]))
+        self.flows_seen += other.flows_seen - overlap
+        self.evicted += other.evicted
+        for byte_count, _, key, flow in other._retired_top:
+            key, flow = self._import(other, key, flow)
+            self._retired_seq += 1
+            entry = (byte_count, self._retired_seq, key, flow)
+            if len(self._retired_top) < self.top_n:
+                heapq.heappush(self._retired_top, entry)
+            else:
+                heapq.heappushpop(self._retired_top, entry)
+        for pair, counts in other._retired_pairs.items():
+            low = self.address_id(other.addresses[pair >> 32])
+            high = self.address_id(other.addresses[pair & 0xFFFFFFFF])
+            counts = list(counts)
+            if low > high:
+                low, high = high, low
+                counts[0:4] = counts[2:4] + counts[0:2]
+            pair = (low << 32) | high
+            mine = self._retired_pairs.get(pair)
+            if mine is None:
+                self._retired_pairs[pair] = counts
+                continue
+            for i in range(4):
+                mine[i] += counts[i]
+            mine[4] = min(mine[4], counts[4])
+            mine[5] = max(mine[5], counts[5])
+            mine[6] += counts[6]
+        while len(self.flows) > self.max_flows:
+            self._retire(*self.flows.popitem(last=False))
+            self.evicted += 1
+
+    def _import(self, other, key, flow):
+        """把 other 流表中的键和流状态换成本表的地址编号"""
+        protocol = key >> _PROTOCOL_SHIFT
+        low = (key >> _SIDE_BITS) & _SIDE_MASK
+        high = key & _SIDE_MASK
+        key, direction = _flow_key(protocol, self.address_id(other.addresses[low >> 16]), low & 0xFFFF,
+                                   self.address_id(other.addresses[high >> 16]), high & 0xFFFF)
+        if direction:
+            flow = flow[2:4] + flow[0:2] + [flow[FIRST_TS], flow[LAST_TS], 1 - flow[INITIATOR]]
+        return key, flow
+
+    def _describe(self, key, flow):
+        """把流状态展开为结果条目，源和目的按发起方向排列"""
+        protocol = key >> _PROTOCOL_SHIFT
+        sides = ((key >> _SIDE_BITS) & _SIDE_MASK, key & _SIDE_MASK)
+        initiator = flow[INITIATOR]
+        src, dst = sides[initiator], sides[1 - initiator]
+        sent = flow[initiator * 2:initiator * 2 + 2]
+        received = flow[(1 - initiator) * 2:(1 - initiator) * 2 + 2]
+        duration = flow[LAST_TS] - flow[FIRST_TS]
+        byte_count = sent[1] + received[1]
+        return {
+            'protocol': ip_protocol_name(protocol),
+            'source': self.addresses[src >> 16],
+            'source_port': src & 0xFFFF,
+            'destination': self.addresses[dst >> 16],
+            'destination_port': dst & 0xFFFF,
+            'packets': sent[0] + received[0],
+            'bytes': byte_count,
+            'forward_packets': sent[0],
+            'forward_bytes': sent[1],
+            'reverse_packets': received[0],
+            'reverse_bytes': received[1],
+            'start': flow[FIRST_TS],
+            'duration': duration,
+            'throughput_bps': byte_count * 8 / duration if duration > 0 else 0.0
+        }
+
+    def summary(self):
+        """返回流数、按字节数排序的主要流和主要主机对"""
+        candidates = [(flow[BYTES] + flow[BYTES + 2], key, flow) for key, flow in self.flows.items()]
+        candidates.extend((byte_count, key, flow) for byte_count, _, key, flow in self._retired_top)
+        top_flows = [self._describe(key, flow) for _, key, flow in
+                     heapq.nlargest(self.top_n, candidates, key=lambda x: x[0])]
+
+        pairs = {key: list(counts) for key, counts in self._retired_pairs.items()}
+        for key, flow in self.flows.items():
+            _add_pair(pairs, key, flow)
+        top_pairs = []
+        for pair, counts in heapq.nlargest(self.top_n, pairs.items(), key=lambda x: x[1][1] + x[1][3]):
+            duration = counts[5] - counts[4]
+            top_pairs.append({
+                'hosts': f"{self.addresses[pair >> 32]} <-> {self.addresses[pair & 0xFFFFFFFF]}",
+                'flows': counts[6],
+                'packets': counts[0] + counts[2],
+                'bytes': counts[1] + counts[3],
+                'a_to_b_bytes': counts[1],
+                'b_to_a_bytes': counts[3],
+                'duration': duration
+            })
+        return {
+            'flows': self.flows_seen,
+            'host_pairs': len(pairs),
+            'evicted_flows': self.evicted,
+            'top_flows': top_flows,
+            'top_host_pairs': top_pairs
+        }
+
+    def format_report(self):
+        """生成双向会话的文本报告段落"""
+        if not self.flows_seen:
+            return ""
+        summary = self.summary()
+        report = f"双向会话（共{summary['flows']}条流, {summary['host_pairs']}个主机对）:\n"
+        for flow in summary['top_flows']:
+            if flow['source_port'] or flow['destination_port']:
+                endpoints = (f"{flow['source']}:{flow['source_port']} -> "
+                             f"{flow['destination']}:{flow['destination_port']}")
+            else:
+                endpoints = f"{flow['source']} -> {flow['destination']}"
+            report += (f"- {flow['protocol']} {endpoints}: "
+                       f"发送 {flow['forward_packets']}包/{flow['forward_bytes']}字节, "
+                       f"接收 {flow['reverse_packets']}包/{flow['reverse_bytes']}字节, "
+                       f"持续 {flow['duration']:.2f}秒, 平均 {flow['throughput_bps'] / 1000000:.3f} Mbps\n")
+        report += "\n主要主机对（双向合计）:\n"
+        for pair in summary['top_host_pairs'][:5]:
+            report += (f"- {pair['hosts']}: {pair['packets']}个包, {pair['bytes']}字节 "
+                       f"({pair['a_to_b_bytes']} / {pair['b_to_a_bytes']}), {pair['flows']}条流\n")
+        return report + "\n"
+
+
+def _add_pair(pairs, key, flow):
+    """把一条流并入主机对汇总：{主机对键: [A→B包数, A→B字节数, B→A包数, B→A字节数, 首时间戳, 末时间戳, 流数]}"""
+    low = ((key >> _SIDE_BITS) & _SIDE_MASK) >> 16
+    high = (key & _SIDE_MASK) >> 16
+    pair = (low << 32) | high
+    counts = pairs.get(pair)
+    if counts is None:
+        pairs[pair] = [flow[0], flow[1], flow[2], flow[3], flow[FIRST_TS], flow[LAST_TS], 1]
+        return
+    for i in range(4):
+        counts[i] += flow[i]
+    counts[4] = min(counts[4], flow[FIRST_TS])
+    counts[5] = max(counts[5], flow[LAST_TS])
+    counts[6] += 1
+
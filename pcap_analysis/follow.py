@@ -0,0 +1,445 @@
+"""从大抓包文件中提取单条TCP/UDP流（类似 Wireshark 的“追踪流”）
+
+    python -m pcap_analysis.follow FILE list [--top 20]
+    python -m pcap_analysis.follow FILE extract tcp 10.0.0.1:51234 10.0.0.2:443 [-o flow.pcap] [--payload PREFIX]
+
+第一次使用时扫描一遍文件，建立流索引（每条流的记录偏移），保存在抓包文件旁的 FILE.flowidx；
+之后的查找只在索引中二分查找，再按偏移读取该流的记录，不再扫描整个文件。
+文件内容变化（指纹不同）时自动重建索引。只索引带完整端口的TCP/UDP包，
+不解开隧道，IP分片中除首片外的分片不计入。
+"""
+import os
+import sys
+import mmap
+import json
+import struct
+import argparse
+import tempfile
+from array import array
+from socket import AF_INET, AF_INET6, inet_ntop, inet_pton
+
+from .cache import file_fingerprint
+from .packet import ETHERTYPE_IPV4, ETHERTYPE_IPV6, IPV6_HEADER_LEN, LINK_LAYERS, ipv6_upper_layer
+from .pcapfile import PCAP_GLOBAL_HEADER_LEN, CorruptRecord, MAX_RECORD_LEN, max_record_len, read_pcap_header
+from .tcp import SEQ_MASK, SYN
+
+# 索引格式变化时递增，旧索引会被重建
+INDEX_VERSION = 1
+INDEX_MAGIC = b'PCAPFIDX'
+INDEX_SUFFIX = '.flowidx'
+# 索引文件头：魔数、版本、元数据JSON长度
+_INDEX_HEADER = struct.Struct('<8sLL')
+# 流表条目：规范化的流键、该流的记录偏移在偏移数组中的起点和数量
+_FLOW_ENTRY = struct.Struct('<37s3xQL')
+# 流键：协议号(1) + 较小端点(地址16 + 端口2) + 较大端点；IPv4地址按IPv4映射的IPv6地址存放
+KEY_LEN = 37
+_IPV4_MAPPED = b'\x00' * 10 + b'\xff\xff'
+PROTOCOLS = {'tcp': 6, 'udp': 17}
+
+READ_CHUNK = 4 * 1024 * 1024
+
+
+def _endpoint(address, port):
+    """地址字符串和端口 -> 18字节的端点编码"""
+    if ':' in address:
+        packed = inet_pton(AF_INET6, address)
+    else:
+        packed = _IPV4_MAPPED + inet_pton(AF_INET, address)
+    return packed + port.to_bytes(2, 'big')
+
+
+def _endpoint_text(endpoint):
+    address, port = endpoint[:16], (endpoint[16] << 8) | endpoint[17]
+    if address.startswith(_IPV4_MAPPED):
+        return f"{inet_ntop(AF_INET, address[12:])}:{port}"
+    return f"[{inet_ntop(AF_INET6, address)}]:{port}"
+
+
+def flow_key(protocol, endpoint_a, endpoint_b):
+    """双向规范化的流键，返回 (键, 方向)：方向0表示 endpoint_a 为较小端点"""
+    if endpoint_a <= endpoint_b:
+        return bytes((protocol,)) + endpoint_a + endpoint_b, 0
+    return bytes((protocol,)) + endpoint_b + endpoint_a, 1
+
+
+def decode_flow(data, link_layer):
+    """解析一个帧的TCP/UDP五元组，返回 (流键, 方向, 传输层偏移, IP结束位置)；不是完整的TCP/UDP包时返回None"""
+    ethertype, offset = link_layer(data)
+    data_len = len(data)
+    if ethertype == ETHERTYPE_IPV4 and data_len - offset >= 20:
+        header_len = (data[offset] & 0x0F) * 4
+        # 非首片没有传输层头
+        if header_len < 20 or data[offset + 6] & 0x1F or data[offset + 7]:
+            return None
+        protocol = data[offset + 9]
+        src = _IPV4_MAPPED + data[offset + 12:offset + 16]
+        dst = _IPV4_MAPPED + data[offset + 16:offset + 20]
+        transport = offset + header_len
+        ip_end = offset + ((data[offset + 2] << 8) | data[offset + 3])
+    elif ethertype == ETHERTYPE_IPV6 and data_len - offset >= IPV6_HEADER_LEN:
+        protocol, transport, _ = ipv6_upper_layer(data, offset, data_len)
+        if transport < 0:
+            return None
+        src = data[offset + 8:offset + 24]
+        dst = data[offset + 24:offset + 40]
+        ip_end = offset + IPV6_HEADER_LEN + ((data[offset + 4] << 8) | data[offset + 5])
+    else:
+        return None
+    if (protocol != 6 and protocol != 17) or data_len - transport < (20 if protocol == 6 else 8):
+        return None
+    key, direction = flow_key(protocol, src + data[transport:transport + 2], dst + data[transport + 2:transport + 4])
+    return key, direction, transport, min(ip_end, data_len)
+
+
+def _scan(f, record_header, max_len=MAX_RECORD_LEN):
+    """逐条返回 (记录在文件中的偏移, 帧数据)；末尾不完整的记录不返回
+
+    记录长度超过 max_len 时抛出 CorruptRecord（offset 为文件中的偏移）。
+    """
+    unpack_from = record_header.unpack_from
+    header_size = record_header.size
+    base = f.tell()
+    pending = b''
+    while True:
+        chunk = f.read(READ_CHUNK)
+        if not chunk:
+            break
+        buf = pending + chunk if pending else chunk
+        pos = 0
+        buf_len = len(buf)
+        while buf_len - pos >= header_size:
+            incl_len = unpack_from(buf, pos)[2]
+            if incl_len > max_len:
+                raise CorruptRecord(base + pos, incl_len, max_len)
+            record_end = pos + header_size + incl_len
+            if record_end > buf_len:
+                break
+            yield base + pos, buf[pos + header_size:record_end]
+            pos = record_end
+        base += pos
+        pending = buf[pos:]
+
+
+def build_index(pcap_path, index_path=None):
+    """扫描抓包文件建立流索引并写入 index_path（默认 FILE.flowidx），返回索引路径
+
+    扫描时每个记录只在内存中保存一个8字节偏移和一个4字节流编号；按流编号做一次计数排序，
+    排序结果直接写入映射到内存的索引文件，不在内存中另存一份。流表按流键排序以便二分查找。
+    """
+    index_path = index_path or pcap_path + INDEX_SUFFIX
+    fingerprint = file_fingerprint(pcap_path)
+    with open(pcap_path, 'rb') as f:
+        try:
+            header = read_pcap_header(f)
+        except Exception:
+            raise ValueError(f"{pcap_path} 不是pcap格式的文件")
+        link_layer = LINK_LAYERS.get(header['linktype'])
+        if link_layer is None:
+            raise ValueError(f"不支持链路类型 {header['linktype']} 的文件")
+        flow_ids = {}
+        offsets = array('Q')
+        owners = array('I')
+        try:
+            for offset, data in _scan(f, header['record_header'], max_record_len(header)):
+                decoded = decode_flow(data, link_layer)
+                if decoded is None:
+                    continue
+                key = decoded[0]
+                flow_id = flow_ids.get(key)
+                if flow_id is None:
+                    flow_id = flow_ids[key] = len(flow_ids)
+                offsets.append(offset)
+                owners.append(flow_id)
+        except CorruptRecord as e:
+            # 只索引损坏位置之前的记录会让之后的流静默缺失
+            raise ValueError(f"{pcap_path} 在偏移 {e.offset} 处{e}，"
+                             f"可用 python -m pcap_analysis.repair 修复后再建立索引")
+
+    # 计数排序：同一条流的偏移连续存放，流内保持文件顺序
+    counts = array('I', [0]) * len(flow_ids)
+    for flow_id in owners:
+        counts[flow_id] += 1
+    starts = array('Q', [0]) * len(flow_ids)
+    total = 0
+    for flow_id, count in enumerate(counts):
+        starts[flow_id] = total
+        total += count
+
+    meta = json.dumps({
+        'fingerprint': fingerprint,
+        'flows': len(flow_ids),
+        'records': len(offsets)
+    }).encode('utf-8')
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w+b') as out:
+        out.write(_INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(meta)))
+        out.write(meta)
+        for key in sorted(flow_ids):
+            flow_id = flow_ids[key]
+            out.write(_FLOW_ENTRY.pack(key, starts[flow_id], counts[flow_id]))
+        offsets_at = out.tell()
+        if offsets:
+            out.truncate(offsets_at + len(offsets) * offsets.itemsize)
+            _write_grouped(out, offsets_at, offsets, owners, starts)
+    os.replace(tmp_path, index_path)
+    return index_path
+
+
+def _write_grouped(out, offsets_at, offsets, owners, starts):
+    """把偏移按流编号分组写入索引文件的偏移数组（starts 用作各流的写入位置，写完后不再是起点）"""
+    with mmap.mmap(out.fileno(), 0) as mapped:
+        view = memoryview(mapped)
+        grouped = view[offsets_at:].cast('Q')
+        try:
+            for offset, flow_id in zip(offsets, owners):
+                grouped[starts[flow_id]] = offset
+                starts[flow_id] += 1
+        finally:
+            grouped.release()
+            view.release()
+        if sys.byteorder != 'little':
+            # 索引文件固定为小端
+            for pos in range(offsets_at, len(mapped), READ_CHUNK):
+                chunk = array('Q', mapped[pos:pos + READ_CHUNK])
+                chunk.byteswap()
+                mapped[pos:pos + READ_CHUNK] = chunk.tobytes()
+
+
+class FlowIndex:
+    """已建立的流索引（内存映射，只在查找时读取用到的部分）"""
+
+    def __init__(self, pcap_path, index_path):
+        self.pcap_path = pcap_path
+        self.index_path = index_path
+        self._file = open(index_path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, meta_len = _INDEX_HEADER.unpack_from(self._map)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            self.close()
+            raise ValueError("索引格式不匹配")
+        self.meta = json.loads(self._map[_INDEX_HEADER.size:_INDEX_HEADER.size + meta_len])
+        self.flow_count = self.meta['flows']
+        self._flows_at = _INDEX_HEADER.size + meta_len
+        self._offsets_at = self._flows_at + self.flow_count * _FLOW_ENTRY.size
+
+    @classmethod
+    def open(cls, pcap_path, rebuild=False):
+        """打开抓包文件的流索引：不存在、格式旧或文件内容已变化时先重建
+
+        索引写在抓包文件旁；目录不可写时写在系统临时目录下的同名文件。
+        """
+        beside = pcap_path + INDEX_SUFFIX
+        fallback = os.path.join(tempfile.gettempdir(), os.path.basename(pcap_path) + INDEX_SUFFIX)
+        if not rebuild:
+            fingerprint = file_fingerprint(pcap_path)
+            for index_path in (beside, fallback):
+                if not os.path.exists(index_path):
+                    continue
+                try:
+                    index = cls(pcap_path, index_path)
+                except (OSError, ValueError):
+                    continue
+                if index.meta.get('fingerprint') == fingerprint:
+                    return index
+                index.close()
+        try:
+            index_path = build_index(pcap_path, beside)
+        except PermissionError:
+            index_path = build_index(pcap_path, fallback)
+        return cls(pcap_path, index_path)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _entry(self, i):
+        return _FLOW_ENTRY.unpack_from(self._map, self._flows_at + i * _FLOW_ENTRY.size)
+
+    def lookup(self, key):
+        """按流键二分查找，返回该流各记录在抓包文件中的偏移（文件顺序）；没有时返回空列表"""
+        low, high = 0, self.flow_count
+        while low < high:
+            mid = (low + high) // 2
+            if self._entry(mid)[0] < key:
+                low = mid + 1
+            else:
+                high = mid
+        if low == self.flow_count:
+            return []
+        entry_key, start, count = self._entry(low)
+        if entry_key != key:
+            return []
+        offsets = array('Q')
+        position = self._offsets_at + start * 8
+        offsets.frombytes(self._map[position:position + count * 8])
+        if sys.byteorder != 'little':
+            offsets.byteswap()
+        return offsets.tolist()
+
+    def flows(self):
+        """逐条返回 (协议名, 端点A, 端点B, 记录数)"""
+        names = {number: name.upper() for name, number in PROTOCOLS.items()}
+        for i in range(self.flow_count):
+            key, _, count = self._entry(i)
+            yield names[key[0]], _endpoint_text(key[1:19]), _endpoint_text(key[19:]), count
+
+
+class _Stream:
+    """一个方向的TCP载荷重组：按序号拼接，重传和重叠部分只保留一次"""
+
+    def __init__(self):
+        self.base = None
+        self.segments = {}
+
+    def add(self, seq, flags, payload):
+        if self.base is None:
+            # 以SYN后的第一个字节（或第一个数据段）为相对序号0
+            self.base = (seq + 1) & SEQ_MASK if flags & SYN else seq
+        if payload:
+            relative = (seq - self.base) & SEQ_MASK
+            if relative < 0x80000000 and len(payload) > len(self.segments.get(relative, b'')):
+                self.segments[relative] = payload
+
+    def assemble(self):
+        """返回 (拼接后的字节, 缺失的字节数)"""
+        data = bytearray()
+        missing = 0
+        for relative in sorted(self.segments):
+            payload = self.segments[relative]
+            end = relative + len(payload)
+            if end <= len(data) + missing:
+                continue
+            if relative > len(data) + missing:
+                # 抓包中缺失的数据段不填充，只计数
+                missing += relative - len(data) - missing
+            data += payload[len(data) + missing - relative:]
+        return bytes(data), missing
+
+
+def follow_flow(pcap_path, protocol, endpoint_a, endpoint_b, output=None, payload_prefix=None, rebuild=False):
+    """提取一条流：写出只含该流记录的pcap（output），可选地输出每个方向的载荷
+
+    endpoint_a/endpoint_b 为 (地址, 端口)，顺序任意。payload_prefix 不为None时写出
+    {prefix}.client.bin 和 {prefix}.server.bin（发起方为第一个包的发送方；TCP按序号重组，UDP按顺序拼接）。
+    返回该流的包数、字节数、首末时间和输出文件。
+    """
+    number = PROTOCOLS[protocol.lower()]
+    key, _ = flow_key(number, _endpoint(*endpoint_a), _endpoint(*endpoint_b))
+    with FlowIndex.open(pcap_path, rebuild=rebuild) as index:
+        offsets = index.lookup(key)
+
+    summary = {'packets': 0, 'bytes': 0, 'first_ts': None, 'last_ts': None, 'output': output, 'payload': {}}
+    if not offsets:
+        return summary
+    streams = (_Stream(), _Stream())
+    datagrams = (bytearray(), bytearray())
+    client = None
+    with open(pcap_path, 'rb') as f:
+        header = read_pcap_header(f)
+        record_header = header['record_header']
+        link_layer = LINK_LAYERS[header['linktype']]
+        f.seek(0)
+        raw_header = f.read(PCAP_GLOBAL_HEADER_LEN)
+        writer = open(output, 'wb') if output else None
+        try:
+            if writer is not None:
+                writer.write(raw_header)
+            for offset in offsets:
+                f.seek(offset)
+                head = f.read(record_header.size)
+                ts_sec, ts_frac, incl_len, _ = record_header.unpack(head)
+                data = f.read(incl_len)
+                decoded = decode_flow(data, link_layer)
+                # 文件在指纹不变的情况下被改写时，偏移处的记录可能已不属于这条流
+                if decoded is None or decoded[0] != key:
+                    continue
+                _, direction, transport, end = decoded
+                ts = ts_sec + ts_frac / header['ts_divisor']
+                if client is None:
+                    client = direction
+                    summary['first_ts'] = ts
+                summary['last_ts'] = ts
+                summary['packets'] += 1
+                summary['bytes'] += len(data)
+                if writer is not None:
+                    writer.write(head + data)
+                if payload_prefix is None:
+                    continue
+                side = 0 if direction == client else 1
+                if number == 6:
+                    seq = int.from_bytes(data[transport + 4:transport + 8], 'big')
+                    streams[side].add(seq, data[transport + 13], data[transport + (data[transport + 12] >> 4) * 4:end])
+                else:
+                    datagrams[side].extend(data[transport + 8:end])
+        finally:
+            if writer is not None:
+                writer.close()
+
+    if payload_prefix is not None:
+        for side, name in enumerate(('client', 'server')):
+            if number == 6:
+                payload, missing = streams[side].assemble()
+            else:
+                payload, missing = bytes(datagrams[side]), 0
+            path = f"{payload_prefix}.{name}.bin"
+            with open(path, 'wb') as f:
+                f.write(payload)
+            summary['payload'][name] = {'path': path, 'bytes': len(payload), 'missing_bytes': missing}
+    return summary
+
+
+def parse_endpoint(text):
+    """解析 地址:端口（IPv6地址写成 [地址]:端口）"""
+    address, _, port = text.rpartition(':')
+    if address.startswith('[') and address.endswith(']'):
+        address = address[1:-1]
+    if not address or not port.isdigit():
+        raise argparse.ArgumentTypeError(f"端点格式应为 地址:端口 或 [IPv6地址]:端口: {text}")
+    return address, int(port)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='按流索引从抓包文件中提取单条TCP/UDP流')
+    parser.add_argument('file_path', help='pcap文件路径')
+    parser.add_argument('--rebuild', action='store_true', help='重建流索引')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    listing = commands.add_parser('list', help='列出记录数最多的流')
+    listing.add_argument('--top', type=int, default=20, help='列出的流数')
+
+    extract = commands.add_parser('extract', help='提取一条流')
+    extract.add_argument('protocol', choices=sorted(PROTOCOLS), help='传输层协议')
+    extract.add_argument('endpoint_a', type=parse_endpoint, help='一端，地址:端口')
+    extract.add_argument('endpoint_b', type=parse_endpoint, help='另一端，地址:端口')
+    extract.add_argument('-o', '--output', help='写出只含该流的pcap文件')
+    extract.add_argument('--payload', metavar='PREFIX', help='写出两个方向的载荷（PREFIX.client.bin / PREFIX.server.bin）')
+
+    args = parser.parse_args(argv)
+    try:
+        if args.command == 'list':
+            with FlowIndex.open(args.file_path, rebuild=args.rebuild) as index:
+                flows = sorted(index.flows(), key=lambda flow: flow[3], reverse=True)[:args.top]
+                print(f"共 {index.flow_count} 条流（{index.meta['records']}个TCP/UDP包），记录数最多的 {len(flows)} 条:")
+            for protocol, a, b, count in flows:
+                print(f"- {protocol} {a} <-> {b}: {count}个包")
+            return 0
+        summary = follow_flow(args.file_path, args.protocol, args.endpoint_a, args.endpoint_b, args.output,
+                              args.payload, args.rebuild)
+    except (OSError, ValueError) as e:
+        print(f"处理失败: {e}", file=sys.stderr)
+        return 1
+    if not summary['packets']:
+        print("文件中没有这条流")
+        return 1
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
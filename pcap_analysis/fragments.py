@@ -0,0 +1,143 @@
+from collections import OrderedDict
+
+# IP数据报的最大长度，超过的分片视为无效
+MAX_DATAGRAM_LEN = 65535 + 8
+
+
+class _Datagram:
+    """一个正在重组的数据报：已收到的分片和总长度（收到最后一片后才知道）"""
+    __slots__ = ('first_ts', 'pieces', 'size', 'total', 'skip')
+
+    def __init__(self, ts):
+        self.first_ts = ts
+        self.pieces = []
+        self.size = 0
+        self.total = None
+        # 首片中上层头相对分片数据的偏移（IPv6首片的分片头之后可能还有扩展头）
+        self.skip = 0
+
+
+class FragmentTable:
+    """IPv4/IPv6分片重组
+
+    按 (源地址, 目的地址, 标识, 协议) 收集分片，收齐后返回从上层头开始的完整载荷。
+    待重组表按建立时间排列：超过 timeout 未收齐的数据报从表头丢弃，
+    缓存的分片数据超过 max_bytes 或数据报数超过 max_datagrams 时淘汰最早的数据报，内存有上限。
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024, max_datagrams=8192, timeout=30.0):
+        self.max_bytes = max_bytes
+        self.max_datagrams = max_datagrams
+        self.timeout = timeout
+        self.pending = OrderedDict()
+        self.bytes = 0
+        self.fragments = 0
+        self.reassembled = 0
+        self.expired = 0
+        self.evicted = 0
+        self.invalid = 0
+
+    def add(self, ts, key, offset, more, data, skip=0):
+        """加入一个分片；offset 为分片数据在数据报中的字节偏移，more 为后面是否还有分片
+
+        skip 只对首片有意义，见 _Datagram.skip。数据报收齐时返回从上层头开始的载荷，否则返回None。
+        """
+        self.fragments += 1
+        self._expire(ts)
+        end = offset + len(data)
+        if end > MAX_DATAGRAM_LEN or (more and len(data) % 8):
+            self.invalid += 1
+            return None
+
+        datagram = self.pending.get(key)
+        if datagram is None:
+            if len(self.pending) >= self.max_datagrams:
+                self._drop_oldest()
+                self.evicted += 1
+            datagram = self.pending[key] = _Datagram(ts)
+        datagram.pieces.append((offset, data))
+        datagram.size += len(data)
+        self.bytes += len(data)
+        if offset == 0:
+            datagram.skip = skip
+        if not more:
+            datagram.total = end
+        while self.bytes > self.max_bytes and self.pending:
+            self._drop_oldest()
+            self.evicted += 1
+        if key not in self.pending or datagram.total is None or datagram.size < datagram.total:
+            return None
+        return self._assemble(key, datagram)
+
+    def _assemble(self, key, datagram):
+        """检查分片是否覆盖整个数据报，覆盖时拼接并移出待重组表"""
+        covered = 0
+        for offset, data in sorted(datagram.pieces, key=lambda piece: piece[0]):
+            if offset > covered:
+                return None
+            covered = max(covered, offset + len(data))
+        buf = bytearray(datagram.total)
+        for offset, data in datagram.pieces:
+            buf[offset:offset + len(data)] = data
+        del self.pending[key]
+        self.bytes -= datagram.size
+        self.reassembled += 1
+        if datagram.skip < 0:
+            return None
+        return bytes(buf[datagram.skip:])
+
+    def merge(self, other):
+        """并入另一个文件或分片的重组状态，other 之后不应再使用
+
+        计数相加；两边都在等待的同一数据报合并已收到的分片，收齐的分片留到下一个分片到达时再重组。
+        """
+        for name in ('fragments', 'reassembled', 'expired', 'evicted', 'invalid'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for key, datagram in other.pending.items():
+            mine = self.pending.get(key)
+            if mine is None:
+                self.pending[key] = datagram
+            else:
+                mine.first_ts = min(mine.first_ts, datagram.first_ts)
+                mine.pieces.extend(datagram.pieces)
+                mine.size += datagram.size
+                if datagram.total is not None:
+                    mine.total = datagram.total
+                if any(offset == 0 for offset, _ in datagram.pieces):
+                    mine.skip = datagram.skip
+            self.bytes += datagram.size
+        while self.pending and (self.bytes > self.max_bytes or len(self.pending) > self.max_datagrams):
+            self._drop_oldest()
+            self.evicted += 1
+
+    def _drop_oldest(self):
+        _, datagram = self.pending.popitem(last=False)
+        self.bytes -= datagram.size
+
+    def _expire(self, now):
+        """丢弃超过 timeout 仍未收齐的数据报（表头即最早建立的数据报）"""
+        pending = self.pending
+        while pending:
+            datagram = next(iter(pending.values()))
+            if now - datagram.first_ts < self.timeout:
+                break
+            self._drop_oldest()
+            self.expired += 1
+
+    def summary(self):
+        return {
+            'fragments': self.fragments,
+            'reassembled': self.reassembled,
+            # 抓包结束时仍未收齐的数据报也计为超时
+            'expired': self.expired + len(self.pending),
+            'evicted': self.evicted,
+            'invalid': self.invalid
+        }
+
+    def format_report(self):
+        """生成IP分片重组的文本报告段落"""
+        if not self.fragments:
+            return ""
+        summary = self.summary()
+        return (f"IP分片:\n- 分片: {summary['fragments']}个, 重组完成: {summary['reassembled']}个数据报, "
+                f"超时未收齐: {summary['expired']}个, 超出内存上限淘汰: {summary['evicted']}个\n\n")
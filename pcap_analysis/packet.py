@@ -0,0 +1,191 @@
+import struct
+
+ETHERNET_HEADER_LEN = 14
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+# 802.1Q、802.1ad（QinQ外层）和旧的QinQ标签类型
+VLAN_ETHERTYPES = frozenset({0x8100, 0x88A8, 0x9100})
+# 最多剥离的VLAN标签层数（QinQ为两层）
+MAX_VLAN_TAGS = 2
+
+# pcap文件头中的链路类型
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+IPV6_HEADER_LEN = 40
+# 逐个跳过的IPv6扩展头：逐跳选项、路由、分片、认证头、目的选项、移动性、HIP、Shim6
+IPV6_FRAGMENT = 44
+IPV6_AUTH = 51
+IPV6_EXTENSION_HEADERS = frozenset({0, 43, IPV6_FRAGMENT, IPV6_AUTH, 60, 135, 139, 140})
+MAX_IPV6_EXTENSIONS = 8
+
+IP_PROTOCOL_NAMES = {
+    1: 'ICMP',
+    6: 'TCP',
+    17: 'UDP',
+    58: 'ICMPv6'
+}
+
+
+def ip_protocol_name(protocol):
+    """IP协议号转报告中使用的协议名"""
+    return IP_PROTOCOL_NAMES.get(protocol, f'Unknown({protocol})')
+
+
+def parse_ethernet_header(data):
+    """解析以太网帧头"""
+    if len(data) < 14:
+        return None
+
+    # 目标MAC地址(6字节) + 源MAC地址(6字节) + 类型(2字节)
+    dst_mac = data[0:6]
+    src_mac = data[6:12]
+    eth_type = struct.unpack('>H', data[12:14])[0]
+
+    return {
+        'dst_mac': dst_mac.hex(),
+        'src_mac': src_mac.hex(),
+        'type': eth_type
+    }
+
+
+def parse_ip_header(data):
+    """解析IP头"""
+    if len(data) < 20:
+        return None
+
+    # 版本和头部长度
+    ver_ihl = data[0]
+    version = ver_ihl >> 4
+    ihl = ver_ihl & 0x0F
+
+    if ihl < 5:
+        return None
+
+    header_len = ihl * 4
+
+    if len(data) < header_len:
+        return None
+
+    # 服务类型、总长度、标识、标志位、片偏移
+    tos = data[1]
+    total_length = struct.unpack('>H', data[2:4])[0]
+    identification = struct.unpack('>H', data[4:6])[0]
+    flags_fragment = struct.unpack('>H', data[6:8])[0]
+
+    # TTL、协议、校验和
+    ttl = data[8]
+    protocol = data[9]
+    checksum = struct.unpack('>H', data[10:12])[0]
+
+    # 源IP和目标IP
+    src_ip = '.'.join(str(b) for b in data[12:16])
+    dst_ip = '.'.join(str(b) for b in data[16:20])
+
+    return {
+        'version': version,
+        'header_length': header_len,
+        'tos': tos,
+        'total_length': total_length,
+        'ttl': ttl,
+        'protocol': ip_protocol_name(protocol),
+        'src_ip': src_ip,
+        'dst_ip': dst_ip
+    }
+
+
+def _strip_vlan(data, ethertype, offset):
+    """跳过最多 MAX_VLAN_TAGS 层VLAN标签，返回 (内层类型, 网络层偏移)"""
+    for _ in range(MAX_VLAN_TAGS):
+        if ethertype not in VLAN_ETHERTYPES or len(data) < offset + 4:
+            break
+        ethertype = (data[offset + 2] << 8) | data[offset + 3]
+        offset += 4
+    return ethertype, offset
+
+
+def ethernet_network(data):
+    """以太网（可带802.1Q/QinQ标签）：返回 (网络层类型, 网络层偏移)，帧不完整时类型为0"""
+    if len(data) < ETHERNET_HEADER_LEN:
+        return 0, 0
+    return _strip_vlan(data, (data[12] << 8) | data[13], ETHERNET_HEADER_LEN)
+
+
+def sll_network(data):
+    """Linux cooked capture v1（-i any）：16字节头，协议类型在第14字节"""
+    if len(data) < 16:
+        return 0, 0
+    return _strip_vlan(data, (data[14] << 8) | data[15], 16)
+
+
+def sll2_network(data):
+    """Linux cooked capture v2：20字节头，协议类型在开头"""
+    if len(data) < 20:
+        return 0, 0
+    return _strip_vlan(data, (data[0] << 8) | data[1], 20)
+
+
+def raw_network(data):
+    """没有链路层头的原始IP：按版本号区分IPv4/IPv6"""
+    if not data:
+        return 0, 0
+    version = data[0] >> 4
+    return (ETHERTYPE_IPV4 if version == 4 else ETHERTYPE_IPV6 if version == 6 else 0), 0
+
+
+def ipv4_network(data):
+    return ETHERTYPE_IPV4, 0
+
+
+def ipv6_network(data):
+    return ETHERTYPE_IPV6, 0
+
+
+# 链路类型 -> 取网络层类型和偏移的函数；表中没有的链路类型不解析网络层
+LINK_LAYERS = {
+    LINKTYPE_ETHERNET: ethernet_network,
+    LINKTYPE_RAW: raw_network,
+    LINKTYPE_LINUX_SLL: sll_network,
+    LINKTYPE_IPV4: ipv4_network,
+    LINKTYPE_IPV6: ipv6_network,
+    LINKTYPE_LINUX_SLL2: sll2_network
+}
+
+
+def ipv6_upper_layer(data, offset, end):
+    """跳过IPv6扩展头，返回 (上层协议号, 上层头偏移, 分片信息)
+
+    offset 为IPv6头的起始位置，end 为数据的结束位置。分片信息不是分片时为None，
+    否则为 (标识, 分片偏移, 是否还有后续分片, 分片数据起点)。分片的非首片没有上层头，
+    扩展头不完整或层数过多时也无法定位，这些情况上层头偏移为 -1。
+    """
+    next_header = data[offset + 6]
+    pos = offset + IPV6_HEADER_LEN
+    fragment = None
+    for _ in range(MAX_IPV6_EXTENSIONS):
+        if next_header not in IPV6_EXTENSION_HEADERS:
+            return next_header, pos, fragment
+        if pos + 8 > end:
+            return next_header, -1, fragment
+        if next_header == IPV6_FRAGMENT:
+            next_header = data[pos]
+            frag_offset = ((data[pos + 2] << 8) | data[pos + 3]) & 0xFFF8
+            more = bool(data[pos + 3] & 0x01)
+            # 偏移为0且没有后续分片的“原子分片”不需要重组
+            if frag_offset or more:
+                fragment = ((data[pos + 4] << 24) | (data[pos + 5] << 16) | (data[pos + 6] << 8) | data[pos + 7],
+                            frag_offset, more, pos + 8)
+            if frag_offset:
+                return next_header, -1, fragment
+            pos += 8
+        elif next_header == IPV6_AUTH:
+            next_header, pos = data[pos], pos + (data[pos + 1] + 2) * 4
+        else:
+            next_header, pos = data[pos], pos + (data[pos + 1] + 1) * 8
+    if next_header not in IPV6_EXTENSION_HEADERS:
+        return next_header, pos, fragment
+    return next_header, -1, fragment
@@ -0,0 +1,147 @@
+"""后端一致性检查
+
+对同一个文件运行所有可用后端，以优先级最高的后端为基准，检查各后端共有的指标是否一致。
+新增或修改后端后运行:
+
+    python -m pcap_analysis.parity FILE [FILE ...] [--backends native,numpy,tshark]
+
+有不一致或后端出错时退出码为1。
+"""
+import sys
+import json
+import argparse
+
+from .analyzer import analyze_file
+from .backends import BackendUnavailable, backend_names, select_backend
+
+# 各后端的协议分层方式不同（tshark 还会报告 ETH、IP 等层），只比较传输层协议
+TRANSPORT_PROTOCOLS = ('TCP', 'UDP', 'ICMP')
+# tshark 以文本输出时间戳，与二进制解析得到的浮点数可能有舍入差异
+TIME_TOLERANCE = 1e-6
+
+
+def compare_results(reference, other):
+    """比较两个后端结果的共有指标，返回差异描述列表"""
+    mismatches = []
+
+    def check(label, expected, actual):
+        if expected != actual:
+            mismatches.append(f"{label}: {expected} != {actual}")
+
+    check('totalPackets', reference['totalPackets'], other['totalPackets'])
+    check('totalSize', reference['totalSize'], other['totalSize'])
+    if abs(reference['duration'] - other['duration']) > TIME_TOLERANCE:
+        mismatches.append(f"duration: {reference['duration']} != {other['duration']}")
+    for protocol in TRANSPORT_PROTOCOLS:
+        check(f"protocols.{protocol}", reference['protocols'].get(protocol, 0), other['protocols'].get(protocol, 0))
+
+    # 排名末尾的并列项顺序可能不同：比较包数的多重集合，以及两边都出现的条目
+    for field, key in (('topTalkers', lambda e: e['ip']),
+                       ('conversations', lambda e: f"{e['source']} -> {e['destination']}")):
+        check(f"{field}.packets", sorted(e['packets'] for e in reference[field]),
+              sorted(e['packets'] for e in other[field]))
+        entries = {key(e): e for e in other[field]}
+        for entry in reference[field]:
+            match = entries.get(key(entry))
+            if match is not None:
+                check(f"{field}[{key(entry)}]", (entry['packets'], entry['bytes']), (match['packets'], match['bytes']))
+
+    # 分桶边界受时间戳舍入影响，时间序列只比较区间数和包大小分布
+    if 'timeSeries' in reference and 'timeSeries' in other:
+        check('timeSeries.buckets', reference['timeSeries']['buckets'], other['timeSeries']['buckets'])
+        check('timeSeries.size_distribution', reference['timeSeries'].get('size_distribution'),
+              other['timeSeries'].get('size_distribution'))
+    if 'tcp' in reference and 'tcp' in other:
+        for field in ('connections', 'handshakes', 'retransmissions', 'dup_acks', 'zero_windows', 'resets'):
+            check(f"tcp.{field}", reference['tcp'][field], other['tcp'][field])
+    if 'applications' in reference and 'applications' in other:
+        check('applications.flows', reference['applications']['flows'], other['applications']['flows'])
+        check('applications.protocols', reference['applications']['protocols'], other['applications']['protocols'])
+    if 'dns' in reference and 'dns' in other:
+        for field in ('queries', 'responses', 'unanswered', 'failures', 'rcodes'):
+            check(f"dns.{field}", reference['dns'][field], other['dns'][field])
+    if 'anomalies' in reference and 'anomalies' in other:
+        check('anomalies.events', [(e['type'], e['start'], e['end']) for e in reference['anomalies']['events']],
+              [(e['type'], e['start'], e['end']) for e in other['anomalies']['events']])
+    if 'flows' in reference and 'flows' in other:
+        for field in ('flows', 'host_pairs', 'evicted_flows'):
+            check(f"flows.{field}", reference['flows'][field], other['flows'][field])
+        check('flows.top_flows', [(f['source'], f['source_port'], f['destination'], f['destination_port'],
+                                   f['forward_packets'], f['reverse_bytes']) for f in reference['flows']['top_flows']],
+              [(f['source'], f['source_port'], f['destination'], f['destination_port'],
+                f['forward_packets'], f['reverse_bytes']) for f in other['flows']['top_flows']])
+    return mismatches
+
+
+def check_parity(file_path, backends=None, metrics=None, max_packets=0):
+    """在一个文件上运行多个后端并与基准后端比较
+
+    返回 {'file', 'reference', 'backends': {名称: {'ok', 'mismatches' 或 'error'}}, 'skipped': {名称: 原因}}
+    """
+    results = {}
+    skipped = {}
+    for name in backends or backend_names():
+        try:
+            select_backend(file_path, metrics, name)
+        except BackendUnavailable as e:
+            skipped[name] = str(e)
+            continue
+        results[name] = analyze_file(file_path, name, metrics, max_packets)
+
+    report = {'file': file_path, 'reference': None, 'backends': {}, 'skipped': skipped}
+    reference = None
+    for name, result in results.items():
+        if result.get('error'):
+            report['backends'][name] = {'ok': False, 'error': result['error']['message']}
+            continue
+        if reference is None:
+            reference = result
+            report['reference'] = name
+            report['backends'][name] = {'ok': True, 'mismatches': []}
+            continue
+        mismatches = compare_results(reference, result)
+        report['backends'][name] = {'ok': not mismatches, 'mismatches': mismatches}
+    return report
+
+
+def format_parity(report):
+    """生成一致性检查的文本报告"""
+    text = f"{report['file']} (基准后端: {report['reference'] or '无'})\n"
+    for name, outcome in report['backends'].items():
+        if 'error' in outcome:
+            text += f"- {name}: 出错 - {outcome['error']}\n"
+        elif outcome['ok']:
+            text += f"- {name}: 一致\n"
+        else:
+            text += f"- {name}: {len(outcome['mismatches'])}项不一致\n"
+            for mismatch in outcome['mismatches']:
+                text += f"    {mismatch}\n"
+    for name, reason in report['skipped'].items():
+        text += f"- {name}: 跳过（{reason}）\n"
+    return text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='检查各分析后端在共有指标上的结果是否一致')
+    parser.add_argument('files', nargs='+', help='PCAP文件路径')
+    parser.add_argument('--backends', help='逗号分隔的后端列表，默认全部')
+    parser.add_argument('--metrics', help='逗号分隔的指标列表，默认全部')
+    parser.add_argument('--max-packets', type=int, default=0, help='每个文件最多分析的数据包数量，0表示不限制')
+    parser.add_argument('--format', choices=['text', 'json'], default='text', help='输出格式')
+    args = parser.parse_args(argv)
+
+    backends = args.backends.split(',') if args.backends else None
+    metrics = args.metrics.split(',') if args.metrics else None
+    failed = False
+    for file_path in args.files:
+        report = check_parity(file_path, backends, metrics, args.max_packets)
+        failed = failed or not all(outcome['ok'] for outcome in report['backends'].values())
+        if args.format == 'json':
+            print(json.dumps(report, ensure_ascii=False))
+        else:
+            print(format_parity(report))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
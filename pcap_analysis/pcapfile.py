@@ -0,0 +1,203 @@
+import struct
+
+PCAP_GLOBAL_HEADER_LEN = 24
+PACKET_HEADER = struct.Struct('<LLLL')
+# 记录长度的上限：文件头的 snaplen 和 libpcap 的最大值中较大者（见 max_record_len）
+MAX_RECORD_LEN = 262144
+
+# 抓包文件开头的魔数
+PCAP_MAGIC = b'\xd4\xc3\xb2\xa1'           # 小端、微秒时间戳
+PCAP_MAGIC_BE = b'\xa1\xb2\xc3\xd4'        # 大端、微秒时间戳
+PCAP_NS_MAGIC = b'\x4d\x3c\xb2\xa1'        # 小端、纳秒时间戳
+PCAP_NS_MAGIC_BE = b'\xa1\xb2\x3c\x4d'     # 大端、纳秒时间戳
+PCAPNG_MAGIC = b'\x0a\x0d\x0d\x0a'
+
+FILE_FORMATS = {
+    PCAP_MAGIC: 'pcap',
+    PCAP_MAGIC_BE: 'pcap-be',
+    PCAP_NS_MAGIC: 'pcap-ns',
+    PCAP_NS_MAGIC_BE: 'pcap-ns-be',
+    PCAPNG_MAGIC: 'pcapng'
+}
+
+
+def detect_format(file_path):
+    """根据魔数判断抓包文件格式，无法识别时返回 'unknown'"""
+    with open(file_path, 'rb') as f:
+        magic = f.read(4)
+    return FILE_FORMATS.get(magic, 'unknown')
+
+
+class StreamReader:
+    """只能向前读取的输入流（标准输入、管道），先返回已预读的文件开头再读后续数据"""
+
+    def __init__(self, stream, head=b''):
+        self.stream = stream
+        self.head = head
+
+    def read(self, size=-1):
+        if not self.head:
+            return self.stream.read(size)
+        head = self.head
+        if 0 <= size < len(head):
+            self.head = head[size:]
+            return head[:size]
+        self.head = b''
+        rest = self.stream.read(-1 if size < 0 else size - len(head))
+        return head + rest if rest else head
+
+
+def open_stream(stream):
+    """预读输入流开头的魔数判断格式，返回 (格式, 可继续从头读取的 StreamReader)"""
+    magic = b''
+    while len(magic) < 4:
+        data = stream.read(4 - len(magic))
+        if not data:
+            break
+        magic += data
+    return FILE_FORMATS.get(magic, 'unknown'), StreamReader(stream, magic)
+
+
+# 经典pcap格式（区别于pcapng）的各种字节序和时间戳精度
+PCAP_FORMATS = frozenset({'pcap', 'pcap-be', 'pcap-ns', 'pcap-ns-be'})
+# 魔数 -> (字节序, 时间戳小数部分的单位数)
+PCAP_VARIANTS = {
+    PCAP_MAGIC: ('<', 1000000),
+    PCAP_MAGIC_BE: ('>', 1000000),
+    PCAP_NS_MAGIC: ('<', 1000000000),
+    PCAP_NS_MAGIC_BE: ('>', 1000000000)
+}
+PACKET_HEADERS = {'<': PACKET_HEADER, '>': struct.Struct('>LLLL')}
+
+
+def read_pcap_header(f):
+    """读取PCAP文件头（大小端、微秒/纳秒时间戳均可）
+
+    除文件头字段外还返回 record_header（按本文件字节序解析记录头的 Struct）、
+    ts_divisor（时间戳小数部分的单位数）和 linktype（链路类型，去掉高位的FCS标志）。
+    """
+    magic = f.read(4)
+    variant = PCAP_VARIANTS.get(magic)
+    if variant is None:
+        raise Exception("Not a valid PCAP file")
+    byte_order, ts_divisor = variant
+
+    # 读取版本号、时区、时间戳精度等
+    header = f.read(PCAP_GLOBAL_HEADER_LEN - 4)
+    if len(header) < PCAP_GLOBAL_HEADER_LEN - 4:
+        raise Exception("PCAP file header is truncated")
+    version_major, version_minor, thiszone, sigfigs, snaplen, network = struct.unpack(byte_order + 'HHlLLL', header)
+
+    return {
+        'version_major': version_major,
+        'version_minor': version_minor,
+        'snaplen': snaplen,
+        'network': network,
+        'linktype': network & 0xFFFF,
+        'byte_order': byte_order,
+        'nanosecond': ts_divisor == 1000000000,
+        'ts_divisor': ts_divisor,
+        'record_header': PACKET_HEADERS[byte_order]
+    }
+
+
+def max_record_len(header):
+    """read_pcap_header 返回的文件头允许的最大记录长度，超出的记录头视为损坏"""
+    return max(header['snaplen'], MAX_RECORD_LEN)
+
+
+class CorruptRecord(ValueError):
+    """记录头的长度超出上限：之后的数据无法按记录边界读取
+
+    offset 为损坏的记录头相对开始读取记录处（全局文件头之后）的偏移。
+    """
+
+    def __init__(self, offset, incl_len, max_len):
+        super().__init__(f"记录头无效：长度 {incl_len} 字节超出上限 {max_len} 字节")
+        self.offset = offset
+        self.incl_len = incl_len
+        self.max_len = max_len
+
+
+def corrupt_record_warning(error, packets):
+    """遇到 CorruptRecord 停止读取时加入 stats.warnings 的说明"""
+    return (f"读取 {packets} 个数据包后遇到损坏的记录（{error}），之后的数据未分析；"
+            f"可用 python -m pcap_analysis.repair 检查并修复文件")
+
+
+def read_packet_header(f):
+    """读取数据包头；文件在记录头中间结束时返回None（检查或修复截断的文件见 repair 模块）"""
+    try:
+        ts_sec = struct.unpack('<L', f.read(4))[0]
+        ts_usec = struct.unpack('<L', f.read(4))[0]
+        incl_len = struct.unpack('<L', f.read(4))[0]
+        orig_len = struct.unpack('<L', f.read(4))[0]
+
+        return {
+            'ts_sec': ts_sec,
+            'ts_usec': ts_usec,
+            'incl_len': incl_len,
+            'orig_len': orig_len
+        }
+    except struct.error:
+        return None
+
+
+def iter_records(f, chunk_size=4 * 1024 * 1024, record_header=PACKET_HEADER, max_len=MAX_RECORD_LEN):
+    """按块读取PCAP记录，逐条返回 (ts_sec, ts_frac, incl_len, orig_len, data)
+
+    调用前文件位置应已越过全局文件头。record_header 为 read_pcap_header 返回的同名字段，
+    ts_frac 的单位由文件头的 ts_divisor 决定。末尾不完整的记录（文件被截断）不返回。
+    记录长度超过 max_len（见 max_record_len）时抛出 CorruptRecord，内存中不会缓存超过一块加一个记录。
+    """
+    unpack_from = record_header.unpack_from
+    header_size = record_header.size
+    base = 0
+    pending = b''
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        buf = pending + chunk if pending else chunk
+        pos = 0
+        buf_len = len(buf)
+        while buf_len - pos >= header_size:
+            ts_sec, ts_usec, incl_len, orig_len = unpack_from(buf, pos)
+            if incl_len > max_len:
+                raise CorruptRecord(base + pos, incl_len, max_len)
+            record_end = pos + header_size + incl_len
+            if record_end > buf_len:
+                break
+            yield ts_sec, ts_usec, incl_len, orig_len, buf[pos + header_size:record_end]
+            pos = record_end
+        base += pos
+        pending = buf[pos:]
+
+
+def iter_raw_records(f, chunk_size=4 * 1024 * 1024, record_header=PACKET_HEADER, max_len=MAX_RECORD_LEN):
+    """与 iter_records 相同，但逐条返回 (ts_sec, ts_frac, record)，record 为含记录头的原始字节
+
+    用于不解码、原样复制记录的文件处理（合并、切分、截取）。
+    """
+    unpack_from = record_header.unpack_from
+    header_size = record_header.size
+    base = 0
+    pending = b''
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        buf = pending + chunk if pending else chunk
+        pos = 0
+        buf_len = len(buf)
+        while buf_len - pos >= header_size:
+            ts_sec, ts_frac, incl_len, _ = unpack_from(buf, pos)
+            if incl_len > max_len:
+                raise CorruptRecord(base + pos, incl_len, max_len)
+            record_end = pos + header_size + incl_len
+            if record_end > buf_len:
+                break
+            yield ts_sec, ts_frac, buf[pos:record_end]
+            pos = record_end
+        base += pos
+        pending = buf[pos:]
@@ -0,0 +1,77 @@
+import time
+
+# 逐包解析的后端每处理这么多个包检查一次进度和截止时间
+CHECK_EVERY = 4096
+
+
+class Progress:
+    """分析进度与时间预算
+
+    后端遍历时定期调用 update(已处理字节数, 已处理包数)。返回 False 表示截止时间已到，
+    后端应立即停止并保留已经累加的统计。设置了 callback 时，每隔 interval 秒
+    以 record() 的格式回调一次进度。
+    """
+
+    def __init__(self, total_bytes, deadline=None, callback=None, interval=1.0):
+        self.total_bytes = total_bytes
+        self.time_budget = deadline
+        self.started = time.monotonic()
+        self.deadline = self.started + deadline if deadline else None
+        self.callback = callback
+        self.interval = interval
+        self.next_report = self.started + interval
+        self.bytes_done = 0
+        self.packets = 0
+        self.expired = False
+
+    def update(self, bytes_done, packets):
+        """记录当前进度，截止时间已到时返回 False"""
+        self.bytes_done = bytes_done
+        self.packets = packets
+        now = time.monotonic()
+        if self.callback is not None and now >= self.next_report:
+            self.next_report = now + self.interval
+            self.callback(self.record(now))
+        if self.deadline is not None and now >= self.deadline:
+            self.expired = True
+            return False
+        return True
+
+    def finish(self, bytes_done, packets):
+        """遍历结束时记录最终进度（不再检查截止时间）"""
+        self.bytes_done = bytes_done
+        self.packets = packets
+
+    @property
+    def fraction(self):
+        """已处理的字节占文件的比例；从输入流读取、总大小未知时为None"""
+        if self.total_bytes is None:
+            return None
+        if not self.total_bytes:
+            return 1.0
+        return min(1.0, self.bytes_done / self.total_bytes)
+
+    def record(self, now=None):
+        """进度记录：已处理字节/包数、耗时和按当前速度估算的剩余时间（秒）"""
+        elapsed = (now if now is not None else time.monotonic()) - self.started
+        fraction = self.fraction
+        return {
+            'type': 'progress',
+            'bytes': self.bytes_done,
+            'totalBytes': self.total_bytes,
+            'packets': self.packets,
+            'fraction': fraction,
+            'elapsed': elapsed,
+            'eta': elapsed * (1 - fraction) / fraction if fraction else None
+        }
+
+    def coverage(self):
+        """结果中的覆盖范围说明"""
+        return {
+            'fraction': self.fraction,
+            'bytes': self.bytes_done,
+            'fileSize': self.total_bytes,
+            'packets': self.packets,
+            'elapsed': time.monotonic() - self.started,
+            'stoppedBy': 'deadline' if self.expired else None
+        }
@@ -0,0 +1,282 @@
+"""PCAP文件完整性检查和尾部修复
+
+    python -m pcap_analysis.repair FILE [FILE ...]              # 只检查
+    python -m pcap_analysis.repair FILE --truncate             # 截断到第一个损坏位置
+    python -m pcap_analysis.repair FILE --repair               # 跳过中间损坏的区域，保留其后的完整记录
+
+只按块读取记录头并跳过数据部分，不解码数据包，速度取决于磁盘读取速度。
+抓包进程被强制结束（signal_handler、rdpcap/wrpcap 重写文件时退出）通常只在末尾留下不完整的记录，
+--truncate 即可修复；文件中间被破坏时，--repair 在损坏位置之后按时间戳和连续有效的记录头
+重新找到记录边界，把后面的完整记录前移，原地压缩后截断文件。两种修复都直接改写文件。
+"""
+import os
+import sys
+import json
+import struct
+import argparse
+
+from .pcapfile import PCAP_GLOBAL_HEADER_LEN, PCAP_MAGIC, PCAP_VARIANTS, max_record_len, read_pcap_header
+
+# 按块读取记录头的块大小
+READ_CHUNK = 8 * 1024 * 1024
+# 相邻记录的时间戳相差超过这么多秒时视为记录头无效（被清零或覆盖的记录头时间戳通常离得很远）
+MAX_TS_GAP = 86400
+# 重新同步时，候选位置之后连续这么多个记录有效才接受
+RESYNC_CHAIN = 4
+# 在损坏位置之后最多搜索这么多字节
+RESYNC_LIMIT = 16 * 1024 * 1024
+# 全局文件头不完整时补写的默认文件头（与 capture.py 相同：小端、微秒、snaplen 65535、以太网）
+DEFAULT_GLOBAL_HEADER = PCAP_MAGIC + struct.pack('<HHlLLL', 2, 4, 0, 0, 65535, 1)
+
+# 只影响文件末尾的问题（抓包进程在写入最后一个记录时被结束），截断只删除不到一个记录
+TAIL_PROBLEMS = frozenset({'truncated_header', 'truncated_record'})
+
+PROBLEMS = {
+    'truncated_global_header': '全局文件头不完整',
+    'truncated_header': '最后一个记录头不完整',
+    'truncated_record': '记录的数据超出文件末尾',
+    'bad_header': '记录头无效（长度或时间戳超出范围）'
+}
+
+
+class _Layout:
+    """按文件头确定的记录头格式和合理性检查参数"""
+
+    def __init__(self, header):
+        self.record_header = header['record_header']
+        self.header_size = self.record_header.size
+        self.ts_divisor = header['ts_divisor']
+        self.max_len = max_record_len(header)
+        # 时间戳秒数的高16位在记录头中的位置（重新同步时用于快速定位候选位置）
+        self.ts_high_offset = 2 if header['byte_order'] == '<' else 0
+        self.byte_order = header['byte_order']
+
+    def plausible(self, ts_frac, incl_len):
+        return incl_len <= self.max_len and ts_frac < self.ts_divisor
+
+
+def _walk(f, layout, pos, size, last_ts=None):
+    """从 pos 开始逐个检查记录头，返回 (最后一个完整记录的结束位置, 包数, 首时间戳, 末时间戳, 问题)
+
+    只读取记录头所在的块，数据部分只用于计算下一个记录的位置。last_ts 为之前最后一个有效记录的时间戳。
+    正好结束于文件末尾时问题为None。
+    """
+    unpack_from = layout.record_header.unpack_from
+    header_size = layout.header_size
+    buf = b''
+    buf_start = pos
+    packets = 0
+    first_ts = None
+    while True:
+        if size - pos < header_size:
+            return pos, packets, first_ts, last_ts, ('truncated_header' if pos < size else None)
+        offset = pos - buf_start
+        if offset + header_size > len(buf):
+            f.seek(pos)
+            buf = f.read(READ_CHUNK)
+            buf_start = pos
+            offset = 0
+        ts_sec, ts_frac, incl_len, _ = unpack_from(buf, offset)
+        if not layout.plausible(ts_frac, incl_len) or (last_ts is not None and abs(ts_sec - last_ts) > MAX_TS_GAP):
+            return pos, packets, first_ts, last_ts, 'bad_header'
+        end = pos + header_size + incl_len
+        if end > size:
+            return pos, packets, first_ts, last_ts, 'truncated_record'
+        if first_ts is None:
+            first_ts = ts_sec
+        last_ts = ts_sec
+        packets += 1
+        pos = end
+
+
+def _chain_ok(f, layout, pos, size, reference_ts):
+    """pos 处起连续 RESYNC_CHAIN 个记录（或直到文件末尾）的记录头都合理"""
+    for _ in range(RESYNC_CHAIN):
+        if pos == size:
+            return True
+        f.seek(pos)
+        head = f.read(layout.header_size)
+        if len(head) < layout.header_size:
+            return False
+        ts_sec, ts_frac, incl_len, _ = layout.record_header.unpack(head)
+        if not layout.plausible(ts_frac, incl_len) or abs(ts_sec - reference_ts) > MAX_TS_GAP:
+            return False
+        pos += layout.header_size + incl_len
+        if pos > size:
+            return False
+    return True
+
+
+def _resync(f, layout, start, size, last_ts):
+    """在 start 之后寻找下一个可信的记录边界，找不到时返回None
+
+    候选位置的时间戳秒数与损坏前的最后一个时间戳相差不超过 MAX_TS_GAP，
+    所以先用 find 查找时间戳高16位可能的取值，不逐字节解析。
+    """
+    if last_ts is None:
+        return None
+    f.seek(start + 1)
+    buf = f.read(RESYNC_LIMIT + layout.header_size)
+    patterns = {struct.pack(layout.byte_order + 'H', (ts >> 16) & 0xFFFF)
+                for ts in (max(last_ts - MAX_TS_GAP, 0), last_ts, last_ts + MAX_TS_GAP)}
+    candidates = set()
+    for pattern in patterns:
+        index = buf.find(pattern, layout.ts_high_offset)
+        while index != -1:
+            candidates.add(index - layout.ts_high_offset)
+            index = buf.find(pattern, index + 1)
+    for offset in sorted(candidates):
+        if offset + layout.header_size > len(buf):
+            continue
+        if _chain_ok(f, layout, start + 1 + offset, size, last_ts):
+            return start + 1 + offset
+    return None
+
+
+def _plan(f, size, resync):
+    """检查整个文件，返回 (文件头, 报告, 要保留的区间列表)"""
+    f.seek(0)
+    header = read_pcap_header(f)
+    layout = _Layout(header)
+    report = {
+        'size': size,
+        'packets': 0,
+        'first_ts': None,
+        'last_ts': None,
+        'first_bad_offset': None,
+        'problem': None,
+        'skipped': []
+    }
+    segments = []
+    pos = PCAP_GLOBAL_HEADER_LEN
+    last_ts = None
+    while True:
+        end, packets, first_ts, last_ts, problem = _walk(f, layout, pos, size, last_ts)
+        segments.append((pos, end))
+        report['packets'] += packets
+        if report['first_ts'] is None:
+            report['first_ts'] = first_ts
+        report['last_ts'] = last_ts
+        if problem is None:
+            break
+        if report['problem'] is None:
+            report['first_bad_offset'] = end
+            report['problem'] = problem
+        next_pos = _resync(f, layout, end, size, last_ts) if resync else None
+        if next_pos is None:
+            report['skipped'].append({'offset': end, 'length': size - end})
+            break
+        report['skipped'].append({'offset': end, 'length': next_pos - end})
+        pos = next_pos
+    report['valid'] = report['problem'] is None
+    report['removed_bytes'] = sum(item['length'] for item in report['skipped'])
+    if report['problem']:
+        report['message'] = f"偏移 {report['first_bad_offset']} 处{PROBLEMS[report['problem']]}"
+    return header, report, segments
+
+
+def _global_header_problem(f, size):
+    """全局文件头不完整或不是pcap格式时返回报告，否则返回None"""
+    f.seek(0)
+    head = f.read(PCAP_GLOBAL_HEADER_LEN)
+    if len(head) >= 4 and head[:4] not in PCAP_VARIANTS:
+        raise ValueError("不是pcap格式的文件（pcapng 请先用 editcap -F pcap 转换）")
+    if size >= PCAP_GLOBAL_HEADER_LEN:
+        return None
+    return {
+        'size': size, 'packets': 0, 'first_ts': None, 'last_ts': None, 'valid': False,
+        'first_bad_offset': 0, 'problem': 'truncated_global_header', 'skipped': [], 'removed_bytes': size,
+        'message': f"偏移 0 处{PROBLEMS['truncated_global_header']}"
+    }
+
+
+def check_capture(path, resync=False):
+    """检查pcap文件，返回报告：valid、包数、首末时间戳（秒）、第一个损坏位置和问题类型
+
+    resync 为真时在损坏位置之后继续寻找记录边界，skipped 列出无法读取的区间（即 --repair 会删除的部分）；
+    否则 skipped 只有从第一个损坏位置到文件末尾的一项（即 --truncate 会删除的部分）。
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        report = _global_header_problem(f, size)
+        if report is None:
+            _, report, _ = _plan(f, size, resync)
+    report['path'] = path
+    return report
+
+
+def repair_capture(path, resync=True):
+    """原地修复pcap文件，返回修复前的检查报告（文件没有问题时不改写）
+
+    resync 为假时截断到第一个损坏位置；为真时保留损坏区域之后能重新找到边界的记录。
+    全局文件头不完整（抓包刚开始就被结束）时改写为只含默认文件头的空抓包。
+    """
+    size = os.path.getsize(path)
+    with open(path, 'r+b') as f:
+        report = _global_header_problem(f, size)
+        if report is not None:
+            f.seek(0)
+            f.write(DEFAULT_GLOBAL_HEADER)
+            f.truncate(PCAP_GLOBAL_HEADER_LEN)
+            report['path'] = path
+            return report
+        _, report, segments = _plan(f, size, resync)
+        if report['valid']:
+            report['path'] = path
+            return report
+        # 各区间只会前移（写位置不超过读位置），逐块复制不会覆盖尚未读取的数据
+        write_pos = segments[0][1]
+        for start, end in segments[1:]:
+            read_pos = start
+            while read_pos < end:
+                f.seek(read_pos)
+                data = f.read(min(READ_CHUNK, end - read_pos))
+                f.seek(write_pos)
+                f.write(data)
+                read_pos += len(data)
+                write_pos += len(data)
+        f.truncate(write_pos)
+    report['path'] = path
+    return report
+
+
+def format_report(report):
+    if report['valid']:
+        return f"{report['path']}: 完整, {report['packets']}个数据包"
+    text = f"{report['path']}: {report['message']}"
+    if report['skipped']:
+        text += f", 无法读取 {report['removed_bytes']} 字节（{len(report['skipped'])}处）"
+    return text + f", 可读取 {report['packets']} 个数据包"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='检查pcap文件的完整性，截断或修复损坏的部分')
+    parser.add_argument('files', nargs='+', help='pcap文件路径')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--truncate', action='store_true', help='原地截断到第一个损坏位置')
+    mode.add_argument('--repair', action='store_true', help='原地删除损坏的区域，保留其后能读取的记录')
+    parser.add_argument('--json', action='store_true', help='输出JSON报告')
+    args = parser.parse_args(argv)
+
+    status = 0
+    for path in args.files:
+        try:
+            if args.truncate or args.repair:
+                report = repair_capture(path, resync=args.repair)
+            else:
+                report = check_capture(path, resync=True)
+        except (OSError, ValueError) as e:
+            print(f"处理失败: {path}: {e}", file=sys.stderr)
+            status = 1
+            continue
+        if args.json:
+            print(json.dumps(report, ensure_ascii=False))
+        else:
+            print(format_report(report) + ("（已修复）" if not report['valid'] and (args.truncate or args.repair) else ""))
+        if not report['valid'] and not (args.truncate or args.repair):
+            status = 2
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
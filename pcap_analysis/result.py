@@ -0,0 +1,113 @@
+import os
+import json
+import datetime
+
+# 结构化结果的格式版本；字段有不兼容变化时递增
+RESULT_SCHEMA_VERSION = 1
+# 结果中列出的主要通信IP数
+TOP_TALKERS = 5
+
+
+def iso_time(ts):
+    """Unix时间戳转ISO格式字符串（UTC）"""
+    if ts is None:
+        return None
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).isoformat()
+
+
+def file_info(file_path):
+    """返回结果中的文件信息"""
+    stats = os.stat(file_path)
+    return {
+        'filePath': file_path,
+        'fileSize': stats.st_size,
+        'createdTime': iso_time(stats.st_mtime)
+    }
+
+
+def build_result(analyzer, analyzer_version, file_path, report, **fields):
+    """组装带版本号的结构化分析结果
+
+    顶层字段与前端 PacketData 保持一致（totalPackets、protocols、topTalkers 等），
+    各分析阶段的详细数据放在各自的键下（如 tcp、timeSeries）。
+    """
+    result = {
+        'schemaVersion': RESULT_SCHEMA_VERSION,
+        'analyzer': analyzer,
+        'analyzerVersion': analyzer_version,
+        'captureInfo': {
+            **(file_info(file_path) if file_path and os.path.exists(file_path) else {'filePath': file_path}),
+            'interface': f"PCAP文件({analyzer})",
+            'filter': '无过滤器'
+        },
+        'totalPackets': 0,
+        'totalSize': 0,
+        'duration': 0,
+        'protocols': {},
+        'topTalkers': [],
+        'conversations': [],
+        'suspiciousActivities': [],
+        'trafficPattern': {
+            'avgPacketSize': 0,
+            'peakTime': None,
+            'bandwidthUsage': 0
+        }
+    }
+    result.update(fields)
+    result['report'] = report
+    return result
+
+
+def top_talkers(ip_counts, limit=TOP_TALKERS):
+    """把 {ip: {'packets', 'bytes'}} 转为按包数排序的列表"""
+    ranked = sorted(ip_counts.items(), key=lambda x: x[1]['packets'], reverse=True)[:limit]
+    return [{'ip': ip, 'packets': stats['packets'], 'bytes': stats['bytes']} for ip, stats in ranked]
+
+
+def top_conversations(conversations, limit=10):
+    """把 {'a -> b': {'packets', 'bytes'}} 转为按包数排序的列表"""
+    ranked = sorted(conversations.items(), key=lambda x: x[1]['packets'], reverse=True)[:limit]
+    result = []
+    for key, stats in ranked:
+        source, _, destination = key.partition(' -> ')
+        result.append({'source': source, 'destination': destination,
+                       'packets': stats['packets'], 'bytes': stats['bytes']})
+    return result
+
+
+def write_columnar(path, tables):
+    """把若干列式表写成 .npz（需要numpy）或 .arrow/.feather（需要pyarrow）
+
+    tables 形如 {'conversations': {'source': [...], 'packets': [...]}, ...}
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.npz':
+        try:
+            import numpy as np
+        except ImportError:
+            raise RuntimeError("导出 .npz 需要安装 numpy")
+        arrays = {}
+        for table, columns in tables.items():
+            for column, values in columns.items():
+                arrays[f"{table}.{column}"] = np.asarray(values)
+        np.savez_compressed(path, **arrays)
+    elif extension in ('.arrow', '.feather'):
+        try:
+            import pyarrow as pa
+            import pyarrow.feather as feather
+        except ImportError:
+            raise RuntimeError("导出 Arrow 文件需要安装 pyarrow")
+        # Arrow文件只能保存一张表，多张表按 表名.arrow 分别写出
+        base = os.path.splitext(path)[0]
+        for table, columns in tables.items():
+            feather.write_feather(pa.table(columns), f"{base}.{table}{extension}")
+    else:
+        raise ValueError(f"不支持的列式输出格式: {extension}")
+
+
+def print_result(result, output_format):
+    """按输出格式打印结果：text 只打印报告，json 打印完整结构化结果"""
+    if output_format == 'json':
+        print(json.dumps(result, ensure_ascii=False))
+    else:
+        print(result['report'])
@@ -0,0 +1,273 @@
+"""超大抓包文件的抽样估算
+
+在文件中等间距取若干个字节窗口（系统抽样），每个窗口先对齐到记录边界，再用与
+read_pcap_header 给出的记录头格式逐条解析窗口内的记录。以窗口为整群、按字节数做比率估计，
+外推总包数、总字节数、协议占比和主要通信IP/对话，并给出置信区间。
+读取量只与窗口数和窗口大小有关，与文件大小无关。
+"""
+import os
+import math
+from statistics import NormalDist
+
+from .backends.native import add_record, link_layer_for
+from .pcapfile import PCAP_GLOBAL_HEADER_LEN, PACKET_HEADER, read_pcap_header
+from .result import build_result, iso_time
+from .traffic import ANALYZER_VERSION, TrafficStats
+
+DEFAULT_WINDOWS = 64
+DEFAULT_WINDOW_BYTES = 256 * 1024
+# snaplen 为0或异常时单条记录长度的上限
+MAX_RECORD_LEN = 256 * 1024
+# 对齐记录边界时要求连续校验通过的记录头数
+RESYNC_CHAIN = 4
+# 对齐时接受的时间戳范围（相对第一条记录）
+MAX_CAPTURE_SPAN = 366 * 86400
+
+
+class _RecordCheck:
+    """判断某个偏移处的16字节是否像一个合法的记录头"""
+
+    def __init__(self, header, first_ts):
+        snaplen = header['snaplen']
+        self.record_header = header['record_header']
+        self.ts_divisor = header['ts_divisor']
+        self.max_len = snaplen if 0 < snaplen <= MAX_RECORD_LEN else MAX_RECORD_LEN
+        self.min_ts = first_ts - 86400
+        self.max_ts = first_ts + MAX_CAPTURE_SPAN
+
+    def plausible(self, ts_sec, ts_frac, incl_len, orig_len):
+        return (ts_frac < self.ts_divisor and 0 < incl_len <= self.max_len and incl_len <= orig_len
+                and orig_len <= 0xFFFFFF and self.min_ts <= ts_sec <= self.max_ts)
+
+    def resync(self, buf, limit):
+        """在 buf[0:limit) 中寻找第一个后续 RESYNC_CHAIN 条记录都合法的位置"""
+        unpack_from = self.record_header.unpack_from
+        header_size = PACKET_HEADER.size
+        buf_len = len(buf)
+        for start in range(0, min(limit, buf_len - header_size)):
+            pos = start
+            for _ in range(RESYNC_CHAIN):
+                if buf_len - pos < header_size:
+                    break
+                fields = unpack_from(buf, pos)
+                if not self.plausible(*fields):
+                    break
+                pos += header_size + fields[2]
+            else:
+                return start
+        return None
+
+
+def _ratio(ys, xs, fpc):
+    """整群比率估计 R = Σy/Σx 及其标准误（fpc 为有限总体校正系数 1-f）"""
+    n = len(ys)
+    sum_x = sum(xs)
+    if not sum_x:
+        return 0.0, 0.0
+    r = sum(ys) / sum_x
+    if n < 2 or fpc <= 0:
+        return r, 0.0
+    mean_x = sum_x / n
+    s2 = sum((y - r * x) ** 2 for y, x in zip(ys, xs)) / (n - 1)
+    return r, math.sqrt(fpc * s2 / n) / mean_x
+
+
+def _interval(ratio, se, scale, z):
+    estimate = ratio * scale
+    margin = z * se * scale
+    return {'estimate': estimate, 'low': max(0.0, estimate - margin), 'high': estimate + margin}
+
+
+def _read_windows(file_path, windows, window_bytes):
+    """读取并解析各抽样窗口，返回 (文件头, 各窗口的 (统计, 覆盖字节数), 是否读取了整个文件)"""
+    file_size = os.path.getsize(file_path)
+    body = file_size - PCAP_GLOBAL_HEADER_LEN
+    with open(file_path, 'rb') as f:
+        header = read_pcap_header(f)
+        first = f.read(PACKET_HEADER.size)
+        if len(first) < PACKET_HEADER.size:
+            return header, [], True
+        check = _RecordCheck(header, header['record_header'].unpack(first)[0])
+        link_layer = link_layer_for(header)
+        ts_divisor = header['ts_divisor']
+        slack = check.max_len + PACKET_HEADER.size
+
+        # 文件不比全部窗口大多少时直接完整解析，结果是精确值
+        if body <= windows * (window_bytes + slack):
+            starts = [PCAP_GLOBAL_HEADER_LEN]
+            window_bytes = body
+            exact = True
+        else:
+            step = (body - window_bytes - slack) / (windows - 1) if windows > 1 else 0
+            starts = [PCAP_GLOBAL_HEADER_LEN + int(i * step) for i in range(windows)]
+            exact = False
+
+        samples = []
+        unpack_from = header['record_header'].unpack_from
+        header_size = PACKET_HEADER.size
+        for start in starts:
+            f.seek(start)
+            buf = f.read(window_bytes + slack)
+            # 第一个窗口从文件头之后开始，天然对齐；其余窗口需要寻找记录边界
+            pos = 0 if start == PCAP_GLOBAL_HEADER_LEN else check.resync(buf, min(slack, len(buf)))
+            if pos is None:
+                continue
+            begin = pos
+            stats = TrafficStats(metrics=('summary',))
+            buf_len = len(buf)
+            while pos < window_bytes and buf_len - pos >= header_size:
+                ts_sec, ts_frac, incl_len, orig_len = unpack_from(buf, pos)
+                record_end = pos + header_size + incl_len
+                if record_end > buf_len or (not exact and not check.plausible(ts_sec, ts_frac, incl_len, orig_len)):
+                    break
+                add_record(stats, ts_sec + ts_frac / ts_divisor, incl_len, orig_len, buf[pos + header_size:record_end],
+                           link_layer)
+                pos = record_end
+            if stats.packet_count:
+                samples.append((stats, pos - begin))
+    return header, samples, exact
+
+
+def estimate(file_path, windows=DEFAULT_WINDOWS, window_bytes=DEFAULT_WINDOW_BYTES, confidence=0.95, top_n=5):
+    """抽样估算文件的整体统计，返回结构化结果（带 estimated 标记和 sampling 区间）"""
+    windows = max(1, windows)
+    file_size = os.path.getsize(file_path)
+    body = file_size - PCAP_GLOBAL_HEADER_LEN
+    _, samples, exact = _read_windows(file_path, windows, window_bytes)
+
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    covered = [size for _, size in samples]
+    sampled_bytes = sum(covered)
+    fraction = min(1.0, sampled_bytes / body) if body > 0 else 1.0
+    fpc = 0.0 if exact else 1.0 - fraction
+    # 完整解析时按实际解析的字节数换算（末尾被截断的记录不计入），结果即精确值
+    population = sampled_bytes if exact else body
+
+    packets = [stats.packet_count for stats, _ in samples]
+    ratio, se = _ratio(packets, covered, fpc)
+    total_packets = _interval(ratio, se, population, z)
+    ratio, se = _ratio([stats.total_bytes for stats, _ in samples], covered, fpc)
+    total_size = _interval(ratio, se, population, z)
+
+    # 协议占比：以包数为分母的比率估计
+    protocol_names = set()
+    for stats, _ in samples:
+        protocol_names.update(stats.protocol_counts)
+    protocols = {}
+    for name in protocol_names:
+        share, se = _ratio([stats.protocol_counts.get(name, 0) for stats, _ in samples], packets, fpc)
+        protocols[name] = {
+            'share': share,
+            'low': max(0.0, share - z * se),
+            'high': min(1.0, share + z * se),
+            'packets': share * total_packets['estimate']
+        }
+
+    def top_entries(table_name, limit):
+        merged = {}
+        for stats, _ in samples:
+            for key, counts in getattr(stats, table_name).items():
+                merged[key] = merged.get(key, 0) + counts['packets']
+        ranked = sorted(merged, key=merged.get, reverse=True)[:limit]
+        entries = []
+        for key in ranked:
+            tables = [getattr(stats, table_name).get(key) for stats, _ in samples]
+            ratio, se = _ratio([t['packets'] if t else 0 for t in tables], covered, fpc)
+            packets_interval = _interval(ratio, se, population, z)
+            ratio, se = _ratio([t['bytes'] if t else 0 for t in tables], covered, fpc)
+            entries.append((key, packets_interval, _interval(ratio, se, population, z)))
+        return entries
+
+    talkers = top_entries('ip_counts', top_n)
+    conversations = top_entries('conversations', 10)
+
+    first_ts = samples[0][0].first_ts if samples else None
+    last_ts = samples[-1][0].last_ts if samples else None
+    duration = last_ts - first_ts if samples else 0
+    estimated_packets = int(round(total_packets['estimate']))
+    estimated_size = int(round(total_size['estimate']))
+
+    sampling = {
+        'method': 'exact' if exact else 'systematic-windows',
+        'windows': len(samples),
+        'windowBytes': window_bytes,
+        'sampledBytes': sampled_bytes,
+        'sampledPackets': sum(packets),
+        'fraction': fraction,
+        'confidence': confidence,
+        'totalPackets': total_packets,
+        'totalSize': total_size,
+        'protocols': protocols
+    }
+    report = format_estimate_report(file_size, sampling, talkers, conversations, duration)
+    return build_result(
+        'pcap_analysis', ANALYZER_VERSION, file_path, report,
+        backend='sample',
+        estimated=not exact,
+        totalPackets=estimated_packets,
+        totalSize=estimated_size,
+        duration=duration,
+        protocols={name: int(round(p['packets'])) for name, p in protocols.items()},
+        topTalkers=[{'ip': ip, 'packets': int(round(p['estimate'])), 'bytes': int(round(b['estimate'])),
+                     'packetsLow': int(p['low']), 'packetsHigh': int(math.ceil(p['high']))}
+                    for ip, p, b in talkers],
+        conversations=[{'source': key.partition(' -> ')[0], 'destination': key.partition(' -> ')[2],
+                        'packets': int(round(p['estimate'])), 'bytes': int(round(b['estimate'])),
+                        'packetsLow': int(p['low']), 'packetsHigh': int(math.ceil(p['high']))}
+                       for key, p, b in conversations],
+        trafficPattern={
+            'avgPacketSize': total_size['estimate'] / total_packets['estimate'] if total_packets['estimate'] else 0,
+            'peakTime': None,
+            # 平均带宽（Mbps）
+            'bandwidthUsage': total_size['estimate'] * 8 / duration / 1000000 if duration > 0 else 0
+        },
+        sampling=sampling,
+        timeRange={'start': iso_time(first_ts), 'end': iso_time(last_ts)}
+    )
+
+
+def _range(interval, digits=0):
+    return f"{interval['low']:,.{digits}f} - {interval['high']:,.{digits}f}"
+
+
+def format_estimate_report(file_size, sampling, talkers, conversations, duration):
+    """生成抽样估算的文本报告"""
+    confidence = f"{sampling['confidence']:.0%}"
+    if sampling['method'] == 'exact':
+        report = "文件较小，已完整解析（以下为精确值）\n\n"
+    else:
+        report = (f"抽样估算: {sampling['windows']}个窗口, 共抽取 {sampling['sampledBytes'] / 1000000:.1f} MB / "
+                  f"{file_size / 1000000:.1f} MB ({sampling['fraction']:.2%}), 区间为{confidence}置信区间\n\n")
+
+    packets = sampling['totalPackets']
+    size = sampling['totalSize']
+    report += f"数据包总数: 约 {packets['estimate']:,.0f} ({_range(packets)})\n"
+    report += f"总字节数: 约 {size['estimate']:,.0f} ({_range(size)})\n"
+    report += f"时间跨度: 约 {duration:.1f} 秒\n\n"
+
+    report += "协议分布:\n"
+    ranked = sorted(sampling['protocols'].items(), key=lambda x: x[1]['share'], reverse=True)[:10]
+    for name, p in ranked:
+        report += (f"- {name}: {p['share']:.1%} ({p['low']:.1%} - {p['high']:.1%}), "
+                   f"约 {p['packets']:,.0f} 个数据包\n")
+    if not ranked:
+        report += "- 无协议信息\n"
+    report += "\n"
+
+    report += "主要通信IP:\n"
+    for ip, p, b in talkers:
+        report += f"- {ip}: 约 {p['estimate']:,.0f} 个包 ({_range(p)}), 约 {b['estimate']:,.0f} 字节\n"
+    if not talkers:
+        report += "- 无IP通信信息\n"
+    report += "\n"
+
+    report += "主要通信对话:\n"
+    for key, p, b in conversations[:5]:
+        report += f"- {key}: 约 {p['estimate']:,.0f} 个包 ({_range(p)}), 约 {b['estimate']:,.0f} 字节\n"
+    if not conversations:
+        report += "- 无通信对话信息\n"
+    report += "\n"
+
+    avg = size['estimate'] / packets['estimate'] if packets['estimate'] else 0
+    report += f"平均数据包大小: {avg:.2f} 字节\n\n"
+    return report
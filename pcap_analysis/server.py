@@ -0,0 +1,515 @@
+"""常驻的PCAP分析服务
+
+启动后预先加载分析包，由固定数量的工作进程处理分析任务，避免每次请求都重新
+启动解释器和导入分析依赖。前端协议为逐行JSON-RPC 2.0，可走 stdin/stdout（默认）
+或 Unix socket（--socket PATH）。
+
+支持的方法:
+- analyze {file_path, analyzer: auto|numpy|native|tshark|pyshark, metrics, max_packets, bucket_ms,
+           timeout, deadline, progress, sample, decap, baseline, record_baseline}
+  deadline 默认比 timeout 提前一些：到时返回 partial 结果，而不是等到超时被强制结束。
+  progress 为真时执行期间发送 progress 通知 {job_id, bytes, totalBytes, packets, fraction, eta}
+  sample 为抽样窗口数时只做抽样估算（结果带 estimated 和 sampling 置信区间）
+  decap 为真或 {vxlan_ports, geneve_ports} 时解开隧道，按内层数据包统计（只有 native 后端支持）
+  baseline 为站点名称时附带与该站点历史基线的比较 baselineComparison，record_baseline 为真时把本次抓包加入基线
+  digest_chars / digest_tokens 设置时结果中附带限定长度的摘要 digest（用于AI分析提示词）
+- cancel {job_id}：job_id 为本连接提交的 analyze 请求的 id（各连接的请求id互不影响）
+- status
+- ping
+- shutdown
+"""
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import itertools
+import threading
+import traceback
+import multiprocessing
+from collections import OrderedDict
+from multiprocessing.connection import wait
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# JSON-RPC 错误码
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+QUEUE_FULL = -32001
+JOB_TIMEOUT = -32002
+JOB_CANCELLED = -32003
+JOB_FAILED = -32004
+
+# 未指定 deadline 时，时间预算比任务超时提前 10%（至少2秒），留出汇总和返回部分结果的时间
+DEADLINE_MARGIN_FRACTION = 0.1
+DEADLINE_MIN_MARGIN = 2.0
+
+
+def default_deadline(timeout):
+    """按任务超时计算分析的时间预算"""
+    margin = max(DEADLINE_MIN_MARGIN, timeout * DEADLINE_MARGIN_FRACTION)
+    return max(timeout - margin, timeout * 0.5)
+
+
+class JobError(Exception):
+    """分析任务失败，code 为JSON-RPC错误码"""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+# 旧版本的分析器名称
+LEGACY_ANALYZERS = {'basic': 'auto'}
+
+
+def run_analysis(params, on_progress=None):
+    """在工作进程中执行一次分析，返回结构化结果"""
+    from pcap_analysis.analyzer import analyze
+    from pcap_analysis.backends import backend_names
+
+    file_path = params.get('file_path')
+    if not file_path or not os.path.exists(file_path):
+        raise JobError(INVALID_PARAMS, f"文件 {file_path} 不存在")
+
+    analyzer = params.get('analyzer', 'auto')
+    analyzer = LEGACY_ANALYZERS.get(analyzer, analyzer)
+    if analyzer != 'auto' and analyzer not in backend_names():
+        raise JobError(INVALID_PARAMS, f"未知的分析器: {analyzer}")
+
+    result = analyze(file_path, backend=analyzer, metrics=params.get('metrics'),
+                     max_packets=params.get('max_packets', 0), bucket_ms=params.get('bucket_ms', 1000),
+                     use_cache=params.get('use_cache', True), deadline=params.get('deadline'),
+                     on_progress=on_progress, sample=params.get('sample', 0), decap=params.get('decap'))
+    if params.get('baseline'):
+        from pcap_analysis.baseline import compare_with_baseline
+        try:
+            result = compare_with_baseline(result, params['baseline'], record=params.get('record_baseline', False))
+        except ValueError as e:
+            raise JobError(INVALID_PARAMS, str(e))
+    if params.get('digest_chars') or params.get('digest_tokens'):
+        from pcap_analysis.digest import digest
+        result = dict(result, digest=digest(result, params.get('digest_chars'), params.get('digest_tokens')))
+    return result
+
+
+def _warm_imports():
+    """预先导入分析包及其依赖，首个任务不再承担导入开销"""
+    if PROJECT_ROOT not in sys.path:
+        sys.path.insert(0, PROJECT_ROOT)
+    import pcap_analysis.analyzer  # noqa: F401
+    try:
+        import pyshark  # noqa: F401  (可选依赖)
+    except ImportError:
+        pass
+
+
+def _worker_main(conn):
+    """工作进程主循环：接收 (job_id, params)，返回 (job_id, ok, payload)
+
+    ok 为 None 的消息是执行中的进度记录，之后还会有最终结果。
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _warm_imports()
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        if message is None:
+            break
+        job_id, params = message
+        on_progress = None
+        if params.get('progress'):
+            on_progress = lambda record, job_id=job_id: conn.send((job_id, None, record))
+        try:
+            conn.send((job_id, True, run_analysis(params, on_progress)))
+        except JobError as e:
+            conn.send((job_id, False, {'code': e.code, 'message': str(e)}))
+        except Exception as e:
+            conn.send((job_id, False, {'code': JOB_FAILED, 'message': str(e),
+                                       'data': traceback.format_exc()}))
+
+
+class _WorkerSlot:
+    """一个工作进程及其当前任务"""
+
+    def __init__(self, context):
+        self.context = context
+        self.start()
+
+    def start(self):
+        self.conn, child_conn = self.context.Pipe()
+        self.process = self.context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.job = None
+        self.deadline = None
+        # 为真时进程正在重启，不分配新任务
+        self.restarting = False
+
+    def restart(self):
+        """强制结束当前进程（超时或取消）并重新启动一个；最多等待5秒，不能在进程池的锁内调用"""
+        self.process.terminate()
+        self.process.join(5)
+        self.conn.close()
+        self.start()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(2)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class _Job:
+    __slots__ = ('job_id', 'params', 'timeout', 'callback', 'on_progress', 'submitted')
+
+    def __init__(self, job_id, params, timeout, callback, on_progress=None):
+        self.job_id = job_id
+        self.params = params
+        self.timeout = timeout
+        self.callback = callback
+        self.on_progress = on_progress
+        self.submitted = time.time()
+
+
+class WorkerPool:
+    """固定大小的分析进程池：有界任务队列、单任务超时和取消
+
+    任务超时或被取消时直接结束对应的工作进程并补一个新进程，其余任务不受影响。
+    进程在锁外重启（见 _restart），重启期间提交任务和查询状态不会被阻塞。
+    callback(job_id, result, error) 和 on_progress(job_id, record) 在调度线程中调用。
+    """
+
+    def __init__(self, workers=2, max_queue=64, default_timeout=120.0):
+        self.max_queue = max_queue
+        self.default_timeout = default_timeout
+        self._context = multiprocessing.get_context('spawn')
+        self._slots = [_WorkerSlot(self._context) for _ in range(max(1, workers))]
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self.completed = 0
+        self.failed = 0
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, job_id, params, callback, timeout=None, on_progress=None):
+        """提交任务；队列已满或 job_id 与排队中、执行中的任务重复时抛出 JobError"""
+        timeout = timeout or self.default_timeout
+        if params.get('deadline') is None:
+            params = {**params, 'deadline': default_deadline(timeout)}
+        with self._lock:
+            if self._closed:
+                raise JobError(JOB_FAILED, "分析服务正在关闭")
+            if len(self._pending) >= self.max_queue:
+                raise JobError(QUEUE_FULL, f"任务队列已满（{self.max_queue}）")
+            if job_id in self._pending or any(slot.job is not None and slot.job.job_id == job_id
+                                              for slot in self._slots):
+                raise JobError(INVALID_REQUEST, f"任务 {job_id!r} 正在执行或排队")
+            self._pending[job_id] = _Job(job_id, params, timeout, callback, on_progress)
+        self._wakeup.set()
+
+    def cancel(self, job_id):
+        """取消排队中或执行中的任务，返回是否找到该任务"""
+        with self._lock:
+            job = self._pending.pop(job_id, None)
+            restarts = []
+            if job is None:
+                for slot in self._slots:
+                    if slot.job is not None and slot.job.job_id == job_id:
+                        job = slot.job
+                        restarts.append(self._detach(slot))
+                        break
+        if job is None:
+            return False
+        _notify(job.callback, job_id, None, {'code': JOB_CANCELLED, 'message': '任务已取消'})
+        self._restart(restarts)
+        return True
+
+    def status(self):
+        with self._lock:
+            return {
+                'workers': len(self._slots),
+                'busy': sum(1 for slot in self._slots if slot.job is not None),
+                'queued': len(self._pending),
+                'completed': self.completed,
+                'failed': self.failed
+            }
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for job in pending:
+            _notify(job.callback, job.job_id, None, {'code': JOB_CANCELLED, 'message': '分析服务已关闭'})
+        self._wakeup.set()
+        self._dispatcher.join(2)
+        for slot in self._slots:
+            slot.stop()
+
+    def _detach(self, slot):
+        """（持有锁时调用）清空进程的当前任务并标记为重启中，返回该进程，由调用方在锁外 _restart"""
+        slot.job = None
+        slot.restarting = True
+        return slot
+
+    def _restart(self, slots):
+        """在锁外重启 _detach 过的进程，重启完成后才会再分配任务"""
+        for slot in slots:
+            slot.restart()
+        if slots:
+            self._wakeup.set()
+
+    def _dispatch_loop(self):
+        while not self._closed:
+            finished = []
+            restarts = []
+            with self._lock:
+                # 把排队任务分配给空闲进程
+                for slot in self._slots:
+                    if slot.job is None and not slot.restarting and self._pending:
+                        job_id, job = self._pending.popitem(last=False)
+                        try:
+                            slot.conn.send((job.job_id, job.params))
+                        except OSError:
+                            # 进程已退出：任务放回队首，进程在锁外重启
+                            self._pending[job_id] = job
+                            self._pending.move_to_end(job_id, last=False)
+                            restarts.append(self._detach(slot))
+                            continue
+                        slot.job = job
+                        slot.deadline = time.time() + job.timeout
+                busy = [slot for slot in self._slots if slot.job is not None]
+
+            try:
+                ready = wait([slot.conn for slot in busy], timeout=0.05) if busy else []
+            except OSError:
+                # 等待期间有进程被取消重启，下一轮重新等待
+                ready = []
+            if not busy and not restarts:
+                self._wakeup.wait(0.05)
+                self._wakeup.clear()
+
+            progress = []
+            with self._lock:
+                now = time.time()
+                for slot in busy:
+                    if slot.job is None:
+                        continue
+                    if slot.conn in ready:
+                        job = slot.job
+                        # 先取出所有进度记录，最终结果排在它们之后
+                        while True:
+                            try:
+                                job_id, ok, payload = slot.conn.recv()
+                            except (EOFError, OSError):
+                                ok, payload = False, {'code': JOB_FAILED, 'message': '工作进程异常退出'}
+                                restarts.append(self._detach(slot))
+                                break
+                            if ok is not None:
+                                break
+                            if job.on_progress is not None:
+                                progress.append((job, payload))
+                            if not slot.conn.poll():
+                                break
+                        if ok is None:
+                            continue
+                        slot.job = None
+                        finished.append((job, payload if ok else None, None if ok else payload))
+                    elif now > slot.deadline:
+                        job = slot.job
+                        restarts.append(self._detach(slot))
+                        finished.append((job, None, {'code': JOB_TIMEOUT,
+                                                     'message': f"分析超时（{job.timeout:g}秒）"}))
+
+            for job, record in progress:
+                _notify(job.on_progress, job.job_id, record)
+            for job, result, error in finished:
+                if error is None:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                _notify(job.callback, job.job_id, result, error)
+            self._restart(restarts)
+
+
+def _notify(callback, *args):
+    """在调度线程中调用回调；回调出错只记录到标准错误，不能让调度线程退出"""
+    try:
+        callback(*args)
+    except Exception:
+        traceback.print_exc()
+
+
+class RpcServer:
+    """逐行JSON-RPC 2.0前端，请求异步处理，响应按完成顺序写回
+
+    各连接的请求id各自独立，进程池中的任务以 (连接, 请求id) 区分，响应和取消只作用于本连接的任务。
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.stopping = threading.Event()
+        self._connections = itertools.count(1)
+
+    def handle_line(self, line, send, connection=0):
+        """处理一行请求；send(dict) 负责写回响应，connection 为发出请求的连接编号"""
+        try:
+            request = json.loads(line)
+        except ValueError:
+            send(_error(None, PARSE_ERROR, '无效的JSON'))
+            return
+        request_id = request.get('id') if isinstance(request, dict) else None
+        if not _valid_id(request_id):
+            send(_error(None, INVALID_REQUEST, 'id 必须是字符串或整数'))
+            return
+        if not isinstance(request, dict) or not isinstance(request.get('method'), str):
+            send(_error(request_id, INVALID_REQUEST, '无效的请求'))
+            return
+
+        method = request['method']
+        params = request.get('params')
+        if params is None:
+            params = {}
+        elif not isinstance(params, dict):
+            send(_error(request_id, INVALID_PARAMS, 'params 必须是对象'))
+            return
+
+        if method == 'analyze':
+            if request_id is None:
+                send(_error(None, INVALID_REQUEST, 'analyze 请求必须带 id'))
+                return
+            for name in ('timeout', 'deadline'):
+                value = params.get(name)
+                if value is not None and not (_is_number(value) and value > 0):
+                    send(_error(request_id, INVALID_PARAMS, f"{name} 必须是正数"))
+                    return
+
+            def on_done(job_id, result, error):
+                send(_error(request_id, error['code'], error['message'], error.get('data')) if error
+                     else {'jsonrpc': '2.0', 'id': request_id, 'result': result})
+
+            def on_progress(job_id, record):
+                send({'jsonrpc': '2.0', 'method': 'progress', 'params': {'job_id': request_id, **record}})
+            try:
+                self.pool.submit((connection, request_id), params, on_done, params.get('timeout'), on_progress)
+            except JobError as e:
+                send(_error(request_id, e.code, str(e)))
+        elif method == 'cancel':
+            if not _valid_id(params.get('job_id')):
+                send(_error(request_id, INVALID_PARAMS, 'job_id 必须是字符串或整数'))
+                return
+            found = self.pool.cancel((connection, params.get('job_id')))
+            send({'jsonrpc': '2.0', 'id': request_id, 'result': {'cancelled': found}})
+        elif method == 'status':
+            send({'jsonrpc': '2.0', 'id': request_id, 'result': self.pool.status()})
+        elif method == 'ping':
+            send({'jsonrpc': '2.0', 'id': request_id, 'result': 'pong'})
+        elif method == 'shutdown':
+            send({'jsonrpc': '2.0', 'id': request_id, 'result': True})
+            self.stopping.set()
+        else:
+            send(_error(request_id, METHOD_NOT_FOUND, f"未知方法: {method}"))
+
+    def serve_stdio(self):
+        """从stdin读取请求，向stdout写响应"""
+        write_lock = threading.Lock()
+
+        def send(message):
+            with write_lock:
+                sys.stdout.write(json.dumps(message, ensure_ascii=False) + '\n')
+                sys.stdout.flush()
+
+        send({'jsonrpc': '2.0', 'method': 'ready', 'params': self.pool.status()})
+        for line in sys.stdin:
+            if line.strip():
+                self.handle_line(line, send)
+            if self.stopping.is_set():
+                break
+
+    def serve_unix(self, socket_path):
+        """在Unix socket上监听，每个连接一个线程"""
+        import socketserver
+
+        rpc = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                connection = next(rpc._connections)
+                write_lock = threading.Lock()
+
+                def send(message):
+                    with write_lock:
+                        try:
+                            self.wfile.write((json.dumps(message, ensure_ascii=False) + '\n').encode('utf-8'))
+                            self.wfile.flush()
+                        except (OSError, ValueError):
+                            # 客户端已断开（连接关闭后写入抛出 ValueError）
+                            pass
+
+                for raw in self.rfile:
+                    if raw.strip():
+                        rpc.handle_line(raw.decode('utf-8'), send, connection)
+                    if rpc.stopping.is_set():
+                        break
+
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        with socketserver.ThreadingUnixStreamServer(socket_path, Handler) as server:
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self.stopping.wait()
+            server.shutdown()
+        os.remove(socket_path)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _valid_id(value):
+    """请求id只能是字符串、整数或省略（通知）；其他类型不能作为任务的键"""
+    return value is None or (isinstance(value, (str, int)) and not isinstance(value, bool))
+
+
+def _error(request_id, code, message, data=None):
+    error = {'code': code, 'message': message}
+    if data is not None:
+        error['data'] = data
+    return {'jsonrpc': '2.0', 'id': request_id, 'error': error}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='常驻的PCAP分析服务（JSON-RPC）')
+    parser.add_argument('--workers', type=int, default=max(1, min(4, (os.cpu_count() or 2) - 1)),
+                        help='工作进程数')
+    parser.add_argument('--max-queue', type=int, default=64, help='最多排队的任务数')
+    parser.add_argument('--timeout', type=float, default=120.0, help='单个任务的默认超时（秒）')
+    parser.add_argument('--socket', metavar='PATH', help='监听Unix socket而不是stdin/stdout')
+    args = parser.parse_args(argv)
+
+    pool = WorkerPool(workers=args.workers, max_queue=args.max_queue, default_timeout=args.timeout)
+    server = RpcServer(pool)
+    try:
+        if args.socket:
+            server.serve_unix(args.socket)
+        else:
+            server.serve_stdio()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+import heapq
+import random
+
+
+def percentile(sorted_values, q):
+    """对已排序的序列求百分位数（线性插值），q取0-100"""
+    if not sorted_values:
+        return 0.0
+    if len(sorted_values) == 1:
+        return float(sorted_values[0])
+    rank = (len(sorted_values) - 1) * q / 100.0
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+class BoundedSample:
+    """有界样本：精确记录数量/总和/最值，百分位数基于蓄水池抽样"""
+
+    def __init__(self, capacity=10000, seed=0):
+        self.capacity = capacity
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.samples = []
+        self._random = random.Random(seed)
+
+    def add(self, value):
+        """加入一个观测值"""
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+        if len(self.samples) < self.capacity:
+            self.samples.append(value)
+        else:
+            index = self._random.randrange(self.count)
+            if index < self.capacity:
+                self.samples[index] = value
+
+    def merge(self, other):
+        """并入另一个样本（另一个文件或分片的统计）
+
+        数量/总和/最值精确相加；两边的样本合计超过容量时，按各自代表的观测数比例随机抽取，
+        合并后的样本仍可看作全部观测的均匀抽样。
+        """
+        if not other.count:
+            return
+        count = self.count + other.count
+        if len(self.samples) + len(other.samples) <= self.capacity:
+            self.samples.extend(other.samples)
+        else:
+            take = min(len(self.samples), round(self.capacity * self.count / count))
+            other_take = min(len(other.samples), self.capacity - take)
+            self.samples = self._random.sample(self.samples, take) + self._random.sample(other.samples, other_take)
+        self.count = count
+        self.total += other.total
+        if self.min is None or other.min < self.min:
+            self.min = other.min
+        if self.max is None or other.max > self.max:
+            self.max = other.max
+
+    def summary(self, scale=1.0, percentiles=(50, 90, 99)):
+        """返回 count/avg/min/max 及各百分位数，数值乘以scale（如秒转毫秒）"""
+        if not self.count:
+            return {'count': 0}
+        ordered = sorted(self.samples)
+        result = {
+            'count': self.count,
+            'avg': self.total / self.count * scale,
+            'min': self.min * scale,
+            'max': self.max * scale
+        }
+        for q in percentiles:
+            result[f"p{q}"] = percentile(ordered, q) * scale
+        return result
+
+
+class TopCounter:
+    """有界的频繁项计数：最多保存 2*capacity 个键
+
+    键数达到上限时只保留计数最大的 capacity 个，被丢弃键的最大计数记为下限 floor；
+    之后新出现的键从 floor 开始计数，因此每个计数最多高估 floor（error 字段）。
+    每次累加均摊O(1)，内存与不同键的数量无关。
+    """
+
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.floor = 0
+        self.total = 0
+
+    def add(self, key, count=1):
+        """累加一个键的计数"""
+        self.total += count
+        counts = self.counts
+        current = counts.get(key)
+        if current is not None:
+            counts[key] = current + count
+            return
+        if len(counts) >= 2 * self.capacity:
+            self._compact()
+        counts[key] = self.floor + count
+        if self.floor:
+            self.errors[key] = self.floor
+
+    def merge(self, other):
+        """并入另一个计数器
+
+        两边都有的键计数相加；只在一边出现的键，在另一边的真实计数不超过那一边的 floor，
+        按 floor 计入并加到最大高估量中。合并后每个计数仍是真实值的上界，floor 为两边之和。
+        两边都未丢弃过键（floor 为0）时结果是精确的。
+        """
+        merged = {}
+        errors = {}
+        for key, count in self.counts.items():
+            other_count = other.counts.get(key)
+            if other_count is None:
+                merged[key] = count + other.floor
+                error = self.errors.get(key, 0) + other.floor
+            else:
+                merged[key] = count + other_count
+                error = self.errors.get(key, 0) + other.errors.get(key, 0)
+            if error:
+                errors[key] = error
+        for key, count in other.counts.items():
+            if key not in merged:
+                merged[key] = count + self.floor
+                error = other.errors.get(key, 0) + self.floor
+                if error:
+                    errors[key] = error
+        self.counts = merged
+        self.errors = errors
+        self.floor += other.floor
+        self.total += other.total
+        if len(merged) > 2 * self.capacity:
+            self._compact()
+
+    def _compact(self):
+        kept = dict(heapq.nlargest(self.capacity, self.counts.items(), key=lambda x: x[1]))
+        dropped = [count for key, count in self.counts.items() if key not in kept]
+        if dropped:
+            self.floor = max(self.floor, max(dropped))
+        self.errors = {key: error for key, error in self.errors.items() if key in kept}
+        self.counts = kept
+
+    def top(self, n=10):
+        """返回计数最大的 n 个键 [(键, 计数, 最大高估量)]"""
+        ranked = heapq.nlargest(n, self.counts.items(), key=lambda x: x[1])
+        return [(key, count, self.errors.get(key, 0)) for key, count in ranked]
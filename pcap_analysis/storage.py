@@ -0,0 +1,472 @@
+"""temp/ 下抓包文件的存储管理：容量上限、按时间保留、后台压缩和目录清单
+
+    python -m pcap_analysis.storage list [--json]
+    python -m pcap_analysis.storage sync
+    python -m pcap_analysis.storage enforce
+
+抓包文件（*.pcap、*.pcapng、压缩后的 *.gz）和 capture.py 的文本备份（*_backup.txt）
+记录在 temp/captures.json 中（大小、包数、时间范围、接口），列出抓包时只读这个文件。
+enforce 先删除超过保留期的文件，再按从旧到新删除直到总大小不超过上限（正在抓包的文件不删除），
+然后把结束超过 compress_after 秒的抓包交给后台低优先级进程压缩为 .gz。
+目录清单可能与磁盘不一致（手动复制或删除了文件）时用 sync 重新扫描目录。
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import shutil
+import argparse
+import subprocess
+from contextlib import contextmanager
+
+from .pcapfile import read_pcap_header
+
+# 默认存储目录：项目根目录下的 temp（与 capture.py 相同）
+DEFAULT_STORAGE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'temp')
+CATALOG_NAME = 'captures.json'
+CATALOG_VERSION = 1
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+DEFAULT_RETENTION_DAYS = 7
+DEFAULT_COMPRESS_AFTER = 3600
+CAPTURE_SUFFIXES = ('.pcap', '.pcapng', '.cap', '.pcap.gz', '.pcapng.gz', '.cap.gz')
+BACKUP_SUFFIX = '_backup.txt'
+# 与抓包文件同名的附属文件（follow 的流索引），随抓包一起删除
+SIDECAR_SUFFIXES = ('.flowidx',)
+# 抓包进程异常退出后，超过这个时间没有写入的“正在抓包”条目视为已结束
+ACTIVE_STALE_SECONDS = 3600
+LOCK_TIMEOUT = 10.0
+STALE_LOCK_SECONDS = 60
+# 锁外扫描期间文件发生变化时最多扫描的次数
+SCAN_ATTEMPTS = 3
+COPY_BUFFER = 1024 * 1024
+
+
+def _env_number(name, default, scale=1):
+    value = os.environ.get(name)
+    return float(value) * scale if value else default
+
+
+def file_kind(name):
+    """按文件名区分抓包文件和文本备份；不由存储管理的文件返回None"""
+    lower = name.lower()
+    if lower.endswith(BACKUP_SUFFIX):
+        return 'backup'
+    if lower.endswith(CAPTURE_SUFFIXES):
+        return 'capture'
+    return None
+
+
+def scan_capture(path):
+    """读取记录头统计包数和首末时间戳，返回 (包数, 首时间戳, 末时间戳)
+
+    只读取每个记录的16字节头并跳过数据；不是pcap格式（如pcapng）时三项都为None，
+    末尾不完整的记录不计入。
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    try:
+        with opener(path, 'rb') as f:
+            header = read_pcap_header(f)
+            record_header = header['record_header']
+            ts_divisor = header['ts_divisor']
+            packets = 0
+            first_ts = last_ts = None
+            while True:
+                head = f.read(record_header.size)
+                if len(head) < record_header.size:
+                    break
+                ts_sec, ts_frac, incl_len, _ = record_header.unpack(head)
+                if len(f.read(incl_len)) < incl_len:
+                    break
+                ts = ts_sec + ts_frac / ts_divisor
+                if first_ts is None:
+                    first_ts = ts
+                last_ts = ts
+                packets += 1
+    except Exception:
+        # 读取失败、gzip数据损坏，或 read_pcap_header 判定不是pcap文件
+        return None, None, None
+    return packets, first_ts, last_ts
+
+
+class CaptureStore:
+    """抓包目录的存储管理
+
+    目录清单为 {文件名: 条目}，条目记录类型（capture/backup）、状态（active/complete/compressing）、
+    大小、修改时间、包数、首末时间戳和接口列表。多个进程（抓包、分析服务、命令行）
+    通过同目录下的锁文件串行修改清单，清单以原子替换方式写入；
+    扫描抓包文件（大文件可能超过锁的过期时间）不持有锁，写入前在锁内确认文件没有再变化。
+    """
+
+    def __init__(self, root=None, max_bytes=None, retention_days=None, compress_after=None, min_free_bytes=None):
+        self.root = root or os.environ.get('PCAP_STORAGE_DIR') or DEFAULT_STORAGE_DIR
+        self.max_bytes = max_bytes if max_bytes is not None else \
+            _env_number('PCAP_STORAGE_MAX_MB', DEFAULT_MAX_BYTES, 1024 * 1024)
+        self.retention_days = retention_days if retention_days is not None else \
+            _env_number('PCAP_STORAGE_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)
+        self.compress_after = compress_after if compress_after is not None else \
+            _env_number('PCAP_STORAGE_COMPRESS_AFTER_MIN', DEFAULT_COMPRESS_AFTER, 60)
+        # 磁盘剩余空间低于这个值时也继续删除旧抓包（0表示不检查）
+        self.min_free_bytes = min_free_bytes if min_free_bytes is not None else \
+            _env_number('PCAP_STORAGE_MIN_FREE_MB', 0, 1024 * 1024)
+        self.catalog_path = os.path.join(self.root, CATALOG_NAME)
+        self.lock_path = self.catalog_path + '.lock'
+
+    @contextmanager
+    def _lock(self):
+        os.makedirs(self.root, exist_ok=True)
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while True:
+            try:
+                fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                try:
+                    # 持有锁的进程异常退出时留下的锁文件
+                    if time.time() - os.path.getmtime(self.lock_path) > STALE_LOCK_SECONDS:
+                        os.remove(self.lock_path)
+                        continue
+                except OSError:
+                    continue
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"等待目录清单锁超时: {self.lock_path}")
+                time.sleep(0.05)
+        try:
+            yield
+        finally:
+            os.close(fd)
+            try:
+                os.remove(self.lock_path)
+            except OSError:
+                pass
+
+    def _load(self):
+        try:
+            with open(self.catalog_path, 'r', encoding='utf-8') as f:
+                catalog = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if catalog.get('version') != CATALOG_VERSION:
+            return None
+        return catalog['captures']
+
+    def _save(self, captures):
+        tmp_path = f"{self.catalog_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': CATALOG_VERSION, 'captures': captures}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.catalog_path)
+
+    @contextmanager
+    def _locked(self):
+        """加锁读取清单（没有或格式不对时为空清单），退出时写回"""
+        with self._lock():
+            captures = self._load()
+            if captures is None:
+                captures = {}
+            yield captures
+            self._save(captures)
+
+    @contextmanager
+    def _edit(self):
+        """加锁读取清单，退出时写回；没有清单时先扫描目录建立清单"""
+        if self._load() is None:
+            self.sync()
+        with self._locked() as captures:
+            yield captures
+
+    def _describe(self, name, interfaces=None, state='complete'):
+        path = os.path.join(self.root, name)
+        stats = os.stat(path)
+        kind = file_kind(name)
+        entry = {
+            'kind': kind,
+            'state': state,
+            'size': stats.st_size,
+            'modified': stats.st_mtime,
+            'packets': None,
+            'first_ts': None,
+            'last_ts': None,
+            'interfaces': list(interfaces or [])
+        }
+        if kind == 'capture' and state != 'active':
+            entry['packets'], entry['first_ts'], entry['last_ts'] = scan_capture(path)
+        return entry
+
+    def _rescan(self, captures):
+        """按目录内容更新清单：去掉已不存在的文件，返回需要（在锁外）扫描的新文件和大小或修改时间变化的文件
+
+        返回 {文件名: 接口列表}。
+        """
+        now = time.time()
+        present = set()
+        pending = {}
+        for item in os.scandir(self.root) if os.path.isdir(self.root) else ():
+            if not item.is_file() or file_kind(item.name) is None:
+                continue
+            present.add(item.name)
+            entry = captures.get(item.name)
+            try:
+                stats = item.stat()
+            except OSError:
+                continue
+            if entry is not None and entry['size'] == stats.st_size and entry['modified'] == stats.st_mtime:
+                continue
+            if entry is not None and entry['state'] == 'active' and now - stats.st_mtime < ACTIVE_STALE_SECONDS:
+                entry['size'], entry['modified'] = stats.st_size, stats.st_mtime
+                continue
+            pending[item.name] = entry['interfaces'] if entry else None
+        for name in list(captures):
+            if name not in present:
+                del captures[name]
+        return pending
+
+    def _scan(self, pending):
+        """不持有锁扫描文件（大文件可能需要很长时间），返回 {文件名: 条目}"""
+        scanned = {}
+        for name, interfaces in pending.items():
+            try:
+                scanned[name] = self._describe(name, interfaces)
+            except OSError:
+                continue
+        return scanned
+
+    def _store(self, scanned, finishing=False):
+        """把锁外扫描得到的条目写入清单，返回清单
+
+        写入前在锁内重新检查大小和修改时间：扫描期间文件又有变化的重新扫描，
+        重试 SCAN_ATTEMPTS 次后仍在变化的按扫描时的大小写入（下次 sync 会再扫描）。
+        正在抓包（扫描期间刚被登记）的文件保持原条目，finishing 为真（抓包结束）时除外。
+        """
+        for attempt in range(1, SCAN_ATTEMPTS + 1):
+            changed = {}
+            with self._locked() as captures:
+                for name, entry in scanned.items():
+                    try:
+                        stats = os.stat(os.path.join(self.root, name))
+                    except OSError:
+                        captures.pop(name, None)
+                        continue
+                    current = captures.get(name)
+                    if (not finishing and current is not None and current['state'] == 'active'
+                            and time.time() - stats.st_mtime < ACTIVE_STALE_SECONDS):
+                        continue
+                    if (stats.st_size, stats.st_mtime) != (entry['size'], entry['modified']) \
+                            and attempt < SCAN_ATTEMPTS:
+                        changed[name] = entry['interfaces']
+                        continue
+                    captures[name] = entry
+            if not changed:
+                break
+            scanned = self._scan(changed)
+        return captures
+
+    def list(self):
+        """返回目录清单 {文件名: 条目}，只读取清单文件"""
+        captures = self._load()
+        if captures is None:
+            captures = self.sync()
+        return captures
+
+    def sync(self):
+        """重新扫描目录并更新清单"""
+        with self._locked() as captures:
+            pending = self._rescan(captures)
+        if not pending:
+            return captures
+        return self._store(self._scan(pending))
+
+    def begin(self, path, interface=None):
+        """开始抓包：先按上限腾出空间，再把输出文件登记为正在抓包（不会被删除或压缩）"""
+        self.enforce(compress=False)
+        name = os.path.basename(path)
+        with self._edit() as captures:
+            captures[name] = {
+                'kind': file_kind(name) or 'capture',
+                'state': 'active',
+                'size': os.path.getsize(path) if os.path.exists(path) else 0,
+                'modified': time.time(),
+                'packets': None,
+                'first_ts': None,
+                'last_ts': None,
+                'interfaces': [interface] if interface else []
+            }
+
+    def finish(self, path, interface=None):
+        """抓包结束：扫描文件补全包数和时间范围；同名的文本备份一起登记"""
+        name = os.path.basename(path)
+        names = [name]
+        backup = os.path.splitext(name)[0] + BACKUP_SUFFIX
+        if os.path.exists(os.path.join(self.root, backup)):
+            names.append(backup)
+        with self._edit() as captures:
+            pending = {}
+            for item in names:
+                if not os.path.exists(os.path.join(self.root, item)):
+                    captures.pop(item, None)
+                    continue
+                previous = captures.get(item, {}).get('interfaces') or []
+                pending[item] = previous + [interface] if interface and interface not in previous else previous
+        return self._store(self._scan(pending), finishing=True).get(name)
+
+    def _remove(self, captures, name):
+        path = os.path.join(self.root, name)
+        for target in (path,) + tuple(path + suffix for suffix in SIDECAR_SUFFIXES):
+            try:
+                os.remove(target)
+            except FileNotFoundError:
+                pass
+        del captures[name]
+
+    def enforce(self, compress=True):
+        """执行保留期和容量上限，返回删除的文件名列表；compress 为真时安排后台压缩"""
+        now = time.time()
+        removed = []
+        with self._edit() as captures:
+            # 从旧到新：先删超过保留期的，再删到总大小和剩余空间都满足要求为止
+            candidates = sorted((entry['modified'], name) for name, entry in captures.items()
+                                if entry['state'] == 'complete')
+            total = sum(entry['size'] for entry in captures.values())
+            cutoff = now - self.retention_days * 86400 if self.retention_days else None
+            for modified, name in candidates:
+                if not ((cutoff is not None and modified < cutoff) or total > self.max_bytes
+                        or self._low_on_space()):
+                    break
+                size = captures[name]['size']
+                try:
+                    self._remove(captures, name)
+                except OSError:
+                    continue
+                total -= size
+                removed.append(name)
+
+            pending = []
+            if compress:
+                for name, entry in captures.items():
+                    if (entry['kind'] == 'capture' and entry['state'] == 'complete'
+                            and not name.endswith('.gz') and now - entry['modified'] >= self.compress_after):
+                        entry['state'] = 'compressing'
+                        entry['compress_started'] = now
+                        pending.append(name)
+                    elif entry['state'] == 'compressing' and now - entry.get('compress_started', 0) > ACTIVE_STALE_SECONDS:
+                        # 压缩进程异常退出，下次重新安排
+                        entry['state'] = 'complete'
+        if pending:
+            self._spawn_compressor(pending)
+        return removed
+
+    def _low_on_space(self):
+        if not self.min_free_bytes:
+            return False
+        try:
+            return shutil.disk_usage(self.root).free < self.min_free_bytes
+        except OSError:
+            return False
+
+    def _spawn_compressor(self, names):
+        """启动独立的低优先级进程依次压缩，不等待它结束（抓包进程退出后继续运行）"""
+        command = [sys.executable, '-m', 'pcap_analysis.storage', '--root', os.path.abspath(self.root), 'compress'] + names
+        options = {'cwd': os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                   'stdin': subprocess.DEVNULL, 'stdout': subprocess.DEVNULL, 'stderr': subprocess.DEVNULL}
+        if os.name == 'nt':
+            # 空闲优先级的进程在 Windows 上同时使用低I/O优先级
+            options['creationflags'] = subprocess.IDLE_PRIORITY_CLASS | subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            options['start_new_session'] = True
+            if shutil.which('ionice'):
+                command = ['ionice', '-c', '3'] + command
+        subprocess.Popen(command, **options)
+
+    def compress(self, name):
+        """把一个已结束的抓包压缩为 name.gz 并删除原文件，返回压缩后的文件名；文件已变化时不压缩"""
+        path = os.path.join(self.root, name)
+        with self._edit() as captures:
+            entry = captures.get(name)
+            if entry is None or entry['state'] != 'compressing':
+                return None
+            size = entry['size']
+        tmp_path = f"{path}.gz.{os.getpid()}.tmp"
+        try:
+            with open(path, 'rb') as src, gzip.open(tmp_path, 'wb', compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, COPY_BUFFER)
+            changed = os.path.getsize(path) != size
+        except OSError:
+            changed = True
+        with self._edit() as captures:
+            entry = captures.get(name)
+            if changed or entry is None or entry['state'] != 'compressing':
+                if entry is not None and entry['state'] == 'compressing':
+                    entry['state'] = 'complete'
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                return None
+            stats = os.stat(path)
+            os.replace(tmp_path, path + '.gz')
+            os.utime(path + '.gz', (stats.st_atime, stats.st_mtime))
+            os.remove(path)
+            for suffix in SIDECAR_SUFFIXES:
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+            del captures[name]
+            entry.pop('compress_started', None)
+            entry.update(state='complete', original_size=size, size=os.path.getsize(path + '.gz'))
+            captures[name + '.gz'] = entry
+        return name + '.gz'
+
+
+def _lower_priority():
+    """后台压缩进程降低CPU优先级（I/O优先级由启动方式设置）"""
+    if hasattr(os, 'nice'):
+        try:
+            os.nice(19)
+        except OSError:
+            pass
+
+
+def _format_time(ts):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts)) if ts is not None else '-'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='抓包目录的容量上限、保留期、后台压缩和目录清单')
+    parser.add_argument('--root', help='抓包目录，默认为项目根目录下的 temp')
+    commands = parser.add_subparsers(dest='command', required=True)
+    listing = commands.add_parser('list', help='列出抓包（只读目录清单）')
+    listing.add_argument('--json', action='store_true', help='输出JSON')
+    commands.add_parser('sync', help='重新扫描目录，更新目录清单')
+    commands.add_parser('enforce', help='执行保留期和容量上限，安排后台压缩')
+    compress = commands.add_parser('compress', help='压缩已结束的抓包（由 enforce 在后台调用）')
+    compress.add_argument('names', nargs='+', help='文件名')
+
+    args = parser.parse_args(argv)
+    store = CaptureStore(args.root)
+    try:
+        if args.command == 'list':
+            captures = store.list()
+            if args.json:
+                print(json.dumps(captures, ensure_ascii=False, indent=2))
+                return 0
+            total = sum(entry['size'] for entry in captures.values())
+            print(f"{store.root}: {len(captures)} 个文件, 共 {total / 1024 / 1024:.1f} MB "
+                  f"(上限 {store.max_bytes / 1024 / 1024:.0f} MB)")
+            for name, entry in sorted(captures.items(), key=lambda item: item[1]['modified'], reverse=True):
+                packets = entry['packets'] if entry['packets'] is not None else '-'
+                interfaces = ','.join(entry['interfaces']) or '-'
+                print(f"- {name} [{entry['state']}] {entry['size']}字节, {packets}个包, "
+                      f"{_format_time(entry['first_ts'])} ~ {_format_time(entry['last_ts'])}, 接口 {interfaces}")
+        elif args.command == 'sync':
+            print(f"目录清单已更新，共 {len(store.sync())} 个文件")
+        elif args.command == 'enforce':
+            removed = store.enforce()
+            print(f"已删除 {len(removed)} 个文件" + (f": {', '.join(removed)}" if removed else ""))
+        else:
+            _lower_priority()
+            for name in args.names:
+                store.compress(name)
+    except (OSError, ValueError) as e:
+        print(f"处理失败: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,49 @@
+"""查看、合并分析汇总（检查点）文件
+
+    python -m pcap_analysis.summary show SUMMARY [--format text|json|digest]
+    python -m pcap_analysis.summary merge SUMMARY [SUMMARY ...] [-o OUT] [--format text|json|digest]
+
+汇总文件由 analyze 的 --checkpoint 选项生成（见 checkpoint 模块）。merge 按抓包的开始时间合并多个文件或
+edit split 切出的分片的汇总，输出与直接分析相同格式的报告，不重新读取pcap；-o 保存的合并结果可以继续合并。
+"""
+import sys
+import argparse
+
+from .checkpoint import load_summary, merge_summaries, save_summary, summary_result
+from .digest import digest
+from .result import print_result
+
+
+def main(argv=None):
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--format', choices=['text', 'json', 'digest'], default='text',
+                        help='输出格式：文本报告、结构化JSON（含文本报告）或限定长度的摘要')
+    parser = argparse.ArgumentParser(description='查看、合并分析汇总（检查点）文件')
+    sub = parser.add_subparsers(dest='command', required=True)
+    show = sub.add_parser('show', parents=[common], help='由汇总文件生成报告')
+    show.add_argument('summary', help='汇总文件')
+    merge = sub.add_parser('merge', parents=[common], help='合并多个文件或分片的汇总并生成报告')
+    merge.add_argument('summaries', nargs='+', help='汇总文件')
+    merge.add_argument('-o', '--output', help='把合并后的汇总写入该文件')
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == 'show':
+            stats, meta = load_summary(args.summary)
+        else:
+            stats, meta = merge_summaries(args.summaries)
+            if args.output:
+                save_summary(args.output, stats, meta['sources'], meta['options'])
+    except (OSError, ValueError) as e:
+        print(f"处理失败: {e}", file=sys.stderr)
+        return 1
+    result = summary_result(stats, meta)
+    if args.format == 'digest':
+        print(digest(result))
+    else:
+        print_result(result, args.format)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,365 @@
+import heapq
+import struct
+from collections import OrderedDict
+
+from .stats import BoundedSample
+
+# 源端口、目的端口、序号、确认号、数据偏移、标志位、窗口
+TCP_HEADER = struct.Struct('>HHLLBBH')
+
+FIN = 0x01
+SYN = 0x02
+RST = 0x04
+ACK = 0x10
+
+SEQ_MASK = 0xFFFFFFFF
+
+
+def seq_after(a, b):
+    """按32位序号回绕规则判断 a 是否在 b 之后"""
+    return a != b and ((a - b) & SEQ_MASK) < 0x80000000
+
+
+class _Direction:
+    """连接单个方向的序号/确认状态"""
+    __slots__ = ('max_seq_end', 'last_ack', 'last_window', 'timed_seq', 'timed_ts',
+                 'packets', 'data_segments', 'retransmissions')
+
+    def __init__(self):
+        self.max_seq_end = None
+        self.last_ack = None
+        self.last_window = None
+        # 正在计时的数据段（每个方向同时只计时一个，Karn算法）
+        self.timed_seq = None
+        self.timed_ts = 0.0
+        self.packets = 0
+        self.data_segments = 0
+        self.retransmissions = 0
+
+    def merge(self, other, continues):
+        """累加另一段统计中同一方向的计数；continues 为真时 other 较晚，沿用其序号/确认状态"""
+        self.packets += other.packets
+        self.data_segments += other.data_segments
+        self.retransmissions += other.retransmissions
+        if continues:
+            self.max_seq_end = other.max_seq_end
+            self.last_ack = other.last_ack
+            self.last_window = other.last_window
+            self.timed_seq = other.timed_seq
+            self.timed_ts = other.timed_ts
+
+
+class _Connection:
+    """单条TCP连接的状态"""
+    __slots__ = ('key', 'client', 'dirs', 'syn_ts', 'handshake_rtt', 'first_ts', 'last_ts',
+                 'rtt_count', 'rtt_total', 'rtt_max', 'dup_acks', 'zero_windows')
+
+    def __init__(self, key, ts):
+        self.key = key
+        self.client = None
+        self.dirs = (_Direction(), _Direction())
+        self.syn_ts = None
+        self.handshake_rtt = None
+        self.first_ts = ts
+        self.last_ts = ts
+        self.rtt_count = 0
+        self.rtt_total = 0.0
+        self.rtt_max = 0.0
+        self.dup_acks = 0
+        self.zero_windows = 0
+
+    def merge(self, other):
+        """并入另一段统计中的同一条连接（如跨越分片边界的连接）"""
+        continues = other.last_ts >= self.last_ts
+        for mine, theirs in zip(self.dirs, other.dirs):
+            mine.merge(theirs, continues)
+        if self.syn_ts is None:
+            self.client = other.client
+            self.syn_ts = other.syn_ts
+        if self.handshake_rtt is None:
+            self.handshake_rtt = other.handshake_rtt
+        self.first_ts = min(self.first_ts, other.first_ts)
+        self.last_ts = max(self.last_ts, other.last_ts)
+        self.rtt_count += other.rtt_count
+        self.rtt_total += other.rtt_total
+        self.rtt_max = max(self.rtt_max, other.rtt_max)
+        self.dup_acks += other.dup_acks
+        self.zero_windows += other.zero_windows
+
+    def label(self):
+        a_ip, a_port, b_ip, b_port = self.key
+        if self.client == 1:
+            a_ip, a_port, b_ip, b_port = b_ip, b_port, a_ip, a_port
+        return f"{a_ip}:{a_port} <-> {b_ip}:{b_port}"
+
+    def summary(self):
+        packets = self.dirs[0].packets + self.dirs[1].packets
+        data_segments = self.dirs[0].data_segments + self.dirs[1].data_segments
+        retransmissions = self.dirs[0].retransmissions + self.dirs[1].retransmissions
+        return {
+            'connection': self.label(),
+            'packets': packets,
+            'data_segments': data_segments,
+            'retransmissions': retransmissions,
+            'retransmission_rate': retransmissions / data_segments if data_segments else 0.0,
+            'dup_acks': self.dup_acks,
+            'zero_windows': self.zero_windows,
+            'handshake_rtt_ms': self.handshake_rtt * 1000 if self.handshake_rtt is not None else None,
+            'avg_rtt_ms': self.rtt_total / self.rtt_count * 1000 if self.rtt_count else None,
+            'max_rtt_ms': self.rtt_max * 1000 if self.rtt_count else None,
+            'duration': self.last_ts - self.first_ts
+        }
+
+
+class TcpAnalyzer:
+    """流式TCP性能分析：重传、重复ACK、零窗口、握手时延和数据往返时延
+
+    每条连接只保存固定大小的状态，连接表按最近活跃顺序排列：
+    超过 idle_timeout 未活动或超过 max_flows 时淘汰最久未活动的连接，每包开销为O(1)。
+    """
+
+    def __init__(self, max_flows=100000, idle_timeout=300.0, top_n=5, min_data_segments=10):
+        self.max_flows = max_flows
+        self.idle_timeout = idle_timeout
+        self.top_n = top_n
+        self.min_data_segments = min_data_segments
+
+        self.connections = OrderedDict()
+        self.connections_seen = 0
+        self.handshakes = 0
+        self.segments = 0
+        self.data_segments = 0
+        self.retransmissions = 0
+        self.dup_acks = 0
+        self.zero_windows = 0
+        self.resets = 0
+        self.evicted = 0
+        self.handshake_rtt = BoundedSample()
+        self.data_rtt = BoundedSample()
+
+        # 已结束连接中重传率/时延最高的若干条（小顶堆）
+        self._top_retrans = []
+        self._top_rtt = []
+        self._finished_seq = 0
+
+    def process(self, ts, src_ip, dst_ip, segment, payload_len=None):
+        """处理一个TCP段；segment 从TCP头开始，payload_len 为IP总长度推出的载荷长度"""
+        if len(segment) < TCP_HEADER.size:
+            return
+        src_port, dst_port, seq, ack, offset, flags, window = TCP_HEADER.unpack_from(segment)
+        if payload_len is None:
+            payload_len = len(segment) - (offset >> 4) * 4
+        if payload_len < 0:
+            payload_len = 0
+
+        self.segments += 1
+
+        # 规范化的双向连接键，direction 为本包所在方向
+        if (src_ip, src_port) <= (dst_ip, dst_port):
+            key = (src_ip, src_port, dst_ip, dst_port)
+            direction = 0
+        else:
+            key = (dst_ip, dst_port, src_ip, src_port)
+            direction = 1
+
+        connections = self.connections
+        conn = connections.get(key)
+        if conn is None:
+            self._expire(ts)
+            if len(connections) >= self.max_flows:
+                self._finish(connections.popitem(last=False)[1])
+                self.evicted += 1
+            conn = _Connection(key, ts)
+            connections[key] = conn
+            self.connections_seen += 1
+        else:
+            connections.move_to_end(key)
+        conn.last_ts = ts
+
+        this_dir = conn.dirs[direction]
+        peer_dir = conn.dirs[1 - direction]
+        this_dir.packets += 1
+
+        # 三次握手：SYN -> SYN/ACK
+        if flags & SYN:
+            if not flags & ACK:
+                if conn.syn_ts is None:
+                    conn.syn_ts = ts
+                    conn.client = direction
+            elif conn.syn_ts is not None and conn.handshake_rtt is None and conn.client != direction:
+                conn.handshake_rtt = ts - conn.syn_ts
+                self.handshake_rtt.add(conn.handshake_rtt)
+                self.handshakes += 1
+
+        # 数据段：序号未推进则视为重传
+        seq_len = payload_len + (1 if flags & SYN else 0) + (1 if flags & FIN else 0)
+        if seq_len:
+            seq_end = (seq + seq_len) & SEQ_MASK
+            if this_dir.max_seq_end is not None and not seq_after(seq_end, this_dir.max_seq_end):
+                this_dir.retransmissions += 1
+                self.retransmissions += 1
+                # Karn算法：重传段覆盖的计时样本不可用
+                if this_dir.timed_seq is not None and not seq_after(seq, this_dir.timed_seq):
+                    this_dir.timed_seq = None
+            else:
+                this_dir.max_seq_end = seq_end
+                if payload_len and this_dir.timed_seq is None:
+                    this_dir.timed_seq = seq_end
+                    this_dir.timed_ts = ts
+            if payload_len:
+                this_dir.data_segments += 1
+                self.data_segments += 1
+
+        if flags & RST:
+            self.resets += 1
+        elif window == 0:
+            conn.zero_windows += 1
+            self.zero_windows += 1
+
+        if flags & ACK:
+            # 数据 -> ACK 往返时延
+            if peer_dir.timed_seq is not None and not seq_after(peer_dir.timed_seq, ack):
+                rtt = ts - peer_dir.timed_ts
+                peer_dir.timed_seq = None
+                self.data_rtt.add(rtt)
+                conn.rtt_count += 1
+                conn.rtt_total += rtt
+                if rtt > conn.rtt_max:
+                    conn.rtt_max = rtt
+
+            # 重复ACK：纯ACK、确认号和窗口不变，且对端仍有未确认数据
+            if (not payload_len and not flags & (SYN | FIN | RST)
+                    and ack == this_dir.last_ack and window == this_dir.last_window
+                    and peer_dir.max_seq_end is not None and seq_after(peer_dir.max_seq_end, ack)):
+                conn.dup_acks += 1
+                self.dup_acks += 1
+            this_dir.last_ack = ack
+            this_dir.last_window = window
+
+        if flags & RST:
+            self._finish(connections.pop(key))
+
+    def merge(self, other):
+        """并入另一个文件或分片的TCP统计，other 之后不应再使用
+
+        计数和时延样本相加；两边都有的连接合并为一条（分片边界处的第一个段不会被判为重传）。
+        合并后的连接表按最后活动时间排列，超过 max_flows 时结束最久未活动的连接。
+        """
+        overlap = 0
+        connections = self.connections
+        for key, conn in other.connections.items():
+            mine = connections.get(key)
+            if mine is None:
+                connections[key] = conn
+            else:
+                mine.merge(conn)
+                overlap += 1
+        self.connections = OrderedDict(sorted(connections.items(), key=lambda item: item[1].last_ts))
+        self.connections_seen += other.connections_seen - overlap
+        for name in ('handshakes', 'segments', 'data_segments', 'retransmissions', 'dup_acks',
+                     'zero_windows', 'resets', 'evicted'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.handshake_rtt.merge(other.handshake_rtt)
+        self.data_rtt.merge(other.data_rtt)
+        for heap, other_heap in ((self._top_retrans, other._top_retrans), (self._top_rtt, other._top_rtt)):
+            for score, _, summary in other_heap:
+                self._finished_seq += 1
+                self._push(heap, score, summary)
+        while len(self.connections) > self.max_flows:
+            self._finish(self.connections.popitem(last=False)[1])
+            self.evicted += 1
+
+    def _expire(self, now):
+        """淘汰超过空闲时间的连接（表头即最久未活动的连接）"""
+        connections = self.connections
+        while connections:
+            conn = next(iter(connections.values()))
+            if now - conn.last_ts < self.idle_timeout:
+                break
+            connections.popitem(last=False)
+            self._finish(conn)
+
+    def _finish(self, conn):
+        """连接结束时只保留进入排行榜所需的摘要"""
+        summary = conn.summary()
+        self._finished_seq += 1
+        if summary['data_segments'] >= self.min_data_segments and summary['retransmissions']:
+            self._push(self._top_retrans, summary['retransmission_rate'], summary)
+        if summary['avg_rtt_ms'] is not None:
+            self._push(self._top_rtt, summary['avg_rtt_ms'], summary)
+
+    def _push(self, heap, score, summary):
+        item = (score, self._finished_seq, summary)
+        if len(heap) < self.top_n:
+            heapq.heappush(heap, item)
+        elif score > heap[0][0]:
+            heapq.heapreplace(heap, item)
+
+    def _ranked(self):
+        """合并已结束和仍活跃的连接，返回重传率/时延排行"""
+        top_retrans = list(self._top_retrans)
+        top_rtt = list(self._top_rtt)
+        for conn in self.connections.values():
+            summary = conn.summary()
+            if summary['data_segments'] >= self.min_data_segments and summary['retransmissions']:
+                top_retrans.append((summary['retransmission_rate'], 0, summary))
+            if summary['avg_rtt_ms'] is not None:
+                top_rtt.append((summary['avg_rtt_ms'], 0, summary))
+        top_retrans = [item[2] for item in heapq.nlargest(self.top_n, top_retrans, key=lambda x: x[0])]
+        top_rtt = [item[2] for item in heapq.nlargest(self.top_n, top_rtt, key=lambda x: x[0])]
+        return top_retrans, top_rtt
+
+    def summary(self):
+        """返回汇总统计"""
+        top_retrans, top_rtt = self._ranked()
+        return {
+            'connections': self.connections_seen,
+            'handshakes': self.handshakes,
+            'segments': self.segments,
+            'data_segments': self.data_segments,
+            'retransmissions': self.retransmissions,
+            'retransmission_rate': self.retransmissions / self.data_segments if self.data_segments else 0.0,
+            'dup_acks': self.dup_acks,
+            'zero_windows': self.zero_windows,
+            'resets': self.resets,
+            'evicted_connections': self.evicted,
+            'handshake_rtt_ms': self.handshake_rtt.summary(scale=1000),
+            'data_rtt_ms': self.data_rtt.summary(scale=1000),
+            'top_retransmission': top_retrans,
+            'top_latency': top_rtt
+        }
+
+    def format_report(self):
+        """生成TCP性能分析的文本报告段落"""
+        if not self.segments:
+            return ""
+        summary = self.summary()
+
+        report = "TCP性能分析:\n"
+        report += f"- TCP连接数: {summary['connections']} (完成握手 {summary['handshakes']})\n"
+        report += (f"- 重传: {summary['retransmissions']}个 "
+                   f"(占数据段 {summary['retransmission_rate'] * 100:.2f}%)\n")
+        report += f"- 重复ACK: {summary['dup_acks']}个\n"
+        report += f"- 零窗口: {summary['zero_windows']}个\n"
+        report += f"- 连接重置(RST): {summary['resets']}个\n"
+        for label, rtt in (('握手时延(SYN→SYN/ACK)', summary['handshake_rtt_ms']),
+                           ('数据往返时延(RTT)', summary['data_rtt_ms'])):
+            if rtt['count']:
+                report += (f"- {label}: 平均 {rtt['avg']:.2f} ms, P50 {rtt['p50']:.2f} ms, "
+                           f"P99 {rtt['p99']:.2f} ms, 最大 {rtt['max']:.2f} ms ({rtt['count']}个样本)\n")
+        report += "\n"
+
+        if summary['top_retransmission']:
+            report += "重传率较高的连接:\n"
+            for conn in summary['top_retransmission']:
+                report += (f"- {conn['connection']}: 重传 {conn['retransmissions']}/{conn['data_segments']} "
+                           f"({conn['retransmission_rate'] * 100:.1f}%)\n")
+            report += "\n"
+
+        if summary['top_latency']:
+            report += "时延较高的连接:\n"
+            for conn in summary['top_latency']:
+                report += f"- {conn['connection']}: 平均RTT {conn['avg_rtt_ms']:.2f} ms, 最大 {conn['max_rtt_ms']:.2f} ms\n"
+            report += "\n"
+
+        return report
@@ -0,0 +1,333 @@
+import math
+import datetime
+from array import array
+from bisect import bisect_right
+
+from .stats import BoundedSample, percentile
+
+try:
+    import numpy as np
+except ImportError:  # 没有numpy时退回纯Python分桶
+    np = None
+
+# 数据包大小分布区间（与Wireshark Packet Lengths统计一致）
+PACKET_SIZE_BINS = (40, 80, 160, 320, 640, 1280, 2560, 5120)
+# 包间隔分布：第k个桶覆盖 [2^(k-1), 2^k) 微秒，最后一个桶收纳更大的间隔
+INTER_ARRIVAL_BUCKETS = 32
+
+
+def _size_bin_label(index):
+    if index == 0:
+        return f"0-{PACKET_SIZE_BINS[0] - 1}"
+    if index == len(PACKET_SIZE_BINS):
+        return f"{PACKET_SIZE_BINS[-1]}+"
+    return f"{PACKET_SIZE_BINS[index - 1]}-{PACKET_SIZE_BINS[index] - 1}"
+
+
+def _gap_bin_label(index):
+    if index == 0:
+        return "<1us"
+    low = 1 << (index - 1)
+    if index == INTER_ARRIVAL_BUCKETS - 1:
+        return f">={low}us"
+    return f"{low}-{(1 << index) - 1}us"
+
+
+class ThroughputSeries:
+    """单次遍历构建按时间间隔分桶的包数/字节数序列，以及包大小、包间隔分布
+
+    时间戳先批量缓存再统一分桶（有numpy时向量化）。桶数超过 max_buckets 时
+    把相邻两桶合并、间隔加倍，因此内存与抓包时长无关。
+    """
+
+    def __init__(self, interval=1.0, max_buckets=65536, batch_size=65536,
+                 burst_factor=3.0, drop_factor=0.1):
+        self.interval = max(interval, 0.001)
+        self.max_buckets = max_buckets
+        self.batch_size = batch_size
+        self.burst_factor = burst_factor
+        self.drop_factor = drop_factor
+
+        self.origin = None
+        self.packets = array('Q')
+        self.bytes = array('Q')
+        self.size_hist = [0] * (len(PACKET_SIZE_BINS) + 1)
+        self.gap_hist = [0] * INTER_ARRIVAL_BUCKETS
+        self.gap_sample = BoundedSample()
+        self.last_ts = None
+        self.first_ts = None
+
+        self._batch_ts = array('d')
+        self._batch_size = array('Q')
+
+    def add(self, ts, size):
+        """加入一个数据包（时间戳为秒）"""
+        self._batch_ts.append(ts)
+        self._batch_size.append(size)
+        if len(self._batch_ts) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """把缓存的一批数据包计入序列和分布"""
+        if not self._batch_ts:
+            return
+        timestamps = self._batch_ts
+        sizes = self._batch_size
+        self._batch_ts = array('d')
+        self._batch_size = array('Q')
+        self._process(timestamps, sizes)
+
+    def add_batch(self, timestamps, sizes):
+        """一次加入一批按时间顺序排列的数据包（numpy数组或序列），不经过逐包缓存"""
+        self.flush()
+        if len(timestamps):
+            self._process(timestamps, sizes)
+
+    def _process(self, timestamps, sizes):
+        if self.origin is None:
+            self.first_ts = float(timestamps[0])
+            self.origin = math.floor(timestamps[0] / self.interval) * self.interval
+
+        # 先按本批最大时间戳调整间隔，避免时间跨度很大时一次性分配过多桶
+        max_ts = float(np.max(timestamps)) if np is not None else max(timestamps)
+        while (max_ts - self.origin) // self.interval >= self.max_buckets:
+            self._coarsen()
+
+        if np is not None:
+            self._flush_numpy(timestamps, sizes)
+        else:
+            self._flush_python(timestamps, sizes)
+        self.last_ts = float(timestamps[-1])
+
+        while len(self.packets) > self.max_buckets:
+            self._coarsen()
+
+    def _flush_numpy(self, timestamps, sizes):
+        ts = np.asarray(timestamps, dtype=np.float64)
+        size = np.asarray(sizes, dtype=np.uint64)
+
+        index = np.floor((ts - self.origin) / self.interval).astype(np.int64)
+        np.clip(index, 0, None, out=index)
+        length = int(index.max()) + 1
+        self._grow(length)
+        packet_counts = np.bincount(index, minlength=length)
+        byte_counts = np.bincount(index, weights=size.astype(np.float64), minlength=length)
+        for i in np.nonzero(packet_counts)[0].tolist():
+            self.packets[i] += int(packet_counts[i])
+            self.bytes[i] += int(byte_counts[i])
+
+        size_index = np.searchsorted(np.asarray(PACKET_SIZE_BINS), size, side='right')
+        for i, count in enumerate(np.bincount(size_index, minlength=len(self.size_hist)).tolist()):
+            self.size_hist[i] += count
+
+        previous = self.last_ts if self.last_ts is not None else ts[0]
+        gaps = np.diff(ts, prepend=previous)
+        if self.last_ts is None:
+            gaps = gaps[1:]
+        gaps = np.clip(gaps, 0, None)
+        gap_us = np.floor(gaps * 1000000).astype(np.int64)
+        gap_index = np.zeros(len(gap_us), dtype=np.int64)
+        positive = gap_us > 0
+        gap_index[positive] = np.floor(np.log2(gap_us[positive])).astype(np.int64) + 1
+        np.clip(gap_index, 0, INTER_ARRIVAL_BUCKETS - 1, out=gap_index)
+        for i, count in enumerate(np.bincount(gap_index, minlength=INTER_ARRIVAL_BUCKETS).tolist()):
+            self.gap_hist[i] += count
+        # 百分位样本按固定步长抽取，避免逐个加入
+        step = max(1, len(gaps) // 1024)
+        for gap in gaps[::step].tolist():
+            self.gap_sample.add(gap)
+
+    def _flush_python(self, timestamps, sizes):
+        origin = self.origin
+        interval = self.interval
+        packets = self.packets
+        byte_counts = self.bytes
+        size_hist = self.size_hist
+        gap_hist = self.gap_hist
+        last_ts = self.last_ts
+        step = max(1, len(timestamps) // 1024)
+
+        for n, (ts, size) in enumerate(zip(timestamps, sizes)):
+            # 与 numpy 路径相同先除后取整（落在桶边界上的时间戳 // 可能分到前一个桶）
+            index = math.floor((ts - origin) / interval)
+            if index < 0:
+                index = 0
+            if index >= len(packets):
+                self._grow(index + 1)
+            packets[index] += 1
+            byte_counts[index] += size
+
+            size_hist[bisect_right(PACKET_SIZE_BINS, size)] += 1
+
+            if last_ts is not None:
+                gap = ts - last_ts if ts > last_ts else 0.0
+                gap_us = int(gap * 1000000)
+                gap_hist[min(gap_us.bit_length(), INTER_ARRIVAL_BUCKETS - 1)] += 1
+                if n % step == 0:
+                    self.gap_sample.add(gap)
+            last_ts = ts
+
+    def _grow(self, length):
+        missing = length - len(self.packets)
+        if missing > 0:
+            self.packets.extend([0] * missing)
+            self.bytes.extend([0] * missing)
+
+    def _coarsen(self):
+        """相邻两桶合并，分桶间隔加倍"""
+        packets = array('Q')
+        byte_counts = array('Q')
+        offset = int(round((self.origin % (self.interval * 2)) / self.interval))
+        # 保证合并后的桶边界仍对齐到新间隔
+        if offset:
+            self.packets.insert(0, 0)
+            self.bytes.insert(0, 0)
+            self.origin -= self.interval
+        for i in range(0, len(self.packets), 2):
+            packets.append(sum(self.packets[i:i + 2]))
+            byte_counts.append(sum(self.bytes[i:i + 2]))
+        self.packets = packets
+        self.bytes = byte_counts
+        self.interval *= 2
+
+    def merge(self, other):
+        """并入另一个序列（另一个文件或分片的统计），other 之后不应再使用
+
+        间隔不同时把较细的一方逐次加倍到相同间隔（两边的间隔须相差2的整数次幂倍），
+        按时间对齐后逐桶相加；总跨度超过 max_buckets 时继续加倍。other 在时间上重叠时衔接处的包间隔不计入分布。
+        """
+        self.flush()
+        other.flush()
+        for i, count in enumerate(other.size_hist):
+            self.size_hist[i] += count
+        for i, count in enumerate(other.gap_hist):
+            self.gap_hist[i] += count
+        self.gap_sample.merge(other.gap_sample)
+        if self.last_ts is not None and other.first_ts is not None and other.first_ts >= self.last_ts:
+            # other 紧接在后时补上两段衔接处的包间隔
+            gap_us = int((other.first_ts - self.last_ts) * 1000000)
+            self.gap_hist[min(gap_us.bit_length(), INTER_ARRIVAL_BUCKETS - 1)] += 1
+        if other.origin is None:
+            return
+        if self.origin is None:
+            self.origin = other.origin
+            self.interval = other.interval
+            self.packets = array('Q', other.packets)
+            self.bytes = array('Q', other.bytes)
+            self.first_ts = other.first_ts
+            self.last_ts = other.last_ts
+            return
+
+        ratio = max(self.interval, other.interval) / min(self.interval, other.interval)
+        doublings = round(math.log2(ratio))
+        if abs(ratio - 2 ** doublings) > 1e-6 * ratio:
+            raise ValueError(f"分桶间隔 {self.interval * 1000:g}ms 和 {other.interval * 1000:g}ms 不成倍数，无法合并")
+        finer = self if self.interval < other.interval else other
+        for _ in range(doublings):
+            finer._coarsen()
+        start = min(self.origin, other.origin)
+        while (max(self.origin + len(self.packets) * self.interval, other.origin + len(other.packets) * other.interval)
+               - start) / self.interval > self.max_buckets:
+            self._coarsen()
+            other._coarsen()
+            start = min(self.origin, other.origin)
+
+        interval = self.interval
+        if other.origin < self.origin:
+            shift = int(round((self.origin - other.origin) / interval))
+            self.packets = array('Q', [0]) * shift + self.packets
+            self.bytes = array('Q', [0]) * shift + self.bytes
+            self.origin = other.origin
+        offset = int(round((other.origin - self.origin) / interval))
+        self._grow(offset + len(other.packets))
+        for i, count in enumerate(other.packets):
+            if count:
+                self.packets[offset + i] += count
+                self.bytes[offset + i] += other.bytes[i]
+        self.first_ts = min(self.first_ts, other.first_ts)
+        self.last_ts = max(self.last_ts, other.last_ts)
+
+    def summary(self, top_n=3, include_series=False):
+        """返回序列峰值、百分位和突发/骤降统计；include_series 为真时附带完整分桶序列"""
+        self.flush()
+        if not self.packets:
+            return {'interval_ms': self.interval * 1000, 'buckets': 0}
+
+        interval = self.interval
+        packet_rates = sorted(self.packets)
+        byte_rates = sorted(self.bytes)
+        median_bytes = percentile(byte_rates, 50)
+
+        peaks = sorted(range(len(self.bytes)), key=lambda i: self.bytes[i], reverse=True)[:top_n]
+        bursts = 0
+        drops = 0
+        if median_bytes > 0:
+            burst_threshold = median_bytes * self.burst_factor
+            drop_threshold = median_bytes * self.drop_factor
+            bursts = sum(1 for value in self.bytes if value > burst_threshold)
+            drops = sum(1 for value in self.bytes if value < drop_threshold)
+
+        result = {
+            'interval_ms': interval * 1000,
+            'start': self.origin,
+            'buckets': len(self.packets),
+            'pps': _rate_percentiles(packet_rates, interval, 1),
+            'bps': _rate_percentiles(byte_rates, interval, 8),
+            'peaks': [{
+                'time': self.origin + i * interval,
+                'packets': self.packets[i],
+                'bytes': self.bytes[i]
+            } for i in peaks],
+            'bursts': bursts,
+            'drops': drops,
+            'size_distribution': {_size_bin_label(i): count for i, count in enumerate(self.size_hist) if count},
+            'inter_arrival_distribution': {_gap_bin_label(i): count for i, count in enumerate(self.gap_hist) if count},
+            'inter_arrival_us': self.gap_sample.summary(scale=1000000)
+        }
+        if include_series:
+            result['packets'] = list(self.packets)
+            result['bytes'] = list(self.bytes)
+        return result
+
+    def format_report(self):
+        """生成流量时间序列的文本报告段落"""
+        summary = self.summary()
+        if not summary['buckets']:
+            return ""
+
+        interval_ms = summary['interval_ms']
+        report = f"流量时间序列(每{interval_ms:g}毫秒, 共{summary['buckets']}个区间):\n"
+        report += (f"- 包速率: 中位数 {summary['pps']['p50']:.1f} pps, P95 {summary['pps']['p95']:.1f} pps, "
+                   f"峰值 {summary['pps']['max']:.1f} pps\n")
+        report += (f"- 带宽: 中位数 {summary['bps']['p50'] / 1000000:.3f} Mbps, P95 {summary['bps']['p95'] / 1000000:.3f} Mbps, "
+                   f"峰值 {summary['bps']['max'] / 1000000:.3f} Mbps\n")
+        report += (f"- 突发区间(超过中位数{self.burst_factor:g}倍): {summary['bursts']}个, "
+                   f"骤降区间(低于中位数{self.drop_factor:g}倍): {summary['drops']}个\n")
+        for peak in summary['peaks']:
+            report += f"- 峰值区间 {_format_time(peak['time'])}: {peak['packets']}个包, {peak['bytes']}字节\n"
+        report += "\n"
+
+        report += "数据包大小分布:\n"
+        for label, count in summary['size_distribution'].items():
+            report += f"- {label}字节: {count}个数据包\n"
+        report += "\n"
+
+        gaps = summary['inter_arrival_us']
+        if gaps['count']:
+            report += (f"包间隔: P50 {gaps['p50']:.1f} us, P99 {gaps['p99']:.1f} us, "
+                       f"最大 {gaps['max']:.1f} us\n\n")
+        return report
+
+
+def _rate_percentiles(sorted_counts, interval, scale):
+    """把每区间计数换算为每秒速率的百分位数"""
+    return {
+        'p50': percentile(sorted_counts, 50) * scale / interval,
+        'p95': percentile(sorted_counts, 95) * scale / interval,
+        'p99': percentile(sorted_counts, 99) * scale / interval,
+        'max': sorted_counts[-1] * scale / interval
+    }
+
+
+def _format_time(ts):
+    return datetime.datetime.fromtimestamp(ts).strftime('%H:%M:%S.%f')[:-3]
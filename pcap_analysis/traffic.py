@@ -0,0 +1,264 @@
+from .apps import AppClassifier
+from .detect import AnomalyDetector
+from .dns import DnsAnalyzer
+from .flows import FlowTable
+from .fragments import FragmentTable
+from .result import build_result, iso_time, top_talkers, top_conversations
+from .tcp import TcpAnalyzer
+from .timeseries import ThroughputSeries
+from .tunnels import TunnelDecoder
+
+# 分析逻辑变更时递增，使旧的缓存结果失效
+ANALYZER_VERSION = '13'
+
+# 可选的分析指标：summary 为基础计数（总是计算），其余为可选阶段
+METRICS = ('summary', 'timeseries', 'tcp', 'apps', 'dns', 'anomalies', 'flows')
+
+
+def format_report(packet_count, total_bytes, protocol_counts, ip_counts, conversations):
+    """根据统计结果生成文本报告"""
+    report = f"数据包总数: {packet_count}\n\n"
+
+    if packet_count == 0:
+        report += "警告: 未捕获到数据包，可能原因:\n"
+        report += "- 抓包接口配置错误\n"
+        report += "- 网络设备未活动\n"
+        report += "- 抓包时无网络流量\n\n"
+
+    # 协议分布
+    if protocol_counts:
+        report += "协议分布:\n"
+        sorted_protocols = sorted(protocol_counts.items(), key=lambda x: x[1], reverse=True)[:10]
+        for protocol, count in sorted_protocols:
+            report += f"- {protocol}: {count}个数据包\n"
+    else:
+        report += "协议分布:\n- 无协议信息\n"
+    report += "\n"
+
+    # 主要通信IP
+    if ip_counts:
+        report += "主要通信IP:\n"
+        sorted_ips = sorted(ip_counts.items(), key=lambda x: x[1]['packets'], reverse=True)[:5]
+        for ip, stats in sorted_ips:
+            report += f"- {ip}: {stats['packets']}个包, {stats['bytes']}字节\n"
+    else:
+        report += "主要通信IP:\n- 无IP通信信息\n"
+    report += "\n"
+
+    # 主要通信对话
+    if conversations:
+        report += "主要通信对话:\n"
+        sorted_convs = sorted(conversations.items(), key=lambda x: x[1]['packets'], reverse=True)[:5]
+        for conv, stats in sorted_convs:
+            report += f"- {conv}: {stats['packets']}个包, {stats['bytes']}字节\n"
+    else:
+        report += "主要通信对话:\n- 无通信对话信息\n"
+    report += "\n"
+
+    # 平均数据包大小
+    avg_packet_size = total_bytes / packet_count if packet_count > 0 else 0
+    report += f"平均数据包大小: {avg_packet_size:.2f} 字节\n\n"
+    return report
+
+
+def _add_counts(table, key, packets, byte_count):
+    entry = table.get(key)
+    if entry is None:
+        table[key] = {'packets': packets, 'bytes': byte_count}
+    else:
+        entry['packets'] += packets
+        entry['bytes'] += byte_count
+
+
+class TrafficStats:
+    """流量聚合状态：各后端把数据包累加到这里，报告和结构化结果只在这里生成
+
+    总字节数、IP和对话统计使用文件中实际保存的长度（incl_len），
+    时间序列按线路上的原始长度（orig_len）统计带宽。
+    decap 为True或隧道端口设置（TunnelDecoder 的参数）时解开隧道，按内层数据包统计。
+    """
+
+    def __init__(self, bucket_interval=1.0, metrics=METRICS, decap=None):
+        self.metrics = frozenset(metrics) | {'summary'}
+        self.packet_count = 0
+        self.total_bytes = 0
+        self.protocol_counts = {}
+        self.ip_counts = {}
+        self.conversations = {}
+        self.first_ts = None
+        self.last_ts = None
+        self.tcp = TcpAnalyzer() if 'tcp' in self.metrics else None
+        self.series = ThroughputSeries(interval=bucket_interval) if 'timeseries' in self.metrics else None
+        self.apps = AppClassifier() if 'apps' in self.metrics else None
+        self.dns = DnsAnalyzer() if 'dns' in self.metrics else None
+        self.anomalies = AnomalyDetector() if 'anomalies' in self.metrics else None
+        self.flows = FlowTable() if 'flows' in self.metrics else None
+        self.fragments = FragmentTable()
+        if decap:
+            self.tunnels = TunnelDecoder(**decap) if isinstance(decap, dict) else TunnelDecoder()
+        else:
+            self.tunnels = None
+        self.warnings = []
+
+    def add(self, ts, cap_len, orig_len, protocols=(), src_ip=None, dst_ip=None):
+        """累加一个数据包；ts、src_ip、dst_ip 可以为None"""
+        self.packet_count += 1
+        self.total_bytes += cap_len
+        if ts is not None:
+            if self.first_ts is None:
+                self.first_ts = ts
+            self.last_ts = ts
+            if self.series is not None:
+                self.series.add(ts, orig_len)
+
+        # 协议统计
+        protocol_counts = self.protocol_counts
+        for protocol in protocols:
+            protocol_counts[protocol] = protocol_counts.get(protocol, 0) + 1
+
+        # IP地址与通信对话统计
+        if src_ip and dst_ip:
+            _add_counts(self.ip_counts, src_ip, 1, cap_len)
+            _add_counts(self.ip_counts, dst_ip, 1, cap_len)
+            _add_counts(self.conversations, f"{src_ip} -> {dst_ip}", 1, cap_len)
+
+    def add_counts(self, packet_count, total_bytes, protocol_counts, ip_counts, conversations):
+        """合并一批已聚合的计数（向量化后端按块调用）"""
+        self.packet_count += packet_count
+        self.total_bytes += total_bytes
+        for protocol, count in protocol_counts.items():
+            self.protocol_counts[protocol] = self.protocol_counts.get(protocol, 0) + count
+        for ip, stats in ip_counts.items():
+            _add_counts(self.ip_counts, ip, stats['packets'], stats['bytes'])
+        for conv, stats in conversations.items():
+            _add_counts(self.conversations, conv, stats['packets'], stats['bytes'])
+
+    def merge(self, other):
+        """并入另一个文件或分片的聚合状态（见 checkpoint 模块），other 之后不应再使用
+
+        两边的分析指标和隧道解封装设置须相同，分片应按时间顺序合并（other 紧接在 self 之后）。
+        基础计数精确相加；各分析阶段的合并规则见各自的 merge，只有跨越分片边界的检测窗口、
+        边界处的重传判断等与一次遍历的结果略有差别。
+        """
+        if self.metrics != other.metrics or (self.tunnels is None) != (other.tunnels is None):
+            raise ValueError("汇总的分析指标或隧道解封装设置不同，无法合并")
+        self.add_counts(other.packet_count, other.total_bytes, other.protocol_counts, other.ip_counts,
+                        other.conversations)
+        if other.first_ts is not None:
+            self.first_ts = other.first_ts if self.first_ts is None else min(self.first_ts, other.first_ts)
+            self.last_ts = other.last_ts if self.last_ts is None else max(self.last_ts, other.last_ts)
+        for stage in ('tcp', 'series', 'apps', 'dns', 'anomalies', 'flows', 'tunnels'):
+            mine = getattr(self, stage)
+            if mine is not None:
+                mine.merge(getattr(other, stage))
+        self.fragments.merge(other.fragments)
+        for warning in other.warnings:
+            if warning not in self.warnings:
+                self.warnings.append(warning)
+
+    @property
+    def duration(self):
+        return self.last_ts - self.first_ts if self.first_ts is not None else 0
+
+    def format_report(self):
+        """生成文本报告"""
+        report = format_report(self.packet_count, self.total_bytes, self.protocol_counts,
+                               self.ip_counts, self.conversations)
+        if self.series is not None:
+            report += self.series.format_report()
+        if self.tcp is not None:
+            report += self.tcp.format_report()
+        if self.apps is not None:
+            report += self.apps.format_report()
+        if self.dns is not None:
+            report += self.dns.format_report()
+        if self.anomalies is not None:
+            report += self.anomalies.format_report()
+        if self.flows is not None:
+            report += self.flows.format_report()
+        if self.tunnels is not None:
+            report += self.tunnels.format_report()
+        report += self.fragments.format_report()
+        for warning in self.warnings:
+            report += f"警告: {warning}\n"
+        return report
+
+    def to_result(self, file_path, backend, partial=False, report=None, coverage=None):
+        """生成结构化结果（包含文本报告，二者来自同一次遍历）
+
+        coverage 为时间预算用尽时已覆盖的文件范围（见 progress.Progress.coverage）。
+        """
+        if report is None:
+            report = self.format_report()
+        duration = self.duration
+        fields = {}
+        peak_time = None
+        if self.series is not None:
+            series = self.series.summary()
+            peak = series.get('peaks') or [{}]
+            peak_time = iso_time(peak[0].get('time'))
+            fields['timeSeries'] = series
+        if self.tcp is not None:
+            fields['tcp'] = self.tcp.summary()
+        if self.apps is not None:
+            fields['applications'] = self.apps.summary()
+        if self.dns is not None:
+            fields['dns'] = self.dns.summary()
+        if self.anomalies is not None:
+            fields['anomalies'] = self.anomalies.summary()
+            fields['suspiciousActivities'] = self.anomalies.suspicious_activities()
+        if self.flows is not None:
+            fields['flows'] = self.flows.summary()
+        if self.tunnels is not None:
+            fields['tunnels'] = self.tunnels.summary()
+        if self.fragments.fragments:
+            fields['fragments'] = self.fragments.summary()
+        if self.warnings:
+            fields['warnings'] = list(self.warnings)
+        if coverage is not None:
+            fields['coverage'] = coverage
+        return build_result(
+            'pcap_analysis', ANALYZER_VERSION, file_path, report,
+            partial=partial,
+            backend=backend,
+            totalPackets=self.packet_count,
+            totalSize=self.total_bytes,
+            duration=duration,
+            protocols=dict(self.protocol_counts),
+            topTalkers=top_talkers(self.ip_counts),
+            conversations=top_conversations(self.conversations),
+            trafficPattern={
+                'avgPacketSize': self.total_bytes / self.packet_count if self.packet_count else 0,
+                'peakTime': peak_time,
+                # 平均带宽（Mbps）
+                'bandwidthUsage': self.total_bytes * 8 / duration / 1000000 if duration > 0 else 0
+            },
+            **fields
+        )
+
+    def columnar_tables(self):
+        """返回按通信对话和时间区间组织的列式表"""
+        sources, destinations, packets, byte_counts = [], [], [], []
+        for key, stats in self.conversations.items():
+            source, _, destination = key.partition(' -> ')
+            sources.append(source)
+            destinations.append(destination)
+            packets.append(stats['packets'])
+            byte_counts.append(stats['bytes'])
+        tables = {
+            'conversations': {
+                'source': sources,
+                'destination': destinations,
+                'packets': packets,
+                'bytes': byte_counts
+            }
+        }
+        if self.series is not None:
+            series = self.series.summary(include_series=True)
+            tables['timeseries'] = {
+                'start': [series.get('start', 0) + i * series['interval_ms'] / 1000
+                          for i in range(series['buckets'])],
+                'packets': series.get('packets', []),
+                'bytes': series.get('bytes', [])
+            }
+        return tables
@@ -0,0 +1,97 @@
+from .packet import ETHERTYPE_IPV4, ETHERTYPE_IPV6, ethernet_network
+from .stats import TopCounter
+
+DEFAULT_VXLAN_PORTS = (4789, 8472)
+DEFAULT_GENEVE_PORTS = (6081,)
+# 隧道内层为以太网帧（GRE透明以太网桥接、Geneve）
+ETHERTYPE_TEB = 0x6558
+# 最多解开的隧道层数
+MAX_TUNNEL_DEPTH = 2
+
+_NETWORK_TYPES = (ETHERTYPE_IPV4, ETHERTYPE_IPV6)
+
+
+def _inner_frame(ethertype, data, offset):
+    """按内层协议类型定位网络层，返回 (类型, 偏移, 数据)；内层不是IP时返回None"""
+    if ethertype == ETHERTYPE_TEB:
+        frame = data[offset:]
+        ethertype, offset = ethernet_network(frame)
+        data = frame
+    if ethertype in _NETWORK_TYPES:
+        return ethertype, offset, data
+    return None
+
+
+class TunnelDecoder:
+    """隧道解封装：VXLAN、Geneve（按UDP目的端口识别）、GRE 和 IP-in-IP
+
+    解开后按内层数据包统计地址、协议和对话，外层只计入隧道类型和隧道端点的计数。
+    """
+
+    def __init__(self, vxlan_ports=DEFAULT_VXLAN_PORTS, geneve_ports=DEFAULT_GENEVE_PORTS, top_n=10,
+                 endpoint_capacity=1000):
+        self.vxlan_ports = frozenset(vxlan_ports)
+        self.geneve_ports = frozenset(geneve_ports)
+        self.top_n = top_n
+        self.counts = {}
+        self.endpoints = TopCounter(endpoint_capacity)
+
+    def inner(self, protocol, segment):
+        """segment 从外层IP的上层头开始，返回 (隧道类型, (内层类型, 网络层偏移, 数据))；不是隧道时返回None"""
+        if protocol == 4:
+            return 'IPIP', (ETHERTYPE_IPV4, 0, segment)
+        if protocol == 41:
+            return 'IPv6-in-IP', (ETHERTYPE_IPV6, 0, segment)
+        tunnel = frame = None
+        if protocol == 47:
+            # 只处理版本0的GRE（版本1为PPTP增强GRE）；可选的校验和、密钥、序号字段各4字节
+            if len(segment) >= 4 and not segment[1] & 0x07:
+                flags = segment[0]
+                offset = 4 + 4 * (bool(flags & 0x80) + bool(flags & 0x20) + bool(flags & 0x10))
+                tunnel, frame = 'GRE', _inner_frame((segment[2] << 8) | segment[3], segment, offset)
+        elif protocol == 17 and len(segment) >= 16:
+            port = (segment[2] << 8) | segment[3]
+            if port in self.vxlan_ports and segment[8] & 0x08:
+                tunnel, frame = 'VXLAN', _inner_frame(ETHERTYPE_TEB, segment, 16)
+            elif port in self.geneve_ports and not segment[8] >> 6:
+                options = (segment[8] & 0x3F) * 4
+                tunnel, frame = 'Geneve', _inner_frame((segment[10] << 8) | segment[11], segment, 16 + options)
+        # 内层不是IP（如ARP）时按外层数据包统计
+        return (tunnel, frame) if frame is not None else None
+
+    def count(self, tunnel, src_ip, dst_ip, byte_count):
+        """记录一个解开的隧道包（外层端点）"""
+        counts = self.counts.get(tunnel)
+        if counts is None:
+            counts = self.counts[tunnel] = [0, 0]
+        counts[0] += 1
+        counts[1] += byte_count
+        self.endpoints.add(f"{src_ip} -> {dst_ip}")
+
+    def merge(self, other):
+        """并入另一个文件或分片的隧道统计"""
+        for name, (packets, byte_count) in other.counts.items():
+            counts = self.counts.setdefault(name, [0, 0])
+            counts[0] += packets
+            counts[1] += byte_count
+        self.endpoints.merge(other.endpoints)
+
+    def summary(self):
+        return {
+            'tunnels': {name: {'packets': p, 'bytes': b}
+                        for name, (p, b) in sorted(self.counts.items(), key=lambda x: x[1][0], reverse=True)},
+            'top_endpoints': [{'endpoints': key, 'packets': count, 'error': error}
+                              for key, count, error in self.endpoints.top(self.top_n)]
+        }
+
+    def format_report(self):
+        """生成隧道解封装的文本报告段落"""
+        if not self.counts:
+            return ""
+        summary = self.summary()
+        report = "隧道封装（已按内层数据包统计）:\n"
+        for name, counts in summary['tunnels'].items():
+            report += f"- {name}: {counts['packets']}个数据包, {counts['bytes']}字节\n"
+        for entry in summary['top_endpoints'][:5]:
+            report += f"- 隧道端点 {entry['endpoints']}: {entry['packets']}个数据包\n"
+        return report + "\n"
@@ -1,7 +1,7 @@
 import { NextRequest } from 'next/server'
 import { analyzePacketWithAI, PacketData } from '@/lib/packetAnalysisAI'
 import { analyzePCAPWithPythonForAI } from '@/lib/pythonAnalyzer'
-import fs from 'fs'
+import { resolveCaptureFile } from '@/lib/packetCaptureStore'
 
 /**
  * AI数据包分析API
@@ -82,10 +82,12 @@ export async function POST(request: NextRequest) {
 
     // 检查是否有PCAP文件路径
     let analysisResult = '';
-    if (packetData.captureInfo?.filePath && fs.existsSync(packetData.captureInfo.filePath)) {
+    // 已被存储管理压缩的抓包改用 .gz 文件，分析脚本可以直接读取
+    const capturePath = packetData.captureInfo?.filePath ? resolveCaptureFile(packetData.captureInfo.filePath) : null;
+    if (capturePath) {
       // 使用Python脚本直接分析PCAP文件
-      console.log('使用Python脚本直接分析PCAP文件:', packetData.captureInfo.filePath);
-      analysisResult = await analyzePCAPWithPythonForAI(packetData.captureInfo.filePath);
+      console.log('使用Python脚本直接分析PCAP文件:', capturePath);
+      analysisResult = await analyzePCAPWithPythonForAI(capturePath);
     } else {
       // 验证数据完整性 - 允许各种数据情况
       console.log('✅ 数据验证通过，开始调用AI大模型...')
@@ -3,6 +3,7 @@ import { exec } from 'child_process';
 import { promisify } from 'util';
 import path from 'path';
 import fs from 'fs';
+import { resolveCaptureFile } from '@/lib/packetCaptureStore';
 
 const execAsync = promisify(exec);
 
@@ -26,8 +27,9 @@ export async function POST(request: NextRequest) {
     
     console.log(`开始分析PCAP文件: ${filePath}`);
     
-    // 检查文件是否存在
-    if (!fs.existsSync(filePath)) {
+    // 检查文件是否存在（已被存储管理压缩时分析 .gz）
+    const capturePath = resolveCaptureFile(filePath);
+    if (!capturePath) {
       return Response.json(
         { 
           success: false, 
@@ -38,7 +40,7 @@ export async function POST(request: NextRequest) {
     }
     
     // 使用tcpdump或tshark分析PCAP文件
-    const analysisResult = await analyzePCAPFile(filePath);
+    const analysisResult = await analyzePCAPFile(capturePath);
     
     console.log('PCAP文件分析完成:', {
       totalPackets: analysisResult.totalPackets,
@@ -82,6 +84,10 @@ async function analyzePCAPFile(filePath: string) {
     // 获取文件真实统计信息
     const stats = fs.statSync(filePath);
     totalSize = stats.size;
+    // tshark 可以直接读取 .gz 抓包，tcpdump 需要先解压到标准输入
+    const tcpdumpRead = filePath.endsWith('.gz')
+      ? `gunzip -c "${filePath}" | tcpdump -r -`
+      : `tcpdump -r "${filePath}"`;
     
     // 如果没有安装工具，直接返回基础真实数据，不进行任何模拟
     let hasTools = false;
@@ -147,11 +153,11 @@ async function analyzePCAPFile(filePath: string) {
         // 使用tcpdump获取真实数据
         try {
           // 获取真实数据包总数
-          const { stdout: countOutput } = await execAsync(`tcpdump -r "${filePath}" -nn 2>/dev/null | wc -l`);
+          const { stdout: countOutput } = await execAsync(`${tcpdumpRead} -nn 2>/dev/null | wc -l`);
           totalPackets = parseInt(countOutput.trim()) || 0;
           
           // 获取真实协议分布
-          const { stdout: protoOutput } = await execAsync(`tcpdump -r "${filePath}" -nn 2>/dev/null | awk '{print $2}' | sort | uniq -c | sort -nr`);
+          const { stdout: protoOutput } = await execAsync(`${tcpdumpRead} -nn 2>/dev/null | awk '{print $2}' | sort | uniq -c | sort -nr`);
           const protocolLines = protoOutput.trim().split('\n');
           for (const line of protocolLines) {
             const match = line.trim().match(/^(\d+)\s+(\w+)/);
@@ -165,7 +171,7 @@ async function analyzePCAPFile(filePath: string) {
           }
           
           // 获取真实Top Talkers
-          const { stdout: talkersOutput } = await execAsync(`tcpdump -r "${filePath}" -nn 2>/dev/null | awk '{print $3}' | cut -d'.' -f1-4 | sort | uniq -c | sort -nr | head -5`);
+          const { stdout: talkersOutput } = await execAsync(`${tcpdumpRead} -nn 2>/dev/null | awk '{print $3}' | cut -d'.' -f1-4 | sort | uniq -c | sort -nr | head -5`);
           const talkerLines = talkersOutput.trim().split('\n');
           for (const line of talkerLines) {
             const match = line.trim().match(/^(\d+)\s+(\d+\.\d+\.\d+\.\d+)/);
@@ -1,8 +1,10 @@
 import { NextRequest } from 'next/server';
 import fs from 'fs';
+import { analyzePCAPWithPythonJSON } from '@/lib/pythonAnalyzer';
+import { resolveCaptureFile } from '@/lib/packetCaptureStore';
 
 /**
- * 检查PCAP文件是否存在
+ * 检查PCAP文件是否存在，并用Python分析脚本生成结构化统计数据
  */
 export async function POST(request: NextRequest) {
   try {
@@ -21,8 +23,9 @@ export async function POST(request: NextRequest) {
     
     console.log(`检查PCAP文件: ${filePath}`);
     
-    // 检查文件是否存在
-    if (!fs.existsSync(filePath)) {
+    // 检查文件是否存在（已被存储管理压缩时分析 .gz，分析脚本可以直接读取）
+    const capturePath = resolveCaptureFile(filePath);
+    if (!capturePath) {
       return Response.json(
         { 
           success: false, 
@@ -33,7 +36,7 @@ export async function POST(request: NextRequest) {
     }
     
     // 获取文件信息
-    const stats = fs.statSync(filePath);
+    const stats = fs.statSync(capturePath);
     
     console.log('PCAP文件检查完成:', {
       fileSize: stats.size,
@@ -41,7 +44,38 @@ export async function POST(request: NextRequest) {
       exists: true
     });
     
-    // 直接返回文件信息，不进行JSON转换
+    // 使用Python分析脚本的JSON输出（同一次遍历得到统计数据和文本报告）
+    try {
+      const result = await analyzePCAPWithPythonJSON(capturePath);
+      if (!result.error) {
+        console.log('PCAP文件结构化分析完成:', {
+          analyzer: result.analyzer,
+          analyzerVersion: result.analyzerVersion,
+          totalPackets: result.totalPackets,
+          protocolsCount: Object.keys(result.protocols).length
+        });
+        
+        return Response.json({
+          success: true,
+          data: {
+            ...result,
+            captureInfo: {
+              ...result.captureInfo,
+              filePath: filePath,
+              fileSize: stats.size,
+              createdTime: stats.mtime.toISOString(),
+              interface: 'unknown',
+              filter: 'none'
+            }
+          }
+        });
+      }
+      console.error('Python分析脚本返回错误:', result.error);
+    } catch (analysisError) {
+      console.error('Python结构化分析失败，仅返回文件信息:', analysisError);
+    }
+    
+    // 分析失败时只返回文件信息
     return Response.json({
       success: true,
       data: {
@@ -1,6 +1,8 @@
 import { NextRequest } from 'next/server';
 import path from 'path';
 import fs from 'fs';
+import zlib from 'zlib';
+import { resolveCaptureFile } from '@/lib/packetCaptureStore';
 
 export async function GET(request: NextRequest) {
   try {
@@ -28,10 +30,11 @@ export async function GET(request: NextRequest) {
       );
     }
     
-    const filePath = path.join(process.cwd(), 'temp', fileName);
+    // 存储管理会把结束较久的抓包压缩为 .gz，下载时解压还原
+    const filePath = resolveCaptureFile(path.join(process.cwd(), 'temp', fileName));
     
     // 检查文件是否存在
-    if (!fs.existsSync(filePath)) {
+    if (!filePath) {
       return Response.json(
         { 
           success: false, 
@@ -42,7 +45,9 @@ export async function GET(request: NextRequest) {
     }
     
     // 读取文件内容
-    const fileBuffer = fs.readFileSync(filePath);
+    const fileBuffer = filePath.endsWith('.gz') && !fileName.endsWith('.gz')
+      ? zlib.gunzipSync(fs.readFileSync(filePath))
+      : fs.readFileSync(filePath);
     
     // 返回文件内容
     return new Response(fileBuffer, {
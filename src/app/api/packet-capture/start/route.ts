@@ -7,7 +7,7 @@ import { activeCaptures } from '@/lib/packetCaptureStore';
 export async function POST(request: NextRequest) {
   try {
     const body = await request.json();
-    const { interface: interfaceName, duration = 30 } = body;
+    const { interface: interfaceName, duration = 30, dedup = false } = body;
     
     // 接口名称现在是可选的，Python脚本会自动检测
     const interfaceToUse = interfaceName || 'auto_detect';
@@ -31,9 +31,13 @@ export async function POST(request: NextRequest) {
     
     console.log(`开始抓包会话: ${sessionId}, 接口: ${interfaceToUse}, 输出文件: ${outputFile}`);
     
-    // 调用Python抓包脚本，使用0表示不限制抓包时间
+    // 调用Python抓包脚本，使用0表示不限制抓包时间；dedup 时丢弃镜像口重复送来的帧
     const scriptPath = path.join(process.cwd(), 'capture.py');
-    const pythonProcess = spawn('python', [scriptPath, interfaceToUse, '0', outputFile]);
+    const args = [scriptPath, interfaceToUse, '0', outputFile];
+    if (dedup) {
+      args.push('--dedup');
+    }
+    const pythonProcess = spawn('python', args);
     
     // 存储进程信息
     activeCaptures.set(sessionId, {
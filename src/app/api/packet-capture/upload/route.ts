@@ -1,65 +1,101 @@
 import { NextRequest } from 'next/server';
+import { analyzeUploadedPCAP } from '@/lib/pythonAnalyzer';
+
+// 以请求体直接上传（application/octet-stream，前端的上传方式）时边接收边按块转发给分析进程，不写入磁盘；
+// pcapng 不能从标准输入流式分析，按块写入临时文件后再分析（见 analyzeUploadedPCAP）。
+// multipart/form-data 只为兼容旧客户端保留：request.formData() 会先把整个文件读入内存，因此限制大小。
+const validExtensions = ['.pcap', '.pcapng', '.cap'];
+const MAX_MULTIPART_BYTES = 100 * 1024 * 1024;
 
 export async function POST(request: NextRequest) {
   try {
-    const formData = await request.formData();
-    const file = formData.get('file');
-    
-    if (!file || !(file instanceof File)) {
-      return Response.json(
-        { 
-          success: false, 
-          error: '请上传有效的PCAP文件' 
-        }, 
-        { status: 400 }
-      );
+    let fileName: string;
+    let fileSize: number;
+    let body: ReadableStream<Uint8Array>;
+
+    const contentType = request.headers.get('content-type') || '';
+    if (contentType.startsWith('multipart/form-data')) {
+      if (Number(request.headers.get('content-length') || 0) > MAX_MULTIPART_BYTES) {
+        return Response.json(
+          {
+            success: false,
+            error: `表单上传的文件不能超过 ${MAX_MULTIPART_BYTES / 1024 / 1024}MB，大文件请以 application/octet-stream 直接上传`
+          },
+          { status: 413 }
+        );
+      }
+      const formData = await request.formData();
+      const file = formData.get('file');
+
+      if (!file || !(file instanceof File)) {
+        return Response.json(
+          {
+            success: false,
+            error: '请上传有效的PCAP文件'
+          },
+          { status: 400 }
+        );
+      }
+      fileName = file.name;
+      fileSize = file.size;
+      body = file.stream();
+    } else {
+      // 直接以请求体上传（application/octet-stream），边接收边分析
+      fileName = decodeURIComponent(request.headers.get('x-file-name') || '');
+      fileSize = Number(request.headers.get('content-length') || 0);
+      if (!fileName || !request.body) {
+        return Response.json(
+          {
+            success: false,
+            error: '请上传有效的PCAP文件'
+          },
+          { status: 400 }
+        );
+      }
+      body = request.body;
     }
-    
+
     // 验证文件类型
-    const validExtensions = ['.pcap', '.pcapng', '.cap'];
-    const fileName = file.name.toLowerCase();
-    const isValidType = validExtensions.some(ext => fileName.endsWith(ext));
-    
+    const isValidType = validExtensions.some(ext => fileName.toLowerCase().endsWith(ext));
+
     if (!isValidType) {
       return Response.json(
-        { 
-          success: false, 
-          error: '请上传PCAP格式的文件' 
-        }, 
+        {
+          success: false,
+          error: '请上传PCAP格式的文件'
+        },
         { status: 400 }
       );
     }
-    
-    // 这里应该调用实际的PCAP文件分析逻辑
-    // 目前返回模拟的分析结果
-    console.log(`上传PCAP文件: ${file.name}, 大小: ${file.size} bytes`);
-    
+
+    console.log(`上传PCAP文件: ${fileName}, 大小: ${fileSize} bytes`);
+    const result = await analyzeUploadedPCAP(body);
+    if (result.error) {
+      return Response.json(
+        {
+          success: false,
+          error: result.error.message
+        },
+        { status: 422 }
+      );
+    }
+
     return Response.json({
       success: true,
       status: 'success',
-      fileName: file.name,
-      fileSize: file.size,
-      analysis: {
-        summary: 'PCAP文件分析完成，发现网络流量模式正常',
-        issues: [
-          '发现少量重传数据包',
-          '检测到正常的ARP请求'
-        ],
-        recommendations: [
-          '建议优化网络路由配置',
-          '定期检查网络设备状态'
-        ]
-      }
+      fileName,
+      fileSize,
+      packetData: result
     });
-    
+
   } catch (error: any) {
     console.error('PCAP文件上传失败:', error);
     return Response.json(
-      { 
-        success: false, 
-        error: error.message || '文件上传失败' 
-      }, 
+      {
+        success: false,
+        error: error.message || '文件上传失败'
+      },
       { status: 500 }
     );
   }
-}
\ No newline at end of file
+}
@@ -494,13 +494,14 @@ export function PacketAnalysis({ onBackToMain }: { onBackToMain: () => void }) {
     setIsAnalyzing(true);
     
     try {
-      // 第一步：上传文件到后端
-      const formData = new FormData();
-      formData.append('file', uploadedFile);
-      
+      // 第一步：以请求体直接上传文件，后端边接收边解析，返回结构化的分析结果
       const uploadResponse = await fetch('/api/packet-capture/upload', {
         method: 'POST',
-        body: formData,
+        headers: {
+          'Content-Type': 'application/octet-stream',
+          'X-File-Name': encodeURIComponent(uploadedFile.name),
+        },
+        body: uploadedFile,
       });
       
       const uploadData = await uploadResponse.json();
@@ -509,46 +510,8 @@ export function PacketAnalysis({ onBackToMain }: { onBackToMain: () => void }) {
         throw new Error(uploadData.error || '文件上传失败');
       }
       
-      // 第二步：从上传的PCAP文件提取数据进行分析
-      // 这里我们模拟从PCAP文件解析出的数据
-      const packetData = {
-        totalPackets: Math.floor(Math.random() * 5000) + 1000,
-        totalSize: Math.floor(Math.random() * 5000000) + 1000000,
-        duration: Math.floor(Math.random() * 300) + 60,
-        protocols: {
-          'TCP': Math.floor(Math.random() * 3000) + 800,
-          'UDP': Math.floor(Math.random() * 1000) + 300,
-          'ICMP': Math.floor(Math.random() * 500) + 100,
-          'ARP': Math.floor(Math.random() * 200) + 50
-        },
-        topTalkers: [
-          { ip: '192.168.1.' + Math.floor(Math.random() * 254), packets: Math.floor(Math.random() * 1000) + 400, bytes: Math.floor(Math.random() * 1000000) + 400000 },
-          { ip: '192.168.1.' + Math.floor(Math.random() * 254), packets: Math.floor(Math.random() * 800) + 300, bytes: Math.floor(Math.random() * 800000) + 300000 },
-          { ip: '8.8.8.8', packets: Math.floor(Math.random() * 500) + 200, bytes: Math.floor(Math.random() * 200000) + 100000 }
-        ],
-        suspiciousActivities: [
-          {
-            type: '端口扫描',
-            count: Math.floor(Math.random() * 5) + 1,
-            details: ['检测到对多个端口的连接尝试', `源IP: 192.168.1.${Math.floor(Math.random() * 254)}`]
-          },
-          {
-            type: '异常流量',
-            count: Math.floor(Math.random() * 3) + 1,
-            details: ['单IP发送大量UDP包', `峰值: ${Math.floor(Math.random() * 1000) + 500}包/秒`]
-          }
-        ],
-        trafficPattern: {
-          avgPacketSize: Math.floor(Math.random() * 2000) + 500,
-          peakTime: new Date().toLocaleTimeString(),
-          bandwidthUsage: Math.random() * 50 + 10
-        },
-        captureInfo: {
-          interface: 'Uploaded PCAP',
-          startTime: new Date().toISOString(),
-          filter: '无'
-        }
-      };
+      // 第二步：使用从上传的PCAP文件解析出的数据
+      const packetData = uploadData.packetData;
       
       // 第三步：调用AI分析API
       const analysisResponse = await fetch('/api/ai-analyze-packet', {
@@ -0,0 +1,171 @@
+import { spawn, ChildProcessWithoutNullStreams } from 'child_process';
+
+/**
+ * 常驻Python分析服务（pcap_analysis/server.py）的客户端
+ * 服务进程在首次使用时启动，之后所有分析请求复用同一组已预热的工作进程
+ */
+
+// 与 pcap_analysis/server.py 中的错误码一致
+const JOB_TIMEOUT = -32002;
+
+interface PendingRequest {
+  resolve: (value: any) => void
+  reject: (error: Error) => void
+  onProgress?: (progress: AnalysisProgress) => void
+  timer?: NodeJS.Timeout
+}
+
+/**
+ * 分析执行中的进度通知（analyze 请求带 progress: true 时发送）
+ */
+export interface AnalysisProgress {
+  job_id: number
+  bytes: number
+  totalBytes: number
+  packets: number
+  fraction: number
+  elapsed: number
+  eta: number | null
+}
+
+export interface AnalyzeParams {
+  file_path: string
+  analyzer?: 'auto' | 'numpy' | 'native' | 'tshark' | 'pyshark' | 'basic'
+  metrics?: Array<'summary' | 'timeseries' | 'tcp' | 'apps' | 'dns' | 'anomalies' | 'flows'>
+  max_packets?: number
+  bucket_ms?: number
+  use_cache?: boolean
+  timeout?: number // 秒
+  deadline?: number // 秒，到时返回部分结果；默认比 timeout 略短
+  progress?: boolean
+  sample?: number // 抽样窗口数，超大文件快速估算
+  digest_chars?: number // 结果附带不超过该字符数的摘要（digest）
+  digest_tokens?: number
+}
+
+export class AnalysisServerError extends Error {
+  constructor(message: string, public code?: number) {
+    super(message)
+    this.name = 'AnalysisServerError'
+  }
+}
+
+class AnalysisServerClient {
+  private process: ChildProcessWithoutNullStreams | null = null
+  private pending = new Map<number, PendingRequest>()
+  private nextId = 1
+  private buffer = ''
+
+  private start() {
+    const child = spawn('python', ['-m', 'pcap_analysis.server'], { cwd: process.cwd() });
+    child.stdout.setEncoding('utf8');
+    child.stdout.on('data', (chunk: string) => this.onData(chunk));
+    child.stderr.on('data', (data) => {
+      console.error('Python分析服务错误输出:', data.toString());
+    });
+    child.on('error', (error) => this.onExit(`Python分析服务启动失败: ${error.message}`));
+    child.on('close', (code) => this.onExit(`Python分析服务已退出，退出码: ${code}`));
+    this.process = child;
+    console.log('✅ 已启动Python分析服务, PID:', child.pid);
+  }
+
+  private onData(chunk: string) {
+    this.buffer += chunk;
+    let newline = this.buffer.indexOf('\n');
+    while (newline >= 0) {
+      const line = this.buffer.slice(0, newline).trim();
+      this.buffer = this.buffer.slice(newline + 1);
+      newline = this.buffer.indexOf('\n');
+      if (!line) continue;
+
+      let message: any;
+      try {
+        message = JSON.parse(line);
+      } catch {
+        console.error('无法解析Python分析服务输出:', line.substring(0, 200));
+        continue;
+      }
+      // 服务主动通知（如 ready、progress）没有 id
+      if (message.id === undefined || message.id === null) {
+        if (message.method === 'progress') {
+          this.pending.get(message.params?.job_id)?.onProgress?.(message.params);
+        }
+        continue;
+      }
+
+      const request = this.pending.get(message.id);
+      if (!request) continue;
+      this.pending.delete(message.id);
+      if (request.timer) clearTimeout(request.timer);
+
+      if (message.error) {
+        request.reject(new AnalysisServerError(message.error.message, message.error.code));
+      } else {
+        request.resolve(message.result);
+      }
+    }
+  }
+
+  private onExit(reason: string) {
+    if (!this.process) return;
+    console.error(reason);
+    this.process = null;
+    this.buffer = '';
+    for (const request of this.pending.values()) {
+      if (request.timer) clearTimeout(request.timer);
+      request.reject(new AnalysisServerError(reason));
+    }
+    this.pending.clear();
+  }
+
+  request<T = any>(
+    method: string,
+    params: Record<string, any> = {},
+    timeoutMs?: number,
+    onProgress?: (progress: AnalysisProgress) => void
+  ): Promise<T> {
+    if (!this.process) {
+      this.start();
+    }
+    const id = this.nextId++;
+    return new Promise<T>((resolve, reject) => {
+      const request: PendingRequest = { resolve, reject, onProgress };
+      if (timeoutMs) {
+        // 客户端超时后通知服务端取消任务，释放工作进程
+        request.timer = setTimeout(() => {
+          this.pending.delete(id);
+          this.send({ jsonrpc: '2.0', id: this.nextId++, method: 'cancel', params: { job_id: id } });
+          reject(new AnalysisServerError(`分析请求超时（${timeoutMs}ms）`, JOB_TIMEOUT));
+        }, timeoutMs);
+      }
+      this.pending.set(id, request);
+      this.send({ jsonrpc: '2.0', id, method, params });
+    });
+  }
+
+  private send(message: Record<string, any>) {
+    this.process?.stdin.write(JSON.stringify(message) + '\n');
+  }
+}
+
+let client: AnalysisServerClient | null = null;
+
+function getClient() {
+  if (!client) {
+    client = new AnalysisServerClient();
+  }
+  return client;
+}
+
+/**
+ * 通过常驻分析服务分析PCAP文件，返回结构化结果
+ * 服务端在超时前用完时间预算时返回 partial 结果（带 coverage），而不是报错
+ */
+export function analyzeWithServer<T = any>(
+  params: AnalyzeParams,
+  timeoutMs = 120000,
+  onProgress?: (progress: AnalysisProgress) => void
+): Promise<T> {
+  const request = { timeout: timeoutMs / 1000, ...params, ...(onProgress ? { progress: true } : {}) };
+  return getClient().request<T>('analyze', request, timeoutMs + 5000, onProgress);
+}
@@ -1,5 +1,6 @@
 // 全局存储活跃的抓包会话
 import { ChildProcess } from 'child_process';
+import fs from 'fs';
 
 export interface CaptureSession {
   process: ChildProcess;
@@ -26,4 +27,16 @@ if (!globalStore.activeCaptures) {
   globalStore.activeCaptures = new Map<string, CaptureSession>();
 }
 
-export const activeCaptures = globalStore.activeCaptures;
\ No newline at end of file
+export const activeCaptures = globalStore.activeCaptures;
+
+/**
+ * 返回抓包文件的实际路径：存储管理会把结束较久的抓包压缩为 .gz，原文件不存在时改用压缩文件；
+ * 两者都不存在时返回 null
+ */
+export function resolveCaptureFile(filePath: string): string | null {
+  if (fs.existsSync(filePath)) {
+    return filePath;
+  }
+  const compressedPath = `${filePath}.gz`;
+  return fs.existsSync(compressedPath) ? compressedPath : null;
+}
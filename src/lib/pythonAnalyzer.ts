@@ -1,10 +1,245 @@
 import { promisify } from 'util';
-import { execFile } from 'child_process';
+import { execFile, spawn } from 'child_process';
 import fs from 'fs';
+import os from 'os';
 import path from 'path';
+import { Readable } from 'stream';
+import { pipeline } from 'stream/promises';
+import type { PacketData } from '@/lib/packetAnalysisAI';
+import { analyzeWithServer, AnalysisServerError } from '@/lib/analysisServer';
 
 const execFileAsync = promisify(execFile);
 
+// 与 pcap_analysis/result.py 中的 RESULT_SCHEMA_VERSION 保持一致
+export const ANALYSIS_RESULT_SCHEMA_VERSION = 1;
+
+// 超过这个大小的文件生成AI文本报告时改为抽样估算，几秒内返回
+const SAMPLE_THRESHOLD_BYTES = 2 * 1024 * 1024 * 1024;
+const SAMPLE_WINDOWS = 64;
+
+// AI分析提示词中抓包摘要的最大字符数，与抓包大小无关
+const DIGEST_MAX_CHARS = 6000;
+
+// pcapng 文件开头的块类型，与 pcap_analysis/pcapfile.py 中的 PCAPNG_MAGIC 相同
+const PCAPNG_MAGIC = Buffer.from([0x0a, 0x0d, 0x0d, 0x0a]);
+
+/**
+ * Python分析脚本输出的结构化结果（--format json）
+ * 顶层字段与 PacketData 一致，可直接交给路由和AI分析模块使用
+ */
+export interface PythonAnalysisResult extends PacketData {
+  schemaVersion: number
+  analyzer: string
+  analyzerVersion: string
+  backend?: string
+  report: string
+  partial?: boolean
+  warnings?: string[]
+  // 时间预算用尽时已分析的文件范围（从标准输入读取时总大小未知，fraction 和 fileSize 为null）
+  coverage?: {
+    fraction: number | null
+    bytes: number
+    fileSize: number | null
+    packets: number
+    elapsed: number
+    stoppedBy: 'deadline' | null
+  }
+  // 抽样估算的结果（--sample）：总量与占比的置信区间
+  estimated?: boolean
+  sampling?: Record<string, any>
+  timeSeries?: Record<string, any>
+  tcp?: Record<string, any>
+  applications?: Record<string, any>
+  dns?: Record<string, any>
+  anomalies?: Record<string, any>
+  // 双向会话表：主要的流（五元组，按发起方向给出两个方向的包数/字节数、时长、吞吐量）和主机对
+  flows?: Record<string, any>
+  // 请求 digest_chars/digest_tokens 时附带的限定长度摘要
+  digest?: string
+}
+
+/**
+ * 使用 pcap_analysis 分析包对PCAP文件做一次遍历，返回结构化结果（后端按文件格式自动选择）
+ */
+export async function analyzePCAPWithPythonJSON(filePath: string): Promise<PythonAnalysisResult> {
+  if (!fs.existsSync(filePath)) {
+    throw new Error('PCAP文件不存在');
+  }
+
+  // 优先使用常驻分析服务，服务不可用时退回单独启动脚本
+  try {
+    const result = await analyzeWithServer<PythonAnalysisResult>({
+      file_path: filePath,
+      analyzer: 'auto',
+      max_packets: 0
+    });
+    return checkSchemaVersion(result);
+  } catch (error) {
+    if (!isServerUnavailable(error)) {
+      throw error;
+    }
+    console.error('Python分析服务不可用，改为直接执行脚本:', error);
+  }
+
+  const { stdout, stderr } = await execFileAsync(
+    'python',
+    // 时间预算比超时短，超大文件返回部分结果而不是被强制结束
+    ['-m', 'pcap_analysis', filePath, '--format', 'json', '--deadline', '110'],
+    {
+      cwd: process.cwd(),
+      timeout: 120000, // 120秒超时
+      maxBuffer: 16 * 1024 * 1024
+    }
+  );
+
+  if (stderr) {
+    console.error('Python脚本错误输出:', stderr);
+  }
+
+  return checkSchemaVersion(JSON.parse(stdout) as PythonAnalysisResult);
+}
+
+/**
+ * 分析上传的抓包数据流：按开头的魔数判断格式，经典pcap用 analyzePCAPStreamWithPython 边接收边解析；
+ * pcapng 没有能从标准输入读取的后端，按块写入临时文件后用 analyzePCAPWithPythonJSON 分析，完成后删除。
+ */
+export async function analyzeUploadedPCAP(body: ReadableStream<Uint8Array>): Promise<PythonAnalysisResult> {
+  const reader = body.getReader();
+  const head: Uint8Array[] = [];
+  let headLength = 0;
+  while (headLength < PCAPNG_MAGIC.length) {
+    const { done, value } = await reader.read();
+    if (done) {
+      break;
+    }
+    head.push(value);
+    headLength += value.length;
+  }
+  // 已读出的开头数据放回流的前面
+  const stream = new ReadableStream<Uint8Array>({
+    start(controller) {
+      head.forEach(chunk => controller.enqueue(chunk));
+    },
+    async pull(controller) {
+      const { done, value } = await reader.read();
+      if (done) {
+        controller.close();
+      } else {
+        controller.enqueue(value);
+      }
+    },
+    cancel(reason) {
+      return reader.cancel(reason);
+    }
+  });
+
+  if (!Buffer.concat(head).subarray(0, PCAPNG_MAGIC.length).equals(PCAPNG_MAGIC)) {
+    return analyzePCAPStreamWithPython(stream);
+  }
+  const directory = await fs.promises.mkdtemp(path.join(os.tmpdir(), 'pcap-upload-'));
+  try {
+    const filePath = path.join(directory, 'upload.pcapng');
+    await pipeline(Readable.fromWeb(stream as any), fs.createWriteStream(filePath));
+    return await analyzePCAPWithPythonJSON(filePath);
+  } finally {
+    await fs.promises.rm(directory, { recursive: true, force: true });
+  }
+}
+
+/**
+ * 把上传的抓包数据流直接送入分析包的标准输入（python -m pcap_analysis -），边接收边解析，
+ * 不需要先写入临时文件。只支持经典pcap格式，上传的数据用 analyzeUploadedPCAP 按格式分派。
+ */
+export async function analyzePCAPStreamWithPython(body: ReadableStream<Uint8Array>): Promise<PythonAnalysisResult> {
+  const child = spawn(
+    'python',
+    // 时间预算比超时短，超大上传返回部分结果而不是被强制结束
+    ['-m', 'pcap_analysis', '-', '--format', 'json', '--deadline', '110'],
+    { cwd: process.cwd(), stdio: ['pipe', 'pipe', 'pipe'] }
+  );
+
+  const stdout: Buffer[] = [];
+  let stderr = '';
+  child.stdout.on('data', (chunk: Buffer) => stdout.push(chunk));
+  child.stderr.on('data', (chunk: Buffer) => { stderr += chunk.toString(); });
+
+  const input = Readable.fromWeb(body as any);
+  // 分析在时间预算内提前结束时不再读取剩余数据，忽略写入已关闭管道的错误
+  child.stdin.on('error', () => input.destroy());
+  input.on('error', () => child.stdin.destroy());
+  input.pipe(child.stdin);
+
+  const timer = setTimeout(() => child.kill(), 120000); // 120秒超时
+  try {
+    const code = await new Promise<number | null>((resolve, reject) => {
+      child.on('error', reject);
+      child.on('close', resolve);
+    });
+    if (stderr) {
+      console.error('Python脚本错误输出:', stderr);
+    }
+    if (code !== 0) {
+      throw new Error(`分析进程异常退出: ${code}`);
+    }
+  } finally {
+    clearTimeout(timer);
+    input.destroy();
+  }
+
+  return checkSchemaVersion(JSON.parse(Buffer.concat(stdout).toString()) as PythonAnalysisResult);
+}
+
+function checkSchemaVersion(result: PythonAnalysisResult) {
+  if (result.schemaVersion !== ANALYSIS_RESULT_SCHEMA_VERSION) {
+    throw new Error(`不支持的分析结果版本: ${result.schemaVersion}`);
+  }
+  return result;
+}
+
+/**
+ * 分析服务进程本身无法启动或已退出（没有JSON-RPC错误码），而不是分析任务失败
+ */
+function isServerUnavailable(error: unknown) {
+  return error instanceof AnalysisServerError && error.code === undefined;
+}
+
+/**
+ * 生成AI分析用的限定长度摘要：优先走常驻分析服务，不可用时直接执行分析包
+ */
+async function runPythonTextAnalysis(filePath: string): Promise<string> {
+  const sample = fs.statSync(filePath).size > SAMPLE_THRESHOLD_BYTES ? SAMPLE_WINDOWS : 0;
+  try {
+    const result = await analyzeWithServer<PythonAnalysisResult>({
+      file_path: filePath,
+      analyzer: 'auto',
+      sample,
+      digest_chars: DIGEST_MAX_CHARS
+    }, 30000);
+    return result.digest ?? result.report;
+  } catch (error) {
+    if (!isServerUnavailable(error)) {
+      throw error;
+    }
+    console.error('Python分析服务不可用，改为直接执行脚本:', error);
+  }
+
+  // 执行分析包分析PCAP文件（在项目根目录下运行），25秒时间预算用完时输出已分析部分的摘要
+  const args = ['-m', 'pcap_analysis', filePath, '--deadline', '25',
+    '--format', 'digest', '--digest-chars', String(DIGEST_MAX_CHARS)];
+  if (sample) {
+    args.push('--sample', String(sample));
+  }
+  const { stdout, stderr } = await execFileAsync('python', args, {
+    cwd: process.cwd(),
+    timeout: 30000 // 30秒超时
+  });
+  
+  if (stderr) {
+    console.error('Python脚本错误输出:', stderr);
+  }
+  return stdout;
+}
+
 /**
  * 使用Python脚本调用tshark库分析PCAP文件并生成AI分析所需的文本报告
  */
@@ -34,18 +269,7 @@ export async function analyzePCAPWithPythonForAI(filePath: string) {
 
     // 尝试使用Python脚本分析PCAP文件
     try {
-      // 获取项目根目录
-      const projectRoot = process.cwd();
-      const pythonScriptPath = path.join(projectRoot, 'analyze_pcap.py');
-      
-      // 执行Python脚本分析PCAP文件
-      const { stdout, stderr } = await execFileAsync('python', [pythonScriptPath, filePath], {
-        timeout: 30000 // 30秒超时
-      });
-      
-      if (stderr) {
-        console.error('Python脚本错误输出:', stderr);
-      }
+      const stdout = await runPythonTextAnalysis(filePath);
       
       // 如果Python脚本成功执行并返回了分析结果
       if (stdout && stdout.trim() !== '') {
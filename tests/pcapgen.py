@@ -0,0 +1,142 @@
+"""测试用的合成抓包：按需构造以太网/SLL/RAW链路、VLAN标签、IPv4/IPv6（含扩展头和分片）、TCP、UDP和DNS"""
+import socket
+import struct
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_LINUX_SLL2 = 276
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPE_ARP = 0x0806
+
+
+def ipv4(src, dst, protocol, payload, ident=0, offset=0, more=False):
+    flags = (0x2000 if more else 0) | (offset // 8)
+    return struct.pack('>BBHHHBBH4s4s', 0x45, 0, 20 + len(payload), ident, flags, 64, protocol, 0,
+                       socket.inet_aton(src), socket.inet_aton(dst)) + payload
+
+
+def ipv6(src, dst, next_header, payload, extensions=b''):
+    return (struct.pack('>IHBB', 0x60000000, len(extensions) + len(payload), next_header, 64) +
+            socket.inet_pton(socket.AF_INET6, src) + socket.inet_pton(socket.AF_INET6, dst) + extensions + payload)
+
+
+def hop_by_hop(next_header):
+    """8字节的逐跳选项扩展头（只含填充）"""
+    return bytes([next_header, 0]) + b'\x01\x04\x00\x00\x00\x00'
+
+
+def tcp(src_port, dst_port, seq=1, ack=1, flags=0x18, payload=b'', window=1000):
+    return struct.pack('>HHLLBBHHH', src_port, dst_port, seq, ack, 0x50, flags, window, 0, 0) + payload
+
+
+def udp(src_port, dst_port, payload):
+    return struct.pack('>HHHH', src_port, dst_port, 8 + len(payload), 0) + payload
+
+
+def dns(txid, name, response=False, rcode=0):
+    labels = b''.join(bytes([len(label)]) + label.encode() for label in name.split('.')) + b'\x00'
+    flags = (0x8180 | rcode) if response else 0x0100
+    answer = b'\xc0\x0c\x00\x01\x00\x01\x00\x00\x00\x3c\x00\x04\x5d\xb8\xd8\x22' if response and not rcode else b''
+    return struct.pack('>HHHHHH', txid, flags, 1, 1 if answer else 0, 0, 0) + labels + b'\x00\x01\x00\x01' + answer
+
+
+def ipv4_fragments(src, dst, protocol, payload, ident, size=24):
+    """把上层数据切成IPv4分片（size 为8的倍数）"""
+    return [ipv4(src, dst, protocol, payload[start:start + size], ident, start, start + size < len(payload))
+            for start in range(0, len(payload), size)]
+
+
+def ipv6_fragments(src, dst, next_header, payload, ident, size=24):
+    """把上层数据切成IPv6分片，分片头之前带一个逐跳选项头"""
+    packets = []
+    for start in range(0, len(payload), size):
+        fragment = struct.pack('>BBHI', next_header, 0, start | (start + size < len(payload)), ident)
+        packets.append(ipv6(src, dst, 0, payload[start:start + size], hop_by_hop(44) + fragment))
+    return packets
+
+
+def mixed_traffic(count=3000):
+    """覆盖各解析分支的数据包序列：[(时间戳, 以太网类型, 网络层数据, VLAN标签)]
+
+    包括TCP握手、数据、重传和重复确认，IPv4/IPv6上的DNS查询和应答（含失败），带扩展头的IPv6，
+    收齐和未收齐的IPv4/IPv6分片，ICMP和ARP。分片间隔较大，numpy 后端在分片之间仍按块向量化聚合。
+    """
+    packets = []
+    ts = 1700000000.0
+
+    def add(ethertype, data, tags=()):
+        nonlocal ts
+        packets.append((ts, ethertype, data, tags))
+        ts += 0.0007
+
+    for i in range(count // 12):
+        client = f'10.0.{i % 4}.{i % 50 + 1}'
+        server = f'192.168.1.{i % 20 + 1}'
+        port = 40000 + i
+        # TCP握手、数据、重传和重复确认
+        add(ETHERTYPE_IPV4, ipv4(client, server, 6, tcp(port, 443, seq=100, ack=0, flags=0x02)))
+        add(ETHERTYPE_IPV4, ipv4(server, client, 6, tcp(443, port, seq=500, ack=101, flags=0x12)), ((0x8100, 10),))
+        add(ETHERTYPE_IPV4, ipv4(client, server, 6, tcp(port, 443, seq=101, ack=501, flags=0x10)))
+        data = tcp(port, 443, seq=101, ack=501, payload=b'\x16\x03\x01' + b'a' * 60)
+        add(ETHERTYPE_IPV4, ipv4(client, server, 6, data))
+        if i % 3 == 0:
+            add(ETHERTYPE_IPV4, ipv4(client, server, 6, data))
+            add(ETHERTYPE_IPV4, ipv4(server, client, 6, tcp(443, port, seq=501, ack=101, flags=0x10)))
+        add(ETHERTYPE_IPV4, ipv4(server, client, 6, tcp(443, port, seq=501, ack=164, flags=0x10)))
+        # IPv4和IPv6上的DNS，QinQ双层标签
+        name = ('example.com', 'a.test', 'nx.invalid')[i % 3]
+        rcode = 3 if name == 'nx.invalid' else 0
+        add(ETHERTYPE_IPV4, ipv4(client, '8.8.8.8', 17, udp(port, 53, dns(i, name))), ((0x88a8, 100), (0x8100, 20)))
+        if i % 7:
+            add(ETHERTYPE_IPV4, ipv4('8.8.8.8', client, 17, udp(53, port, dns(i, name, True, rcode))))
+        client6 = f'2001:db8::{i % 40 + 1:x}'
+        add(ETHERTYPE_IPV6, ipv6(client6, '2001:4860::8888', 17, udp(port, 53, dns(i, name))))
+        add(ETHERTYPE_IPV6, ipv6('2001:4860::8888', client6, 17, udp(53, port, dns(i, name, True, rcode))))
+        # 带逐跳选项头的IPv6 TCP
+        add(ETHERTYPE_IPV6, ipv6(client6, 'fe80::1', 0, tcp(port, 80, payload=b'GET / HTTP/1.1\r\n\r\n'),
+                                 hop_by_hop(6)), ((0x8100, 30),))
+        # 分片：收齐的IPv4、IPv6数据报和缺一片的IPv4数据报
+        if i % 40 == 0:
+            for data in ipv4_fragments(client, server, 17, udp(port, 5353, dns(i, name) * 3), i):
+                add(ETHERTYPE_IPV4, data)
+            for data in ipv6_fragments(client6, 'fe80::1', 17, udp(port, 9000, b'z' * 70), i):
+                add(ETHERTYPE_IPV6, data)
+            for data in ipv4_fragments(client, server, 17, udp(port, 7000, b'y' * 80), i + 30000)[1:]:
+                add(ETHERTYPE_IPV4, data)
+        add(ETHERTYPE_IPV4, ipv4(client, server, 1, b'\x08\x00' + b'\x00' * 6))
+        add(ETHERTYPE_ARP, b'\x00\x01' * 14)
+    return packets
+
+
+def link_frame(linktype, ethertype, data, tags=()):
+    """按链路类型封装网络层数据；RAW链路无法表示非IP数据包，返回None"""
+    if linktype == LINKTYPE_ETHERNET:
+        header = b'\x00\x11\x22\x33\x44\x55\x66\x77\x88\x99\xaa\xbb'
+        for tpid, vid in tags:
+            header += struct.pack('>HH', tpid, vid)
+        return header + struct.pack('>H', ethertype) + data
+    if linktype == LINKTYPE_LINUX_SLL:
+        return struct.pack('>HHH8sH', 0, 1, 6, b'\x00' * 8, ethertype) + data
+    if linktype == LINKTYPE_LINUX_SLL2:
+        return struct.pack('>HHIHBB8s', ethertype, 0, 2, 1, 0, 6, b'\x00' * 8) + data
+    if linktype == LINKTYPE_RAW:
+        return data if ethertype in (ETHERTYPE_IPV4, ETHERTYPE_IPV6) else None
+    raise ValueError(f"不支持的链路类型 {linktype}")
+
+
+def write_pcap(path, packets, linktype=LINKTYPE_ETHERNET, byteorder='<', nanosecond=False):
+    """把 mixed_traffic 格式的数据包写成经典pcap文件"""
+    divisor = 1000000000 if nanosecond else 1000000
+    with open(path, 'wb') as f:
+        f.write(struct.pack(byteorder + 'IHHiIII', 0xa1b23c4d if nanosecond else 0xa1b2c3d4, 2, 4, 0, 0, 65535,
+                            linktype))
+        for ts, ethertype, data, tags in packets:
+            frame = link_frame(linktype, ethertype, data, tags)
+            if frame is None:
+                continue
+            seconds = int(ts)
+            fraction = round((ts - seconds) * divisor)
+            f.write(struct.pack(byteorder + 'IIII', seconds, fraction, len(frame), len(frame)) + frame)
+    return path
@@ -0,0 +1,96 @@
+"""应用层协议识别：载荷特征、端口归类、有界的SNI计数和跨分片合并"""
+import struct
+
+import pytest
+
+from pcap_analysis.analyzer import analyze_file
+from pcap_analysis.apps import AppClassifier, tls_server_name
+from pcapgen import ETHERTYPE_IPV4, dns, ipv4, tcp, udp, write_pcap
+
+START = 1700000000.0
+# 以太网头和IPv4头：字节数按整帧计
+FRAME_OVERHEAD = 14 + 20
+
+
+def client_hello(name):
+    """带SNI扩展的TLS ClientHello记录"""
+    encoded = name.encode('ascii')
+    server_name = struct.pack('>HBH', len(encoded) + 3, 0, len(encoded)) + encoded
+    extensions = struct.pack('>HH', 0, len(server_name)) + server_name
+    body = (b'\x03\x03' + b'\x00' * 32 + b'\x00' + struct.pack('>H', 2) + b'\x13\x01' + b'\x01\x00'
+            + struct.pack('>H', len(extensions)) + extensions)
+    handshake = b'\x01' + len(body).to_bytes(3, 'big') + body
+    return b'\x16\x03\x01' + struct.pack('>H', len(handshake)) + handshake
+
+
+def _traffic(names):
+    """每个域名一条TLS连接，另有HTTP、DNS、只按端口识别和无法识别的流
+
+    返回 [(时间, 协议号, 源, 目的, 传输层段)]。
+    """
+    packets = []
+    for i, name in enumerate(names):
+        client = f'10.0.{i // 200}.{i % 200 + 1}'
+        segment = tcp(40000 + i % 1000, 443, payload=client_hello(name))
+        packets.append((START + i * 0.01, 6, client, '93.184.216.34', segment))
+    ts = START + len(names) * 0.01
+    packets.append((ts, 6, '10.1.0.1', '10.1.0.2', tcp(41000, 8000, payload=b'GET / HTTP/1.1\r\n\r\n')))
+    packets.append((ts + 0.01, 17, '10.1.0.1', '8.8.8.8', udp(5000, 53, dns(1, 'example.com'))))
+    for j in range(3):
+        packets.append((ts + 0.02 + j * 0.01, 6, '10.1.0.1', '10.1.0.3', tcp(41001, 22, payload=b'\x00' * 8)))
+        packets.append((ts + 0.02 + j * 0.01, 17, '10.1.0.1', '10.1.0.4', udp(41002, 9999, b'\x00' * 8)))
+    return packets
+
+
+def _classify(packets, classifier=None):
+    classifier = classifier or AppClassifier()
+    for _, protocol, src, dst, segment in packets:
+        classifier.process(protocol, src, dst, segment, len(segment) + FRAME_OVERHEAD)
+    return classifier
+
+
+def test_classification():
+    names = ['a.example'] * 3 + ['b.example']
+    summary = _classify(_traffic(names)).summary()
+    assert summary['flows'] == 8
+    protocols = summary['protocols']
+    assert protocols['TLS']['flows'] == 4 and protocols['HTTP']['flows'] == 1 and protocols['DNS']['flows'] == 1
+    # SSH只有端口可以判断，另一条UDP流无法识别
+    assert protocols['SSH'] == {'packets': 3, 'bytes': 3 * (28 + FRAME_OVERHEAD), 'flows': 1}
+    assert protocols['Other-UDP']['flows'] == 1
+    assert summary['methods'] == {'signature': 6, 'port': 1, 'unknown': 1}
+    assert summary['tls_server_names'] == [{'name': 'a.example', 'flows': 3, 'error': 0},
+                                           {'name': 'b.example', 'flows': 1, 'error': 0}]
+
+
+def test_server_names_are_bounded():
+    names = ['popular.example'] * 50 + [f'host{i}.example' for i in range(500)]
+    classifier = _classify(_traffic(names), AppClassifier(name_capacity=20))
+    assert len(classifier.server_names.counts) <= 40
+    top = classifier.summary()['tls_server_names'][0]
+    assert top['name'] == 'popular.example' and top['flows'] >= 50
+
+
+@pytest.mark.parametrize('split', [1, 3, 6])
+def test_merge_equals_single_pass(split):
+    packets = _traffic(['a.example', 'b.example', 'a.example', 'c.example'])
+    merged = _classify(packets[:split])
+    merged.merge(_classify(packets[split:]))
+    assert merged.summary() == _classify(packets).summary()
+
+
+def test_truncated_client_hello():
+    record = client_hello('example.com')
+    assert tls_server_name(record) == 'example.com'
+    assert tls_server_name(record[:60]) is None
+
+
+@pytest.mark.parametrize('backend', ['native', 'numpy'])
+def test_applications_in_capture(tmp_path, backend):
+    packets = _traffic(['a.example', 'a.example', 'b.example'])
+    frames = [(ts, ETHERTYPE_IPV4, ipv4(src, dst, protocol, segment), ())
+              for ts, protocol, src, dst, segment in packets]
+    result = analyze_file(write_pcap(str(tmp_path / 'apps.pcap'), frames), backend)
+    expected = _classify(packets).summary()
+    assert result['applications']['protocols'] == expected['protocols']
+    assert result['applications']['tls_server_names'] == expected['tls_server_names']
@@ -0,0 +1,39 @@
+"""基线概况中分桶速率的单位和比较范围"""
+import pytest
+
+from pcap_analysis.analyzer import analyze
+from pcap_analysis.baseline import capture_profile, compare_profile
+from pcapgen import ETHERTYPE_IPV4, ipv4, udp, write_pcap
+
+# 每秒100个1000字节的帧：包速率100包/秒，带宽0.8Mbps
+RATE = 100
+FRAME = 1000
+
+
+def _steady_capture(path, seconds):
+    payload = udp(5000, 6000, b'x' * (FRAME - 14 - 20 - 8))
+    packets = [(1700000000.005 + i / RATE, ETHERTYPE_IPV4, ipv4('10.0.0.1', '10.0.0.2', 17, payload), ())
+               for i in range(seconds * RATE)]
+    return write_pcap(path, packets)
+
+
+def _profile(path, bucket_ms):
+    return capture_profile(analyze(path, backend='native', use_cache=False, bucket_ms=bucket_ms))
+
+
+@pytest.mark.parametrize('bucket_ms', [100, 1000])
+def test_bucket_rates_are_per_second(tmp_path, bucket_ms):
+    metrics = _profile(_steady_capture(str(tmp_path / 'steady.pcap'), 20), bucket_ms)['metrics']
+    assert metrics['packet_rate'] == pytest.approx(RATE, rel=0.01)
+    assert metrics['pps_p50'] == pytest.approx(RATE, rel=0.1)
+    assert metrics['mbps_p50'] == pytest.approx(RATE * FRAME * 8 / 1000000, rel=0.1)
+
+
+def test_bucket_metrics_compared_at_same_interval(tmp_path):
+    baseline = _profile(_steady_capture(str(tmp_path / 'baseline.pcap'), 20), 1000)
+    path = _steady_capture(str(tmp_path / 'current.pcap'), 21)
+    names = {entry['metric'] for entry in compare_profile(_profile(path, 100), [baseline])['metrics']}
+    assert 'packet_rate' in names
+    assert not names & {'pps_p50', 'pps_p95', 'mbps_p50', 'mbps_p95', 'mbps_p99'}
+    names = {entry['metric'] for entry in compare_profile(_profile(path, 1000), [baseline])['metrics']}
+    assert {'pps_p50', 'mbps_p99'} <= names
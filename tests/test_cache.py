@@ -0,0 +1,76 @@
+"""分析结果缓存：命中、文件和选项变化后失效、LRU淘汰"""
+import os
+
+import pytest
+
+from pcap_analysis.analyzer import analyze
+from pcap_analysis.cache import AnalysisCache, cached_analysis
+from pcapgen import mixed_traffic, write_pcap
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return AnalysisCache(str(tmp_path / 'cache'))
+
+
+@pytest.fixture
+def capture(tmp_path):
+    return write_pcap(str(tmp_path / 'mixed.pcap'), mixed_traffic(600))
+
+
+class _Compute:
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return dict(self.value)
+
+
+def test_hit_and_invalidation(cache, capture):
+    compute = _Compute({'totalPackets': 1})
+    assert cached_analysis(capture, 'native', 1, {}, compute, cache) == {'totalPackets': 1}
+    assert cached_analysis(capture, 'native', 1, {}, compute, cache) == {'totalPackets': 1}
+    assert compute.calls == 1
+
+    # 分析器版本和选项是缓存键的一部分
+    cached_analysis(capture, 'native', 2, {}, compute, cache)
+    cached_analysis(capture, 'native', 1, {'bucket_ms': 100}, compute, cache)
+    assert compute.calls == 3
+
+    # 文件追加数据后指纹变化
+    with open(capture, 'ab') as f:
+        f.write(b'\x00' * 16)
+    cached_analysis(capture, 'native', 1, {}, compute, cache)
+    assert compute.calls == 4
+
+
+@pytest.mark.parametrize('value', [{'partial': True}, {'error': '暂时失败'}])
+def test_incomplete_results_not_cached(cache, capture, value):
+    compute = _Compute(value)
+    cached_analysis(capture, 'native', 1, {}, compute, cache)
+    cached_analysis(capture, 'native', 1, {}, compute, cache)
+    assert compute.calls == 2
+
+
+def test_evicts_least_recently_used(cache):
+    for index, key in enumerate(('aa01', 'bb02', 'cc03')):
+        cache.put(key, {'data': 'x' * 1000})
+        os.utime(cache._entry_path(key), (1000 + index, 1000 + index))
+    # 读取刷新访问时间，最早写入的条目变成最近使用
+    assert cache.get('aa01') == {'data': 'x' * 1000}
+    cache.max_bytes = os.path.getsize(cache._entry_path('aa01')) * 2
+    assert cache.evict() == 1
+    assert cache.get('bb02') is None
+    assert cache.get('aa01') is not None and cache.get('cc03') is not None
+
+
+def test_analyze_uses_cache(tmp_path, monkeypatch, capture):
+    monkeypatch.setenv('PCAP_ANALYSIS_CACHE_DIR', str(tmp_path / 'cache'))
+    first = analyze(capture, backend='native')
+    assert os.listdir(tmp_path / 'cache')
+    assert analyze(capture, backend='native') == first
+
+    write_pcap(capture, mixed_traffic(300))
+    assert analyze(capture, backend='native')['totalPackets'] < first['totalPackets']
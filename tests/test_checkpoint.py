@@ -0,0 +1,54 @@
+"""汇总（检查点）文件的保存、加载和对构造数据的拒绝"""
+import json
+import pickle
+import zlib
+
+import pytest
+
+from pcap_analysis.analyzer import analyze
+from pcap_analysis.checkpoint import SUMMARY_MAGIC, SUMMARY_VERSION, _SUMMARY_HEADER, load_summary, summary_result
+from pcap_analysis.traffic import ANALYZER_VERSION, TrafficStats
+from pcapgen import mixed_traffic, write_pcap
+
+
+def _write_summary(path, payload):
+    """写一个元数据合法、聚合状态为任意 pickle 数据的汇总文件"""
+    meta = json.dumps({'analyzer_version': ANALYZER_VERSION, 'options': {}, 'sources': []}).encode('utf-8')
+    with open(path, 'wb') as f:
+        f.write(_SUMMARY_HEADER.pack(SUMMARY_MAGIC, SUMMARY_VERSION, len(meta)) + meta + zlib.compress(payload))
+    return path
+
+
+def test_round_trip(tmp_path):
+    path = write_pcap(str(tmp_path / 'mixed.pcap'), mixed_traffic(1200))
+    summary = str(tmp_path / 'mixed.summary')
+    result = analyze(path, backend='native', use_cache=False, checkpoint=summary)
+    stats, meta = load_summary(summary)
+    assert isinstance(stats, TrafficStats)
+    assert meta['sources'][0]['complete']
+    restored = summary_result(stats, meta)
+    for key in ('totalPackets', 'totalSize', 'protocols', 'topTalkers', 'tcp', 'dns', 'flows', 'fragments'):
+        assert restored[key] == result[key]
+
+
+@pytest.mark.parametrize('payload', [
+    # REDUCE 直接调用本包的类（构造函数会创建文件）
+    b'cpcap_analysis.edit\n_Writer\n(V{target}\nC\x00tR.',
+    # 经 _restore 创建白名单之外的类型
+    b'cpcap_analysis.checkpoint\n_restore\n(Vedit\nV_Writer\ntR.',
+    # 白名单中的类也不能被直接引用
+    b'cpcap_analysis.traffic\nTrafficStats\n(tR.',
+    b'cos\nsystem\n(Vtouch {target}\ntR.'
+])
+def test_rejects_crafted_payload(tmp_path, payload):
+    target = tmp_path / 'pwned'
+    path = _write_summary(str(tmp_path / 'evil.summary'), payload.replace(b'{target}', str(target).encode()))
+    with pytest.raises(ValueError):
+        load_summary(path)
+    assert not target.exists()
+
+
+def test_rejects_non_stats(tmp_path):
+    path = _write_summary(str(tmp_path / 'dict.summary'), pickle.dumps({'packet_count': 1}))
+    with pytest.raises(ValueError, match='TrafficStats'):
+        load_summary(path)
@@ -0,0 +1,63 @@
+"""时间预算到时返回部分结果，进度记录"""
+import io
+
+import pytest
+
+from pcap_analysis.analyzer import analyze, analyze_file, analyze_stream
+from pcap_analysis.backends import native, vectorized
+from pcap_analysis.server import default_deadline
+from pcapgen import mixed_traffic, write_pcap
+
+BACKENDS = ['native', 'numpy']
+
+
+@pytest.fixture(scope='module')
+def capture(tmp_path_factory):
+    return write_pcap(str(tmp_path_factory.mktemp('deadline') / 'mixed.pcap'), mixed_traffic(6000))
+
+
+@pytest.fixture(autouse=True)
+def frequent_checks(monkeypatch):
+    """小文件上也要多次检查截止时间"""
+    monkeypatch.setattr(native, 'CHECK_EVERY', 500)
+    monkeypatch.setattr(vectorized, 'CHUNK_SIZE', 32 * 1024)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_expired_deadline_returns_partial_result(tmp_path, monkeypatch, capture, backend):
+    monkeypatch.setenv('PCAP_ANALYSIS_CACHE_DIR', str(tmp_path / 'cache'))
+    total = analyze_file(capture, backend)['totalPackets']
+    result = analyze(capture, backend=backend, deadline=1e-9)
+    assert result['partial'] and 0 < result['totalPackets'] < total
+    coverage = result['coverage']
+    assert coverage['stoppedBy'] == 'deadline' and 0 < coverage['fraction'] < 1
+    assert coverage['packets'] == result['totalPackets']
+    assert any('时间预算' in warning for warning in result['warnings'])
+    # 部分结果不写入缓存
+    assert analyze(capture, backend=backend)['totalPackets'] == total
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_progress_records(capture, backend):
+    records = []
+    result = analyze(capture, backend=backend, use_cache=False, on_progress=records.append, progress_interval=0)
+    assert not result['partial'] and len(records) > 1
+    assert [record['bytes'] for record in records] == sorted(record['bytes'] for record in records)
+    assert all(0 < record['fraction'] <= 1 and record['totalBytes'] > 0 for record in records)
+    assert records[-1]['packets'] <= result['totalPackets']
+
+
+def test_stream_progress_has_unknown_total(capture):
+    records = []
+    with open(capture, 'rb') as f:
+        result = analyze_stream(io.BytesIO(f.read()), backend='native', deadline=1e-9, on_progress=records.append,
+                                progress_interval=0)
+    assert records and all(record['fraction'] is None and record['eta'] is None for record in records)
+    assert result['partial'] and result['coverage']['fraction'] is None
+    assert result['coverage']['bytes'] > 0
+
+
+def test_default_deadline_leaves_margin():
+    assert default_deadline(120) == pytest.approx(108)
+    assert default_deadline(10) == pytest.approx(8)
+    assert default_deadline(2) == pytest.approx(1)
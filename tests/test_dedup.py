@@ -0,0 +1,81 @@
+"""镜像口重复帧的去除：只比较网络层内容，窗口外的重发和内容不同的包保留"""
+import pytest
+
+from pcap_analysis.dedup import DuplicateFilter
+from pcap_analysis.edit import dedup_capture
+from pcap_analysis.pcapfile import iter_raw_records, read_pcap_header
+from pcapgen import ETHERTYPE_ARP, ETHERTYPE_IPV4, ETHERTYPE_IPV6, ipv4, ipv6, link_frame, udp, write_pcap
+
+START = 1700000000.0
+
+
+def _mirror_copy(packet):
+    """晚20微秒的镜像副本：IP包经过路由，TTL减1、校验和不同并带VLAN标签；非IP帧（按整帧比较）原样重复"""
+    ts, ethertype, data, tags = packet
+    if ethertype == ETHERTYPE_IPV4:
+        data = data[:8] + bytes([data[8] - 1]) + data[9:10] + b'\xab\xcd' + data[12:]
+        tags = ((0x8100, 99),)
+    elif ethertype == ETHERTYPE_IPV6:
+        data = data[:7] + bytes([data[7] - 1]) + data[8:]
+        tags = ((0x8100, 99),)
+    return ts + 0.00002, ethertype, data, tags
+
+
+def _traffic():
+    packets = []
+    for i in range(300):
+        ts = START + i * 0.002
+        if i % 3 == 0:
+            data = ipv4('10.0.0.1', '10.0.0.2', 17, udp(5000, 6000, b'x' * 40), ident=i)
+            packets.append((ts, ETHERTYPE_IPV4, data, ()))
+        elif i % 3 == 1:
+            packets.append((ts, ETHERTYPE_IPV6, ipv6('2001:db8::1', '2001:db8::2', 17, udp(5000, 6000, b'%d' % i)), ()))
+        else:
+            packets.append((ts, ETHERTYPE_ARP, b'\x00\x01' * 13 + bytes([i % 256, 0]), ()))
+    return packets
+
+
+def _frames(path):
+    with open(path, 'rb') as f:
+        header = read_pcap_header(f)
+        return [record for _, _, record in iter_raw_records(f, record_header=header['record_header'])]
+
+
+def test_removes_mirror_copies(tmp_path):
+    original = _traffic()
+    duplicated = sorted(original + [_mirror_copy(packet) for packet in original[::2]], key=lambda p: p[0])
+    source = write_pcap(str(tmp_path / 'span.pcap'), duplicated)
+    output = str(tmp_path / 'dedup.pcap')
+    summary = dedup_capture(source, output)
+    assert summary['packets'] == len(duplicated) and summary['duplicates'] == 150
+    assert summary['evicted'] == 0
+    assert _frames(output) == _frames(write_pcap(str(tmp_path / 'original.pcap'), original))
+
+
+def test_keeps_retransmissions_outside_window():
+    frame = link_frame(1, ETHERTYPE_IPV4, ipv4('10.0.0.1', '10.0.0.2', 17, udp(5000, 6000, b'x'), ident=7))
+    duplicates = DuplicateFilter(window=0.001)
+    assert not duplicates.is_duplicate(START, frame)
+    assert duplicates.is_duplicate(START + 0.0005, frame)
+    # 窗口之外的相同内容（真正的重发）
+    assert not duplicates.is_duplicate(START + 0.01, frame)
+    # IPv4标识不同的包不是副本
+    other = link_frame(1, ETHERTYPE_IPV4, ipv4('10.0.0.1', '10.0.0.2', 17, udp(5000, 6000, b'x'), ident=8))
+    assert not duplicates.is_duplicate(START + 0.0101, other)
+
+
+def test_table_is_bounded():
+    duplicates = DuplicateFilter(window=60, max_entries=10)
+    for i in range(100):
+        frame = link_frame(1, ETHERTYPE_IPV4, ipv4('10.0.0.1', '10.0.0.2', 17, udp(5000, 6000, b''), ident=i))
+        duplicates.is_duplicate(START, frame)
+    assert len(duplicates.recent) == len(duplicates.seen) == 10
+    assert duplicates.summary()['evicted'] == 90
+
+
+@pytest.mark.parametrize('window, expected', [(0.00001, 0), (0.001, 150)])
+def test_window_option(tmp_path, window, expected):
+    original = _traffic()
+    duplicated = sorted(original + [_mirror_copy(packet) for packet in original[::2]], key=lambda p: p[0])
+    source = write_pcap(str(tmp_path / 'span.pcap'), duplicated)
+    assert dedup_capture(source, str(tmp_path / 'dedup.pcap'), window=window)['duplicates'] == expected
@@ -0,0 +1,97 @@
+"""滑动窗口异常检测：SYN洪泛、端口扫描、ICMP洪泛和速率突变"""
+import pytest
+
+from pcap_analysis.analyzer import analyze_file
+from pcap_analysis.detect import AnomalyDetector
+from pcap_analysis.tcp import ACK, SYN
+from pcapgen import ETHERTYPE_IPV4, ipv4, tcp, udp, write_pcap
+
+START = 1700000000.0
+ATTACKER, SERVER = '203.0.113.9', '10.0.0.80'
+
+
+def _syn_flood():
+    """4秒内从不同源地址向服务器发1200个SYN，服务器只回复少量SYN/ACK"""
+    packets = []
+    for i in range(1200):
+        ts = START + i * 4 / 1200
+        source = f'198.51.{i // 250}.{i % 250 + 1}'
+        packets.append((ts, 6, source, SERVER, tcp(1024 + i, 80, flags=SYN)))
+        if i % 20 == 0:
+            packets.append((ts, 6, SERVER, source, tcp(80, 1024 + i, flags=SYN | ACK)))
+    return packets
+
+
+def _horizontal_scan():
+    return [(START + i * 0.01, 6, ATTACKER, f'10.1.0.{i + 1}', tcp(40000, 22, flags=SYN)) for i in range(120)]
+
+
+def _vertical_scan():
+    return [(START + i * 0.01, 17, ATTACKER, SERVER, udp(50000, 1 + i, b'')) for i in range(300)]
+
+
+def _icmp_flood():
+    return [(START + i * 0.002, 1, ATTACKER, SERVER, b'\x08\x00' + b'\x00' * 6) for i in range(1500)]
+
+
+def _detect(packets, detector=None):
+    detector = detector or AnomalyDetector()
+    for ts, protocol, src, dst, segment in packets:
+        detector.count(ts)
+        detector.process(ts, protocol, src, dst, segment)
+    return detector
+
+
+@pytest.mark.parametrize('packets, kind, source, target', [
+    (_syn_flood(), 'syn_flood', None, SERVER),
+    (_horizontal_scan(), 'horizontal_scan', ATTACKER, 22),
+    (_vertical_scan(), 'vertical_scan', ATTACKER, SERVER),
+    (_icmp_flood(), 'icmp_flood', None, SERVER)
+])
+def test_detects_one_event(packets, kind, source, target):
+    summary = _detect(packets).summary()
+    assert summary['event_counts'] == {kind: 1}
+    event = summary['events'][0]
+    assert (event['type'], event['source'], event['target']) == (kind, source, target)
+    assert event['duration'] > 0
+
+
+def test_normal_traffic_has_no_events():
+    # 客户端连接服务器，服务器回复SYN/ACK，UDP响应发往客户端的临时端口
+    packets = []
+    for i in range(3000):
+        ts = START + i * 0.02
+        client = f'10.2.{i % 8}.{i % 200 + 1}'
+        packets.append((ts, 6, client, SERVER, tcp(30000 + i, 443, flags=SYN)))
+        packets.append((ts, 6, SERVER, client, tcp(443, 30000 + i, flags=SYN | ACK)))
+        packets.append((ts, 17, '8.8.8.8', client, udp(53, 30000 + i, b'')))
+    assert _detect(packets).summary()['events'] == []
+
+
+def test_rate_spike_and_drop():
+    detector = AnomalyDetector()
+    for second in range(60):
+        rate = 2000 if 30 <= second < 32 else 0 if second >= 50 else 200
+        for i in range(rate):
+            detector.count(START + second + i / rate)
+    detector.count(START + 60)
+    kinds = [event['type'] for event in detector.summary()['events']]
+    assert kinds == ['rate_spike', 'rate_drop']
+
+
+def test_merge_joins_events_across_split():
+    packets = sorted(_syn_flood(), key=lambda packet: packet[0])
+    middle = len(packets) // 2
+    merged = _detect(packets[:middle])
+    merged.merge(_detect(packets[middle:]))
+    summary = merged.summary()
+    assert summary['event_counts'] == {'syn_flood': 1} and len(summary['events']) == 1
+
+
+@pytest.mark.parametrize('backend', ['native', 'numpy'])
+def test_scan_in_capture(tmp_path, backend):
+    frames = [(ts, ETHERTYPE_IPV4, ipv4(src, dst, protocol, segment), ())
+              for ts, protocol, src, dst, segment in _horizontal_scan()]
+    result = analyze_file(write_pcap(str(tmp_path / 'scan.pcap'), frames), backend)
+    assert [event['type'] for event in result['anomalies']['events']] == ['horizontal_scan']
+    assert result['suspiciousActivities'][0]['count'] == 1
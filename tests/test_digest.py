@@ -0,0 +1,40 @@
+"""摘要长度限制、优先级和确定性"""
+import pytest
+
+from pcap_analysis.analyzer import analyze
+from pcap_analysis.digest import digest, estimate_tokens
+from pcapgen import mixed_traffic, write_pcap
+
+
+@pytest.fixture(scope='module')
+def result(tmp_path_factory):
+    path = write_pcap(str(tmp_path_factory.mktemp('digest') / 'mixed.pcap'), mixed_traffic(3000))
+    return analyze(path, backend='native', use_cache=False)
+
+
+@pytest.mark.parametrize('max_chars', [50, 300, 1500, 6000])
+def test_char_budget(result, max_chars):
+    text = digest(result, max_chars=max_chars)
+    assert 0 < len(text) <= max_chars
+    assert text == digest(result, max_chars=max_chars)
+
+
+@pytest.mark.parametrize('max_tokens', [100, 400, 2000])
+def test_token_budget(result, max_tokens):
+    assert estimate_tokens(digest(result, max_tokens=max_tokens)) <= max_tokens
+
+
+def test_sections_by_priority(result):
+    short = digest(result, max_chars=300)
+    assert short.startswith('概况:\n') and '省略' in short
+    full = digest(result, max_chars=100000)
+    assert '省略' not in full
+    positions = [full.index(f"{title}:\n") for title in ('概况', '协议分布', 'TCP性能', 'DNS', '主要通信IP')]
+    assert positions == sorted(positions)
+    # 放得下时每段至少有标题和第一行
+    assert all(title in digest(result, max_chars=1500) for title in ('概况:', '协议分布:', 'TCP性能:', 'DNS:'))
+
+
+def test_error_result():
+    text = digest({'error': {'message': '文件不存在'}}, max_chars=20)
+    assert text.startswith('分析失败') and len(text) <= 20
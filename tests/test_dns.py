@@ -0,0 +1,73 @@
+"""DNS事务分析：查询与响应配对、重发、未响应、失败和跨分片合并"""
+import pytest
+
+from pcap_analysis.dns import DnsAnalyzer, parse_question
+from pcapgen import dns, tcp, udp
+
+CLIENT, RESOLVER = '10.0.0.1', '8.8.8.8'
+START = 1700000000.0
+
+# (时间, 是否查询, 标识, 域名, 响应码)
+EVENTS = [
+    (0.000, True, 1, 'example.com', 0),
+    (0.025, False, 1, 'example.com', 0),
+    (0.100, True, 2, 'nx.invalid', 0),
+    (0.200, True, 2, 'nx.invalid', 0),
+    (0.300, False, 2, 'nx.invalid', 3),
+    (0.400, True, 3, 'lost.test', 0),
+    (0.500, False, 99, 'stray.test', 0),
+    (10.00, True, 4, 'example.com', 0)
+]
+
+
+def _feed(analyzer, events):
+    for ts, query, txid, name, rcode in events:
+        if query:
+            analyzer.process(START + ts, 17, CLIENT, RESOLVER, udp(5000, 53, dns(txid, name)))
+        else:
+            analyzer.process(START + ts, 17, RESOLVER, CLIENT, udp(53, 5000, dns(txid, name, True, rcode)))
+    return analyzer
+
+
+def test_transactions():
+    summary = _feed(DnsAnalyzer(), EVENTS).summary()
+    assert (summary['queries'], summary['responses'], summary['retransmissions']) == (4, 2, 1)
+    # txid 3 超时未响应，txid 4 在抓包结束时仍在等待
+    assert summary['unanswered'] == 2 and summary['unmatched_responses'] == 1
+    assert summary['rcodes'] == {'NOERROR': 1, 'NXDOMAIN': 1}
+    assert summary['failures'] == 1 and summary['failure_rate'] == 0.5
+    # 重发的查询从第一次发出算起
+    assert summary['latency_ms']['min'] == pytest.approx(25, abs=0.01)
+    assert summary['latency_ms']['max'] == pytest.approx(200, abs=0.01)
+    assert summary['query_types'] == {'A': 4}
+    assert summary['resolvers'][0]['resolver'] == RESOLVER and summary['resolvers'][0]['failures'] == 1
+    assert summary['top_names'][0] == {'name': 'example.com', 'queries': 2, 'error': 0}
+    assert summary['top_failed_names'] == [{'name': 'nx.invalid', 'failures': 1, 'error': 0}]
+
+
+@pytest.mark.parametrize('split', [1, 2, 4, 5])
+def test_merge_pairs_across_split(split):
+    """查询在前一分片、响应在后一分片时仍配对（分片边界不在重发的查询之间）"""
+    merged = _feed(DnsAnalyzer(), EVENTS[:split])
+    merged.merge(_feed(DnsAnalyzer(), EVENTS[split:]))
+    assert merged.summary() == _feed(DnsAnalyzer(), EVENTS).summary()
+
+
+def test_pending_table_is_bounded():
+    analyzer = DnsAnalyzer(max_pending=10)
+    for txid in range(100):
+        analyzer.process(START, 17, CLIENT, RESOLVER, udp(5000, 53, dns(txid, 'example.com')))
+    assert len(analyzer.pending) == 10 and analyzer.summary()['unanswered'] == 100
+
+
+def test_dns_over_tcp():
+    message = dns(7, 'example.com')
+    segment = tcp(40000, 53, payload=len(message).to_bytes(2, 'big') + message)
+    analyzer = DnsAnalyzer()
+    analyzer.process(START, 6, CLIENT, RESOLVER, segment)
+    assert analyzer.queries == 1
+
+
+@pytest.mark.parametrize('payload', [b'', b'\x00' * 11, dns(1, 'example.com')[:14]])
+def test_malformed_question(payload):
+    assert parse_question(payload) is None
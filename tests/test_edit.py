@@ -0,0 +1,85 @@
+"""合并、切分和截取：记录原样复制，格式不同的输入改写记录头"""
+import os
+import socket
+
+import pytest
+
+from pcap_analysis.edit import merge_captures, slice_capture, split_capture
+from pcap_analysis.pcapfile import iter_raw_records, read_pcap_header
+from pcapgen import ETHERTYPE_IPV4, LINKTYPE_LINUX_SLL, mixed_traffic, write_pcap
+
+
+@pytest.fixture(scope='module')
+def traffic():
+    return mixed_traffic(1200)
+
+
+@pytest.fixture
+def capture(tmp_path, traffic):
+    return write_pcap(str(tmp_path / 'mixed.pcap'), traffic)
+
+
+def _records(path):
+    """返回 (文件头, [(纳秒时间戳, 帧数据)])"""
+    with open(path, 'rb') as f:
+        header = read_pcap_header(f)
+        scale = 1000000000 // header['ts_divisor']
+        return header, [(ts_sec * 1000000000 + ts_frac * scale, record[16:])
+                        for ts_sec, ts_frac, record in iter_raw_records(f, record_header=header['record_header'])]
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_split_by_packets_then_merge_restores_file(tmp_path, capture):
+    outputs = split_capture(capture, str(tmp_path / 'part'), packets=250)
+    counts = [len(_records(path)[1]) for path in outputs]
+    assert counts[:-1] == [250] * (len(outputs) - 1) and 0 < counts[-1] <= 250
+    merged = str(tmp_path / 'merged.pcap')
+    assert merge_captures(outputs[::-1], merged) == sum(counts)
+    assert _read(merged) == _read(capture)
+
+
+def test_split_by_size_and_time(tmp_path, capture):
+    for path in split_capture(capture, str(tmp_path / 'size'), size=4096):
+        assert os.path.getsize(path) <= 4096
+    outputs = split_capture(capture, str(tmp_path / 'time'), seconds=0.25)
+    first = _records(capture)[1][0][0]
+    for path in outputs:
+        timestamps = [ts for ts, _ in _records(path)[1]]
+        assert len({(ts - first) // 250000000 for ts in timestamps}) == 1
+    assert sum(len(_records(path)[1]) for path in outputs) == len(_records(capture)[1])
+
+
+def test_merge_converts_byte_order_and_precision(tmp_path, traffic):
+    first = write_pcap(str(tmp_path / 'even.pcap'), traffic[0::2])
+    second = write_pcap(str(tmp_path / 'odd.pcap'), traffic[1::2], byteorder='>', nanosecond=True)
+    merged = str(tmp_path / 'merged.pcap')
+    assert merge_captures([first, second], merged) == len(traffic)
+    header, records = _records(merged)
+    assert (header['byte_order'], header['ts_divisor']) == ('<', 1000000)
+    expected = _records(write_pcap(str(tmp_path / 'all.pcap'), traffic))[1]
+    assert [frame for _, frame in records] == [frame for _, frame in expected]
+    # 纳秒时间戳换算为微秒时截断，与直接按微秒写出的时间戳最多差1微秒
+    assert all(abs(b - a) <= 1000 for (a, _), (b, _) in zip(records, expected))
+
+
+def test_merge_rejects_mixed_link_types(tmp_path, traffic):
+    first = write_pcap(str(tmp_path / 'ethernet.pcap'), traffic)
+    second = write_pcap(str(tmp_path / 'sll.pcap'), traffic, LINKTYPE_LINUX_SLL)
+    with pytest.raises(ValueError, match='链路类型'):
+        merge_captures([first, second], str(tmp_path / 'merged.pcap'))
+
+
+def test_slice_by_time_and_host(tmp_path, traffic, capture):
+    output = str(tmp_path / 'window.pcap')
+    assert slice_capture(capture, output, start=traffic[100][0], end=traffic[300][0]) == 200
+    assert _records(output)[1] == _records(capture)[1][100:300]
+
+    address = socket.inet_aton('8.8.8.8')
+    expected = sum(1 for _, ethertype, data, _ in traffic
+                   if ethertype == ETHERTYPE_IPV4 and address in (data[12:16], data[16:20]))
+    assert expected > 0
+    assert slice_capture(capture, output, host='8.8.8.8') == expected
@@ -0,0 +1,109 @@
+"""双向流表：按方向计数、按最近活跃淘汰、空闲超时和跨分片合并"""
+import pytest
+
+from pcap_analysis.analyzer import analyze_file
+from pcap_analysis.flows import LAST_TS, FlowTable
+from pcapgen import ETHERTYPE_IPV4, ipv4, tcp, udp, write_pcap
+
+START = 1700000000.0
+CLIENT, SERVER = ('10.0.0.1', 40000), ('10.0.0.2', 443)
+
+
+def _add(table, ts, src, dst, size, protocol=6):
+    table.add(ts, protocol, src[0], src[1], dst[0], dst[1], size)
+
+
+def _flow(summary, port):
+    return next(flow for flow in summary['top_flows'] if port in (flow['source_port'], flow['destination_port']))
+
+
+def test_directions_follow_initiator():
+    table = FlowTable()
+    # 服务器地址较小，发起方仍是第一个包的发送方
+    _add(table, START, ('10.0.0.9', 50000), ('10.0.0.2', 80), 100)
+    _add(table, START + 0.5, ('10.0.0.2', 80), ('10.0.0.9', 50000), 1500)
+    _add(table, START + 1, ('10.0.0.9', 50000), ('10.0.0.2', 80), 60)
+    summary = table.summary()
+    assert summary['flows'] == 1 and summary['host_pairs'] == 1
+    flow = summary['top_flows'][0]
+    assert (flow['source'], flow['source_port'], flow['destination_port']) == ('10.0.0.9', 50000, 80)
+    assert (flow['forward_packets'], flow['forward_bytes']) == (2, 160)
+    assert (flow['reverse_packets'], flow['reverse_bytes']) == (1, 1500)
+    assert flow['duration'] == 1 and flow['throughput_bps'] == 1660 * 8
+
+
+def test_active_flow_survives_eviction():
+    table = FlowTable(max_flows=4)
+    _add(table, START, CLIENT, SERVER, 1000)
+    for i in range(20):
+        # 长连接持续有包，短流一个接一个出现
+        _add(table, START + i + 0.5, ('10.0.1.%d' % (i + 1), 5000), ('10.0.0.53', 53), 80, protocol=17)
+        _add(table, START + i + 1, SERVER, CLIENT, 1000)
+    summary = table.summary()
+    assert summary['flows'] == 21 and summary['evicted_flows'] == 17
+    flow = _flow(summary, SERVER[1])
+    assert flow['packets'] == 21 and flow['source'] == CLIENT[0]
+
+
+def test_idle_flow_expires():
+    table = FlowTable(idle_timeout=60)
+    _add(table, START, CLIENT, SERVER, 100)
+    _add(table, START + 50, ('10.0.0.3', 1), ('10.0.0.4', 2), 100)
+    # 新流出现时结束空闲超过60秒的流，之后同一五元组的包算作新的流；空闲结束的流不计入淘汰数
+    _add(table, START + 100, ('10.0.0.5', 1), ('10.0.0.6', 2), 100)
+    assert len(table.flows) == 2
+    _add(table, START + 101, CLIENT, SERVER, 100)
+    summary = table.summary()
+    assert summary['flows'] == 4 and summary['evicted_flows'] == 0
+    assert summary['top_host_pairs'][0]['hosts'] == '10.0.0.1 <-> 10.0.0.2'
+    assert summary['top_host_pairs'][0]['flows'] == 2
+
+
+def _packets():
+    packets = []
+    for i in range(400):
+        ts = START + i * 0.05
+        client = ('10.1.%d.%d' % (i % 3, i % 7 + 1), 30000 + i % 11)
+        if i % 2:
+            packets.append((ts, 17, client, ('10.0.0.53', 53), 60 + i % 5))
+        else:
+            packets.append((ts, 6, SERVER, client, 200 + i))
+    return packets
+
+
+@pytest.mark.parametrize('split', [1, 150, 399])
+def test_merge_equals_single_pass(split):
+    def feed(packets):
+        table = FlowTable()
+        for ts, protocol, src, dst, size in packets:
+            _add(table, ts, src, dst, size, protocol)
+        return table
+
+    packets = _packets()
+    merged = feed(packets[:split])
+    merged.merge(feed(packets[split:]))
+    assert merged.summary() == feed(packets).summary()
+
+
+def test_merge_keeps_most_recent_flows():
+    first, second = FlowTable(max_flows=3), FlowTable(max_flows=3)
+    for i in range(3):
+        _add(first, START + i, ('10.0.0.%d' % (i + 1), 1), SERVER, 10)
+        _add(second, START + i + 0.5, ('10.0.1.%d' % (i + 1), 1), SERVER, 10)
+    first.merge(second)
+    assert first.summary()['evicted_flows'] == 3 and len(first.flows) == 3
+    assert [flow[LAST_TS] for flow in first.flows.values()] == [START + 1.5, START + 2, START + 2.5]
+
+
+@pytest.mark.parametrize('backend', ['native', 'numpy'])
+def test_flows_in_capture(tmp_path, backend):
+    frames = []
+    for ts, protocol, src, dst, size in _packets():
+        segment = tcp(src[1], dst[1], payload=b'x' * size) if protocol == 6 else udp(src[1], dst[1], b'x' * size)
+        frames.append((ts, ETHERTYPE_IPV4, ipv4(src[0], dst[0], protocol, segment), ()))
+    expected = FlowTable()
+    for ts, protocol, src, dst, size in _packets():
+        _add(expected, ts, src, dst, size, protocol)
+    result = analyze_file(write_pcap(str(tmp_path / 'flows.pcap'), frames), backend)
+    assert result['flows']['flows'] == expected.summary()['flows']
+    assert result['flows']['host_pairs'] == expected.summary()['host_pairs']
@@ -0,0 +1,60 @@
+"""跟踪仍在写入的抓包：增量读取、重写后重新统计和损坏的记录头"""
+import struct
+
+from analyze_pcap_basic import PcapFollower
+from pcap_analysis.pcapfile import PCAP_GLOBAL_HEADER_LEN
+from pcapgen import mixed_traffic, write_pcap
+
+
+def _capture(tmp_path, count, shift=0.0):
+    packets = [(ts + shift, ethertype, data, tags) for ts, ethertype, data, tags in mixed_traffic(count)]
+    path = write_pcap(str(tmp_path / 'source.pcap'), packets)
+    with open(path, 'rb') as f:
+        return f.read(), len(packets)
+
+
+def test_reads_records_as_they_are_written(tmp_path):
+    data, count = _capture(tmp_path, 200)
+    path = tmp_path / 'live.pcap'
+    follower = PcapFollower(str(path), chunk_size=256)
+    total = 0
+    # 每次写入的长度与记录边界无关，写了一半的记录留到下次
+    for end in range(0, len(data) + 1000, 1000):
+        path.write_bytes(data[:end])
+        total += follower.poll()
+    assert total == count == follower.stats.packet_count
+    assert follower.offset == len(data) and follower.poll() == 0
+
+
+def test_rewritten_file_is_counted_again(tmp_path):
+    data, count = _capture(tmp_path, 100)
+    path = tmp_path / 'live.pcap'
+    path.write_bytes(data)
+    follower = PcapFollower(str(path))
+    assert follower.poll() == count
+    # 原地重写为另一份更长的抓包（inode不变）
+    longer, longer_count = _capture(tmp_path, 150, shift=60)
+    with open(path, 'r+b') as f:
+        f.write(longer)
+    assert follower.poll() == longer_count and follower.stats.packet_count == longer_count
+
+
+def test_corrupt_header_stops_reading(tmp_path):
+    data, count = _capture(tmp_path, 100)
+    path = tmp_path / 'live.pcap'
+    # 有效记录之后是长度字段损坏的记录头，后面的数据不应被缓存或解析
+    corrupt = struct.pack('<LLLL', 1700000000, 0, 0x7FFFFFF0, 0x7FFFFFF0)
+    path.write_bytes(data + corrupt + b'\x00' * 100000)
+    follower = PcapFollower(str(path), chunk_size=4096)
+    assert follower.poll() == count
+    assert follower.offset == len(data)
+    assert follower.corrupt is not None and follower.stats.warnings == [follower.corrupt]
+    with open(path, 'ab') as f:
+        f.write(b'\x00' * 1000)
+    assert follower.poll() == 0 and follower.stats.warnings == [follower.corrupt]
+
+    # 文件被截断重写后从头统计
+    path.write_bytes(data[:PCAP_GLOBAL_HEADER_LEN])
+    assert follower.poll() == 0 and follower.corrupt is None
+    path.write_bytes(data)
+    assert follower.poll() == count
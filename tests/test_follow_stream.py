@@ -0,0 +1,82 @@
+"""按流索引提取单条流：记录、载荷重组和索引重建"""
+import os
+
+import pytest
+
+from pcap_analysis.analyzer import analyze_file
+from pcap_analysis.follow import INDEX_SUFFIX, follow_flow
+from pcap_analysis.tcp import ACK, SYN
+from pcapgen import ETHERTYPE_IPV4, ETHERTYPE_IPV6, ipv4, ipv6, mixed_traffic, tcp, udp, write_pcap
+
+CLIENT, SERVER = ('10.9.0.1', 41000), ('10.9.0.2', 8080)
+
+
+def _segment(ts, from_client, **fields):
+    src, dst = (CLIENT, SERVER) if from_client else (SERVER, CLIENT)
+    return ts, ETHERTYPE_IPV4, ipv4(src[0], dst[0], 6, tcp(src[1], dst[1], **fields)), ()
+
+
+def _conversation(start):
+    """客户端数据乱序到达且有重传；服务器的数据中间缺一段"""
+    return [
+        _segment(start, True, seq=1000, ack=0, flags=SYN),
+        _segment(start + 0.01, False, seq=5000, ack=1001, flags=SYN | ACK),
+        _segment(start + 0.02, True, seq=1001, ack=5001, payload=b'hello '),
+        _segment(start + 0.03, True, seq=1013, ack=5001, payload=b'world!'),
+        _segment(start + 0.04, True, seq=1007, ack=5001, payload=b'there '),
+        _segment(start + 0.05, True, seq=1007, ack=5001, payload=b'there '),
+        _segment(start + 0.06, False, seq=5001, ack=1019, payload=b'OK'),
+        _segment(start + 0.07, False, seq=5006, ack=1019, payload=b'tail')
+    ]
+
+
+@pytest.fixture
+def capture(tmp_path):
+    background = mixed_traffic(1200)
+    conversation = _conversation(background[100][0] + 0.0001)
+    # 目标流的记录分散在其他流量之间
+    packets = sorted(background + conversation, key=lambda packet: packet[0])
+    return write_pcap(str(tmp_path / 'mixed.pcap'), packets), len(conversation)
+
+
+def test_extract_tcp_flow(tmp_path, capture):
+    path, count = capture
+    output = str(tmp_path / 'flow.pcap')
+    prefix = str(tmp_path / 'flow')
+    summary = follow_flow(path, 'tcp', SERVER, CLIENT, output=output, payload_prefix=prefix)
+    assert summary['packets'] == count
+    result = analyze_file(output, 'native')
+    assert result['totalPackets'] == count and result['flows']['flows'] == 1
+    assert summary['payload']['client'] == {'path': prefix + '.client.bin', 'bytes': 18, 'missing_bytes': 0}
+    assert summary['payload']['server']['missing_bytes'] == 3
+    with open(prefix + '.client.bin', 'rb') as f:
+        assert f.read() == b'hello there world!'
+    with open(prefix + '.server.bin', 'rb') as f:
+        assert f.read() == b'OKtail'
+
+
+def test_index_reused_until_file_changes(tmp_path, capture):
+    path, count = capture
+    follow_flow(path, 'tcp', CLIENT, SERVER)
+    index_path = path + INDEX_SUFFIX
+    os.utime(index_path, (1000, 1000))
+    assert follow_flow(path, 'tcp', CLIENT, SERVER)['packets'] == count
+    assert os.path.getmtime(index_path) == 1000
+
+    # 文件被改写后重建索引
+    write_pcap(path, _conversation(1700000000.0)[:3])
+    assert follow_flow(path, 'tcp', CLIENT, SERVER)['packets'] == 3
+    assert os.path.getmtime(index_path) != 1000
+
+
+def test_udp_over_ipv6_and_missing_flow(tmp_path):
+    client, server = ('2001:db8::1', 5353), ('2001:db8::2', 9000)
+    packets = [(1700000000.0 + i * 0.01, ETHERTYPE_IPV6,
+                ipv6(client[0], server[0], 17, udp(client[1], server[1], b'%d;' % i)), ()) for i in range(5)]
+    path = write_pcap(str(tmp_path / 'udp.pcap'), packets)
+    prefix = str(tmp_path / 'udp')
+    summary = follow_flow(path, 'udp', client, server, payload_prefix=prefix)
+    assert summary['packets'] == 5 and summary['payload']['client']['bytes'] == 10
+    with open(prefix + '.client.bin', 'rb') as f:
+        assert f.read() == b'0;1;2;3;4;'
+    assert follow_flow(path, 'tcp', client, server)['packets'] == 0
@@ -0,0 +1,57 @@
+"""结构化JSON输出和列式导出"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from pcap_analysis.analyzer import analyze
+from pcap_analysis.result import RESULT_SCHEMA_VERSION, write_columnar
+from pcapgen import mixed_traffic, write_pcap
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 与前端 PacketData 一致的顶层字段
+PACKET_DATA_FIELDS = ('captureInfo', 'totalPackets', 'totalSize', 'duration', 'protocols', 'topTalkers',
+                      'conversations', 'suspiciousActivities', 'trafficPattern')
+
+
+@pytest.fixture(scope='module')
+def capture(tmp_path_factory):
+    return write_pcap(str(tmp_path_factory.mktemp('output') / 'mixed.pcap'), mixed_traffic(1200))
+
+
+def _run(*args):
+    completed = subprocess.run([sys.executable, '-m', 'pcap_analysis', *args, '--no-cache'],
+                               capture_output=True, text=True, cwd=PROJECT_ROOT, check=True)
+    return completed.stdout
+
+
+def test_json_output(capture):
+    result = json.loads(_run(capture, '--backend', 'native', '--format', 'json'))
+    assert result['schemaVersion'] == RESULT_SCHEMA_VERSION
+    assert all(field in result for field in PACKET_DATA_FIELDS)
+    assert result['captureInfo']['fileSize'] == os.path.getsize(capture)
+    assert result == json.loads(json.dumps(analyze(capture, backend='native', use_cache=False)))
+    # 文本格式只输出报告
+    assert _run(capture, '--backend', 'native') == result['report'] + '\n'
+
+
+def test_columnar_npz(tmp_path, capture):
+    np = pytest.importorskip('numpy')
+    path = str(tmp_path / 'tables.npz')
+    result = analyze(capture, backend='native', use_cache=False, columnar_path=path)
+    with np.load(path) as tables:
+        assert int(tables['timeseries.packets'].sum()) == result['totalPackets']
+        assert int(tables['timeseries.bytes'].sum()) == result['totalSize']
+        columns = [tables[f"conversations.{column}"] for column in ('source', 'destination', 'packets', 'bytes')]
+        assert len({len(column) for column in columns}) == 1 and len(columns[0]) > 0
+        top = result['conversations'][0]
+        index = int(columns[2].argmax())
+        assert (columns[0][index], columns[1][index], columns[2][index]) == (top['source'], top['destination'],
+                                                                             top['packets'])
+
+
+def test_columnar_rejects_unknown_format(tmp_path):
+    with pytest.raises(ValueError, match='.csv'):
+        write_columnar(str(tmp_path / 'tables.csv'), {'conversations': {'packets': [1]}})
@@ -0,0 +1,82 @@
+"""完整性检查、尾部截断和损坏区域之后的重新同步"""
+import struct
+
+import pytest
+
+from pcap_analysis.analyzer import analyze_file
+from pcap_analysis.repair import DEFAULT_GLOBAL_HEADER, check_capture, repair_capture
+from pcapgen import mixed_traffic, write_pcap
+
+
+@pytest.fixture(scope='module')
+def original(tmp_path_factory):
+    path = write_pcap(str(tmp_path_factory.mktemp('repair') / 'mixed.pcap'), mixed_traffic(1200))
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _offsets(data):
+    """各记录的起始位置，最后一项为文件末尾"""
+    offsets = [24]
+    while offsets[-1] < len(data):
+        offsets.append(offsets[-1] + 16 + struct.unpack_from('<I', data, offsets[-1] + 8)[0])
+    return offsets
+
+
+def _write(tmp_path, data):
+    path = tmp_path / 'capture.pcap'
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_valid_file(tmp_path, original):
+    report = check_capture(_write(tmp_path, original))
+    assert report['valid'] and report['packets'] == len(_offsets(original)) - 1
+    assert repair_capture(report['path'])['valid']
+    assert (tmp_path / 'capture.pcap').read_bytes() == original
+
+
+@pytest.mark.parametrize('cut, problem', [(5, 'truncated_header'), (30, 'truncated_record')])
+def test_truncate_incomplete_tail(tmp_path, original, cut, problem):
+    offsets = _offsets(original)
+    path = _write(tmp_path, original[:offsets[-2] + cut])
+    report = check_capture(path)
+    assert report['problem'] == problem and report['first_bad_offset'] == offsets[-2]
+    assert report['packets'] == len(offsets) - 2
+    repair_capture(path, resync=False)
+    assert (tmp_path / 'capture.pcap').read_bytes() == original[:offsets[-2]]
+    assert check_capture(path)['valid']
+
+
+def test_resync_skips_damaged_record(tmp_path, original):
+    offsets = _offsets(original)
+    damaged = len(offsets) // 2
+    data = bytearray(original)
+    data[offsets[damaged]:offsets[damaged] + 16] = b'\xff' * 16
+    path = _write(tmp_path, bytes(data))
+
+    report = check_capture(path, resync=True)
+    assert report['problem'] == 'bad_header' and report['first_bad_offset'] == offsets[damaged]
+    assert report['skipped'] == [{'offset': offsets[damaged], 'length': offsets[damaged + 1] - offsets[damaged]}]
+    assert report['packets'] == len(offsets) - 2
+
+    repair_capture(path)
+    assert (tmp_path / 'capture.pcap').read_bytes() == original[:offsets[damaged]] + original[offsets[damaged + 1]:]
+    assert analyze_file(path, 'native')['totalPackets'] == len(offsets) - 2
+
+
+def test_truncate_at_damaged_record(tmp_path, original):
+    offsets = _offsets(original)
+    data = bytearray(original)
+    data[offsets[10]:offsets[10] + 16] = b'\xff' * 16
+    path = _write(tmp_path, bytes(data))
+    assert check_capture(path)['skipped'] == [{'offset': offsets[10], 'length': len(original) - offsets[10]}]
+    repair_capture(path, resync=False)
+    assert (tmp_path / 'capture.pcap').read_bytes() == original[:offsets[10]]
+
+
+def test_truncated_global_header(tmp_path, original):
+    path = _write(tmp_path, original[:10])
+    assert check_capture(path)['problem'] == 'truncated_global_header'
+    repair_capture(path)
+    assert (tmp_path / 'capture.pcap').read_bytes() == DEFAULT_GLOBAL_HEADER
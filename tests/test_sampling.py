@@ -0,0 +1,44 @@
+"""抽样估算：小文件给出精确值，大文件的置信区间覆盖真实值"""
+import pytest
+
+from pcap_analysis.analyzer import analyze, analyze_file
+from pcap_analysis.sampling import estimate
+from pcapgen import mixed_traffic, write_pcap
+
+
+@pytest.fixture(scope='module')
+def large(tmp_path_factory):
+    path = write_pcap(str(tmp_path_factory.mktemp('sampling') / 'large.pcap'), mixed_traffic(60000))
+    return path, analyze_file(path, 'native')
+
+
+def test_small_file_is_exact(tmp_path):
+    path = write_pcap(str(tmp_path / 'small.pcap'), mixed_traffic(600))
+    expected = analyze_file(path, 'native')
+    result = estimate(path, windows=8)
+    assert not result['estimated'] and result['sampling']['method'] == 'exact'
+    assert (result['totalPackets'], result['totalSize']) == (expected['totalPackets'], expected['totalSize'])
+    assert result['protocols'] == expected['protocols']
+
+
+def test_intervals_cover_true_values(large):
+    path, expected = large
+    result = estimate(path, windows=32, window_bytes=16 * 1024)
+    sampling = result['sampling']
+    assert result['estimated'] and sampling['method'] == 'systematic-windows'
+    assert sampling['windows'] == 32 and sampling['fraction'] < 0.2
+    for name, key in (('totalPackets', 'totalPackets'), ('totalSize', 'totalSize')):
+        interval = sampling[key]
+        assert interval['low'] <= expected[name] <= interval['high']
+        assert result[name] == pytest.approx(expected[name], rel=0.05)
+    for name, count in expected['protocols'].items():
+        share = sampling['protocols'][name]
+        assert share['low'] <= count / expected['totalPackets'] <= share['high']
+
+
+def test_analyze_sample_option(large):
+    path, expected = large
+    result = analyze(path, sample=16, use_cache=False)
+    assert result['backend'] == 'sample' and result['estimated']
+    assert result['sampling']['windows'] == 16
+    assert analyze('-', sample=16)['error']['code'] == 'INVALID_OPTIONS'
@@ -0,0 +1,130 @@
+"""工作进程池：进程崩溃和回调出错后调度线程继续工作；RPC前端拒绝格式错误的请求"""
+import threading
+import time
+
+import pytest
+
+from pcap_analysis.server import INVALID_PARAMS, INVALID_REQUEST, JOB_FAILED, PARSE_ERROR, RpcServer, WorkerPool
+from pcapgen import mixed_traffic, write_pcap
+
+WAIT = 60
+
+
+@pytest.fixture(scope='module')
+def captures(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('server')
+    return {
+        'large': write_pcap(str(directory / 'large.pcap'), mixed_traffic(60000)),
+        'small': write_pcap(str(directory / 'small.pcap'), mixed_traffic(600))
+    }
+
+
+@pytest.fixture
+def pool():
+    pool = WorkerPool(workers=1)
+    yield pool
+    pool.shutdown()
+
+
+class _Results:
+    """收集任务回调的结果"""
+
+    def __init__(self):
+        self.results = {}
+        self.done = threading.Condition()
+
+    def __call__(self, job_id, result, error):
+        with self.done:
+            self.results[job_id] = (result, error)
+            self.done.notify_all()
+
+    def wait(self, job_id):
+        with self.done:
+            assert self.done.wait_for(lambda: job_id in self.results, WAIT), f"任务 {job_id} 没有完成"
+            return self.results[job_id]
+
+
+def _params(path):
+    return {'file_path': path, 'analyzer': 'native', 'use_cache': False}
+
+
+def test_worker_crash_fails_job_and_pool_recovers(pool, captures):
+    results = _Results()
+    pool.submit('large', _params(captures['large']), results)
+    _wait_busy(pool)
+    pool._slots[0].process.kill()
+    result, error = results.wait('large')
+    assert result is None and error['code'] == JOB_FAILED
+
+    pool.submit('small', _params(captures['small']), results)
+    result, error = results.wait('small')
+    assert error is None and result['totalPackets'] > 0
+    assert pool.status()['failed'] == 1
+
+
+def _wait_busy(pool):
+    deadline = time.monotonic() + WAIT
+    while pool.status()['busy'] == 0:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_restart_does_not_block_pool(pool, captures):
+    slot = pool._slots[0]
+    restart = slot.restart
+    restarting = threading.Event()
+
+    def slow_restart():
+        restarting.set()
+        time.sleep(1)
+        restart()
+
+    slot.restart = slow_restart
+    results = _Results()
+    pool.submit('large', _params(captures['large']), results)
+    _wait_busy(pool)
+    cancel = threading.Thread(target=pool.cancel, args=('large',))
+    cancel.start()
+    assert restarting.wait(WAIT)
+    started = time.monotonic()
+    pool.status()
+    pool.submit('small', _params(captures['small']), results)
+    assert time.monotonic() - started < 0.5
+    cancel.join()
+    assert results.wait('large')[0] is None
+    result, error = results.wait('small')
+    assert error is None and result['totalPackets'] > 0
+
+
+def test_failing_callback_keeps_dispatcher_running(pool, captures):
+    def broken(job_id, result, error):
+        raise RuntimeError("回调出错")
+
+    results = _Results()
+    pool.submit('broken', _params(captures['small']), broken)
+    pool.submit('next', _params(captures['small']), results)
+    result, error = results.wait('next')
+    assert error is None and result['totalPackets'] > 0
+    assert pool._dispatcher.is_alive()
+
+
+@pytest.mark.parametrize('line, request_id, code', [
+    ('{"id": 1, "method": "analyze"', None, PARSE_ERROR),
+    ('[1, 2]', None, INVALID_REQUEST),
+    ('{"id": [1], "method": "ping"}', None, INVALID_REQUEST),
+    ('{"id": true, "method": "ping"}', None, INVALID_REQUEST),
+    ('{"id": 1, "method": 5}', 1, INVALID_REQUEST),
+    ('{"id": 1, "method": "analyze", "params": ["a.pcap"]}', 1, INVALID_PARAMS),
+    ('{"id": 1, "method": "analyze", "params": {"file_path": "a.pcap", "timeout": "30"}}', 1, INVALID_PARAMS),
+    ('{"id": 1, "method": "analyze", "params": {"file_path": "a.pcap", "timeout": -1}}', 1, INVALID_PARAMS),
+    ('{"id": 1, "method": "analyze", "params": {"file_path": "a.pcap", "deadline": NaN}}', 1, INVALID_PARAMS),
+    ('{"id": 1, "method": "cancel", "params": {"job_id": {"a": 1}}}', 1, INVALID_PARAMS)
+])
+def test_malformed_request_gets_error_response(pool, line, request_id, code):
+    server = RpcServer(pool)
+    sent = []
+    server.handle_line(line, sent.append)
+    server.handle_line('{"jsonrpc": "2.0", "id": "next", "method": "ping"}', sent.append)
+    assert sent[0]['id'] == request_id and sent[0]['error']['code'] == code
+    assert sent[1] == {'jsonrpc': '2.0', 'id': 'next', 'result': 'pong'}
+    assert pool.status()['queued'] == 0
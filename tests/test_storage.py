@@ -0,0 +1,80 @@
+"""抓包目录清单：锁外扫描、扫描期间文件变化和正在抓包的文件"""
+import os
+
+import pytest
+
+from pcap_analysis import storage
+from pcap_analysis.storage import CaptureStore
+from pcapgen import mixed_traffic, write_pcap
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CaptureStore(str(tmp_path), max_bytes=1 << 30, retention_days=0, compress_after=1 << 30)
+
+
+def _scan_without_lock(monkeypatch, store, before_scan=None):
+    """扫描时断言锁文件不存在；before_scan(path) 在每次扫描前调用"""
+    scan = storage.scan_capture
+    calls = []
+
+    def checked(path):
+        assert not os.path.exists(store.lock_path)
+        calls.append(os.path.basename(path))
+        if before_scan is not None:
+            before_scan(path)
+        return scan(path)
+
+    monkeypatch.setattr(storage, 'scan_capture', checked)
+    return calls
+
+
+def test_sync_scans_outside_lock(monkeypatch, store):
+    first, second = mixed_traffic(50), mixed_traffic(20)
+    write_pcap(os.path.join(store.root, 'a.pcap'), first)
+    write_pcap(os.path.join(store.root, 'b.pcap'), second)
+    calls = _scan_without_lock(monkeypatch, store)
+    captures = store.list()
+    assert sorted(calls) == ['a.pcap', 'b.pcap']
+    assert (captures['a.pcap']['packets'], captures['b.pcap']['packets']) == (len(first), len(second))
+    # 没有变化的文件不再扫描
+    store.sync()
+    assert len(calls) == 2
+
+
+def test_file_changed_during_scan_is_rescanned(monkeypatch, store):
+    path = os.path.join(store.root, 'grow.pcap')
+    grown = mixed_traffic(30)
+    write_pcap(path, mixed_traffic(10))
+
+    def grow(scanned_path):
+        # 第一次扫描期间文件被改写
+        if len(calls) == 1:
+            write_pcap(scanned_path, grown)
+            os.utime(scanned_path, (1000, 1000))
+
+    calls = _scan_without_lock(monkeypatch, store, grow)
+    entry = store.sync()['grow.pcap']
+    assert calls == ['grow.pcap', 'grow.pcap']
+    assert (entry['packets'], entry['size'], entry['modified']) == (len(grown), os.path.getsize(path), 1000)
+
+
+def test_capture_started_during_scan_stays_active(monkeypatch, store):
+    path = os.path.join(store.root, 'live.pcap')
+    packets = mixed_traffic(10)
+    write_pcap(path, packets)
+    _scan_without_lock(monkeypatch, store, lambda scanned_path: store.begin(scanned_path, 'eth0'))
+    assert store.sync()['live.pcap']['state'] == 'active'
+
+    monkeypatch.undo()
+    entry = store.finish(path, 'eth1')
+    assert entry['state'] == 'complete' and entry['packets'] == len(packets)
+    assert entry['interfaces'] == ['eth0', 'eth1']
+
+
+def test_removed_files_leave_catalog(store):
+    path = write_pcap(os.path.join(store.root, 'old.pcap'), mixed_traffic(5))
+    assert 'old.pcap' in store.list()
+    os.remove(path)
+    assert store.sync() == {}
+    assert store.finish(path) is None
@@ -0,0 +1,53 @@
+"""从输入流分析和损坏的记录头"""
+import io
+import struct
+
+import pytest
+
+from pcap_analysis.analyzer import analyze_file, analyze_stream
+from pcap_analysis.edit import split_capture
+from pcap_analysis.follow import build_index
+from pcapgen import mixed_traffic, write_pcap
+
+BACKENDS = ['native', 'numpy']
+
+
+@pytest.fixture(scope='module')
+def capture(tmp_path_factory):
+    return write_pcap(str(tmp_path_factory.mktemp('stream') / 'mixed.pcap'), mixed_traffic(1200))
+
+
+@pytest.fixture
+def corrupt(tmp_path, capture):
+    """完整的抓包之后跟一个声称3GB的记录头和一段垃圾数据"""
+    path = tmp_path / 'corrupt.pcap'
+    with open(capture, 'rb') as f:
+        data = f.read()
+    path.write_bytes(data + struct.pack('<IIII', 1700000000, 0, 3 << 30, 3 << 30) + b'\xee' * (1 << 20))
+    return str(path)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_stream_matches_file(capture, backend):
+    with open(capture, 'rb') as f:
+        streamed = analyze_stream(io.BytesIO(f.read()), backend=backend)
+    result = analyze_file(capture, backend)
+    for key in ('totalPackets', 'totalSize', 'protocols', 'topTalkers', 'tcp', 'dns', 'flows'):
+        assert streamed[key] == result[key]
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_corrupt_record_stops_with_warning(capture, corrupt, backend):
+    expected = analyze_file(capture, backend)['totalPackets']
+    with open(corrupt, 'rb') as f:
+        for result in (analyze_file(corrupt, backend), analyze_stream(f, backend=backend)):
+            assert result['partial']
+            assert result['totalPackets'] == expected
+            assert any('pcap_analysis.repair' in warning for warning in result['warnings'])
+
+
+def test_corrupt_record_rejected_by_file_tools(tmp_path, corrupt):
+    with pytest.raises(ValueError, match='pcap_analysis.repair'):
+        build_index(corrupt, str(tmp_path / 'corrupt.flowidx'))
+    with pytest.raises(ValueError, match='记录头无效'):
+        split_capture(corrupt, str(tmp_path / 'part'), packets=1000)
@@ -0,0 +1,73 @@
+"""TCP性能阶段：握手和数据往返时延、重传、重复ACK、零窗口和复位"""
+import pytest
+
+from pcap_analysis.analyzer import analyze_file
+from pcap_analysis.tcp import ACK, RST, SYN, TcpAnalyzer, seq_after
+from pcapgen import ETHERTYPE_IPV4, ipv4, tcp, write_pcap
+
+CLIENT, SERVER = '10.0.0.1', '10.0.0.2'
+DATA = b'd' * 100
+
+# (时间, 是否客户端发出, TCP段)
+CONVERSATION = [
+    (0.000, True, tcp(40000, 80, seq=100, ack=0, flags=SYN)),
+    (0.030, False, tcp(80, 40000, seq=500, ack=101, flags=SYN | ACK)),
+    (0.031, True, tcp(40000, 80, seq=101, ack=501, flags=ACK)),
+    (0.040, True, tcp(40000, 80, seq=101, ack=501, payload=DATA)),
+    (0.060, False, tcp(80, 40000, seq=501, ack=201, flags=ACK)),
+    (0.070, True, tcp(40000, 80, seq=201, ack=501, payload=DATA)),
+    (0.080, False, tcp(80, 40000, seq=501, ack=201, flags=ACK)),
+    (0.090, True, tcp(40000, 80, seq=201, ack=501, payload=DATA)),
+    (0.100, False, tcp(80, 40000, seq=501, ack=301, flags=ACK)),
+    (0.110, False, tcp(80, 40000, seq=501, ack=301, flags=ACK, window=0)),
+    (0.120, True, tcp(40000, 80, seq=301, ack=501, flags=RST))
+]
+
+
+def _check(summary):
+    assert summary['connections'] == 1 and summary['handshakes'] == 1
+    assert summary['segments'] == len(CONVERSATION) and summary['data_segments'] == 3
+    assert summary['retransmissions'] == 1 and summary['dup_acks'] == 1
+    assert summary['zero_windows'] == 1 and summary['resets'] == 1
+    assert summary['handshake_rtt_ms']['avg'] == pytest.approx(30, abs=0.01)
+    # 重传覆盖了第二个数据段的计时样本（Karn算法），只有第一个数据段的往返时延
+    assert summary['data_rtt_ms']['count'] == 1
+    assert summary['data_rtt_ms']['avg'] == pytest.approx(20, abs=0.01)
+
+
+def test_conversation():
+    analyzer = TcpAnalyzer()
+    for ts, from_client, segment in CONVERSATION:
+        src, dst = (CLIENT, SERVER) if from_client else (SERVER, CLIENT)
+        analyzer.process(1700000000 + ts, src, dst, segment)
+    _check(analyzer.summary())
+    # RST 结束连接，连接表中不再保留
+    assert not analyzer.connections
+
+
+@pytest.mark.parametrize('backend', ['native', 'numpy'])
+def test_conversation_from_capture(tmp_path, backend):
+    packets = [(1700000000 + ts, ETHERTYPE_IPV4,
+                ipv4(*((CLIENT, SERVER) if from_client else (SERVER, CLIENT)), 6, segment), ())
+               for ts, from_client, segment in CONVERSATION]
+    _check(analyze_file(write_pcap(str(tmp_path / 'tcp.pcap'), packets), backend)['tcp'])
+
+
+def test_connection_table_is_bounded():
+    analyzer = TcpAnalyzer(max_flows=10, idle_timeout=5)
+    for i in range(50):
+        analyzer.process(1700000000 + i * 0.001, CLIENT, SERVER, tcp(10000 + i, 80, flags=SYN))
+    assert len(analyzer.connections) == 10 and analyzer.evicted == 40
+    # 超过空闲时间的连接在新连接到来时结束
+    analyzer.process(1700000010, CLIENT, SERVER, tcp(20000, 80, flags=SYN))
+    assert len(analyzer.connections) == 1
+    assert analyzer.summary()['connections'] == 51
+
+
+def test_sequence_wraparound():
+    assert seq_after(5, 0xFFFFFFF0)
+    assert not seq_after(0xFFFFFFF0, 5)
+    analyzer = TcpAnalyzer()
+    for seq in (0xFFFFFF00, 0xFFFFFF64, 0x00000008):
+        analyzer.process(1700000000, CLIENT, SERVER, tcp(40000, 80, seq=seq, payload=DATA))
+    assert analyzer.retransmissions == 0
@@ -0,0 +1,78 @@
+"""吞吐量时间序列：分桶、突发检测、桶数上限和合并"""
+import pytest
+
+from pcap_analysis import timeseries
+from pcap_analysis.timeseries import ThroughputSeries
+
+START = 1700000000.0
+
+
+def _steady_with_burst(seconds=10, rate=10, burst_second=4, burst_rate=100):
+    """每秒 rate 个100字节的包，第 burst_second 秒为 burst_rate 个1000字节的包"""
+    packets = []
+    for second in range(seconds):
+        count, size = (burst_rate, 1000) if second == burst_second else (rate, 100)
+        packets.extend((START + second + i / count, size) for i in range(count))
+    return packets
+
+
+def _series(packets, **options):
+    series = ThroughputSeries(**options)
+    for ts, size in packets:
+        series.add(ts, size)
+    return series
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def backend(request, monkeypatch):
+    if request.param == 'python':
+        monkeypatch.setattr(timeseries, 'np', None)
+    elif timeseries.np is None:
+        pytest.skip('没有安装numpy')
+
+
+def test_buckets_and_bursts(backend):
+    summary = _series(_steady_with_burst()).summary(include_series=True)
+    assert summary['buckets'] == 10 and summary['interval_ms'] == 1000
+    assert summary['packets'] == [10] * 4 + [100] + [10] * 5
+    assert summary['pps']['p50'] == 10 and summary['pps']['max'] == 100
+    assert summary['bursts'] == 1 and summary['drops'] == 0
+    assert summary['peaks'][0] == {'time': START + 4, 'packets': 100, 'bytes': 100000}
+    assert summary['size_distribution'] == {'80-159': 90, '640-1279': 100}
+    assert sum(summary['inter_arrival_distribution'].values()) == 189
+
+
+def test_python_fallback_matches_numpy(monkeypatch):
+    if timeseries.np is None:
+        pytest.skip('没有安装numpy')
+    packets = _steady_with_burst()
+    expected = _series(packets, interval=0.1, batch_size=37).summary(include_series=True)
+    monkeypatch.setattr(timeseries, 'np', None)
+    result = _series(packets, interval=0.1, batch_size=37).summary(include_series=True)
+    assert result.pop('inter_arrival_us')['count'] > 0
+    expected.pop('inter_arrival_us')
+    assert result == expected
+
+
+def test_bucket_count_is_bounded(backend):
+    packets = [(START + second, 100) for second in range(100)]
+    summary = _series(packets, max_buckets=8).summary(include_series=True)
+    assert summary['buckets'] <= 8 and summary['interval_ms'] == 16000
+    assert sum(summary['packets']) == 100 and sum(summary['bytes']) == 10000
+
+
+@pytest.mark.parametrize('intervals', [(1.0, 1.0), (0.25, 1.0), (1.0, 0.5)])
+def test_merge_matches_single_pass(backend, intervals):
+    packets = _steady_with_burst()
+    first = _series(packets[:120], interval=intervals[0])
+    first.merge(_series(packets[120:], interval=intervals[1]))
+    whole = _series(packets, interval=max(intervals)).summary(include_series=True)
+    merged = first.summary(include_series=True)
+    for key in ('interval_ms', 'start', 'packets', 'bytes', 'size_distribution', 'inter_arrival_distribution'):
+        assert merged[key] == whole[key]
+
+
+def test_merge_rejects_incompatible_intervals():
+    first = _series(_steady_with_burst(), interval=1.0)
+    with pytest.raises(ValueError, match='不成倍数'):
+        first.merge(_series(_steady_with_burst(), interval=0.3))
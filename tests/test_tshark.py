@@ -0,0 +1,47 @@
+"""tshark 后端：用假的 tshark 程序检查输出解析和 stderr 的处理"""
+import os
+import sys
+
+import pytest
+
+from pcap_analysis.analyzer import analyze_file
+from pcapgen import mixed_traffic, write_pcap
+
+FAKE_TSHARK = '''#!{python}
+import sys
+# 先写出超过管道缓冲区的诊断信息，再输出字段
+for _ in range(2048):
+    sys.stderr.write('tshark: warning ' + 'x' * 100 + '\\n')
+sys.stderr.flush()
+for i in range({packets}):
+    print(f'{{1700000000 + i * 0.5}}\\t60\\t60\\teth:ethertype:ip:udp\\t10.0.0.{{i % 4 + 1}}\\t10.0.0.9\\t\\t')
+sys.stdout.flush()
+if {fail}:
+    sys.stderr.write('tshark: The file "x.pcap" appears to have been cut short in the middle of a packet.\\n')
+    sys.exit(2)
+'''
+
+
+@pytest.fixture
+def fake_tshark(tmp_path, monkeypatch):
+    def install(packets, fail=False):
+        path = tmp_path / 'tshark'
+        path.write_text(FAKE_TSHARK.format(python=sys.executable, packets=packets, fail=fail))
+        path.chmod(0o755)
+        monkeypatch.setenv('TSHARK_PATH', str(path))
+        return write_pcap(str(tmp_path / 'capture.pcap'), mixed_traffic(10))
+    return install
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='假的 tshark 是脚本，需要 #! 解释器行')
+@pytest.mark.parametrize('packets, fail', [(100, False), (100, True), (0, True)])
+def test_large_stderr_does_not_block(fake_tshark, packets, fail):
+    result = analyze_file(fake_tshark(packets, fail), 'tshark')
+    if not packets:
+        # 没有输出任何数据包时以stderr最后一行作为错误
+        assert 'cut short' in result['error']['message']
+        return
+    assert result['totalPackets'] == packets and result['backend'] == 'tshark'
+    assert result['protocols']['UDP'] == packets
+    # 截断的文件：已输出的数据包有效，错误信息作为警告
+    assert any('cut short' in warning for warning in result['warnings']) == fail